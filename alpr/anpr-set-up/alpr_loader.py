@@ -0,0 +1,79 @@
+"""
+Deferred import of fast_alpr.
+
+fast_alpr pulls in cv2, onnxruntime and the model hub packages, which take
+most of the startup time of the web app. Entry points import it through
+these helpers on the inference path only, so importing app.py or
+alpr_service.py (and serving health checks or logs) stays cheap.
+"""
+import os
+import sys
+import threading
+
+_lock = threading.Lock()
+_module = None
+
+
+def _patch_pil():
+    """Restore PIL.Image.ANTIALIAS (removed in Pillow 10), which older model code still uses."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return
+    if not hasattr(Image, 'ANTIALIAS'):
+        Image.ANTIALIAS = Image.LANCZOS
+
+
+def import_fast_alpr():
+    """
+    Import fast_alpr, falling back to the bundled fast-alpr-master source.
+
+    Returns:
+        The fast_alpr module
+
+    Raises:
+        ImportError: If fast_alpr is neither installed nor bundled
+    """
+    global _module
+    with _lock:
+        if _module is None:
+            _patch_pil()
+            try:
+                import fast_alpr
+            except ImportError:
+                fast_alpr_path = os.path.join(os.path.dirname(__file__), 'fast-alpr-master')
+                if not os.path.exists(fast_alpr_path):
+                    raise
+                if fast_alpr_path not in sys.path:
+                    sys.path.insert(0, fast_alpr_path)
+                import fast_alpr
+            _module = fast_alpr
+        return _module
+
+
+def import_alpr():
+    """The fast_alpr ALPR class (see import_fast_alpr)."""
+    return import_fast_alpr().ALPR
+
+
+def shared_model_registry():
+    """
+    The process-wide fast_alpr model registry.
+
+    ALPR instances built with it share their ONNX sessions whenever the
+    model names, providers and session options match.
+    """
+    return import_fast_alpr().model_registry.default_registry
+
+
+def describe_models(registry) -> list:
+    """Loaded models of a fast_alpr ModelRegistry, for the metrics endpoints."""
+    return [
+        {
+            "kind": info.key.kind,
+            "model": info.key.model,
+            "refs": info.refs,
+            "load_seconds": round(info.load_seconds, 3),
+        }
+        for info in registry.models()
+    ]
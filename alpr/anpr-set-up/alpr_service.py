@@ -1,35 +1,44 @@
 """
 Standalone ALPR Service Module
 Can be easily integrated into existing web applications.
+
+Importing this module is cheap: fast_alpr, cv2 and numpy are imported and
+the models loaded on the first scan (or in __init__ with preload_models).
 """
 import base64
-import csv
 import json
 import logging
 import os
 import statistics
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional, Dict, List, Tuple
+from typing import TYPE_CHECKING, Callable, Optional, Dict, List, Mapping, Tuple
 
-import cv2
-import numpy as np
+from alpr_loader import describe_models, import_alpr, shared_model_registry
+from image_decode import (
+    DEFAULT_MAX_PIXELS,
+    DEFAULT_MAX_UPLOAD_BYTES,
+    ImageTooLarge,
+    crop_boxes,
+    decode_image,
+    decode_image_file,
+    decode_stats,
+    request_memory,
+)
+from event_sink import EventSink
+from log_writer import AsyncLogWriter
+from registrations import RegistrationDatabase, VehicleRecord
+from scan_feed import SSE_HEADERS, FeedFull, ScanFeed, event_filter, parse_event_id
+from scan_store import ScanStore
+from scheduler import BULK, SiteBusy, scan_lane
+from sessions import SessionEngine, parse_direction
+from watchlist import Watchlist
 
-# Import ALPR from the fast-alpr package
-try:
-    from fast_alpr import ALPR
-except ImportError:
-    # Try importing from local source if available
-    import sys
-    fast_alpr_path = os.path.join(os.path.dirname(__file__), 'fast-alpr-master')
-    if os.path.exists(fast_alpr_path):
-        sys.path.insert(0, fast_alpr_path)
-        try:
-            from fast_alpr import ALPR
-        except ImportError:
-            ALPR = None
-    else:
-        ALPR = None
+if TYPE_CHECKING:
+    import numpy as np
 
 
 class ALPRService:
@@ -42,7 +51,33 @@ class ALPRService:
         detector_model: str = "yolo-v9-t-384-license-plate-end2end",
         ocr_model: str = "cct-xs-v1-global-model",
         registrations_csv_path: Optional[str] = None,
-        logs_dir: Optional[str] = None
+        logs_dir: Optional[str] = None,
+        crop_quality=None,
+        ocr_cache=None,
+        plate_decoder=None,
+        cascade=None,
+        tiling=None,
+        log_queue_size: int = 10000,
+        log_flush_interval: float = 0.2,
+        log_overflow: str = "drop",
+        watch_registrations: bool = True,
+        registrations_poll_interval: float = 2.0,
+        registrations_snapshot_path: Optional[str] = None,
+        max_image_pixels: int = DEFAULT_MAX_PIXELS,
+        max_upload_bytes: int = DEFAULT_MAX_UPLOAD_BYTES,
+        preload_models: bool = False,
+        alpr=None,
+        model_registry=None,
+        site_id: Optional[str] = None,
+        camera_directions: Optional[Dict[str, str]] = None,
+        sessions: Optional[SessionEngine] = None,
+        watchlist_paths: Optional[List[str]] = None,
+        on_watchlist_match: Optional[Callable[[Dict], None]] = None,
+        feed: Optional[ScanFeed] = None,
+        backend_url: Optional[str] = None,
+        backend_headers: Optional[Dict[str, str]] = None,
+        event_sink: Optional[EventSink] = None,
+        session_max_hours: Optional[float] = None
     ):
         """
         Initialize ALPR Service.
@@ -52,125 +87,353 @@ class ALPRService:
             ocr_model: ALPR OCR model name
             registrations_csv_path: Path to CSV file with vehicle registrations
             logs_dir: Directory to store vehicle logs
+            crop_quality: fast_alpr CropQualityConfig. Detections whose crops fail
+                these checks skip OCR and are not logged. None runs OCR on every detection.
+            ocr_cache: fast_alpr OcrCacheConfig. Reuses the OCR result of a plate crop that
+                has not changed since the last frame (fixed cameras). None disables it.
+            plate_decoder: fast_alpr PlateDecoder, e.g. FormatConstrainedDecoder(). Reads
+                plates as the most probable string of a known registration format, so
+                check_registration sees "191-D-12345" rather than "191-D-I2345".
+                None takes the most probable character in each position.
+            cascade: fast_alpr CascadeConfig. Re-reads low-confidence or badly formatted
+                plates with a larger OCR model (and optionally runs a larger detector on
+                frames with no plate), so only the hard crops pay for the big model.
+                Escalation counts are reported by get_metrics(). None uses ocr_model alone.
+            tiling: fast_alpr TilingConfig. Runs the detector on overlapping tiles of
+                large frames, so small distant plates on wide high-resolution cameras
+                are found. None runs the detector on the whole frame.
+            log_queue_size: Maximum number of scans waiting to be written to disk
+            log_flush_interval: Seconds the log writer waits to fill a batch
+            log_overflow: "drop" or "block" when the log queue is full
+            watch_registrations: Reload the registrations CSV (and the watchlists)
+                automatically when it changes
+            registrations_poll_interval: Seconds between checks of the CSV (and the
+                watchlists) for changes
+            registrations_snapshot_path: Binary snapshot of the parsed CSV, reused at
+                startup while the CSV is unchanged. Worth it for very large registers.
+            max_image_pixels: Images larger than this are decoded at 1/2, 1/4 or 1/8
+                resolution (bounding boxes are still reported in original coordinates)
+            max_upload_bytes: Request size limit set on the Flask app by create_flask_routes
+                (if the app has none)
+            preload_models: Load the models now instead of on the first scan
+            alpr: An existing fast_alpr ALPR (or anything with the same predict
+                methods) to use instead of building one. The model arguments are
+                then ignored, and close() leaves it open. A scheduler.SiteALPR
+                runs scans in priority lanes (see lane_for).
+            model_registry: fast_alpr ModelRegistry the models are taken from.
+                Defaults to the process-wide registry, so services with the same
+                models share one set of ONNX sessions.
+            site_id: Site this service scans for (see sites.MultiSiteService). Recorded
+                in every log entry, and gives the service its own scan logger.
+            camera_directions: camera_id -> "entry" or "exit". Scans from these
+                cameras open and close vehicle sessions (see get_occupancy).
+            sessions: SessionEngine to record sessions in, e.g. one shared by
+                several sites. Defaults to one of this service's own, snapshotted
+                to <logs_dir>/sessions.snapshot.
+            watchlist_paths: Watchlist CSV files of full or partial plates ("191-D-1??48",
+                "*XYZ*"), one list each (see watchlist.py). Every read plate is
+                matched against all of them.
+            on_watchlist_match: Called with an alert dict (plate_text, matches,
+                confidence, camera_id, site_id, timestamp) whenever a read plate
+                is on a watchlist. Runs on the scanning thread, so hand slow work
+                (notifications, HTTP calls) to a queue.
+            feed: ScanFeed every logged scan is published to, e.g. one shared by
+                several sites. Defaults to one of this service's own.
+            backend_url: Parking backend endpoint every logged scan is POSTed to,
+                in batches over keep-alive connections (see event_sink.py).
+                Undelivered batches are spooled to <logs_dir>/backend_spool.
+            backend_headers: Extra headers for backend_url, e.g. {"Authorization": "Bearer ..."}
+            event_sink: EventSink to deliver scans with instead, e.g. one shared by
+                several sites or with other retry settings. backend_url is then ignored.
+            session_max_hours: Close open sessions not seen for this long (a missed
+                exit scan); None keeps them open. Ignored when sessions is passed in.
         """
-        self.alpr = None
+        self.site_id = site_id
+        self.alpr = alpr
+        self._owns_alpr = False
+        self._model_registry = model_registry
+        self._alpr_lock = threading.Lock()
+        self._alpr_settings = {
+            "detector_model": detector_model,
+            "ocr_model": ocr_model,
+            "crop_quality": crop_quality,
+            "ocr_cache": ocr_cache,
+            "plate_decoder": plate_decoder,
+            "cascade": cascade,
+            "tiling": tiling,
+        }
         self.registrations_csv_path = registrations_csv_path
+        self.max_image_pixels = max_image_pixels
+        self.max_upload_bytes = max_upload_bytes
         self.logs_dir = Path(logs_dir) if logs_dir else Path(__file__).parent / "vehicle_logs"
         self.logs_dir.mkdir(exist_ok=True)
         
-        # Load registrations database
-        self.registrations_db = self._load_registrations()
+        # Load registrations database (reloaded in the background when the CSV changes)
+        self.registrations = RegistrationDatabase(
+            registrations_csv_path,
+            watch=watch_registrations,
+            poll_interval=registrations_poll_interval,
+            snapshot_path=registrations_snapshot_path,
+        )
+        custom = self._load_registrations()
+        if custom is not None:
+            self.registrations.replace(custom)
+        
+        # Partial-plate watchlists, compiled into one automaton and reloaded like the CSV
+        self.watchlist = Watchlist(
+            watchlist_paths,
+            watch=watch_registrations,
+            poll_interval=registrations_poll_interval,
+        )
+        self.on_watchlist_match = on_watchlist_match
+        self._watchlist_alerts = 0
+        self._watchlist_lock = threading.Lock()
         
         # Setup logging
         self._setup_logging()
         
-        # Initialize ALPR (lazy initialization)
-        self._initialize_alpr(detector_model, ocr_model)
+        # Live occupancy, fed by scans from cameras with a direction
+        self.camera_directions = {
+            camera: parse_direction(direction)
+            for camera, direction in (camera_directions or {}).items()
+        }
+        self._owns_sessions = sessions is None
+        self.sessions = sessions or SessionEngine(
+            snapshot_path=str(self.logs_dir / "sessions.snapshot"),
+            max_session_seconds=session_max_hours * 3600 if session_max_hours else None,
+        )
+        
+        # Logged scans are pushed to live clients (/api/alpr/events)
+        self._owns_feed = feed is None
+        self.feed = feed or ScanFeed()
+        
+        # Logged scans are also pushed to the parking backend, if there is one
+        self._owns_event_sink = event_sink is None and backend_url is not None
+        if self._owns_event_sink:
+            event_sink = EventSink(
+                backend_url,
+                headers=backend_headers,
+                spool_dir=str(self.logs_dir / "backend_spool"),
+            )
+        self.event_sink = event_sink
+        
+        # Indexed scan history; legacy daily JSON logs are imported on first use
+        self.scan_store = ScanStore(self.logs_dir / "scans.db")
+        if self.scan_store.created:
+            imported = self.scan_store.import_json_logs(self.logs_dir)
+            if imported:
+                print(f"Imported {imported} scans from daily JSON logs")
+        
+        # Scans are logged off the request thread, in batches
+        self.log_writer = AsyncLogWriter(
+            self._write_scan_batch,
+            max_queue=log_queue_size,
+            flush_interval=log_flush_interval,
+            overflow=log_overflow,
+            name="alpr-service-log-writer",
+        )
+        
+        if preload_models:
+            self.get_alpr()
     
     def _setup_logging(self):
         """Setup logging for vehicle scans."""
         log_file = self.logs_dir / "vehicle_scans.log"
         handler = logging.FileHandler(log_file)
         handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
-        self.logger = logging.getLogger('alpr_service')
+        if self.site_id is None:
+            self.logger = logging.getLogger('alpr_service')
+        else:
+            # Each site writes only to its own log file
+            self.logger = logging.getLogger(f'alpr_service.sites.{self.site_id}')
+            self.logger.propagate = False
         self.logger.setLevel(logging.INFO)
         self.logger.addHandler(handler)
+        self._log_handler = handler
     
-    def _initialize_alpr(self, detector_model: str, ocr_model: str):
+    def _initialize_alpr(
+        self,
+        detector_model: str,
+        ocr_model: str,
+        crop_quality=None,
+        ocr_cache=None,
+        plate_decoder=None,
+        cascade=None,
+        tiling=None
+    ):
         """Initialize ALPR system."""
-        if ALPR is None:
+        try:
+            ALPR = import_alpr()
+            if self._model_registry is None:
+                self._model_registry = shared_model_registry()
+        except ImportError:
             print("WARNING: fast_alpr not available. Install with: pip install fast-alpr[onnx]")
             return
         
         try:
             import certifi
-            import ssl
             os.environ['SSL_CERT_FILE'] = certifi.where()
             os.environ['REQUESTS_CA_BUNDLE'] = certifi.where()
             
             self.alpr = ALPR(
                 detector_model=detector_model,
                 ocr_model=ocr_model,
+                crop_quality=crop_quality,
+                ocr_cache=ocr_cache,
+                plate_decoder=plate_decoder,
+                cascade=cascade,
+                tiling=tiling,
+                model_registry=self._model_registry,
             )
+            self._owns_alpr = True
             print("ALPR system initialized successfully!")
         except Exception as e:
             print(f"Error initializing ALPR: {e}")
             self.alpr = None
     
-    def _load_registrations(self) -> Dict[str, Dict]:
+    def get_alpr(self):
         """
-        Load vehicle registrations from CSV file.
+        The ALPR instance, loading the models on first use.
         
-        CSV format should be:
-        registration,owner,vehicle_type,make,model,color,notes
-        ABC-123,John Doe,Car,Toyota,Camry,Blue,Company vehicle
+        Concurrent callers wait for one load. After a failed load the next call tries again.
         
         Returns:
-            Dictionary mapping registration -> vehicle info
+            The ALPR instance, or None if it could not be loaded
+        """
+        if self.alpr is None:
+            with self._alpr_lock:
+                if self.alpr is None:
+                    self._initialize_alpr(**self._alpr_settings)
+        return self.alpr
+    
+    @property
+    def scheduler(self):
+        """The FairScheduler scans run through, if alpr is a scheduler.SiteALPR."""
+        return getattr(self.alpr, 'scheduler', None)
+    
+    def lane_for(
+        self,
+        priority: Optional[str] = None,
+        camera_id: Optional[str] = None,
+        direction: Optional[str] = None,
+        bulk: bool = False
+    ) -> str:
         """
-        if not self.registrations_csv_path or not os.path.exists(self.registrations_csv_path):
-            return {}
+        Scheduler lane of a scan (see scheduler.scan_lane).
         
-        registrations = {}
-        try:
-            with open(self.registrations_csv_path, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    # Normalize registration (uppercase, remove spaces)
-                    reg = row.get('registration', '').strip().upper()
-                    if reg:
-                        registrations[reg] = {
-                            'registration': reg,
-                            'owner': row.get('owner', ''),
-                            'vehicle_type': row.get('vehicle_type', ''),
-                            'make': row.get('make', ''),
-                            'model': row.get('model', ''),
-                            'color': row.get('color', ''),
-                            'notes': row.get('notes', ''),
-                        }
-            print(f"Loaded {len(registrations)} registrations from database")
-        except Exception as e:
-            print(f"Error loading registrations: {e}")
+        Scans from cameras in camera_directions, or sent with a direction, are
+        gate scans and go in the realtime lane; batch uploads go in the bulk lane.
+        
+        Raises:
+            ValueError: If priority is not a lane name
+        """
+        gate = direction is not None or camera_id in self.camera_directions
+        return scan_lane(priority, gate=gate, bulk=bulk)
+    
+    def _inference(self, lane: str):
+        """The ALPR to scan with, in the given lane if it is scheduled."""
+        with_lane = getattr(self.alpr, 'with_lane', None)
+        return with_lane(lane) if with_lane is not None else self.alpr
+    
+    def _load_registrations(self) -> Optional[Dict[str, Dict]]:
+        """
+        Hook for loading registrations from somewhere other than the CSV.
         
-        return registrations
+        Returns:
+            Registration -> vehicle info, or None to use the CSV file
+        """
+        return None
     
-    def reload_registrations(self):
-        """Reload registrations from CSV file."""
-        self.registrations_db = self._load_registrations()
+    @property
+    def registrations_db(self) -> Mapping[str, VehicleRecord]:
+        """Current registrations snapshot (read-only registration -> VehicleRecord)."""
+        return self.registrations.snapshot.registrations
+    
+    def reload_registrations(self) -> Dict:
+        """
+        Reload registrations from the CSV file now.
+        
+        Returns:
+            Reload stats (mode, added, updated, removed, count, seconds)
+        """
+        custom = self._load_registrations()
+        if custom is not None:
+            return self.registrations.replace(custom)
+        return self.registrations.reload(force=True)
     
     def check_registration(self, plate_text: str) -> Tuple[bool, Optional[Dict]]:
         """
         Check if a registration exists in the database.
         
+        Matches ignore case, spaces and dashes.
+        
         Args:
             plate_text: Scanned license plate text
             
         Returns:
             Tuple of (found, vehicle_info)
         """
-        # Normalize the plate text
-        normalized = plate_text.strip().upper().replace(' ', '')
-        
-        # Direct match
-        if normalized in self.registrations_db:
-            return True, self.registrations_db[normalized]
+        record = self.registrations.lookup(plate_text)
+        if record is None:
+            return False, None
+        return True, record._asdict()
+    
+    def check_watchlist(self, plate_text: str) -> List[Dict]:
+        """
+        Find a plate on the watchlists.
         
-        # Try with/without dashes
-        normalized_no_dash = normalized.replace('-', '')
-        for reg, info in self.registrations_db.items():
-            reg_no_dash = reg.replace('-', '').replace(' ', '')
-            if normalized_no_dash == reg_no_dash:
-                return True, info
+        Matching takes time linear in the plate's length, however many
+        patterns are loaded.
         
-        return False, None
+        Args:
+            plate_text: Scanned license plate text
+            
+        Returns:
+            Matching entries (pattern, list_name, category, notes), empty if none
+        """
+        return [entry._asdict() for entry in self.watchlist.match(plate_text)]
+    
+    def reload_watchlist(self) -> Dict:
+        """Reload the watchlist files now."""
+        return self.watchlist.reload(force=True)
+    
+    def _watchlist_alert(
+        self,
+        plate_text: str,
+        matches: List[Dict],
+        confidence: float,
+        camera_id: Optional[str]
+    ):
+        """Count a watchlist match and pass it to the alert hook."""
+        with self._watchlist_lock:
+            self._watchlist_alerts += 1
+        if self.on_watchlist_match is None:
+            return
+        alert = {
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "plate_text": plate_text,
+            "confidence": confidence,
+            "matches": matches,
+            "camera_id": camera_id,
+            "site_id": self.site_id,
+        }
+        try:
+            self.on_watchlist_match(alert)
+        except Exception as e:
+            print(f"Error in watchlist alert hook: {e}")
     
     def scan_image(
         self,
         image_path: str = None,
         image_data: bytes = None,
-        image_array: np.ndarray = None,
+        image_array: 'np.ndarray' = None,
         check_database: bool = True,
-        log_scan: bool = True
+        log_scan: bool = True,
+        camera_id: Optional[str] = None,
+        direction: Optional[str] = None,
+        priority: Optional[str] = None,
+        image_filename: Optional[str] = None,
+        annotate: bool = True
     ) -> Dict:
         """
         Scan an image for license plates.
@@ -181,82 +444,376 @@ class ALPRService:
             image_array: Image as numpy array (BGR format)
             check_database: Whether to check against registration database
             log_scan: Whether to log the scan
+            camera_id: Camera that took the image, recorded with the logged scans
+            direction: "entry" or "exit", for a camera not in camera_directions
+            priority: Scheduler lane ("realtime", "interactive" or "bulk") instead
+                of the one lane_for picks. Only used when alpr is a SiteALPR.
+            image_filename: Name of the uploaded image, recorded with the logged scans
+            annotate: Include the annotated image (costs an extra inference pass)
             
         Returns:
-            Dictionary with scan results
+            Dictionary with scan results ("busy": True if the lane's queue is full,
+            "invalid": True if the image or priority is bad)
         """
-        if self.alpr is None:
+        if self.get_alpr() is None:
             return {
                 "success": False,
                 "error": "ALPR system not initialized"
             }
         
         try:
-            # Load image
+            # Load image (within the pixel budget)
             if image_path:
-                img = cv2.imread(image_path)
-                if img is None:
-                    return {"success": False, "error": f"Failed to load image: {image_path}"}
+                img, scale = decode_image_file(image_path, self.max_image_pixels)
             elif image_data:
-                nparr = np.frombuffer(image_data, np.uint8)
-                img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                img, scale = decode_image(image_data, self.max_image_pixels)
             elif image_array is not None:
-                img = image_array
+                img, scale = image_array, 1
             else:
                 return {"success": False, "error": "No image provided"}
             
             # Process with ALPR
-            results = self.alpr.predict(img)
+            inference = self._inference(self.lane_for(priority, camera_id, direction))
+            results = inference.predict(img)
+            plates, skipped = self._collect_plates(
+                results, check_database, log_scan, scale, camera_id, direction, image_filename
+            )
             
-            # Prepare response
-            plates = []
-            for result in results:
-                if result.ocr is not None and result.ocr.text:
-                    conf = result.ocr.confidence
-                    if isinstance(conf, list):
-                        avg_confidence = statistics.mean(conf)
-                    else:
-                        avg_confidence = conf
-                    
-                    plate_text = result.ocr.text.strip()
-                    
-                    # Check database if requested
-                    in_database = False
-                    vehicle_info = None
-                    if check_database:
-                        in_database, vehicle_info = self.check_registration(plate_text)
-                    
-                    plate_data = {
-                        "text": plate_text,
-                        "confidence": float(avg_confidence),
-                        "detection_confidence": float(result.detection.confidence),
-                        "in_database": in_database,
-                        "vehicle_info": vehicle_info,
-                        "bounding_box": {
-                            "x1": result.detection.bounding_box.x1,
-                            "y1": result.detection.bounding_box.y1,
-                            "x2": result.detection.bounding_box.x2,
-                            "y2": result.detection.bounding_box.y2,
-                        }
+            response = {
+                "success": True,
+                "plates": plates,
+                "count": len(plates),
+                "skipped": skipped,
+            }
+            if annotate:
+                # Generate annotated image
+                import cv2
+                annotated_image = inference.draw_predictions(img)
+                _, buffer = cv2.imencode('.jpg', annotated_image)
+                image_base64 = base64.b64encode(buffer).decode('utf-8')
+                response["annotated_image"] = f"data:image/jpeg;base64,{image_base64}"
+            return response
+        
+        except ImageTooLarge as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "too_large": True
+            }
+        except SiteBusy as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "busy": True
+            }
+        except ValueError as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "invalid": True
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    def _collect_plates(
+        self,
+        results,
+        check_database: bool,
+        log_scan: bool,
+        scale: int = 1,
+        camera_id: Optional[str] = None,
+        direction: Optional[str] = None,
+        image_filename: Optional[str] = None
+    ) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Turn ALPR results into response dicts, checking the database and logging each plate.
+        
+        Bounding boxes are multiplied by `scale` (the decode reduction factor).
+        Logged plates are also recorded in the session engine, with `direction`
+        or else the camera's configured direction.
+        
+        Returns:
+            Tuple of (plates, skipped)
+        """
+        direction = parse_direction(direction) or self.camera_directions.get(camera_id)
+        plates = []
+        skipped = []
+        for result in results:
+            if result.skip_reason is not None:
+                skipped.append({
+                    "reason": result.skip_reason,
+                    "detection_confidence": float(result.detection.confidence),
+                })
+                continue
+            if result.ocr is not None and result.ocr.text:
+                conf = result.ocr.confidence
+                if isinstance(conf, list):
+                    avg_confidence = statistics.mean(conf)
+                else:
+                    avg_confidence = conf
+                
+                plate_text = result.ocr.text.strip()
+                
+                # Check database if requested
+                in_database = False
+                vehicle_info = None
+                if check_database:
+                    in_database, vehicle_info = self.check_registration(plate_text)
+                watchlist = self.check_watchlist(plate_text)
+                if watchlist:
+                    self._watchlist_alert(plate_text, watchlist, float(avg_confidence), camera_id)
+                
+                plate_data = {
+                    "text": plate_text,
+                    "confidence": float(avg_confidence),
+                    "detection_confidence": float(result.detection.confidence),
+                    "in_database": in_database,
+                    "vehicle_info": vehicle_info,
+                    "watchlist": watchlist,
+                    "bounding_box": {
+                        "x1": result.detection.bounding_box.x1 * scale,
+                        "y1": result.detection.bounding_box.y1 * scale,
+                        "x2": result.detection.bounding_box.x2 * scale,
+                        "y2": result.detection.bounding_box.y2 * scale,
                     }
-                    plates.append(plate_data)
-                    
-                    # Log the scan
-                    if log_scan:
-                        self._log_vehicle_scan(plate_text, avg_confidence, in_database, vehicle_info)
+                }
+                plates.append(plate_data)
+                
+                # Log the scan
+                if log_scan:
+                    self._log_vehicle_scan(
+                        plate_text, avg_confidence, in_database, vehicle_info, camera_id,
+                        [match["pattern"] for match in watchlist], image_filename
+                    )
+                    self.sessions.record(
+                        plate_text,
+                        direction,
+                        site_id=self.site_id,
+                        camera_id=camera_id,
+                        in_database=in_database,
+                    )
+        return plates, skipped
+    
+    def _decode_image(self, image) -> Tuple['np.ndarray', int]:
+        """
+        Load one scan_images item: encoded bytes, an image path or a BGR array.
+        
+        Returns:
+            Tuple of (image, scale), scale being the decode reduction factor
+        """
+        import numpy as np
+        
+        if isinstance(image, np.ndarray):
+            return image, 1
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            return decode_image(image, self.max_image_pixels)
+        if isinstance(image, (str, Path)):
+            return decode_image_file(image, self.max_image_pixels)
+        raise ValueError(f"Unsupported image type: {type(image).__name__}")
+    
+    def scan_images(
+        self,
+        images: List,
+        check_database: bool = True,
+        log_scan: bool = True,
+        annotate: bool = False,
+        decode_workers: Optional[int] = None,
+        camera_id: Optional[str] = None,
+        direction: Optional[str] = None,
+        priority: Optional[str] = None,
+        image_filenames: Optional[List[str]] = None
+    ) -> List[Dict]:
+        """
+        Scan several images with one batched inference pass.
+        
+        Images are decoded in parallel, then all frames go through
+        `ALPR.predict_batch` together. A bad image only fails its own entry.
+        
+        Args:
+            images: Encoded image bytes, image paths or BGR arrays (can be mixed)
+            check_database: Whether to check against registration database
+            log_scan: Whether to log the scans
+            annotate: Include an annotated image per entry (costs an extra inference pass each)
+            decode_workers: Decode threads (default: one per image, up to the CPU count)
+            camera_id: Camera that took the images, recorded with the logged scans
+            direction: "entry" or "exit", for a camera not in camera_directions
+            priority: Scheduler lane instead of "bulk" (see scan_image)
+            image_filenames: Names of the uploaded images, recorded with their logged scans
             
-            # Generate annotated image
-            annotated_image = self.alpr.draw_predictions(img)
-            _, buffer = cv2.imencode('.jpg', annotated_image)
-            image_base64 = base64.b64encode(buffer).decode('utf-8')
+        Returns:
+            One result dict per image, in input order, shaped like `scan_image`'s result
+            plus an "index" key. If the lane's queue is full, the decoded images fail
+            with "busy": True.
+        """
+        if self.get_alpr() is None:
+            return [
+                {"index": i, "success": False, "error": "ALPR system not initialized"}
+                for i in range(len(images))
+            ]
+        if not images:
+            return []
+        inference = self._inference(self.lane_for(priority, camera_id, direction, bulk=True))
+        
+        # cv2 releases the GIL while decoding, so threads decode in parallel
+        workers = decode_workers or min(len(images), os.cpu_count() or 4)
+        
+        def decode(image):
+            try:
+                return (*self._decode_image(image), None)
+            except Exception as e:
+                return None, 1, str(e)
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            decoded = list(executor.map(decode, images))
+        
+        responses: List[Dict] = [
+            {"index": i, "success": False, "error": error}
+            for i, (_, _, error) in enumerate(decoded)
+        ]
+        valid = [i for i, (img, _, _) in enumerate(decoded) if img is not None]
+        frames = [decoded[i][0] for i in valid]
+        
+        try:
+            batch_results = inference.predict_batch(frames)
+        except SiteBusy as e:
+            # The queue is full: retrying frame by frame would only fail again
+            for i in valid:
+                responses[i].update(error=str(e), busy=True)
+            return responses
+        except Exception:
+            # Find the frames that fail instead of failing the whole batch
+            batch_results = []
+            for frame in frames:
+                try:
+                    batch_results.append(inference.predict(frame))
+                except Exception as e:
+                    batch_results.append(e)
+        
+        for i, frame, results in zip(valid, frames, batch_results):
+            if isinstance(results, Exception):
+                responses[i]["error"] = str(results)
+                continue
+            try:
+                plates, skipped = self._collect_plates(
+                    results, check_database, log_scan, decoded[i][1], camera_id, direction,
+                    image_filenames[i] if image_filenames else None
+                )
+                response = {
+                    "index": i,
+                    "success": True,
+                    "plates": plates,
+                    "count": len(plates),
+                    "skipped": skipped,
+                }
+                if annotate:
+                    import cv2
+                    _, buffer = cv2.imencode('.jpg', inference.draw_predictions(frame))
+                    image_base64 = base64.b64encode(buffer).decode('utf-8')
+                    response["annotated_image"] = f"data:image/jpeg;base64,{image_base64}"
+                responses[i] = response
+            except Exception as e:
+                responses[i]["error"] = str(e)
+        
+        return responses
+    
+    def read_plates(
+        self,
+        plates: Optional[List] = None,
+        image=None,
+        boxes: Optional[List] = None,
+        check_database: bool = True,
+        log_scan: bool = True,
+        camera_id: Optional[str] = None,
+        direction: Optional[str] = None,
+        priority: Optional[str] = None,
+        image_filename: Optional[str] = None
+    ) -> Dict:
+        """
+        Read plates already located by the client, without running the detector.
+        
+        For edge devices that detect plates themselves: send either the plate
+        crops, or the full frame plus the plate boxes. Only the OCR runs (all
+        crops in one batch), followed by the registration lookup.
+        
+        Args:
+            plates: Plate crops as encoded bytes, image paths or BGR arrays
+            image: Full frame (bytes, path or BGR array), used with `boxes`
+            boxes: [x1, y1, x2, y2] plate boxes in `image`'s pixel coordinates
+            check_database: Whether to check against registration database
+            log_scan: Whether to log the scans
+            camera_id: Camera that took the images, recorded with the logged scans
+            direction: "entry" or "exit", for a camera not in camera_directions
+            priority: Scheduler lane instead of the one lane_for picks (see scan_image)
+            image_filename: Name recorded with the logged scans
+            
+        Returns:
+            Dictionary shaped like `scan_image`'s result, without the annotated image.
+            Each plate has the "index" of its crop or box; with `boxes` it also has
+            its "bounding_box". "busy": True if the site's queue is full.
+        """
+        if self.get_alpr() is None:
+            return {"success": False, "error": "ALPR system not initialized"}
+        if not hasattr(self.alpr, 'read_plates'):
+            return {"success": False, "error": "This ALPR backend cannot read pre-cropped plates"}
+        
+        try:
+            inference = self._inference(self.lane_for(priority, camera_id, direction))
+            if plates:
+                crops = [self._decode_image(plate)[0] for plate in plates]
+            elif image is not None and boxes:
+                frame, scale = self._decode_image(image)
+                crops = crop_boxes(frame, boxes, scale)
+            else:
+                return {"success": False, "error": "No plates or boxes provided"}
+            
+            results = inference.read_plates(crops)
+            found = []
+            skipped = []
+            for index, result in enumerate(results):
+                plate_found, plate_skipped = self._collect_plates(
+                    [result], check_database, log_scan, camera_id=camera_id, direction=direction,
+                    image_filename=image_filename
+                )
+                for plate in plate_found:
+                    plate["index"] = index
+                    if plates:
+                        del plate["bounding_box"]
+                    else:
+                        x1, y1, x2, y2 = boxes[index]
+                        plate["bounding_box"] = {"x1": x1, "y1": y1, "x2": x2, "y2": y2}
+                for skip in plate_skipped:
+                    skip["index"] = index
+                found.extend(plate_found)
+                skipped.extend(plate_skipped)
             
             return {
                 "success": True,
-                "plates": plates,
-                "count": len(plates),
-                "annotated_image": f"data:image/jpeg;base64,{image_base64}"
+                "plates": found,
+                "count": len(found),
+                "skipped": skipped
             }
         
+        except ImageTooLarge as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "too_large": True
+            }
+        except SiteBusy as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "busy": True
+            }
+        except ValueError as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "invalid": True
+            }
         except Exception as e:
             return {
                 "success": False,
@@ -268,7 +825,10 @@ class ALPRService:
         plate_text: str,
         confidence: float,
         in_database: bool,
-        vehicle_info: Optional[Dict]
+        vehicle_info: Optional[Dict],
+        camera_id: Optional[str] = None,
+        watchlist: Optional[List[str]] = None,
+        image_filename: Optional[str] = None
     ):
         """Log a vehicle scan."""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -280,48 +840,127 @@ class ALPRService:
             "in_database": in_database,
             "vehicle_info": vehicle_info
         }
+        if self.site_id is not None:
+            log_entry["site_id"] = self.site_id
+        if camera_id is not None:
+            log_entry["camera_id"] = camera_id
+        if watchlist:
+            log_entry["watchlist"] = watchlist
+        if image_filename is not None:
+            log_entry["image_filename"] = image_filename
         
-        # Log to file
-        self.logger.info(json.dumps(log_entry))
+        # Returns immediately; the log writer thread does the disk I/O
+        self.log_writer.submit(log_entry)
+        self.feed.publish(log_entry)
+        if self.event_sink is not None:
+            self.event_sink.submit(log_entry)
+    
+    def _write_scan_batch(self, entries: List[Dict]):
+        """Log writer sink: append to the text log, then insert into the scan store."""
+        for entry in entries:
+            self.logger.info(json.dumps(entry))
+        self.scan_store.add_many(entries)
+    
+    def flush_logs(self):
+        """Block until every queued scan has been written."""
+        self.log_writer.flush()
+    
+    def close(self):
+        """
+        Write queued scans, stop watching the registrations CSV and release the models.
         
-        # Also save to daily log file
-        daily_log_file = self.logs_dir / f"scans_{datetime.now().strftime('%Y-%m-%d')}.json"
-        try:
-            logs = []
-            if daily_log_file.exists():
-                with open(daily_log_file, 'r') as f:
-                    logs = json.load(f)
-            logs.append(log_entry)
-            with open(daily_log_file, 'w') as f:
-                json.dump(logs, f, indent=2)
-        except Exception as e:
-            print(f"Error writing daily log: {e}")
+        Models shared with other services stay loaded until the last one is
+        closed. An ALPR, SessionEngine, ScanFeed or EventSink passed in is left
+        open. Scans the backend has not received stay in the spool for next time.
+        """
+        self.log_writer.close()
+        self.registrations.stop()
+        self.watchlist.stop()
+        if self._owns_sessions:
+            self.sessions.close()
+        if self._owns_feed:
+            self.feed.close()
+        if self._owns_event_sink:
+            self.event_sink.close()
+        self.logger.removeHandler(self._log_handler)
+        self._log_handler.close()
+        with self._alpr_lock:
+            if self._owns_alpr and self.alpr is not None:
+                self.alpr.close()
+            self.alpr = None
+            self._owns_alpr = False
     
-    def get_vehicle_logs(self, date: str = None, limit: int = 100) -> List[Dict]:
+    def get_metrics(self) -> Dict:
+        """Runtime counters for monitoring."""
+        metrics = {
+            "log_writer": self.log_writer.stats(),
+            "decode": decode_stats.stats(),
+            "memory": request_memory.stats(),
+            "sessions": self.sessions.stats(),
+            "watchlist": {**self.watchlist.stats(), "alerts": self._watchlist_alerts},
+            "feed": self.feed.stats(),
+        }
+        if self.event_sink is not None:
+            metrics["backend"] = self.event_sink.stats()
+        if self.scheduler is not None:
+            metrics["lanes"] = self.scheduler.stats()["lanes"]
+        ocr_cache = getattr(self.alpr, 'ocr_cache', None)
+        if ocr_cache is not None:
+            stats = ocr_cache.stats()
+            metrics["ocr_cache"] = {**asdict(stats), "hit_rate": stats.hit_rate}
+        cascade_stats = getattr(self.alpr, 'cascade_stats', None)
+        if cascade_stats is not None and cascade_stats():
+            metrics["cascade"] = {
+                stage: {**asdict(stats), "escalation_rate": stats.escalation_rate}
+                for stage, stats in cascade_stats().items()
+            }
+        if self._model_registry is not None:
+            metrics["models"] = describe_models(self._model_registry)
+        return metrics
+    
+    def get_vehicle_logs(
+        self,
+        date: str = None,
+        limit: int = 100,
+        start: str = None,
+        end: str = None,
+        plate_text: str = None,
+        min_confidence: float = None,
+        in_database: bool = None,
+        camera_id: str = None
+    ) -> List[Dict]:
         """
         Get vehicle scan logs.
         
         Args:
-            date: Date in YYYY-MM-DD format. If None, uses today.
+            date: Date in YYYY-MM-DD format. If None (and no start/end), uses today.
             limit: Maximum number of logs to return
+            start: Start of a time range (YYYY-MM-DD or YYYY-MM-DD HH:MM:SS)
+            end: End of a time range, inclusive
+            plate_text: Only scans of this plate (dash/space-insensitive)
+            min_confidence: Minimum OCR confidence
+            in_database: Only scans that were (or were not) found in the database
+            camera_id: Only scans from this camera
             
         Returns:
-            List of log entries
+            List of log entries, oldest first
         """
-        if date is None:
+        if date is None and start is None and end is None:
             date = datetime.now().strftime('%Y-%m-%d')
+        if date is not None:
+            start = end = date
         
-        log_file = self.logs_dir / f"scans_{date}.json"
-        if not log_file.exists():
-            return []
-        
-        try:
-            with open(log_file, 'r') as f:
-                logs = json.load(f)
-            return logs[-limit:]  # Return most recent
-        except Exception as e:
-            print(f"Error reading logs: {e}")
-            return []
+        logs = self.scan_store.query(
+            start=start,
+            end=end,
+            plate=plate_text,
+            min_confidence=min_confidence,
+            in_database=in_database,
+            camera_id=camera_id,
+            limit=limit,
+        )
+        logs.reverse()  # Most recent last
+        return logs
     
     def get_vehicle_stats(self, plate_text: str, days: int = 30) -> Dict:
         """
@@ -334,29 +973,141 @@ class ALPRService:
         Returns:
             Statistics dictionary
         """
-        from datetime import timedelta
+        self._yield_to_scans()
+        start_date = datetime.now() - timedelta(days=days)
+        stats = self.scan_store.plate_stats(
+            plate_text,
+            start=start_date.strftime('%Y-%m-%d'),
+            max_scans=50,  # Last 50 scans
+        )
+        return {"plate_text": plate_text, **stats}
+
+    def get_summary(
+        self,
+        start: str = None,
+        end: str = None,
+        days: int = 7,
+        bucket: str = 'day'
+    ) -> Dict:
+        """
+        Dashboard analytics for a date range, merged from the hourly rollups.
+
+        Args:
+            start: Start date/time. If None (and no end), the last `days` days.
+            end: End date/time, inclusive (optional)
+            days: Days to summarize when no range is given, today included
+            bucket: "hour" or "day" breakdown, or "none" for totals only
+
+        Returns:
+            Scans, unique plates (estimated), hit rate, mean confidence and
+            the confidence histogram (see rollups.summarize)
+
+        Raises:
+            ValueError: If bucket is not one of rollups.BUCKETS
+        """
+        if start is None and end is None:
+            start = (datetime.now() - timedelta(days=max(days, 1) - 1)).strftime('%Y-%m-%d')
+        return self.scan_store.summary(start=start, end=end, bucket=bucket)
+
+    def _yield_to_scans(self):
+        """Back-office queries wait (briefly) while the gate lanes are behind their SLO."""
+        if self.scheduler is not None:
+            self.scheduler.throttle(BULK)
+
+    def get_occupancy(self, include_vehicles: bool = False) -> Dict:
+        """
+        Vehicles on site now, from the session engine (no log scan).
         
-        scans = []
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days)
+        Args:
+            include_vehicles: Also list the open sessions, longest stay first
+            
+        Returns:
+            Occupancy, peak and entry/exit counters of this service's site
+        """
+        occupancy = self.sessions.occupancy(self.site_id)
+        if include_vehicles:
+            occupancy["vehicles"] = self.sessions.open_sessions(self.site_id)
+        return occupancy
+    
+    def get_session(self, plate_text: str) -> Dict:
+        """
+        Whether a vehicle is on site, since when, and its last completed stay.
         
-        current_date = start_date
-        while current_date <= end_date:
-            date_str = current_date.strftime('%Y-%m-%d')
-            daily_logs = self.get_vehicle_logs(date_str, limit=1000)
-            for log in daily_logs:
-                if log.get('plate_text', '').upper().replace('-', '').replace(' ', '') == \
-                   plate_text.upper().replace('-', '').replace(' ', ''):
-                    scans.append(log)
-            current_date += timedelta(days=1)
+        Args:
+            plate_text: License plate text (any spacing or case)
+            
+        Returns:
+            Session dictionary (see SessionEngine.session)
+        """
+        return self.sessions.session(plate_text, self.site_id)
+    
+    def export_scans(self, out_path: str, start: str = None, end: str = None) -> Path:
+        """
+        Export scan history to a compressed columnar file (Parquet or .npz).
         
-        return {
-            "plate_text": plate_text,
-            "total_scans": len(scans),
-            "first_seen": scans[0]['timestamp'] if scans else None,
-            "last_seen": scans[-1]['timestamp'] if scans else None,
-            "scans": scans[-50:]  # Last 50 scans
-        }
+        Args:
+            out_path: Output path ending in .parquet or .npz
+            start: Start date/time (optional)
+            end: End date/time, inclusive (optional)
+            
+        Returns:
+            Path of the written file
+        """
+        self._yield_to_scans()
+        return self.scan_store.export(out_path, start=start, end=end)
+
+
+def decode_base64_image(value) -> bytes:
+    """
+    Decode a base64 image string (optionally a data: URL) to bytes.
+    
+    Invalid input decodes to b"", which then fails as an undecodable image.
+    """
+    if not isinstance(value, str):
+        return b""
+    if value.startswith('data:'):
+        value = value.partition(',')[2]
+    try:
+        return base64.b64decode(value)
+    except ValueError:
+        return b""
+
+
+def read_request_args(request) -> Dict:
+    """
+    `ALPRService.read_plates` arguments from a read request: multipart crops
+    under "plates", or an "image" plus a "boxes" field ([[x1, y1, x2, y2], ...]
+    as JSON), or the same as a JSON body with base64 images.
+    
+    Raises:
+        ValueError: If boxes is not a JSON list, or no plates or boxes are given
+    """
+    if request.files:
+        plates = [file.read() for file in request.files.getlist('plates')]
+        image = request.files['image'].read() if 'image' in request.files else None
+        values = request.form
+    else:
+        values = request.get_json(silent=True) or {}
+        plates = [decode_base64_image(plate) for plate in values.get('plates') or []]
+        image = decode_base64_image(values['image']) if values.get('image') else None
+    boxes = values.get('boxes')
+    if isinstance(boxes, str):
+        try:
+            boxes = json.loads(boxes)
+        except ValueError:
+            raise ValueError("boxes must be a JSON list of [x1, y1, x2, y2]") from None
+    if boxes is not None and not isinstance(boxes, list):
+        raise ValueError("boxes must be a JSON list of [x1, y1, x2, y2]")
+    if not plates and (image is None or not boxes):
+        raise ValueError("No plates or boxes provided")
+    return {
+        "plates": plates,
+        "image": image,
+        "boxes": boxes,
+        "camera_id": values.get('camera'),
+        "direction": values.get('direction'),
+        "priority": values.get('priority'),
+    }
 
 
 # Example usage and Flask integration helper
@@ -371,6 +1122,24 @@ def create_flask_routes(app, alpr_service: ALPRService):
         create_flask_routes(app, alpr)
     """
     
+    # Bound request bodies, unless the host app already does
+    if app.config.get('MAX_CONTENT_LENGTH') is None:
+        app.config['MAX_CONTENT_LENGTH'] = alpr_service.max_upload_bytes
+    
+    # Scan endpoints whose peak RSS is reported at /api/alpr/metrics
+    tracked_endpoints = {'alpr_scan', 'alpr_scan_batch', 'alpr_read'}
+    
+    @app.before_request
+    def alpr_track_request_memory():
+        if request.endpoint in tracked_endpoints:
+            request_memory.start()
+    
+    @app.after_request
+    def alpr_record_request_memory(response):
+        if request.endpoint in tracked_endpoints:
+            request_memory.finish(request.endpoint)
+        return response
+    
     @app.route('/api/alpr/scan', methods=['POST'])
     def alpr_scan():
         """Scan image endpoint."""
@@ -381,21 +1150,119 @@ def create_flask_routes(app, alpr_service: ALPRService):
         if file.filename == '':
             return jsonify({"error": "No file selected"}), 400
         
-        # Save temporarily
-        import tempfile
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp:
-            file.save(tmp.name)
-            result = alpr_service.scan_image(image_path=tmp.name)
-            os.unlink(tmp.name)
+        # Decoded in memory; the upload is bounded by MAX_CONTENT_LENGTH
+        result = alpr_service.scan_image(
+            image_data=file.read(),
+            camera_id=request.form.get('camera'),
+            direction=request.form.get('direction'),
+            priority=request.form.get('priority'),
+        )
+        if not result["success"] and result.get("too_large"):
+            return jsonify(result), 413
+        if not result["success"] and result.get("busy"):
+            return jsonify(result), 429, {"Retry-After": "1"}
+        return jsonify(result)
+    
+    @app.route('/api/alpr/scan/batch', methods=['POST'])
+    def alpr_scan_batch():
+        """
+        Scan several images in one request.
+        
+        Accepts multipart uploads under "images" or a JSON body
+        {"images": [<base64>, ...]}. Each entry of "results" reports its own
+        success or error.
+        """
+        if request.files:
+            images = [file.read() for file in request.files.getlist('images')]
+        else:
+            data = request.get_json(silent=True) or {}
+            images = data.get('images')
+            if not isinstance(images, list):
+                return jsonify({"error": "No images provided"}), 400
+            images = [decode_base64_image(image) for image in images]
+        if not images:
+            return jsonify({"error": "No images provided"}), 400
+        
+        try:
+            results = alpr_service.scan_images(
+                images,
+                annotate=request.args.get('annotate', '').lower() in ('1', 'true'),
+                camera_id=request.args.get('camera'),
+                direction=request.args.get('direction'),
+                priority=request.args.get('priority'),
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if any(r.get("busy") for r in results):
+            return jsonify({"error": "ALPR queue is full", "busy": True, "results": results}), 429, {"Retry-After": "1"}
+        return jsonify({
+            "results": results,
+            "count": len(results),
+            "failed": sum(1 for r in results if not r["success"]),
+        })
+    
+    @app.route('/api/alpr/read', methods=['POST'])
+    def alpr_read():
+        """
+        Read plates located by the client (OCR only, no detection).
+        
+        Accepts multipart uploads of crops under "plates", or an "image" plus
+        a "boxes" field ([[x1, y1, x2, y2], ...] as JSON), or the same as a
+        JSON body with base64 images.
+        """
+        try:
+            args = read_request_args(request)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
+        result = alpr_service.read_plates(**args)
+        if not result["success"] and result.get("too_large"):
+            return jsonify(result), 413
+        if not result["success"] and result.get("busy"):
+            return jsonify(result), 429, {"Retry-After": "1"}
         return jsonify(result)
     
+    @app.route('/api/alpr/events', methods=['GET'])
+    def alpr_events():
+        """Live feed of logged scans (Server-Sent Events); resumes from Last-Event-ID."""
+        try:
+            subscription = alpr_service.feed.subscribe(
+                last_event_id=parse_event_id(
+                    request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+                ),
+                backlog=request.args.get('backlog', 0, type=int),
+                match=event_filter(alpr_service.site_id, request.args.get('camera')),
+            )
+        except FeedFull as e:
+            return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+        return Response(subscription, mimetype='text/event-stream', headers=SSE_HEADERS)
+    
+    @app.route('/api/alpr/events/recent', methods=['GET'])
+    def alpr_recent_events():
+        """Buffered scan events after ?after=<id>, for clients that poll."""
+        return jsonify(alpr_service.feed.recent(
+            after=parse_event_id(request.args.get('after')),
+            limit=request.args.get('limit', 100, type=int),
+            match=event_filter(alpr_service.site_id, request.args.get('camera')),
+        ))
+    
     @app.route('/api/alpr/logs', methods=['GET'])
     def alpr_logs():
         """Get vehicle logs."""
         date = request.args.get('date')
         limit = int(request.args.get('limit', 100))
-        logs = alpr_service.get_vehicle_logs(date=date, limit=limit)
+        min_confidence = request.args.get('min_confidence', type=float)
+        in_database = request.args.get('in_database')
+        logs = alpr_service.get_vehicle_logs(
+            date=date,
+            limit=limit,
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            plate_text=request.args.get('plate'),
+            min_confidence=min_confidence,
+            in_database=None if in_database is None else in_database.lower() in ('1', 'true'),
+            camera_id=request.args.get('camera'),
+        )
         return jsonify({"logs": logs, "count": len(logs)})
     
     @app.route('/api/alpr/stats/<plate_text>', methods=['GET'])
@@ -404,16 +1271,58 @@ def create_flask_routes(app, alpr_service: ALPRService):
         days = int(request.args.get('days', 30))
         stats = alpr_service.get_vehicle_stats(plate_text, days=days)
         return jsonify(stats)
+
+    @app.route('/api/alpr/summary', methods=['GET'])
+    def alpr_summary():
+        """Scan analytics for ?start=&end= (or the last ?days=7), by ?bucket=day|hour|none."""
+        try:
+            summary = alpr_service.get_summary(
+                start=request.args.get('start'),
+                end=request.args.get('end'),
+                days=request.args.get('days', 7, type=int),
+                bucket=request.args.get('bucket', 'day'),
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify(summary)
+
+    @app.route('/api/alpr/occupancy', methods=['GET'])
+    def alpr_occupancy():
+        """Vehicles on site now; ?vehicles=true lists them."""
+        include_vehicles = request.args.get('vehicles', '').lower() in ('1', 'true')
+        return jsonify(alpr_service.get_occupancy(include_vehicles=include_vehicles))
+    
+    @app.route('/api/alpr/sessions/<plate_text>', methods=['GET'])
+    def alpr_session(plate_text):
+        """Current and last stay of a vehicle."""
+        return jsonify(alpr_service.get_session(plate_text))
     
     @app.route('/api/alpr/reload', methods=['POST'])
     def alpr_reload():
         """Reload registrations database."""
-        alpr_service.reload_registrations()
-        return jsonify({"success": True, "count": len(alpr_service.registrations_db)})
+        stats = alpr_service.reload_registrations()
+        return jsonify({"success": stats["mode"] != "error", **stats})
+    
+    @app.route('/api/alpr/watchlist/<plate_text>', methods=['GET'])
+    def alpr_watchlist(plate_text):
+        """Watchlist entries matching a plate."""
+        matches = alpr_service.check_watchlist(plate_text)
+        return jsonify({"plate_text": plate_text, "matches": matches, "count": len(matches)})
+    
+    @app.route('/api/alpr/watchlist/reload', methods=['POST'])
+    def alpr_watchlist_reload():
+        """Reload the watchlist files."""
+        stats = alpr_service.reload_watchlist()
+        return jsonify({"success": stats["mode"] != "error", **stats})
+    
+    @app.route('/api/alpr/metrics', methods=['GET'])
+    def alpr_metrics():
+        """Runtime counters (log writer queue depth, drops, ...)."""
+        return jsonify(alpr_service.get_metrics())
     
     # Import request and jsonify if not already imported
     try:
-        from flask import request, jsonify
+        from flask import Response, request, jsonify
     except ImportError:
         print("WARNING: Flask not available. Routes not created.")
 
@@ -1,156 +1,606 @@
-# FIX: Patch PIL.Image.ANTIALIAS before any imports that might use it
-try:
-    from PIL import Image
-    # Fix for Pillow 10.0.0+ compatibility
-    if not hasattr(Image, 'ANTIALIAS'):
-        Image.ANTIALIAS = Image.LANCZOS
-except ImportError:
-    pass
-
 """
 Flask web application for ALPR (Automatic License Plate Recognition).
+
+Routes are registered on a blueprint and create_app() builds the application,
+so importing this module has no side effects. create_app() opens the scan
+store, starts the log writer and starts loading the models in the background.
+cv2, numpy and fast_alpr are only imported on the inference path, so health
+checks and log queries never wait on them.
 """
 
-import base64
 import json
 import logging
 import os
-import ssl
-import statistics
-from datetime import datetime
+import threading
+from dataclasses import asdict
+from datetime import datetime, timedelta
 from pathlib import Path
 
-import certifi
-import cv2
-import numpy as np
-from flask import Flask, jsonify, render_template, request, send_from_directory
+from flask import Blueprint, Flask, Response, current_app, jsonify, render_template, request
 from flask_cors import CORS
 
-# Import ALPR from the fast-alpr package
-try:
-    from fast_alpr import ALPR
-except ImportError:
-    # Try importing from local source if available
-    import sys
-    fast_alpr_path = os.path.join(os.path.dirname(__file__), 'fast-alpr-master')
-    if os.path.exists(fast_alpr_path):
-        sys.path.insert(0, fast_alpr_path)
-        try:
-            from fast_alpr import ALPR
-        except ImportError:
-            print("ERROR: Could not import fast_alpr from local source.")
-            print("Please install it with: pip install fast-alpr[onnx]")
-            ALPR = None
-    else:
-        print("ERROR: Could not import fast_alpr. Please install it with: pip install fast-alpr[onnx]")
-        ALPR = None
+from alpr_loader import describe_models, import_fast_alpr, shared_model_registry
+from alpr_service import ALPRService
+from event_sink import EventSink
+from image_decode import (
+    DEFAULT_MAX_PIXELS,
+    DEFAULT_MAX_UPLOAD_BYTES,
+    ImageTooLarge,
+    decode_base64,
+    decode_stats,
+    request_memory,
+)
+from scan_feed import SSE_HEADERS, FeedFull, ScanFeed, event_filter, parse_event_id
+from scheduler import FairScheduler, SiteALPR
+from sessions import SessionEngine, parse_direction
+
+bp = Blueprint('web', __name__)
 
-app = Flask(__name__)
-CORS(app)
+# Decoded frames over MAX_IMAGE_PIXELS are decoded at 1/2, 1/4 or 1/8 resolution
+MAX_IMAGE_PIXELS = int(os.environ.get('ALPR_MAX_IMAGE_PIXELS', DEFAULT_MAX_PIXELS))
+
+# Endpoints whose peak RSS is reported at /api/metrics
+TRACKED_ENDPOINTS = {'web.scan_image', 'web.scan_batch', 'web.process', 'web.process_plates'}
 
-# Configure logging
 LOG_DIR = Path(__file__).parent / "logs"
-LOG_DIR.mkdir(exist_ok=True)
-
-# Set up file logging for scanned registrations
-log_file = LOG_DIR / "scanned_registrations.log"
-file_handler = logging.FileHandler(log_file)
-file_handler.setLevel(logging.INFO)
-formatter = logging.Formatter('%(asctime)s - %(message)s')
-file_handler.setFormatter(formatter)
-
-logger = logging.getLogger('alpr_scanner')
-logger.setLevel(logging.INFO)
-logger.addHandler(file_handler)
-
-# Initialize ALPR (this will download models on first run)
-# Use lazy initialization to allow app to start even if models aren't ready
-alpr = None
-alpr_init_error = None
-
-def initialize_alpr():
-    """Initialize ALPR system. Can be called multiple times safely."""
-    global alpr, alpr_init_error
-    if alpr is not None:
-        return alpr
+LOG_FILE_NAME = "scanned_registrations.log"
+log_file = LOG_DIR / LOG_FILE_NAME
+
+# Scans go through priority lanes when ALPR_PRIORITY_LANES is on (see scheduler.py);
+# this app's frames are queued under one site id
+LOCAL_SITE = "local"
+
+# Key of the app's AppState in app.extensions
+STATE_KEY = 'alpr'
+
+
+class WebALPRService(ALPRService):
+    """
+    The ALPRService behind the app's scan routes.
+    
+    Scans are logged to scanned_registrations.log (imported into the scan
+    store on first run) and the models come from `load_alpr`, which builds
+    them from the environment (see build_alpr).
+    """
+    
+    def __init__(self, load_alpr, **kwargs):
+        """
+        Args:
+            load_alpr: Callable returning the ALPR to scan with, or None
+            **kwargs: ALPRService arguments
+        """
+        self._load_alpr = load_alpr
+        super().__init__(**kwargs)
+        if self.scan_store.created:
+            self.scan_store.import_text_log(self.log_file)
+    
+    def _setup_logging(self):
+        """Log scans to scanned_registrations.log, through a child logger per app."""
+        self.log_file = self.logs_dir / LOG_FILE_NAME
+        handler = logging.FileHandler(self.log_file)
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+        # Two apps never write to each other's file
+        self.logger = logging.getLogger(f'alpr_scanner.{id(self):x}')
+        self.logger.setLevel(logging.INFO)
+        self.logger.addHandler(handler)
+        self._log_handler = handler
+    
+    def _initialize_alpr(self, **settings):
+        """Use the app's ALPR; the model settings come from the environment instead."""
+        self.alpr = self._load_alpr()
+
+
+class AppState:
+    """
+    What the routes of one app share: the models, the scan service (with
+    its scan store and log writer), the session engine, the live feed, the
+    backend sink, the lane scheduler and the multi-site service.
+    
+    create_app() builds one per app and keeps it in app.extensions['alpr'];
+    the routes reach it through current_app (see `_state`).
+    """
+    
+    def __init__(self, logs_dir=LOG_DIR):
+        """
+        Open the scan store (importing the text log on first run), start the
+        log writer and restore the sessions. The models are not loaded here.
+        
+        Args:
+            logs_dir: Directory of the scan log, scan store, sessions snapshot
+                and backend spool
+        """
+        self.logs_dir = Path(logs_dir)
+        self.logs_dir.mkdir(exist_ok=True)
+        
+        # Loaded by load_alpr(): in the background from create_app(), or by the
+        # first scan. Models are downloaded on first run.
+        self.alpr = None
+        self.alpr_init_error = None
+        self.init_thread = None
+        self._alpr_lock = threading.Lock()
+        
+        # Who is on site now, fed by scans from cameras with a direction
+        self.camera_directions = camera_directions_from_env()
+        max_hours = float(os.environ.get('ALPR_SESSION_MAX_HOURS', 0))
+        self.session_engine = SessionEngine(
+            snapshot_path=str(self.logs_dir / "sessions.snapshot"),
+            max_session_seconds=max_hours * 3600 if max_hours > 0 else None,
+        )
+        
+        # Pushes new scans to open dashboards (/api/events) instead of them polling /api/logs
+        self.scan_feed = ScanFeed(
+            capacity=int(os.environ.get('ALPR_FEED_SIZE', 1000)),
+            max_subscribers=int(os.environ.get('ALPR_FEED_MAX_CLIENTS', 100)),
+        )
+        
+        # Scans go straight to the parking backend too, rather than via the mobile app
+        self.backend_sink = backend_sink_from_env(self.logs_dir)
+        
+        self.lane_scheduler = lane_scheduler_from_env(self.load_alpr)
+        
+        # Reads, logs and records the scans of the scan routes
+        self.service = WebALPRService(
+            self.load_alpr,
+            logs_dir=str(self.logs_dir),
+            log_queue_size=int(os.environ.get('ALPR_LOG_QUEUE_SIZE', 10000)),
+            log_flush_interval=float(os.environ.get('ALPR_LOG_FLUSH_INTERVAL', 0.2)),
+            log_overflow=os.environ.get('ALPR_LOG_OVERFLOW', 'drop'),
+            watch_registrations=False,
+            max_image_pixels=MAX_IMAGE_PIXELS,
+            # Priority lanes: this app's frames are queued under one site id
+            alpr=SiteALPR(self.lane_scheduler, LOCAL_SITE) if self.lane_scheduler else None,
+            camera_directions=self.camera_directions,
+            sessions=self.session_engine,
+            feed=self.scan_feed,
+            event_sink=self.backend_sink,
+        )
+        self.log_file = self.service.log_file
+        # Indexed scan history behind /api/logs, written off the request thread
+        self.scan_store = self.service.scan_store
+        self.scan_log_writer = self.service.log_writer
+        
+        # Per-site routes under /api/sites, built by create_app() when ALPR_SITES_CONFIG is set
+        self.site_service = None
+    
+    def log_registration(
+        self,
+        plate_text: str,
+        confidence: float,
+        image_filename: str = None,
+        camera_id: str = None,
+        direction: str = None
+    ):
+        """Log a scan read outside the scan routes, and record it in the session engine."""
+        self.service._log_vehicle_scan(
+            plate_text, confidence, None, None, camera_id, image_filename=image_filename
+        )
+        self.session_engine.record(
+            plate_text,
+            parse_direction(direction) or self.camera_directions.get(camera_id),
+            camera_id=camera_id,
+        )
+    
+    def load_alpr(self):
+        """
+        Initialize the ALPR system. Can be called multiple times safely.
+        
+        Concurrent callers wait for the first one instead of loading the models twice.
+        
+        Returns:
+            The ALPR instance, or None if it could not be loaded (see alpr_init_error)
+        """
+        with self._alpr_lock:
+            if self.alpr is None:
+                self.alpr, self.alpr_init_error = build_alpr()
+            return self.alpr
+    
+    def preload(self):
+        """Start loading the models in a background thread (once)."""
+        if self.init_thread is None:
+            self.init_thread = threading.Thread(target=self.load_alpr, daemon=True)
+            self.init_thread.start()
+    
+    def close(self):
+        """Stop the lane scheduler and the sites, write queued scans and save the sessions."""
+        if self.lane_scheduler is not None:
+            self.lane_scheduler.close()
+        if self.site_service is not None:
+            self.site_service.close()
+        self.service.close()
+        self.session_engine.close()
+        self.scan_feed.close()
+        if self.backend_sink is not None:
+            self.backend_sink.close()
+        self.scan_store.close()
+
+
+def _state() -> AppState:
+    """The AppState of the app handling the request."""
+    return current_app.extensions[STATE_KEY]
+
+
+def backend_sink_from_env(logs_dir=LOG_DIR):
+    """
+    EventSink for the ALPR_BACKEND_URL env var, or None when it is unset.
+    
+    ALPR_BACKEND_TOKEN, if set, is sent as a bearer token. Batches the
+    backend does not take are spooled to <logs_dir>/backend_spool.
+    """
+    url = os.environ.get('ALPR_BACKEND_URL', '').strip()
+    if not url:
+        return None
+    token = os.environ.get('ALPR_BACKEND_TOKEN', '').strip()
+    return EventSink(
+        url,
+        headers={"Authorization": f"Bearer {token}"} if token else None,
+        spool_dir=str(Path(logs_dir) / "backend_spool"),
+        flush_interval=float(os.environ.get('ALPR_BACKEND_FLUSH_INTERVAL', 1.0)),
+    )
+
+
+def camera_directions_from_env():
+    """
+    Camera directions from the ALPR_CAMERA_DIRECTIONS env var.
+    
+    A JSON object of camera id -> "entry" or "exit", e.g.
+    '{"gate-in": "entry", "gate-out": "exit"}'. Scans sent with one of these
+    cameras open or close a session at /api/sessions/<plate>.
+    """
+    value = os.environ.get('ALPR_CAMERA_DIRECTIONS', '').strip()
+    if not value:
+        return {}
+    return {camera: parse_direction(direction) for camera, direction in json.loads(value).items()}
+
+
+def crop_quality_from_env():
+    """
+    Build the crop quality thresholds from the ALPR_CROP_QUALITY env var.
+    
+    Unset or "off" disables the checks, "on" uses the defaults, a JSON object
+    overrides individual thresholds (e.g. '{"min_width": 40, "min_sharpness": null}').
+    """
+    value = os.environ.get('ALPR_CROP_QUALITY', '').strip()
+    if not value or value.lower() in ('off', 'false', '0'):
+        return None
+    overrides = json.loads(value) if value.startswith('{') else {}
+    return import_fast_alpr().CropQualityConfig(**overrides)
+
+
+def ocr_cache_from_env():
+    """
+    Build the OCR result cache settings from the ALPR_OCR_CACHE env var.
     
-    if ALPR is None:
-        alpr_init_error = "fast_alpr package not available"
+    Unset or "off" disables the cache, "on" uses the defaults, a JSON object
+    overrides individual settings (e.g. '{"ttl_seconds": 60, "max_entries": 2048}').
+    """
+    value = os.environ.get('ALPR_OCR_CACHE', '').strip()
+    if not value or value.lower() in ('off', 'false', '0'):
         return None
+    overrides = json.loads(value) if value.startswith('{') else {}
+    if 'thumbnail_size' in overrides:
+        overrides['thumbnail_size'] = tuple(overrides['thumbnail_size'])
+    return import_fast_alpr().OcrCacheConfig(**overrides)
+
+
+def plate_decoder_from_env():
+    """
+    Build the format-constrained OCR decoder from the ALPR_PLATE_FORMATS env var.
+    
+    Unset or "off" reads each character independently, a preset name ("ie")
+    uses its formats, anything else is a whitespace-separated list of patterns
+    (e.g. '\\d{2,3}-[A-Z]{1,2}-\\d{1,6} [A-Z]{3}-\\d{3}'). ALPR_PLATE_FORMAT_MAX_COST
+    sets how much less likely than the raw reading a valid plate may be.
+    """
+    value = os.environ.get('ALPR_PLATE_FORMATS', '').strip()
+    if not value or value.lower() in ('off', 'false', '0'):
+        return None
+    fast_alpr = import_fast_alpr()
+    presets = {'ie': fast_alpr.IRISH_PLATE_FORMATS}
+    formats = presets.get(value.lower()) or value.split()
+    max_cost = float(os.environ.get('ALPR_PLATE_FORMAT_MAX_COST', 4.0))
+    return fast_alpr.FormatConstrainedDecoder(formats, max_cost=max_cost)
+
+
+def cascade_from_env():
+    """
+    Build the model cascade settings from the ALPR_CASCADE env var.
+    
+    Unset or "off" runs one OCR model on every crop, "on" re-reads unsure crops
+    with cct-s-v1-global-model, a JSON object overrides individual settings
+    (e.g. '{"min_confidence": 0.85, "plate_formats": "ie",
+    "detector_model": "yolo-v9-s-608-license-plate-end2end"}').
+    """
+    value = os.environ.get('ALPR_CASCADE', '').strip()
+    if not value or value.lower() in ('off', 'false', '0'):
+        return None
+    fast_alpr = import_fast_alpr()
+    overrides = json.loads(value) if value.startswith('{') else {}
+    plate_formats = overrides.get('plate_formats')
+    if isinstance(plate_formats, str):
+        presets = {'ie': fast_alpr.IRISH_PLATE_FORMATS}
+        overrides['plate_formats'] = presets.get(plate_formats.lower()) or plate_formats.split()
+    if overrides.get('plate_formats') is not None:
+        overrides['plate_formats'] = tuple(overrides['plate_formats'])
+    return fast_alpr.CascadeConfig(**overrides)
+
+
+def tiling_from_env():
+    """
+    Build the tiled detection settings from the ALPR_TILING env var.
+    
+    Unset or "off" runs the detector on the whole frame, "on" splits large
+    frames into 640 px tiles overlapping by 20%, a JSON object overrides
+    individual settings (e.g. '{"tile_size": 960, "overlap": 0.25}').
+    Worth it for wide high-resolution cameras where distant plates are small.
+    """
+    value = os.environ.get('ALPR_TILING', '').strip()
+    if not value or value.lower() in ('off', 'false', '0'):
+        return None
+    overrides = json.loads(value) if value.startswith('{') else {}
+    return import_fast_alpr().TilingConfig(**overrides)
+
+
+def cascade_metrics(alpr_instance):
+    """Escalation counters of an ALPR's cascade, for the metrics endpoints."""
+    cascade_stats = getattr(alpr_instance, 'cascade_stats', None)
+    if cascade_stats is None:
+        return {}
+    return {
+        stage: {**asdict(stats), "escalation_rate": stats.escalation_rate}
+        for stage, stats in cascade_stats().items()
+    }
+
+
+def build_alpr():
+    """
+    Build the ALPR system the environment asks for: an in-process fast_alpr
+    ALPR, or a pool of inference worker processes (ALPR_INFERENCE_WORKERS).
+    
+    Returns:
+        Tuple of (alpr, error): the ALPR, or None and the reason it could not be built
+    """
+    try:
+        fast_alpr = import_fast_alpr()
+    except ImportError:
+        print("ERROR: Could not import fast_alpr. Please install it with: pip install fast-alpr[onnx]")
+        return None, "fast_alpr package not available"
     
     print("Initializing ALPR system...")
     try:
         # Try to fix SSL certificate issues on macOS
-        import ssl
         import certifi
-        import os
         
         # Set SSL certificate path
         os.environ['SSL_CERT_FILE'] = certifi.where()
         os.environ['REQUESTS_CA_BUNDLE'] = certifi.where()
         
-        alpr = ALPR(
-            detector_model="yolo-v9-t-384-license-plate-end2end",
-            ocr_model="cct-xs-v1-global-model",
-        )
+        # ALPR_INFERENCE_WORKERS > 0 runs inference in a pool of worker
+        # processes fed through shared memory instead of in this process.
+        workers = int(os.environ.get('ALPR_INFERENCE_WORKERS', 0))
+        if workers > 0:
+            from inference_server import InferencePool
+            alpr = InferencePool(
+                workers=workers,
+                detector_model="yolo-v9-t-384-license-plate-end2end",
+                ocr_model="cct-xs-v1-global-model",
+                alpr_kwargs={
+                    "crop_quality": crop_quality_from_env(),
+                    "ocr_cache": ocr_cache_from_env(),
+                    "plate_decoder": plate_decoder_from_env(),
+                    "cascade": cascade_from_env(),
+                    "tiling": tiling_from_env(),
+                },
+            ).start()
+        else:
+            alpr = fast_alpr.ALPR(
+                detector_model="yolo-v9-t-384-license-plate-end2end",
+                ocr_model="cct-xs-v1-global-model",
+                crop_quality=crop_quality_from_env(),
+                ocr_cache=ocr_cache_from_env(),
+                plate_decoder=plate_decoder_from_env(),
+                cascade=cascade_from_env(),
+                tiling=tiling_from_env(),
+                # Shares sessions with any ALPRService in this process
+                model_registry=shared_model_registry(),
+            )
         print("ALPR system initialized successfully!")
-        alpr_init_error = None
-        return alpr
+        return alpr, None
     except Exception as e:
         error_msg = str(e)
         print(f"Error initializing ALPR: {error_msg}")
-        alpr_init_error = error_msg
-        alpr = None
+        return None, error_msg
+
+
+def lane_scheduler_from_env(load_alpr):
+    """
+    Priority lanes for the scan routes, or None unless ALPR_PRIORITY_LANES is "1".
+    
+    `load_alpr` returns the ALPR the lanes share (e.g. AppState.load_alpr).
+    Scans from gate cameras (or sent with a direction) run in the realtime
+    lane, batch uploads in the bulk lane and other scans in the interactive
+    lane; a "priority" field overrides this. ALPR_LANE_MAX_BATCH caps the
+    frames per inference batch and ALPR_LANE_MAX_PENDING the frames waiting
+    per lane.
+    """
+    if os.environ.get('ALPR_PRIORITY_LANES', '0').lower() not in ('1', 'true'):
         return None
+    scheduler = FairScheduler(
+        load_alpr,
+        max_batch=int(os.environ.get('ALPR_LANE_MAX_BATCH', 8)),
+        # One dispatch thread per inference worker process keeps them all busy
+        workers=max(int(os.environ.get('ALPR_INFERENCE_WORKERS', 0)), 1),
+        name='lane-scheduler',
+    )
+    scheduler.add_site(LOCAL_SITE, max_pending=int(os.environ.get('ALPR_LANE_MAX_PENDING', 64)))
+    return scheduler
+
+
+def create_app(load_models: bool = None, logs_dir=None) -> Flask:
+    """
+    Build the Flask app.
+    
+    Each app has its own AppState (scan store, log writer, sessions, ...),
+    kept in app.extensions['alpr'].
+    
+    Args:
+        load_models: Start loading the models in a background thread. If
+            False they load on the first scan. Defaults to the
+            ALPR_PRELOAD_MODELS env var (on unless "0").
+        logs_dir: Directory of the scan log and scan store (default: logs/
+            next to this file)
+    
+    Returns:
+        The Flask app
+    """
+    app = Flask(__name__)
+    CORS(app)
+    
+    # Uploads over this size are rejected with 413 before they are read
+    app.config['MAX_CONTENT_LENGTH'] = int(
+        float(os.environ.get('ALPR_MAX_UPLOAD_MB', DEFAULT_MAX_UPLOAD_BYTES / (1 << 20))) * (1 << 20)
+    )
+    state = AppState(logs_dir or LOG_DIR)
+    app.extensions[STATE_KEY] = state
+    app.register_blueprint(bp)
+    
+    # ALPR_SITES_CONFIG points at a sites.json; the sites share this app's model
+    sites_config = os.environ.get('ALPR_SITES_CONFIG')
+    if sites_config:
+        from sites import MultiSiteService, create_site_routes
+        state.site_service = MultiSiteService.from_config(
+            sites_config,
+            load_alpr=state.load_alpr,
+            max_image_pixels=MAX_IMAGE_PIXELS,
+        )
+        create_site_routes(app, state.site_service)
+    
+    if load_models is None:
+        load_models = os.environ.get('ALPR_PRELOAD_MODELS', '1') != '0'
+    if load_models:
+        state.preload()
+    return app
+
+
+# AppState attributes that used to be module globals, by their old name
+_LEGACY_ATTRIBUTES = {
+    'scan_store': 'scan_store',
+    'scan_log_writer': 'scan_log_writer',
+    'session_engine': 'session_engine',
+    'camera_directions': 'camera_directions',
+    'scan_feed': 'scan_feed',
+    'backend_sink': 'backend_sink',
+    'alpr': 'alpr',
+    'alpr_init_error': 'alpr_init_error',
+    'init_thread': 'init_thread',
+    'lane_scheduler': 'lane_scheduler',
+    'site_service': 'site_service',
+    'initialize_alpr': 'load_alpr',
+    'log_registration': 'log_registration',
+}
 
-# Try to initialize in background (non-blocking)
-try:
-    import threading
-    init_thread = threading.Thread(target=initialize_alpr, daemon=True)
-    init_thread.start()
-except Exception:
-    # If threading fails, try synchronous init
-    initialize_alpr()
-
-# Create uploads directory
-UPLOAD_DIR = Path(__file__).parent / "uploads"
-UPLOAD_DIR.mkdir(exist_ok=True)
-
-
-def log_registration(plate_text: str, confidence: float, image_filename: str = None):
-    """Log a scanned registration to the log file."""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = {
-        "timestamp": timestamp,
-        "plate_text": plate_text,
-        "confidence": confidence,
-        "image_filename": image_filename
-    }
-    logger.info(json.dumps(log_entry))
-    return log_entry
 
+def __getattr__(name):
+    # `app:app` (gunicorn, `flask --app`) builds the app on first access
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    # Back-compat for code that used the old module globals: they are the
+    # module-level app's state now
+    if name in _LEGACY_ATTRIBUTES:
+        module_app = globals().get('app') or __getattr__('app')
+        return getattr(module_app.extensions[STATE_KEY], _LEGACY_ATTRIBUTES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-@app.route('/')
+
+@bp.before_app_request
+def _track_request_memory():
+    if request.endpoint in TRACKED_ENDPOINTS:
+        request_memory.start()
+
+
+@bp.after_app_request
+def _record_request_memory(response):
+    if request.endpoint in TRACKED_ENDPOINTS:
+        request_memory.finish(request.endpoint)
+    return response
+
+
+@bp.app_errorhandler(413)
+def upload_too_large(e):
+    """JSON error for uploads over MAX_CONTENT_LENGTH."""
+    limit_mb = current_app.config['MAX_CONTENT_LENGTH'] / (1 << 20)
+    return jsonify({"success": False, "error": f"Upload too large (limit {limit_mb:.0f} MB)"}), 413
+
+
+def _scan_source(values):
+    """(camera_id, direction) sent with a scan request; raises ValueError for a bad direction."""
+    return values.get('camera'), parse_direction(values.get('direction'))
+
+
+def _scan_request(values, bulk=False):
+    """
+    (camera_id, direction, priority, lane) of a scan request (see ALPRService.lane_for).
+    
+    Raises:
+        ValueError: For a bad direction or priority
+    """
+    camera_id, direction = _scan_source(values)
+    priority = values.get('priority')
+    return camera_id, direction, priority, _state().service.lane_for(priority, camera_id, direction, bulk=bulk)
+
+
+def _respond(result, body=None):
+    """
+    Response for an ALPRService result: `body` (default: the result) if it
+    succeeded, else the result with the HTTP status of its failure.
+    """
+    if result["success"]:
+        return jsonify(result if body is None else body)
+    if result.get("too_large"):
+        return jsonify(result), 413
+    if result.get("busy"):
+        return jsonify(result), 429, {"Retry-After": "1"}
+    if result.get("invalid"):
+        return jsonify(result), 400
+    return jsonify(result), 500
+
+
+def _bbox(plate):
+    """[x1, y1, x2, y2] of an ALPRService plate, as the mobile app expects it."""
+    box = plate["bounding_box"]
+    return [float(box["x1"]), float(box["y1"]), float(box["x2"]), float(box["y2"])]
+
+
+def _lane_busy(lane, frames=1):
+    """429 response if the lane has no room for `frames` more frames, else None."""
+    scheduler = _state().lane_scheduler
+    if scheduler is None or scheduler.has_capacity(LOCAL_SITE, frames, lane):
+        return None
+    response = jsonify({"success": False, "error": f"Too many {lane} scans waiting", "busy": True})
+    response.headers['Retry-After'] = '1'
+    return response, 429
+
+
+@bp.route('/')
 def index():
     """Serve the main page."""
     return render_template('index.html')
 
 
-@app.route('/favicon.ico')
+@bp.route('/favicon.ico')
 def favicon():
     """Serve favicon to avoid 404 errors."""
     return '', 204  # No content
 
 
-@app.route('/api/scan', methods=['POST'])
+@bp.route('/api/scan', methods=['POST'])
 def scan_image():
     """Process uploaded image with ALPR."""
     # Try to initialize if not already done
-    if alpr is None:
-        initialize_alpr()
-    
-    if alpr is None:
-        error_msg = alpr_init_error or "ALPR system not initialized. Models may still be downloading."
+    state = _state()
+    if state.load_alpr() is None:
+        error_msg = state.alpr_init_error or "ALPR system not initialized. Models may still be downloading."
         return jsonify({"error": error_msg}), 500
     
     if 'image' not in request.files:
@@ -161,200 +611,357 @@ def scan_image():
         return jsonify({"error": "No file selected"}), 400
     
     try:
-        # Save uploaded file temporarily
-        filename = file.filename
-        filepath = UPLOAD_DIR / filename
-        file.save(str(filepath))
-        
-        # Process image with ALPR
-        results = alpr.predict(str(filepath))
-        
-        # Prepare response data
-        plates = []
-        for result in results:
-            if result.ocr is not None and result.ocr.text:
-                # Calculate average confidence
-                conf = result.ocr.confidence
-                if isinstance(conf, list):
-                    avg_confidence = statistics.mean(conf)
-                else:
-                    avg_confidence = conf
-                
-                plate_data = {
-                    "text": result.ocr.text,
-                    "confidence": float(avg_confidence),
-                    "detection_confidence": float(result.detection.confidence),
-                    "bounding_box": {
-                        "x1": result.detection.bounding_box.x1,
-                        "y1": result.detection.bounding_box.y1,
-                        "x2": result.detection.bounding_box.x2,
-                        "y2": result.detection.bounding_box.y2,
-                    }
-                }
-                plates.append(plate_data)
-                
-                # Log the registration
-                log_registration(
-                    plate_text=result.ocr.text,
-                    confidence=float(avg_confidence),
-                    image_filename=filename
-                )
-        
-        # Generate annotated image
-        annotated_image = alpr.draw_predictions(str(filepath))
-        
-        # Convert annotated image to base64
-        _, buffer = cv2.imencode('.jpg', annotated_image)
-        image_base64 = base64.b64encode(buffer).decode('utf-8')
-        
-        # Clean up uploaded file
-        filepath.unlink()
-        
-        return jsonify({
-            "success": True,
-            "plates": plates,
-            "annotated_image": f"data:image/jpeg;base64,{image_base64}",
-            "count": len(plates)
-        })
+        camera_id, direction, priority, lane = _scan_request(request.form)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    busy = _lane_busy(lane)
+    if busy:
+        return busy
     
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    # Decoded in memory, at reduced resolution if the photo is very large
+    result = state.service.scan_image(
+        image_data=file.read(),
+        camera_id=camera_id,
+        direction=direction,
+        priority=priority,
+        image_filename=file.filename,
+    )
+    return _respond(result)
+
+
+def _upload_bytes(data, max_upload_bytes=None):
+    """Encoded image of a batch item: uploaded bytes, or a copy of the decoded base64 text."""
+    if isinstance(data, str):
+        # decode_base64 reuses its buffer for the next image, so keep a copy
+        return bytes(decode_base64(data, max_upload_bytes))
+    return data
+
+
+@bp.route('/api/scan/batch', methods=['POST'])
+def scan_batch():
+    """Process several images in one request with one batched inference pass.
+    
+    Accepts multipart uploads under "images" or a JSON body
+    {"images": [<base64>, ...]}. Results are returned in upload order and a
+    bad image only fails its own entry.
+    """
+    state = _state()
+    if state.load_alpr() is None:
+        error_msg = state.alpr_init_error or "ALPR system not initialized. Models may still be downloading."
+        return jsonify({"error": error_msg}), 500
+    
+    if request.files:
+        items = [(file.filename, file.read()) for file in request.files.getlist('images')]
+        source = request.form
+    else:
+        data = request.get_json(silent=True) or {}
+        images = data.get('images')
+        if not isinstance(images, list):
+            return jsonify({"error": "No images provided"}), 400
+        items = [(f"image_{i}", image) for i, image in enumerate(images)]
+        source = data
+    if not items:
+        return jsonify({"error": "No images provided"}), 400
+    try:
+        camera_id, direction, priority, lane = _scan_request(source, bulk=True)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    busy = _lane_busy(lane, len(items))
+    if busy:
+        return busy
+    
+    responses = [
+        {"index": i, "filename": name, "success": False, "error": None}
+        for i, (name, _) in enumerate(items)
+    ]
+    valid, images = [], []
+    for i, (name, data) in enumerate(items):
+        try:
+            images.append(_upload_bytes(data, current_app.config['MAX_CONTENT_LENGTH']))
+            valid.append(i)
+        except ValueError as e:
+            responses[i]["error"] = f"{name}: {e}"
+    
+    results = state.service.scan_images(
+        images,
+        camera_id=camera_id,
+        direction=direction,
+        priority=priority,
+        image_filenames=[items[i][0] for i in valid],
+    )
+    if any(result.get("busy") for result in results):
+        # The lane filled up since the capacity check
+        return jsonify({"success": False, "error": f"Too many {lane} scans waiting", "busy": True}), 429, {"Retry-After": "1"}
+    for i, result in zip(valid, results):
+        responses[i].update(result, index=i)
+    
+    return jsonify({
+        "success": True,
+        "results": responses,
+        "count": len(responses),
+        "failed": sum(1 for r in responses if not r["success"]),
+    })
 
 
-@app.route('/api/logs', methods=['GET'])
+@bp.route('/api/logs', methods=['GET'])
 def get_logs():
-    """Get scanned registration logs."""
+    """Get scanned registration logs, most recent first.
+    
+    Query parameters: start, end (YYYY-MM-DD[ HH:MM:SS]), plate,
+    min_confidence and limit (default 1000).
+    """
     try:
-        logs = []
-        if log_file.exists():
-            with open(log_file, 'r') as f:
-                for line in f:
-                    if line.strip():
-                        try:
-                            log_entry = json.loads(line.strip())
-                            logs.append(log_entry)
-                        except json.JSONDecodeError:
-                            # Handle old format logs
-                            logs.append({"raw": line.strip()})
-        
-        # Return most recent first
-        logs.reverse()
+        logs = _state().scan_store.query(
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            plate=request.args.get('plate'),
+            min_confidence=request.args.get('min_confidence', type=float),
+            limit=request.args.get('limit', 1000, type=int),
+        )
         return jsonify({"logs": logs, "count": len(logs)})
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/api/health', methods=['GET'])
-def health():
-    """Health check endpoint."""
-    # Try to initialize if not already done
-    if alpr is None:
-        initialize_alpr()
+@bp.route('/api/summary', methods=['GET'])
+def summary():
+    """Scan analytics for a date range, merged from the hourly rollups.
     
+    Query parameters: start, end (YYYY-MM-DD[ HH:MM:SS]) or days (default
+    7, today included), and bucket ("day", "hour" or "none").
+    """
+    start, end = request.args.get('start'), request.args.get('end')
+    if start is None and end is None:
+        days = max(request.args.get('days', 7, type=int), 1)
+        start = (datetime.now() - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    try:
+        return jsonify(_state().scan_store.summary(
+            start=start, end=end, bucket=request.args.get('bucket', 'day')
+        ))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@bp.route('/api/events', methods=['GET'])
+def events():
+    """Live scan feed (Server-Sent Events).
+    
+    Each new scan is pushed as a "scan" event carrying its log entry. A
+    reconnecting client's Last-Event-ID header (or ?last_event_id=) replays
+    the scans it missed; ?backlog=N replays the latest N on first connect.
+    """
+    last_event_id = parse_event_id(
+        request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    )
+    try:
+        subscription = _state().scan_feed.subscribe(
+            last_event_id=last_event_id,
+            backlog=request.args.get('backlog', 0, type=int),
+            match=event_filter(camera_id=request.args.get('camera')),
+        )
+    except FeedFull as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+    return Response(subscription, mimetype='text/event-stream', headers=SSE_HEADERS)
+
+
+@bp.route('/api/events/recent', methods=['GET'])
+def recent_events():
+    """Buffered scan events after ?after=<id>, for clients that cannot stream (no file reads)."""
+    return jsonify(_state().scan_feed.recent(
+        after=parse_event_id(request.args.get('after')),
+        limit=request.args.get('limit', 100, type=int),
+        match=event_filter(camera_id=request.args.get('camera')),
+    ))
+
+
+@bp.route('/api/health', methods=['GET'])
+def health():
+    """Health check endpoint. Reports model status without waiting for the models to load."""
+    state = _state()
     return jsonify({
         "status": "ok",
-        "alpr_initialized": alpr is not None,
-        "alpr_error": alpr_init_error if alpr is None else None
+        "alpr_initialized": state.alpr is not None,
+        "alpr_error": state.alpr_init_error if state.alpr is None else None
     })
 
 
-@app.route('/health', methods=['GET'])
+@bp.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Runtime counters (log writer queue depth, drops, OCR cache hit rate, decode memory, ...)."""
+    state = _state()
+    alpr = state.alpr
+    metrics = {
+        "log_writer": state.scan_log_writer.stats(),
+        "decode": decode_stats.stats(),
+        "memory": request_memory.stats(),
+        "sessions": state.session_engine.stats(),
+        "feed": state.scan_feed.stats(),
+    }
+    if state.lane_scheduler is not None:
+        metrics["lanes"] = state.lane_scheduler.stats()["lanes"]
+    if state.backend_sink is not None:
+        metrics["backend"] = state.backend_sink.stats()
+    # Only the in-process ALPR; inference workers each keep their own cache and models
+    ocr_cache = getattr(alpr, 'ocr_cache', None)
+    if ocr_cache is not None:
+        stats = ocr_cache.stats()
+        metrics["ocr_cache"] = {**asdict(stats), "hit_rate": stats.hit_rate}
+    cascade = cascade_metrics(alpr)
+    if cascade:
+        metrics["cascade"] = cascade
+    if alpr is not None:
+        metrics["models"] = describe_models(shared_model_registry())
+    return jsonify(metrics)
+
+
+@bp.route('/api/occupancy', methods=['GET'])
+def occupancy():
+    """Vehicles on site now, from the entry/exit camera scans (?vehicles=true lists them)."""
+    sessions = _state().session_engine
+    response = {"occupancy": sessions.occupancy()}
+    if request.args.get('vehicles', '').lower() in ('1', 'true'):
+        response["vehicles"] = sessions.open_sessions()
+    return jsonify(response)
+
+
+@bp.route('/api/sessions/<plate_text>', methods=['GET'])
+def plate_session(plate_text):
+    """Whether a plate is on site, since when, and its last completed stay."""
+    return jsonify(_state().session_engine.session(plate_text))
+
+
+@bp.route('/health', methods=['GET'])
 def health_mobile():
     """Health check endpoint for mobile app."""
-    # Try to initialize if not already done
-    if alpr is None:
-        initialize_alpr()
-    
+    state = _state()
     return jsonify({
-        "status": "healthy" if alpr is not None else "initializing",
-        "alpr_initialized": alpr is not None,
-        "alpr_error": alpr_init_error if alpr is None else None
+        "status": "healthy" if state.alpr is not None else "initializing",
+        "alpr_initialized": state.alpr is not None,
+        "alpr_error": state.alpr_init_error if state.alpr is None else None
     })
 
 
-@app.route('/process', methods=['POST'])
+@bp.route('/process', methods=['POST'])
 def process():
     """Process base64 image with ALPR (for mobile app)."""
     # Try to initialize if not already done
-    if alpr is None:
-        initialize_alpr()
+    state = _state()
+    if state.load_alpr() is None:
+        error_msg = state.alpr_init_error or "ALPR system not initialized. Models may still be downloading."
+        return jsonify({"success": False, "error": error_msg}), 500
+    
+    data = request.get_json(silent=True)
+    if not data or 'image' not in data:
+        return jsonify({"success": False, "error": "No image data provided"}), 400
+    try:
+        camera_id, direction, priority, lane = _scan_request(data)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    busy = _lane_busy(lane)
+    if busy:
+        return busy
+    
+    # Decode base64 in chunks into this thread's reused buffer; the service
+    # decodes the image from it within the pixel budget (reduced resolution if needed)
+    try:
+        image_data = decode_base64(data['image'], current_app.config['MAX_CONTENT_LENGTH'])
+    except ImageTooLarge as e:
+        return jsonify({"success": False, "error": str(e)}), 413
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    # Name used for the log entry; the decoded frame goes straight to ALPR
+    # (or into a shared-memory slot of the inference pool) without a disk round trip.
+    temp_filename = f"temp_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.jpg"
+    result = state.service.scan_image(
+        image_data=image_data,
+        camera_id=camera_id,
+        direction=direction,
+        priority=priority,
+        image_filename=temp_filename,
+        annotate=False,
+    )
+    detections = [
+        {"registration": plate["text"], "confidence": plate["confidence"], "bbox": _bbox(plate)}
+        for plate in result.get("plates", [])
+    ]
+    return _respond(result, {
+        "success": True,
+        "detections": detections,
+        "count": len(detections),
+        "skipped": result.get("skipped")
+    })
+
+
+@bp.route('/process/plates', methods=['POST'])
+def process_plates():
+    """Read plates located on the device (for gate units that run their own detector).
     
-    if alpr is None:
-        error_msg = alpr_init_error or "ALPR system not initialized. Models may still be downloading."
+    JSON body {"plates": [<base64 crop>, ...]} or {"image": <base64>,
+    "boxes": [[x1, y1, x2, y2], ...]}. Only OCR runs on the server, all
+    crops in one batch. Each detection carries the "index" of its crop or box.
+    """
+    state = _state()
+    if state.load_alpr() is None:
+        error_msg = state.alpr_init_error or "ALPR system not initialized. Models may still be downloading."
         return jsonify({"success": False, "error": error_msg}), 500
     
+    data = request.get_json(silent=True) or {}
+    plates = data.get('plates')
+    boxes = data.get('boxes')
+    if not plates and not (data.get('image') and boxes):
+        return jsonify({"success": False, "error": "No plates or boxes provided"}), 400
+    
+    max_bytes = current_app.config['MAX_CONTENT_LENGTH']
     try:
-        data = request.get_json()
-        if not data or 'image' not in data:
-            return jsonify({"success": False, "error": "No image data provided"}), 400
-        
-        # Decode base64 image
-        image_base64 = data['image']
-        image_data = base64.b64decode(image_base64)
-        
-        # Convert to numpy array
-        nparr = np.frombuffer(image_data, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if img is None:
-            return jsonify({"success": False, "error": "Failed to decode image"}), 400
-        
-        # Save temporarily for processing
-        temp_filename = f"temp_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.jpg"
-        temp_filepath = UPLOAD_DIR / temp_filename
-        cv2.imwrite(str(temp_filepath), img)
-        
-        # Process image with ALPR
-        results = alpr.predict(str(temp_filepath))
-        
-        # Prepare response data
-        detections = []
-        for result in results:
-            if result.ocr is not None and result.ocr.text:
-                # Calculate average confidence
-                conf = result.ocr.confidence
-                if isinstance(conf, list):
-                    avg_confidence = statistics.mean(conf)
-                else:
-                    avg_confidence = conf
-                
-                detection = {
-                    "registration": result.ocr.text,
-                    "confidence": float(avg_confidence),
-                    "bbox": [
-                        float(result.detection.bounding_box.x1),
-                        float(result.detection.bounding_box.y1),
-                        float(result.detection.bounding_box.x2),
-                        float(result.detection.bounding_box.y2),
-                    ]
-                }
-                detections.append(detection)
-                
-                # Log the registration
-                log_registration(
-                    plate_text=result.ocr.text,
-                    confidence=float(avg_confidence),
-                    image_filename=temp_filename
-                )
-        
-        # Clean up temporary file
-        temp_filepath.unlink()
-        
-        return jsonify({
-            "success": True,
-            "detections": detections,
-            "count": len(detections)
-        })
+        camera_id, direction, priority, lane = _scan_request(data)
+        if plates:
+            plates = [_upload_bytes(plate, max_bytes) for plate in plates]
+            image = None
+        elif not isinstance(boxes, list):
+            raise ValueError("boxes must be a list of [x1, y1, x2, y2]")
+        else:
+            image = decode_base64(data['image'], max_bytes)
+    except ImageTooLarge as e:
+        return jsonify({"success": False, "error": str(e)}), 413
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    busy = _lane_busy(lane, len(plates or boxes))
+    if busy:
+        return busy
     
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
+    result = state.service.read_plates(
+        plates=plates,
+        image=image,
+        boxes=boxes,
+        camera_id=camera_id,
+        direction=direction,
+        priority=priority,
+        image_filename=f"plates_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}",
+    )
+    detections = []
+    for plate in result.get("plates", []):
+        detection = {
+            "index": plate["index"],
+            "registration": plate["text"],
+            "confidence": plate["confidence"],
+        }
+        if not plates:
+            detection["bbox"] = _bbox(plate)
+        detections.append(detection)
+    return _respond(result, {
+        "success": True,
+        "detections": detections,
+        "count": len(detections),
+        "skipped": result.get("skipped")
+    })
 
 
 if __name__ == '__main__':
+    app = create_app()
     print(f"Starting ALPR web server...")
-    print(f"Logs will be saved to: {log_file}")
-    print(f"Uploads will be saved to: {UPLOAD_DIR}")
+    print(f"Logs will be saved to: {app.extensions[STATE_KEY].log_file}")
     # Use port 5001 to avoid conflict with macOS AirPlay Receiver on port 5000
     port = int(os.environ.get('PORT', 5001))
     print(f"Server starting on http://localhost:{port}")
@@ -0,0 +1,178 @@
+"""
+Backend delivery benchmark: event_sink.EventSink against a local stand-in backend.
+
+Starts a small HTTP/1.1 server on localhost that stores the batches it is
+sent (ignoring repeated batch ids, as the real backend should), then:
+  - per-event: one POST per scan on a new connection (what relaying every
+               result costs), for comparison
+  - batched:   scans submitted to an EventSink at --rate per second
+  - outage:    the backend is stopped for --outage seconds while scans keep
+               coming, then restarted; the spool must drain in order
+
+Reports requests and connections per scan and the delivery lag, and checks
+that the backend got every scan exactly once, in order.
+
+Usage:
+    python benchmarks/bench_event_sink.py
+    python benchmarks/bench_event_sink.py --events 5000 --rate 1000 --outage 5
+"""
+import argparse
+import json
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from event_sink import EventSink  # noqa: E402
+
+
+class StandInBackend:
+    """Records POSTed batches; can be stopped and restarted on the same port."""
+
+    def __init__(self, port: int = 0):
+        self.events = []
+        self.batch_ids = set()
+        self.requests = 0
+        self.connections = 0
+        self._sockets = set()
+        self._lock = threading.Lock()
+        self._server = None
+        self.port = port
+        self.start()
+
+    def start(self):
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with backend._lock:
+                    backend.connections += 1
+                    backend._sockets.add(self.connection)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with backend._lock:
+                    backend.requests += 1
+                    if "batch_id" not in body:
+                        backend.events.append(body)
+                    elif body["batch_id"] not in backend.batch_ids:
+                        backend.batch_ids.add(body["batch_id"])
+                        backend.events.extend(body["events"])
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        """Stop listening and drop the open keep-alive connections, like a crashed backend."""
+        self._server.shutdown()
+        self._server.server_close()
+        with self._lock:
+            for sock in self._sockets:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            self._sockets.clear()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/api/alpr/events"
+
+
+def submit_at_rate(sink: EventSink, start: int, count: int, rate: float):
+    began = time.perf_counter()
+    for i in range(start, start + count):
+        sink.submit({"seq": i, "plate_text": f"191D{i:05d}", "confidence": 0.93})
+        delay = began + (i - start + 1) / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def wait_delivered(sink: EventSink, total: int, timeout: float) -> float:
+    began = time.perf_counter()
+    while sink.stats()["delivered"] < total and time.perf_counter() - began < timeout:
+        time.sleep(0.05)
+    return time.perf_counter() - began
+
+
+def check(backend: StandInBackend, total: int):
+    seqs = [event["seq"] for event in backend.events]
+    if seqs != list(range(total)):
+        raise SystemExit(f"Backend got {len(seqs)} scans, expected 0..{total - 1} in order")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=2000, help="Scans per phase")
+    parser.add_argument("--rate", type=float, default=500, help="Scans submitted per second")
+    parser.add_argument("--outage", type=float, default=3.0, help="Seconds the backend is down")
+    parser.add_argument("--per-event", type=int, default=300, help="Scans sent one request each")
+    args = parser.parse_args()
+
+    backend = StandInBackend()
+    spool_dir = tempfile.mkdtemp(prefix="event-spool-")
+    try:
+        start = time.perf_counter()
+        for i in range(args.per_event):
+            request = urllib.request.Request(
+                backend.url, data=json.dumps({"seq": i}).encode(),
+                headers={"Content-Type": "application/json", "Connection": "close"},
+            )
+            urllib.request.urlopen(request).read()
+        per_event = (time.perf_counter() - start) / args.per_event
+        print(f"per-event: {per_event * 1000:.2f} ms per scan, 1 request and 1 connection per scan")
+
+        backend.events.clear()
+        backend.requests = backend.connections = 0
+        sink = EventSink(backend.url, spool_dir=spool_dir, retry_base=0.2, retry_max=1.0, max_attempts=2)
+        submit_at_rate(sink, 0, args.events, args.rate)
+        wait_delivered(sink, args.events, 30)
+        stats = sink.stats()
+        check(backend, args.events)
+        print(f"batched:   {args.events} scans in {backend.requests} requests over "
+              f"{backend.connections} connections, lag {stats['lag_seconds']}")
+
+        backend.stop()
+        down_at = time.perf_counter()
+        outage_events = int(args.outage * args.rate)
+        submit_at_rate(sink, args.events, outage_events, args.rate)
+        while time.perf_counter() - down_at < args.outage:
+            time.sleep(0.05)
+        stats = sink.stats()
+        print(f"outage:    {stats['spooled_batches']} batches spooled ({stats['spool_bytes']} bytes), "
+              f"oldest {stats['oldest_spooled_seconds']} s, {stats['failed_attempts']} failed attempts")
+        backend.start()
+        total = args.events + outage_events
+        submit_at_rate(sink, total, args.events, args.rate)
+        total += args.events
+        drained = wait_delivered(sink, total, 60)
+        stats = sink.stats()
+        check(backend, total)
+        sink.close()
+        print(f"recovered: spool drained and caught up {drained:.1f} s after the last scan, "
+              f"max lag {stats['lag_seconds']['max']} s, {stats['spooled_batches']} batches left")
+    finally:
+        backend.stop()
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
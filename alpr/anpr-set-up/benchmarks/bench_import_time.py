@@ -0,0 +1,92 @@
+"""
+Startup benchmark: import time of the app.py and alpr_service.py entry points.
+
+Each import runs in a fresh interpreter under `python -X importtime`, and the
+median cumulative time of the entry module is reported along with the
+heaviest modules it pulled in. Pass --baseline with another checkout of this
+directory (e.g. `git worktree add /tmp/alpr-before <rev>`) to compare.
+
+Usage:
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --baseline /tmp/alpr-before/alpr/anpr-set-up --runs 9
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+TREE = Path(__file__).resolve().parent.parent
+
+# Modules that should only be loaded on the inference path
+HEAVY = ("cv2", "numpy", "onnxruntime", "fast_alpr", "fast_plate_ocr", "open_image_models", "PIL")
+
+
+def import_profile(tree: Path, module: str) -> dict:
+    """Import `module` from `tree` in a fresh interpreter; return {name: (cumulative_us, depth)}."""
+    env = dict(os.environ, ALPR_PRELOAD_MODELS="0")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=tree, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode:
+        raise RuntimeError(f"import {module} failed in {tree}:\n{proc.stderr[-2000:]}")
+    profile = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():
+            depth = (len(name) - len(name.lstrip()) - 1) // 2
+            profile[name.strip()] = (int(cumulative_us), depth)
+    return profile
+
+
+def measure(tree: Path, module: str, runs: int) -> dict:
+    """Median import time of `module` over `runs` fresh interpreters, after one warm-up."""
+    import_profile(tree, module)
+    profiles = [import_profile(tree, module) for _ in range(runs)]
+    last = profiles[-1]
+    # Direct imports of the entry module (depth 1), by cumulative time
+    heaviest = sorted(
+        (name for name, (_, depth) in last.items() if depth == 1),
+        key=lambda name: last[name][0],
+        reverse=True,
+    )
+    return {
+        "ms": statistics.median(p[module][0] for p in profiles) / 1000,
+        "heavy": [name for name in HEAVY if name in last],
+        "heaviest": [(name, last[name][0] / 1000) for name in heaviest],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=["app", "alpr_service"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--baseline", type=Path, help="Another checkout of this directory")
+    parser.add_argument("--top", type=int, default=5, help="Heaviest direct imports to list")
+    args = parser.parse_args()
+
+    trees = [("current", TREE)]
+    if args.baseline:
+        trees.insert(0, ("baseline", args.baseline.resolve()))
+
+    print(f"{'module':<14}{'tree':<10}{'import ms':>10}{'speedup':>10}  heavy modules loaded")
+    for module in args.modules:
+        baseline = None
+        results = []
+        for label, tree in trees:
+            result = measure(tree, module, args.runs)
+            baseline = baseline or result["ms"]
+            results.append((label, result))
+            print(f"{module:<14}{label:<10}{result['ms']:>10.1f}{baseline / result['ms']:>10.2f}  "
+                  f"{', '.join(result['heavy']) or '-'}")
+        for label, result in results:
+            top = ", ".join(f"{name} {ms:.0f}" for name, ms in result["heaviest"][:args.top])
+            print(f"  {label} heaviest (ms): {top}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Throughput benchmark: single-process ALPR vs. the shared-memory inference pool.
+
+The single-process baseline mirrors app.py without ALPR_INFERENCE_WORKERS: one
+ALPR instance called from concurrent request threads. The pool is measured at
+1, 2, 4 and 8 worker processes with the same client concurrency.
+
+Usage:
+    python benchmarks/bench_inference_server.py --image path/to/frame.jpg --requests 200
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from inference_server import InferencePool, create_alpr  # noqa: E402
+
+DEFAULT_IMAGE = (
+    Path(__file__).resolve().parent.parent / "fast-alpr-master" / "assets" / "test_image.png"
+)
+
+
+def measure(predict, frame, requests: int, concurrency: int) -> float:
+    """Return frames per second for `requests` calls issued from `concurrency` threads."""
+    # Warm-up
+    for _ in range(min(4, requests)):
+        predict(frame)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(lambda _: predict(frame), range(requests)))
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--image", default=str(DEFAULT_IMAGE), help="Frame to run inference on")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per configuration")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent client threads")
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="Pool sizes to measure"
+    )
+    args = parser.parse_args()
+
+    frame = cv2.imread(args.image)
+    if frame is None:
+        sys.exit(f"Failed to load image: {args.image}")
+
+    print(f"CPU cores: {os.cpu_count()}, frame: {frame.shape[1]}x{frame.shape[0]}, "
+          f"requests: {args.requests}, concurrency: {args.concurrency}")
+    print(f"{'mode':<22}{'frames/s':>12}{'speedup':>10}")
+
+    alpr = create_alpr()
+    baseline = measure(alpr.predict, frame, args.requests, args.concurrency)
+    del alpr
+    print(f"{'single process':<22}{baseline:>12.1f}{1.0:>10.2f}")
+
+    for workers in args.workers:
+        pool = InferencePool(workers=workers).start()
+        try:
+            fps = measure(pool.predict, frame, args.requests, args.concurrency)
+        finally:
+            pool.shutdown()
+        print(f"{f'pool, {workers} workers':<22}{fps:>12.1f}{fps / baseline:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
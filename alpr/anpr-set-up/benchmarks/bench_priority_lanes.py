@@ -0,0 +1,127 @@
+"""
+Priority lane benchmark: gate-barrier scan latency under a bulk backlog.
+
+A stand-in ALPR takes --frame-ms per frame (plus --batch-ms per batch), so
+no models are needed. Several clients keep the bulk lane full with batch
+uploads while a gate camera sends one realtime scan every --interval
+seconds. The same load is run through:
+  - one lane:  every frame in a single FIFO lane (the scheduler without lanes)
+  - lanes:     the default realtime / interactive / bulk lanes
+
+Reports the gate scans' latency (p50/p95/max, against the 300 ms realtime
+SLO) and the bulk frames per second that still got through.
+
+Usage:
+    python benchmarks/bench_priority_lanes.py
+    python benchmarks/bench_priority_lanes.py --frame-ms 40 --bulk-clients 8 --duration 20
+"""
+import argparse
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scheduler import BULK, DEFAULT_LANES, INTERACTIVE, REALTIME, FairScheduler, Lane, SiteALPR  # noqa: E402
+
+
+class StandInALPR:
+    """Sleeps like an ALPR would compute; the GIL is released as for ONNX inference."""
+
+    def __init__(self, frame_seconds: float, batch_seconds: float):
+        self.frame_seconds = frame_seconds
+        self.batch_seconds = batch_seconds
+
+    def predict_batch(self, frames):
+        time.sleep(self.batch_seconds + self.frame_seconds * len(frames))
+        return [[] for _ in frames]
+
+    def predict(self, frame):
+        return self.predict_batch([frame])[0]
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run(lanes, gate_lane: str, bulk_lane: str, args) -> dict:
+    alpr = StandInALPR(args.frame_ms / 1000, args.batch_ms / 1000)
+    scheduler = FairScheduler(lambda: alpr, max_batch=args.max_batch, lanes=lanes, default_lane=bulk_lane)
+    scheduler.add_site("car-park", max_pending=args.max_pending)
+    gate = SiteALPR(scheduler, "car-park", gate_lane)
+    bulk = SiteALPR(scheduler, "car-park", bulk_lane)
+    stop = threading.Event()
+    bulk_frames = [0]
+    lock = threading.Lock()
+
+    def upload():
+        while not stop.is_set():
+            try:
+                bulk.predict_batch([None] * args.upload_size)
+            except RuntimeError:
+                # Queue full (or the scheduler closed); the client retries
+                time.sleep(0.05)
+                continue
+            with lock:
+                bulk_frames[0] += args.upload_size
+
+    clients = [threading.Thread(target=upload, daemon=True) for _ in range(args.bulk_clients)]
+    for client in clients:
+        client.start()
+    # Let the backlog build up before the first car arrives
+    time.sleep(1.0)
+
+    latencies = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < args.duration:
+        sent = time.perf_counter()
+        gate.predict(None)
+        latencies.append(time.perf_counter() - sent)
+        time.sleep(max(0.0, args.interval - (time.perf_counter() - sent)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    stats = scheduler.stats()
+    scheduler.close()
+    for client in clients:
+        client.join(timeout=5)
+
+    return {
+        "p50": statistics.median(latencies) * 1000,
+        "p95": percentile(latencies, 0.95) * 1000,
+        "max": max(latencies) * 1000,
+        "within_slo": sum(1 for v in latencies if v <= 0.3) / len(latencies),
+        "bulk_fps": bulk_frames[0] / elapsed,
+        "throttled": stats["throttled"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frame-ms", type=float, default=25, help="Inference time per frame")
+    parser.add_argument("--batch-ms", type=float, default=5, help="Fixed cost per batch")
+    parser.add_argument("--max-batch", type=int, default=8, help="Frames per inference batch")
+    parser.add_argument("--max-pending", type=int, default=64, help="Frames queued per lane")
+    parser.add_argument("--bulk-clients", type=int, default=4, help="Clients uploading batches")
+    parser.add_argument("--upload-size", type=int, default=16, help="Frames per batch upload")
+    parser.add_argument("--interval", type=float, default=0.25, help="Seconds between gate scans")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds of gate scans per run")
+    args = parser.parse_args()
+
+    print(f"{args.frame_ms:g} ms/frame, {args.bulk_clients} clients uploading "
+          f"{args.upload_size} frames at a time, a gate scan every {args.interval:g} s")
+    print(f"{'mode':<10}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}{'in SLO':>9}{'bulk fps':>10}{'throttled':>11}")
+    runs = (
+        ("one lane", (Lane(INTERACTIVE),), INTERACTIVE, INTERACTIVE),
+        ("lanes", DEFAULT_LANES, REALTIME, BULK),
+    )
+    for mode, lanes, gate_lane, bulk_lane in runs:
+        r = run(lanes, gate_lane, bulk_lane, args)
+        print(f"{mode:<10}{r['p50']:>9.0f}{r['p95']:>9.0f}{r['max']:>9.0f}"
+              f"{r['within_slo']:>9.0%}{r['bulk_fps']:>10.1f}{r['throttled']:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Registration loading benchmark: load time and memory at 10k / 100k / 1M rows.
+
+Compares the old csv.DictReader loader (one seven-key dict per row) with
+registrations.RegistrationDatabase parsing the CSV, and loading from its
+binary snapshot. Each measurement runs in a fresh process so RSS numbers
+are not polluted by earlier runs.
+
+Usage:
+    python benchmarks/bench_registration_load.py --rows 10000 100000 1000000
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from registrations import RegistrationDatabase  # noqa: E402
+
+MAKES = [
+    ("Toyota", ["Corolla", "Yaris", "RAV4"]),
+    ("Volkswagen", ["Golf", "Polo", "Passat"]),
+    ("Ford", ["Focus", "Fiesta", "Transit"]),
+    ("Hyundai", ["Tucson", "i30"]),
+]
+COLORS = ["Black", "White", "Silver", "Blue", "Red", "Grey"]
+TYPES = ["Car", "Van", "Truck"]
+
+
+def write_csv(path: Path, rows: int):
+    """Write a synthetic fleet register with Irish-style registrations."""
+    rng = random.Random(rows)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["registration", "owner", "vehicle_type", "make", "model", "color", "notes"])
+        for i in range(rows):
+            make, models = rng.choice(MAKES)
+            writer.writerow([
+                f"{rng.randint(10, 25)}{rng.choice('DCGLKW')}-{i}",
+                f"Owner {i}",
+                rng.choice(TYPES),
+                make,
+                rng.choice(models),
+                rng.choice(COLORS),
+                "" if i % 10 else "Fleet vehicle",
+            ])
+
+
+def rss_mb() -> float:
+    """Current resident set size (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / (1 << 20)
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def legacy_load(csv_path: str) -> dict:
+    """The loader ALPRService used before registrations.py."""
+    registrations = {}
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            reg = row.get('registration', '').strip().upper()
+            if reg:
+                registrations[reg] = {
+                    'registration': reg,
+                    'owner': row.get('owner', ''),
+                    'vehicle_type': row.get('vehicle_type', ''),
+                    'make': row.get('make', ''),
+                    'model': row.get('model', ''),
+                    'color': row.get('color', ''),
+                    'notes': row.get('notes', ''),
+                }
+    return registrations
+
+
+def run_one(mode: str, csv_path: str, snapshot_path: str):
+    """Child process: load once and print a JSON result line."""
+    baseline = rss_mb()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == "legacy":
+            loaded = legacy_load(csv_path)
+        else:
+            loaded = RegistrationDatabase(
+                csv_path, watch=False, snapshot_path=snapshot_path if mode == "snapshot" else None
+            )
+    count = len(loaded)
+    seconds = time.perf_counter() - start
+    print(json.dumps({"seconds": seconds, "rss_mb": rss_mb() - baseline, "count": count}))
+
+
+def measure(mode: str, csv_path: Path, snapshot_path: Path) -> dict:
+    out = subprocess.run(
+        [sys.executable, __file__, "--run", mode, "--csv", str(csv_path),
+         "--snapshot", str(snapshot_path)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--run", choices=["legacy", "parse", "snapshot"], help=argparse.SUPPRESS)
+    parser.add_argument("--csv", help=argparse.SUPPRESS)
+    parser.add_argument("--snapshot", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_one(args.run, args.csv, args.snapshot)
+        return
+
+    print(f"{'rows':>10}  {'loader':<10}{'seconds':>10}{'RSS MB':>10}{'speedup':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            csv_path = Path(tmp) / f"registrations_{rows}.csv"
+            snapshot_path = Path(tmp) / f"registrations_{rows}.snapshot"
+            write_csv(csv_path, rows)
+            # Writes the snapshot the "snapshot" run loads
+            with contextlib.redirect_stdout(io.StringIO()):
+                RegistrationDatabase(str(csv_path), watch=False, snapshot_path=str(snapshot_path))
+
+            baseline = None
+            for mode in ("legacy", "parse", "snapshot"):
+                result = measure(mode, csv_path, snapshot_path)
+                assert result["count"] == rows, result
+                baseline = baseline or result["seconds"]
+                print(f"{rows:>10}  {mode:<10}{result['seconds']:>10.3f}"
+                      f"{result['rss_mb']:>10.1f}{baseline / result['seconds']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Tiled detection benchmark: latency vs. recall on wide, high-resolution frames.
+
+Builds synthetic overview-camera frames (4K by default) by pasting real plate
+crops, scaled to a range of widths, at random positions on a textured
+background. The plate crops are cut from --image by the detector itself, or
+read from --plates. Every frame is run through the detector on the whole
+frame and with each tile size / overlap, and the median latency per frame,
+plate recall (IoU >= 0.5) and false positives per frame are reported.
+
+Usage:
+    python benchmarks/bench_tiled_detection.py
+    python benchmarks/bench_tiled_detection.py --frames 30 --plate-widths 24 160 \
+        --tile-sizes 512 640 960 --overlaps 0.15 0.3
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from alpr_loader import import_fast_alpr  # noqa: E402
+
+DEFAULT_IMAGE = (
+    Path(__file__).resolve().parent.parent / "fast-alpr-master" / "assets" / "test_image.png"
+)
+
+
+def plate_crops(detector, image_path: Path, plates_dir: Path = None) -> list:
+    """Plate images to paste: every image in plates_dir, or the plates found in image_path."""
+    if plates_dir is not None:
+        crops = [cv2.imread(str(p)) for p in sorted(plates_dir.iterdir())]
+        return [c for c in crops if c is not None]
+    image = cv2.imread(str(image_path))
+    if image is None:
+        raise SystemExit(f"Could not read {image_path}")
+    boxes, _, _ = detector.predict_arrays(image)
+    crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes.tolist() if x2 > x1 and y2 > y1]
+    if not crops:
+        raise SystemExit(f"No plates found in {image_path}; pass --plates")
+    return crops
+
+
+def synthetic_frame(rng, crops, width: int, height: int, count: int, widths) -> tuple:
+    """A textured frame with `count` pasted plates. Returns (frame, ground-truth boxes)."""
+    noise = rng.integers(40, 200, size=(height // 8, width // 8, 3), dtype=np.uint8)
+    frame = cv2.resize(noise, (width, height), interpolation=cv2.INTER_LINEAR)
+    boxes = []
+    attempts = 0
+    while len(boxes) < count and attempts < count * 50:
+        attempts += 1
+        crop = crops[rng.integers(len(crops))]
+        plate_width = int(rng.integers(widths[0], widths[1] + 1))
+        plate_height = max(4, round(crop.shape[0] * plate_width / crop.shape[1]))
+        x = int(rng.integers(0, width - plate_width))
+        y = int(rng.integers(0, height - plate_height))
+        box = (x, y, x + plate_width, y + plate_height)
+        if any(iou(box, other) > 0 for other in boxes):
+            continue
+        frame[y:y + plate_height, x:x + plate_width] = cv2.resize(
+            crop, (plate_width, plate_height), interpolation=cv2.INTER_AREA
+        )
+        boxes.append(box)
+    return frame, boxes
+
+
+def iou(a, b) -> float:
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union
+
+
+def score(predicted, truth) -> tuple:
+    """(matched ground-truth plates, false positives) with greedy IoU >= 0.5 matching."""
+    unmatched = list(truth)
+    false_positives = 0
+    for box in predicted:
+        best = max(unmatched, key=lambda t: iou(box, t), default=None)
+        if best is not None and iou(box, best) >= 0.5:
+            unmatched.remove(best)
+        else:
+            false_positives += 1
+    return len(truth) - len(unmatched), false_positives
+
+
+def run(detector, frames) -> dict:
+    """Median latency, recall and false positives of `detector` over the frames."""
+    detector.predict_arrays(frames[0][0])  # warm-up
+    latencies, matched, total, false_positives = [], 0, 0, 0
+    for frame, truth in frames:
+        start = time.perf_counter()
+        boxes, _, _ = detector.predict_arrays(frame)
+        latencies.append(time.perf_counter() - start)
+        hits, misses = score([tuple(b) for b in boxes.tolist()], truth)
+        matched += hits
+        total += len(truth)
+        false_positives += misses
+    return {
+        "ms": statistics.median(latencies) * 1000,
+        "recall": matched / total if total else 0.0,
+        "fp": false_positives / len(frames),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--detector-model", default="yolo-v9-t-384-license-plate-end2end")
+    parser.add_argument("--image", type=Path, default=DEFAULT_IMAGE, help="Image to cut plates from")
+    parser.add_argument("--plates", type=Path, help="Directory of plate crops to paste instead")
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--width", type=int, default=3840)
+    parser.add_argument("--height", type=int, default=2160)
+    parser.add_argument("--plates-per-frame", type=int, default=6)
+    parser.add_argument("--plate-widths", type=int, nargs=2, default=(32, 240),
+                        help="Smallest and largest pasted plate width in pixels")
+    parser.add_argument("--tile-sizes", type=int, nargs="+", default=[640, 960, 1280])
+    parser.add_argument("--overlaps", type=float, nargs="+", default=[0.2])
+    parser.add_argument("--no-full-frame", action="store_true",
+                        help="Tiled runs skip the extra whole-frame pass")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    fast_alpr = import_fast_alpr()
+    from fast_alpr.default_detector import DefaultDetector
+
+    detector = DefaultDetector(model_name=args.detector_model)
+    crops = plate_crops(detector, args.image, args.plates)
+    rng = np.random.default_rng(args.seed)
+    frames = [
+        synthetic_frame(rng, crops, args.width, args.height, args.plates_per_frame, args.plate_widths)
+        for _ in range(args.frames)
+    ]
+    print(f"{len(frames)} frames of {args.width}x{args.height}, "
+          f"{sum(len(t) for _, t in frames)} plates {args.plate_widths[0]}-{args.plate_widths[1]} px wide, "
+          f"{len(crops)} plate images")
+
+    print(f"{'mode':<28}{'tiles':>6}{'ms/frame':>10}{'recall':>8}{'fp/frame':>10}")
+    result = run(detector, frames)
+    print(f"{'full frame':<28}{1:>6}{result['ms']:>10.1f}{result['recall']:>8.2f}{result['fp']:>10.2f}")
+    for tile_size in args.tile_sizes:
+        for overlap in args.overlaps:
+            config = fast_alpr.TilingConfig(
+                tile_size=tile_size, overlap=overlap, include_full_frame=not args.no_full_frame
+            )
+            tiles = len(fast_alpr.tiling.tile_boxes(args.width, args.height, config))
+            tiles += int(config.include_full_frame)
+            result = run(fast_alpr.TiledDetector(detector, config), frames)
+            label = f"tiles {tile_size} overlap {overlap:g}"
+            print(f"{label:<28}{tiles:>6}{result['ms']:>10.1f}{result['recall']:>8.2f}"
+                  f"{result['fp']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Watchlist matching benchmark: time per plate against 10k wildcard patterns.
+
+Generates a synthetic watchlist of Irish-style partial plates (a mix of
+exact plates, "?" gaps and "*" fragments) and a stream of scanned plates,
+a few of which are on the list. Reports the compile time and the time per
+plate of:
+  - loop:       one compiled regex per pattern, tried in turn (the obvious
+                implementation; run on fewer plates, it is slow)
+  - alternation: all patterns in one regex alternation
+  - automaton:  watchlist.WatchlistAutomaton, first pass (DFA states built
+                as plates reach them) and second pass (all cached)
+
+Every method must agree on which plates match.
+
+Usage:
+    python benchmarks/bench_watchlist.py
+    python benchmarks/bench_watchlist.py --patterns 1000 10000 50000 --plates 200000
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from plates import canonical_plate  # noqa: E402
+from watchlist import WatchEntry, WatchlistAutomaton, parse_pattern  # noqa: E402
+
+COUNTIES = ["D", "C", "G", "L", "KE", "KK", "W", "WX", "MH", "TS"]
+ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+
+
+def random_plate(rng: random.Random) -> str:
+    return f"{rng.randint(10, 25)}{rng.choice('12')}-{rng.choice(COUNTIES)}-{rng.randint(1, 99999)}"
+
+
+def random_pattern(rng: random.Random) -> str:
+    """An exact plate (60%), a plate with one or two "?" (30%) or a "*" fragment (10%)."""
+    plate = random_plate(rng)
+    kind = rng.random()
+    if kind < 0.6:
+        return plate
+    chars = list(plate)
+    positions = [i for i, c in enumerate(chars) if c.isalnum()]
+    if kind < 0.9:
+        for i in rng.sample(positions, rng.randint(1, 2)):
+            chars[i] = "?"
+        return "".join(chars)
+    fragment = canonical_plate(plate)[-rng.randint(4, 5):]
+    return rng.choice([f"*{fragment}*", f"*{fragment}", f"{plate[:3]}*{fragment}"])
+
+
+def to_regex(pattern: str) -> str:
+    return re.escape(parse_pattern(pattern)).replace(r"\?", ".").replace(r"\*", ".*")
+
+
+def timed(fn, plates) -> tuple:
+    """(seconds per plate, plates that matched)"""
+    start = time.perf_counter()
+    hits = {plate for plate in plates if fn(plate)}
+    return (time.perf_counter() - start) / len(plates), hits
+
+
+def run(pattern_count: int, plate_count: int, loop_plates: int, rng: random.Random):
+    patterns = [random_pattern(rng) for _ in range(pattern_count)]
+    plates = [random_plate(rng) for _ in range(plate_count)]
+    # Make sure some plates are on the list
+    for i in range(0, plate_count, 100):
+        pattern = parse_pattern(rng.choice(patterns))
+        plates[i] = "".join(rng.choice(ALPHABET) if c in "?*" else c for c in pattern)
+    canonical = [canonical_plate(plate) for plate in plates]
+
+    rows = []
+    start = time.perf_counter()
+    compiled = [re.compile(to_regex(p)) for p in patterns]
+    compile_loop = time.perf_counter() - start
+    subset = canonical[:loop_plates]
+    per_plate, loop_hits = timed(lambda p: any(r.fullmatch(p) for r in compiled), subset)
+    rows.append(("loop", compile_loop, per_plate))
+
+    start = time.perf_counter()
+    alternation = re.compile("|".join(f"(?:{to_regex(p)})" for p in patterns))
+    compile_alt = time.perf_counter() - start
+    per_plate, alt_hits = timed(alternation.fullmatch, canonical)
+    rows.append(("alternation", compile_alt, per_plate))
+
+    start = time.perf_counter()
+    automaton = WatchlistAutomaton(WatchEntry(p, "bench") for p in patterns)
+    compile_dfa = time.perf_counter() - start
+    per_plate, cold_hits = timed(automaton.match, canonical)
+    rows.append(("automaton (first pass)", compile_dfa, per_plate))
+    per_plate, warm_hits = timed(automaton.match, canonical)
+    rows.append(("automaton (cached)", 0.0, per_plate))
+
+    if not (alt_hits == cold_hits == warm_hits and loop_hits == alt_hits & set(subset)):
+        raise SystemExit("Methods disagree on the matches")
+
+    stats = automaton.stats()
+    print(f"\n{pattern_count} patterns, {plate_count} plates ({len(warm_hits)} on the list), "
+          f"{stats['trie_nodes']} trie nodes, {stats['dfa_states']} DFA states")
+    print(f"{'method':<26}{'compile ms':>12}{'us/plate':>12}")
+    for name, compile_seconds, seconds in rows:
+        print(f"{name:<26}{compile_seconds * 1000:>12.1f}{seconds * 1e6:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--patterns", type=int, nargs="+", default=[10000])
+    parser.add_argument("--plates", type=int, default=100000)
+    parser.add_argument("--loop-plates", type=int, default=500,
+                        help="Plates run through the one-regex-per-pattern loop")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for count in args.patterns:
+        run(count, args.plates, min(args.loop_plates, args.plates), rng)
+
+
+if __name__ == "__main__":
+    main()
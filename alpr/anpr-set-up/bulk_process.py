@@ -0,0 +1,422 @@
+"""
+Offline bulk ALPR processing for folders of images.
+
+Decodes images on a thread pool and feeds them in batches to
+`ALPR.predict_batch`. With --pipeline, decoding, detection and OCR run
+instead as separate stages on their own threads (fast_alpr.alpr_pipeline),
+so detection of one image overlaps OCR of the previous one. Results go to a
+JSONL or CSV file through a background writer, together with a checkpoint
+of finished images, so an interrupted run picks up where it stopped.
+Nothing is drawn, encoded or logged per plate.
+
+Usage:
+    python bulk_process.py archive/2025-12/ --out results.jsonl
+    python bulk_process.py "archive/**/*.jpg" --out results.csv --batch-size 32
+    python bulk_process.py archive/ --out results.jsonl --inference-workers 4
+    python bulk_process.py archive/ --out results.jsonl --pipeline --ocr-workers 2
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+import cv2
+
+from alpr_loader import import_fast_alpr
+from inference_server import DEFAULT_DETECTOR_MODEL, DEFAULT_OCR_MODEL, create_alpr
+from log_writer import OVERFLOW_BLOCK, AsyncLogWriter
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff'}
+
+CSV_COLUMNS = [
+    'path', 'plate_text', 'confidence', 'detection_confidence',
+    'x1', 'y1', 'x2', 'y2', 'error',
+]
+
+
+def find_images(inputs: Iterable[str]) -> List[str]:
+    """
+    Expand directories (recursively) and glob patterns into a sorted list of image paths.
+
+    Args:
+        inputs: Directories, glob patterns or file paths
+    """
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = (str(p) for p in Path(item).rglob('*'))
+        else:
+            candidates = glob.glob(item, recursive=True)
+        paths.update(
+            p for p in candidates
+            if os.path.splitext(p)[1].lower() in IMAGE_EXTENSIONS and os.path.isfile(p)
+        )
+    return sorted(paths)
+
+
+def load_checkpoint(checkpoint_path: Path) -> Set[str]:
+    """Paths already processed by an earlier run."""
+    if not checkpoint_path.exists():
+        return set()
+    with open(checkpoint_path, 'r', encoding='utf-8') as f:
+        return {line.rstrip('\n') for line in f if line.strip()}
+
+
+def _read_image(path: str):
+    img = cv2.imread(path)
+    return img, None if img is not None else f"Failed to load image: {path}"
+
+
+def _decode_image(path: str):
+    """Decode stage of the pipelined run: the image, or an error for its record."""
+    img = cv2.imread(path)
+    if img is None:
+        raise ValueError(f"Failed to load image: {path}")
+    return img
+
+
+def _image_record(path: str, results=None, error: Optional[str] = None) -> Dict:
+    """One output record per image."""
+    if error is not None:
+        return {"path": path, "plates": [], "skipped": 0, "error": error}
+    plates = []
+    skipped = 0
+    for result in results:
+        if result.ocr is None or not result.ocr.text:
+            skipped += 1
+            continue
+        conf = result.ocr.confidence
+        bbox = result.detection.bounding_box
+        plates.append({
+            "text": result.ocr.text,
+            "confidence": float(statistics.mean(conf) if isinstance(conf, list) else conf),
+            "detection_confidence": float(result.detection.confidence),
+            "bbox": [bbox.x1, bbox.y1, bbox.x2, bbox.y2],
+        })
+    return {"path": path, "plates": plates, "skipped": skipped, "error": None}
+
+
+class ResultSink:
+    """
+    Writes image records to JSONL or CSV, then appends their paths to the checkpoint.
+
+    Called from the AsyncLogWriter thread with a batch of records at a time.
+    Results are flushed before the checkpoint, so a crash can only repeat
+    work, never lose it.
+    """
+
+    def __init__(self, out_path: Path, checkpoint_path: Path, fmt: str):
+        self.fmt = fmt
+        new_file = not out_path.exists() or out_path.stat().st_size == 0
+        self._out = open(out_path, 'a', encoding='utf-8', newline='')
+        self._csv = csv.writer(self._out) if fmt == 'csv' else None
+        if self._csv is not None and new_file:
+            self._csv.writerow(CSV_COLUMNS)
+        self._checkpoint = open(checkpoint_path, 'a', encoding='utf-8')
+
+    def __call__(self, records: List[Dict]):
+        for record in records:
+            if self._csv is None:
+                self._out.write(json.dumps(record) + '\n')
+                continue
+            if not record["plates"]:
+                self._csv.writerow([record["path"], '', '', '', '', '', '', '', record["error"] or ''])
+            for plate in record["plates"]:
+                self._csv.writerow([
+                    record["path"], plate["text"], f'{plate["confidence"]:.4f}',
+                    f'{plate["detection_confidence"]:.4f}', *plate["bbox"], '',
+                ])
+        self._out.flush()
+        os.fsync(self._out.fileno())
+        self._checkpoint.write(''.join(record["path"] + '\n' for record in records))
+        self._checkpoint.flush()
+
+    def close(self):
+        self._out.close()
+        self._checkpoint.close()
+
+
+def process_images(
+    alpr,
+    paths: List[str],
+    out_path,
+    checkpoint_path=None,
+    fmt: Optional[str] = None,
+    batch_size: int = 16,
+    decode_workers: Optional[int] = None,
+    progress_every: float = 5.0,
+) -> Dict:
+    """
+    Run ALPR over `paths`, skipping those already in the checkpoint.
+
+    Args:
+        alpr: Anything with `predict_batch` (ALPR or InferencePool)
+        paths: Image paths, in processing order
+        out_path: Output file (.jsonl or .csv)
+        checkpoint_path: Checkpoint file (default: out_path + ".checkpoint")
+        fmt: "jsonl" or "csv" (default: from out_path's extension)
+        batch_size: Frames per predict_batch call
+        decode_workers: Decode threads (default: CPU count)
+        progress_every: Seconds between progress lines (0 disables them)
+
+    Returns:
+        Stats: total, skipped (already done), processed, failed, plates, seconds, images_per_second
+    """
+    todo, stats, sink, writer = _start_run(paths, out_path, checkpoint_path, fmt, batch_size)
+
+    started = time.perf_counter()
+    last_report = started
+    workers = decode_workers or os.cpu_count() or 4
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Keep a few batches of decodes in flight ahead of the model
+            pending = deque()
+            queued = iter(todo)
+            lookahead = batch_size * 3
+            for path in queued:
+                pending.append((path, executor.submit(_read_image, path)))
+                if len(pending) >= lookahead:
+                    break
+
+            while pending:
+                batch = [pending.popleft() for _ in range(min(batch_size, len(pending)))]
+                for path in queued:
+                    pending.append((path, executor.submit(_read_image, path)))
+                    if len(pending) >= lookahead:
+                        break
+
+                decoded = [(path, *future.result()) for path, future in batch]
+                frames = [(path, img) for path, img, _ in decoded if img is not None]
+                for path, _, error in decoded:
+                    if error is not None:
+                        writer.submit(_image_record(path, error=error))
+                        stats["failed"] += 1
+
+                try:
+                    batch_results = alpr.predict_batch([img for _, img in frames])
+                except Exception:
+                    batch_results = []
+                    for _, img in frames:
+                        try:
+                            batch_results.append(alpr.predict(img))
+                        except Exception as e:
+                            batch_results.append(e)
+
+                for (path, _), results in zip(frames, batch_results):
+                    if isinstance(results, Exception):
+                        record = _image_record(path, error=str(results))
+                        stats["failed"] += 1
+                    else:
+                        record = _image_record(path, results)
+                        stats["plates"] += len(record["plates"])
+                    writer.submit(record)
+                stats["processed"] += len(batch)
+
+                now = time.perf_counter()
+                if progress_every and now - last_report >= progress_every:
+                    last_report = now
+                    rate = stats["processed"] / (now - started)
+                    print(f"{stats['processed']}/{len(todo)} images, {stats['plates']} plates, "
+                          f"{rate:.1f} images/s", flush=True)
+    finally:
+        writer.close(timeout=None)
+        sink.close()
+
+    return _finish_stats(stats, started)
+
+
+def process_images_pipelined(
+    alpr,
+    paths: List[str],
+    out_path,
+    checkpoint_path=None,
+    fmt: Optional[str] = None,
+    decode_workers: int = 2,
+    detect_workers: int = 1,
+    ocr_workers: int = 1,
+    queue_size: int = 8,
+    progress_every: float = 5.0,
+) -> Dict:
+    """
+    Run ALPR over `paths` as a stage-parallel pipeline, skipping those already in the checkpoint.
+
+    Decode, detect and crop + OCR run on their own threads with bounded queues
+    between them, so the stages of consecutive images overlap. Output and
+    checkpoint are the same as process_images.
+
+    Args:
+        alpr: A fast_alpr ALPR (the pipeline calls its detect and recognize stages)
+        paths: Image paths, in processing order
+        out_path: Output file (.jsonl or .csv)
+        checkpoint_path: Checkpoint file (default: out_path + ".checkpoint")
+        fmt: "jsonl" or "csv" (default: from out_path's extension)
+        decode_workers: Threads of the decode stage
+        detect_workers: Threads of the detect stage
+        ocr_workers: Threads of the crop + OCR stage
+        queue_size: Images waiting in front of each stage
+        progress_every: Seconds between progress lines (0 disables them)
+
+    Returns:
+        Stats as process_images, plus "stages" (per-stage items, utilization and
+        mean time) and "bottleneck" (the busiest stage)
+    """
+    todo, stats, sink, writer = _start_run(paths, out_path, checkpoint_path, fmt, queue_size)
+    pipeline = import_fast_alpr().alpr_pipeline(
+        alpr,
+        decode=_decode_image,
+        decode_workers=decode_workers,
+        detect_workers=detect_workers,
+        ocr_workers=ocr_workers,
+        queue_size=queue_size,
+    )
+
+    started = time.perf_counter()
+    last_report = started
+    try:
+        for result in pipeline.run(todo):
+            if result.ok:
+                record = _image_record(result.item, result.value)
+                stats["plates"] += len(record["plates"])
+            else:
+                record = _image_record(result.item, error=str(result.error))
+                stats["failed"] += 1
+            writer.submit(record)
+            stats["processed"] += 1
+
+            now = time.perf_counter()
+            if progress_every and now - last_report >= progress_every:
+                last_report = now
+                busy = ', '.join(
+                    f"{stage.name} {stage.utilization:.0%}" for stage in pipeline.stats()
+                )
+                print(f"{stats['processed']}/{len(todo)} images, {stats['plates']} plates, "
+                      f"{stats['processed'] / (now - started):.1f} images/s ({busy})", flush=True)
+    finally:
+        writer.close(timeout=None)
+        sink.close()
+
+    stats["stages"] = [
+        {
+            "name": stage.name,
+            "workers": stage.workers,
+            "items": stage.items,
+            "errors": stage.errors,
+            "utilization": round(stage.utilization, 3),
+            "mean_ms": round(stage.mean_seconds * 1000, 2),
+        }
+        for stage in pipeline.stats()
+    ]
+    stats["bottleneck"] = pipeline.bottleneck()
+    return _finish_stats(stats, started)
+
+
+def _start_run(paths: List[str], out_path, checkpoint_path, fmt: Optional[str], batch_size: int):
+    """Images still to do, initial stats, and the result sink and its writer."""
+    out_path = Path(out_path)
+    checkpoint_path = Path(checkpoint_path or f"{out_path}.checkpoint")
+    fmt = fmt or ('csv' if out_path.suffix.lower() == '.csv' else 'jsonl')
+
+    done = load_checkpoint(checkpoint_path)
+    todo = [p for p in paths if p not in done]
+    stats = {
+        "total": len(paths), "skipped": len(paths) - len(todo),
+        "processed": 0, "failed": 0, "plates": 0,
+    }
+
+    sink = ResultSink(out_path, checkpoint_path, fmt)
+    # "block" overflow: a slow disk throttles the run instead of dropping results
+    writer = AsyncLogWriter(
+        sink, max_queue=batch_size * 64, batch_size=batch_size * 4,
+        overflow=OVERFLOW_BLOCK, name='bulk-result-writer',
+    )
+    return todo, stats, sink, writer
+
+
+def _finish_stats(stats: Dict, started: float) -> Dict:
+    seconds = time.perf_counter() - started
+    stats["seconds"] = round(seconds, 3)
+    stats["images_per_second"] = round(stats["processed"] / seconds, 2) if seconds else 0.0
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run ALPR over folders of images.")
+    parser.add_argument('inputs', nargs='+', help="Directories, glob patterns or image files")
+    parser.add_argument('--out', required=True, help="Output file (.jsonl or .csv)")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help="Default: from --out extension")
+    parser.add_argument('--checkpoint', help="Checkpoint file (default: <out>.checkpoint)")
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--decode-workers', type=int, help="Decode threads (default: CPU count)")
+    parser.add_argument('--inference-workers', type=int, default=0,
+                        help="Run inference in this many worker processes (see inference_server.py)")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="Overlap decode, detection and OCR in a stage-parallel pipeline")
+    parser.add_argument('--detect-workers', type=int, default=1, help="Detect threads (--pipeline)")
+    parser.add_argument('--ocr-workers', type=int, default=1, help="Crop + OCR threads (--pipeline)")
+    parser.add_argument('--detector-model', default=DEFAULT_DETECTOR_MODEL)
+    parser.add_argument('--ocr-model', default=DEFAULT_OCR_MODEL)
+    args = parser.parse_args()
+    if args.pipeline and args.inference_workers > 0:
+        parser.error("--pipeline runs in this process; it cannot be combined with --inference-workers")
+
+    paths = find_images(args.inputs)
+    if not paths:
+        sys.exit("No images found")
+    print(f"Found {len(paths)} images")
+
+    if args.inference_workers > 0:
+        from inference_server import InferencePool
+        alpr = InferencePool(
+            workers=args.inference_workers,
+            detector_model=args.detector_model,
+            ocr_model=args.ocr_model,
+        ).start()
+    else:
+        alpr = create_alpr(args.detector_model, args.ocr_model)
+
+    try:
+        if args.pipeline:
+            stats = process_images_pipelined(
+                alpr,
+                paths,
+                args.out,
+                checkpoint_path=args.checkpoint,
+                fmt=args.format,
+                decode_workers=args.decode_workers or 2,
+                detect_workers=args.detect_workers,
+                ocr_workers=args.ocr_workers,
+            )
+        else:
+            stats = process_images(
+                alpr,
+                paths,
+                args.out,
+                checkpoint_path=args.checkpoint,
+                fmt=args.format,
+                batch_size=args.batch_size,
+                decode_workers=args.decode_workers,
+            )
+    finally:
+        if args.inference_workers > 0:
+            alpr.shutdown()
+
+    print(f"Done: {stats['processed']} processed ({stats['skipped']} already done, "
+          f"{stats['failed']} failed), {stats['plates']} plates in {stats['seconds']:.1f}s, "
+          f"{stats['images_per_second']:.1f} images/s")
+    for stage in stats.get("stages", []):
+        print(f"  {stage['name']:<7} {stage['workers']} workers, {stage['utilization']:.0%} busy, "
+              f"{stage['mean_ms']:.1f} ms/image")
+    if stats.get("bottleneck"):
+        print(f"Bottleneck: {stats['bottleneck']} (give it more workers)")
+
+
+if __name__ == '__main__':
+    main()
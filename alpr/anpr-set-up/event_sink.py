@@ -0,0 +1,408 @@
+"""
+Outbound delivery of scan events to the parking backend.
+
+Scans are queued in memory (log_writer.AsyncLogWriter) and POSTed to the
+backend in batches, as JSON, over a small pool of keep-alive HTTP
+connections, so the backend hears about each scan within about a second
+without the mobile app relaying it and without a TCP/TLS handshake per scan.
+
+A batch that fails (connection error, timeout, 5xx, 408 or 429) is retried
+with exponential backoff. If it still fails, it is written to the spool
+directory, one file per batch, and so is every later batch until the
+backend is back. A drain thread resends the spooled batches oldest first,
+and only then does delivery go direct again, so the backend receives scans
+in order. The spool survives restarts. Each batch carries a batch_id
+(also sent as the Idempotency-Key header), which stays the same across
+retries, so the backend can ignore a batch it has already stored.
+
+Any other 4xx means the backend will never accept the batch, so it is
+dropped and counted as rejected rather than retried.
+
+Request body:
+    {"batch_id": "3f2a...", "count": 2, "events": [{"timestamp": ..., "plate_text": ...}, ...]}
+
+Usage:
+    sink = EventSink("https://backend.example.com/api/alpr/events",
+                     headers={"Authorization": "Bearer ..."},
+                     spool_dir="vehicle_logs/backend_spool")
+    sink.submit(log_entry)
+"""
+import atexit
+import http.client
+import json
+import queue
+import random
+import ssl
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from log_writer import AsyncLogWriter
+
+SENT = "sent"
+RETRY = "retry"
+REJECTED = "rejected"
+
+# Statuses worth retrying besides 5xx
+_RETRY_STATUSES = {408, 429}
+
+# Errors of a pooled connection the server closed while it sat idle
+_STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP(S) connections to one host, reused across requests.
+
+    Thread-safe. A connection the server has closed while idle is replaced
+    and the request resent once, transparently.
+    """
+
+    def __init__(self, url: str, size: int = 2, timeout: float = 10.0):
+        """
+        Args:
+            url: Endpoint every request is POSTed to (http or https)
+            size: Idle connections kept open
+            timeout: Seconds to connect and to wait for each response
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Expected an http(s) URL, got {url!r}")
+        self.url = url
+        self.timeout = timeout
+        self._https = parts.scheme == "https"
+        self._host = parts.hostname
+        self._port = parts.port
+        self._path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self._idle: "queue.LifoQueue" = queue.LifoQueue(maxsize=size)
+        self._ssl_context = None
+        self.opened = 0
+
+    def _connect(self) -> http.client.HTTPConnection:
+        self.opened += 1
+        if not self._https:
+            return http.client.HTTPConnection(self._host, self._port, timeout=self.timeout)
+        if self._ssl_context is None:
+            try:
+                import certifi
+                self._ssl_context = ssl.create_default_context(cafile=certifi.where())
+            except ImportError:
+                self._ssl_context = ssl.create_default_context()
+        return http.client.HTTPSConnection(
+            self._host, self._port, timeout=self.timeout, context=self._ssl_context
+        )
+
+    def post(self, body: bytes, headers: Dict[str, str]) -> Tuple[int, Optional[str]]:
+        """
+        POST a body to the pool's URL.
+
+        Returns:
+            (status, Retry-After header or None)
+
+        Raises:
+            OSError / http.client.HTTPException: If the request fails
+        """
+        for reuse in (True, False):
+            conn = None
+            if reuse:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    pass
+            reused = conn is not None
+            if conn is None:
+                conn = self._connect()
+            try:
+                conn.request("POST", self._path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+            except _STALE_ERRORS:
+                conn.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                try:
+                    self._idle.put_nowait(conn)
+                except queue.Full:
+                    conn.close()
+            return response.status, response.getheader("Retry-After")
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class EventSink:
+    """
+    Batches scan events and POSTs them to a backend URL, spooling to disk while it is down.
+
+    submit() never blocks on the network: it only queues the event. One
+    thread sends new batches and, while the spool is not empty, a second
+    one resends it.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        spool_dir: Optional[str] = None,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        max_queue: int = 10000,
+        pool_size: int = 2,
+        timeout: float = 10.0,
+        max_attempts: int = 3,
+        retry_base: float = 0.5,
+        retry_max: float = 60.0,
+        spool_max_bytes: int = 256 * 1024 * 1024
+    ):
+        """
+        Start the delivery threads.
+
+        Args:
+            url: Backend endpoint batches are POSTed to
+            headers: Extra request headers, e.g. {"Authorization": "Bearer ..."}
+            spool_dir: Directory for batches that could not be delivered. None
+                drops them instead (counted in "dropped").
+            batch_size: Most events per request
+            flush_interval: Seconds to wait for a full batch before sending a
+                partial one; the delivery lag when the backend keeps up
+            max_queue: Events waiting in memory before new ones are dropped
+            pool_size: Keep-alive connections kept open to the backend
+            timeout: Seconds to connect and to wait for each response
+            max_attempts: Tries of a new batch before it is spooled
+            retry_base: First backoff delay in seconds; doubles on every failure
+            retry_max: Longest backoff delay in seconds
+            spool_max_bytes: Spool size beyond which new batches are dropped
+        """
+        self.pool = ConnectionPool(url, size=pool_size, timeout=timeout)
+        self.url = url
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        self.max_attempts = max(max_attempts, 1)
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.spool_max_bytes = spool_max_bytes
+
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._closed = False
+        self.delivered = 0
+        self.batches = 0
+        self.failed_attempts = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.last_success: Optional[str] = None
+        self.last_error: Optional[str] = None
+        # Seconds from submit() to the backend's response, per batch (its oldest event)
+        self._lags: Deque[float] = deque(maxlen=1000)
+
+        # Spooled batch files, oldest first: "<seq>_<queued ms>_<events>_<batch id>.json"
+        self.spool_dir = Path(spool_dir) if spool_dir else None
+        self._spool: Deque[Path] = deque()
+        self._spool_bytes = 0
+        self._spool_seq = 0
+        self._spooled = threading.Event()
+        self._drainer = None
+        if self.spool_dir is not None:
+            self.spool_dir.mkdir(parents=True, exist_ok=True)
+            for path in sorted(self.spool_dir.glob("*.json")):
+                self._spool.append(path)
+                self._spool_bytes += path.stat().st_size
+            if self._spool:
+                self._spool_seq = int(self._spool[-1].name.split("_")[0])
+                self._spooled.set()
+            self._drainer = threading.Thread(target=self._drain, name="event-sink-spool", daemon=True)
+            self._drainer.start()
+
+        self._writer = AsyncLogWriter(
+            self._deliver,
+            max_queue=max_queue,
+            batch_size=batch_size,
+            flush_interval=flush_interval,
+            name="event-sink",
+        )
+        atexit.register(self.close)
+
+    def submit(self, event: Dict) -> bool:
+        """
+        Queue an event for delivery.
+
+        Returns:
+            True if it was queued, False if the queue was full (or the sink closed)
+        """
+        return self._writer.submit((time.time(), event))
+
+    def _backoff(self, failures: int, retry_after: Optional[str] = None) -> float:
+        delay = min(self.retry_base * 2 ** failures, self.retry_max)
+        # Jitter, so services that lost the backend together do not retry together
+        delay *= random.uniform(0.5, 1.0)
+        try:
+            return max(delay, min(float(retry_after), self.retry_max))
+        except (TypeError, ValueError):
+            return delay
+
+    def _post(self, body: bytes, batch_id: str) -> Tuple[str, Optional[str]]:
+        """Send one batch once. Returns (SENT, RETRY or REJECTED, Retry-After header)."""
+        try:
+            status, retry_after = self.pool.post(body, {**self.headers, "Idempotency-Key": batch_id})
+        except (OSError, http.client.HTTPException) as e:
+            error, outcome, retry_after = f"{type(e).__name__}: {e}", RETRY, None
+        else:
+            if 200 <= status < 300:
+                return SENT, None
+            error = f"HTTP {status}"
+            outcome = RETRY if status >= 500 or status in _RETRY_STATUSES else REJECTED
+        with self._lock:
+            self.failed_attempts += 1
+            self.last_error = error
+        return outcome, retry_after
+
+    def _record(self, outcome: str, queued_at: float, count: int):
+        with self._lock:
+            if outcome == SENT:
+                self.delivered += count
+                self.batches += 1
+                self.last_success = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                self._lags.append(time.time() - queued_at)
+            else:
+                self.rejected += count
+        if outcome == REJECTED:
+            print(f"Backend rejected {count} scan events ({self.last_error}); dropped them")
+
+    def _deliver(self, items: List[Tuple[float, Dict]]):
+        """Writer thread: send a new batch, retrying with backoff, or spool it."""
+        queued_at = items[0][0]
+        batch_id = uuid.uuid4().hex
+        body = json.dumps(
+            {"batch_id": batch_id, "count": len(items), "events": [event for _, event in items]},
+            default=str,
+        ).encode()
+        with self._lock:
+            backlog = bool(self._spool)
+        # Behind a spool, go to the back of it so the backend sees scans in order
+        if not backlog:
+            for attempt in range(self.max_attempts):
+                outcome, retry_after = self._post(body, batch_id)
+                if outcome != RETRY:
+                    self._record(outcome, queued_at, len(items))
+                    return
+                if attempt + 1 < self.max_attempts and self._stopping.wait(self._backoff(attempt, retry_after)):
+                    break
+        self._spool_batch(body, batch_id, queued_at, len(items))
+
+    def _spool_batch(self, body: bytes, batch_id: str, queued_at: float, count: int):
+        with self._lock:
+            if self.spool_dir is None or self._spool_bytes + len(body) > self.spool_max_bytes:
+                self.dropped += count
+                print(f"Dropped {count} scan events for the backend ({self.last_error})")
+                return
+            self._spool_seq += 1
+            name = f"{self._spool_seq:012d}_{int(queued_at * 1000)}_{count}_{batch_id}.json"
+            tmp = self.spool_dir / f"{name}.tmp"
+            tmp.write_bytes(body)
+            # Complete files only: a crash mid-write leaves a .tmp, not a bad batch
+            path = tmp.replace(self.spool_dir / name)
+            self._spool.append(path)
+            self._spool_bytes += len(body)
+        self._spooled.set()
+
+    def _drain(self):
+        """Spool thread: resend spooled batches oldest first, backing off while the backend is down."""
+        failures = 0
+        while not self._stopping.is_set():
+            with self._lock:
+                path = self._spool[0] if self._spool else None
+            if path is None:
+                self._spooled.wait()
+                self._spooled.clear()
+                continue
+            _, queued_ms, count, batch_id = path.stem.split("_")
+            try:
+                body = path.read_bytes()
+            except OSError as e:
+                print(f"Skipping unreadable spooled batch {path.name}: {e}")
+                with self._lock:
+                    self._spool.popleft()
+                continue
+            outcome, retry_after = self._post(body, batch_id)
+            if outcome == RETRY:
+                self._stopping.wait(self._backoff(failures, retry_after))
+                failures += 1
+                continue
+            failures = 0
+            self._record(outcome, int(queued_ms) / 1000, int(count))
+            with self._lock:
+                self._spool.popleft()
+                self._spool_bytes -= len(body)
+            path.unlink()
+
+    def flush(self):
+        """Block until every queued event has been sent or spooled."""
+        self._writer.flush()
+
+    def close(self, timeout: Optional[float] = 10.0):
+        """
+        Send or spool the queued events and stop the threads.
+
+        Batches still in the spool stay there and are sent by the next
+        EventSink with the same spool_dir.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        # Cuts retry backoff short: what cannot be sent at once is spooled
+        self._stopping.set()
+        self._writer.close(timeout)
+        self._spooled.set()
+        if self._drainer is not None:
+            self._drainer.join(timeout)
+        self.pool.close()
+
+    def stats(self) -> Dict:
+        """Delivery counters and lag, for the metrics endpoints."""
+        writer = self._writer.stats()
+        with self._lock:
+            lags = sorted(self._lags)
+            oldest = int(self._spool[0].name.split("_")[1]) / 1000 if self._spool else None
+            return {
+                "url": self.url,
+                "queued": writer["queued"],
+                "pending": writer["pending"],
+                "delivered": self.delivered,
+                "batches": self.batches,
+                "failed_attempts": self.failed_attempts,
+                "rejected": self.rejected,
+                "dropped": writer["dropped"] + self.dropped,
+                "spooled_batches": len(self._spool),
+                "spool_bytes": self._spool_bytes,
+                # How far behind the backend is while batches wait in the spool
+                "oldest_spooled_seconds": round(time.time() - oldest, 3) if oldest else None,
+                "connections_opened": self.pool.opened,
+                "last_success": self.last_success,
+                "last_error": self.last_error,
+                "lag_seconds": {
+                    "last": round(self._lags[-1], 3),
+                    "p50": round(_percentile(lags, 0.5), 3),
+                    "p95": round(_percentile(lags, 0.95), 3),
+                    "max": round(lags[-1], 3),
+                } if lags else None,
+            }
@@ -2,7 +2,48 @@
 FastALPR package.
 """
 
-from fast_alpr.alpr import ALPR, ALPRResult
+from fast_alpr.alpr import ALPR, ALPRArrayResult, ALPRResult
 from fast_alpr.base import BaseDetector, BaseOCR, DetectionResult, OcrResult
+from fast_alpr.cascade import CascadeConfig, CascadeDetector, CascadeOCR, CascadeStats
+from fast_alpr.model_registry import ModelInfo, ModelKey, ModelRegistry
+from fast_alpr.ocr_cache import OcrCache, OcrCacheConfig
+from fast_alpr.pipeline import Pipeline, PipelineResult, Stage, StageStats, alpr_pipeline
+from fast_alpr.plate_format import (
+    IRISH_PLATE_FORMATS,
+    FormatConstrainedDecoder,
+    PlateDecoder,
+    PlateFormat,
+)
+from fast_alpr.quality import CropQualityConfig
+from fast_alpr.tiling import TiledDetector, TilingConfig
 
-__all__ = ["ALPR", "ALPRResult", "BaseDetector", "BaseOCR", "DetectionResult", "OcrResult"]
+__all__ = [
+    "ALPR",
+    "IRISH_PLATE_FORMATS",
+    "ALPRArrayResult",
+    "ALPRResult",
+    "BaseDetector",
+    "BaseOCR",
+    "CascadeConfig",
+    "CascadeDetector",
+    "CascadeOCR",
+    "CascadeStats",
+    "CropQualityConfig",
+    "DetectionResult",
+    "FormatConstrainedDecoder",
+    "ModelInfo",
+    "ModelKey",
+    "ModelRegistry",
+    "OcrCache",
+    "OcrCacheConfig",
+    "OcrResult",
+    "Pipeline",
+    "PipelineResult",
+    "PlateDecoder",
+    "PlateFormat",
+    "Stage",
+    "StageStats",
+    "TiledDetector",
+    "TilingConfig",
+    "alpr_pipeline",
+]
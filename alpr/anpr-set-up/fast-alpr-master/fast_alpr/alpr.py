@@ -4,7 +4,7 @@ ALPR module.
 
 import os
 import statistics
-from collections.abc import Sequence
+from collections.abc import Iterator, Sequence
 from dataclasses import dataclass
 from typing import Literal
 
@@ -14,15 +14,21 @@ import onnxruntime as ort
 from fast_plate_ocr.inference.hub import OcrModel
 from open_image_models.detection.core.hub import PlateDetectorModel
 
-from fast_alpr.base import BaseDetector, BaseOCR, DetectionResult, OcrResult
+from fast_alpr.base import BaseDetector, BaseOCR, BoundingBox, DetectionResult, OcrResult
+from fast_alpr.cascade import CascadeConfig, CascadeDetector, CascadeOCR, CascadeStats
 from fast_alpr.default_detector import DefaultDetector
 from fast_alpr.default_ocr import DefaultOCR
+from fast_alpr.model_registry import ModelRegistry
+from fast_alpr.ocr_cache import CropKey, OcrCache, OcrCacheConfig
+from fast_alpr.plate_format import PlateDecoder
+from fast_alpr.quality import CropQualityConfig, assess_crop_quality
+from fast_alpr.tiling import TiledDetector, TilingConfig
 
 # pylint: disable=too-many-arguments, too-many-locals
 # ruff: noqa: PLR0913
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ALPRResult:
     """
     Dataclass to hold the results of detection and OCR for a license plate.
@@ -30,6 +36,72 @@ class ALPRResult:
 
     detection: DetectionResult
     ocr: OcrResult | None
+    skip_reason: str | None = None
+    """Why OCR was not run on this detection (see `fast_alpr.quality`), None if it was."""
+
+
+@dataclass(frozen=True, slots=True)
+class ALPRArrayResult:
+    """
+    Array-backed results for one frame, one row per detected plate.
+
+    Holds the same information as a list of `ALPRResult` without creating per-plate objects.
+    Indexing or iterating builds `ALPRResult` objects on demand, so code written against the
+    list form keeps working.
+    """
+
+    boxes: np.ndarray
+    """`(N, 4)` int32 array of `x1, y1, x2, y2`."""
+    detection_confidences: np.ndarray
+    """`(N,)` float32 array of detector confidences."""
+    labels: list[str]
+    """Detector label of each plate."""
+    texts: list[str | None]
+    """Recognized text of each plate, None where OCR was not run."""
+    ocr_confidences: np.ndarray
+    """`(N,)` float32 array of mean OCR confidences, NaN where OCR was not run."""
+    skip_reasons: list[str | None]
+    """Why OCR was not run on each plate, None if it was."""
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, index: int) -> ALPRResult:
+        x1, y1, x2, y2 = self.boxes[index].tolist()
+        text = self.texts[index]
+        return ALPRResult(
+            detection=DetectionResult(
+                label=self.labels[index],
+                confidence=float(self.detection_confidences[index]),
+                bounding_box=BoundingBox(x1=x1, y1=y1, x2=x2, y2=y2),
+            ),
+            ocr=None
+            if text is None
+            else OcrResult(text=text, confidence=float(self.ocr_confidences[index])),
+            skip_reason=self.skip_reasons[index],
+        )
+
+    def __iter__(self) -> Iterator[ALPRResult]:
+        return (self[i] for i in range(len(self)))
+
+    def to_results(self) -> list[ALPRResult]:
+        """Convert to the list form returned by `ALPR.predict`."""
+        return list(self)
+
+
+def load_frame(frame: np.ndarray | str) -> np.ndarray:
+    """
+    Read an image path with OpenCV, or pass a BGR array through unchanged.
+
+    Raises:
+        ValueError: If the image cannot be read.
+    """
+    if isinstance(frame, str):
+        img = cv2.imread(frame)
+        if img is None:
+            raise ValueError(f"Failed to load image from path: {frame}")
+        return img
+    return frame
 
 
 class ALPR:
@@ -54,6 +126,13 @@ class ALPR:
         ocr_model_path: str | os.PathLike | None = None,
         ocr_config_path: str | os.PathLike | None = None,
         ocr_force_download: bool = False,
+        *,
+        crop_quality: CropQualityConfig | None = None,
+        ocr_cache: OcrCacheConfig | None = None,
+        plate_decoder: PlateDecoder | None = None,
+        model_registry: ModelRegistry | None = None,
+        cascade: CascadeConfig | None = None,
+        tiling: TilingConfig | None = None,
     ) -> None:
         """
         Initialize the ALPR system.
@@ -78,25 +157,146 @@ class ALPR:
             ocr_config_path: Custom config path for the OCR. If None, the default configuration is
                 used.
             ocr_force_download: Whether to force download the OCR model.
+            crop_quality: Thresholds for the crop quality checks run between detection and OCR.
+                Crops that fail them are returned with `ocr=None` and a `skip_reason` instead of
+                being sent to the OCR. If None, every detection is sent to the OCR.
+            ocr_cache: Settings for reusing the OCR result of a crop that has not materially
+                changed since it was last read (same place, near-identical pixels). Useful for
+                fixed cameras. If None, the OCR runs on every crop.
+            plate_decoder: Decoder for the default OCR's output, such as a
+                `FormatConstrainedDecoder` that only reads plates of known registration formats.
+                Ignored when a custom `ocr` is given.
+            model_registry: Registry to get the default detector and OCR models from, so that
+                ALPR instances with the same models share their ONNX sessions (e.g.
+                `fast_alpr.model_registry.default_registry`). Call `close()` to release them.
+                If None, this instance loads its own models.
+            cascade: Runs a second, more accurate OCR on crops the first OCR is unsure about,
+                and optionally a second detector on frames with no detection (see
+                `fast_alpr.cascade`). The second models use the same device, providers,
+                session options, decoder and registry as the first. Wraps a custom `ocr` or
+                `detector` too. `cascade_stats()` reports how often each escalates. If None,
+                every crop and frame goes through one model.
+            tiling: Runs the detector on overlapping tiles of frames larger than a tile and
+                merges the boxes (see `fast_alpr.tiling`), so small, distant plates in high
+                resolution frames are not lost when the frame is resized to the model input.
+                Applies to a custom `detector` too. If None, the detector sees the whole frame.
         """
+        # Models this instance created, released by close()
+        self._owned: list[BaseDetector | BaseOCR] = []
+
         # Initialize the detector
-        self.detector = detector or DefaultDetector(
-            model_name=detector_model,
-            conf_thresh=detector_conf_thresh,
-            providers=detector_providers,
-            sess_options=detector_sess_options,
-        )
+        if detector is None:
+            detector = DefaultDetector(
+                model_name=detector_model,
+                conf_thresh=detector_conf_thresh,
+                providers=detector_providers,
+                sess_options=detector_sess_options,
+                registry=model_registry,
+            )
+            self._owned.append(detector)
+        self.detector = detector
 
         # Initialize the OCR
-        self.ocr = ocr or DefaultOCR(
-            hub_ocr_model=ocr_model,
-            device=ocr_device,
-            providers=ocr_providers,
-            sess_options=ocr_sess_options,
-            model_path=ocr_model_path,
-            config_path=ocr_config_path,
-            force_download=ocr_force_download,
-        )
+        if ocr is None:
+            try:
+                ocr = DefaultOCR(
+                    hub_ocr_model=ocr_model,
+                    device=ocr_device,
+                    providers=ocr_providers,
+                    sess_options=ocr_sess_options,
+                    model_path=ocr_model_path,
+                    config_path=ocr_config_path,
+                    force_download=ocr_force_download,
+                    decoder=plate_decoder,
+                    registry=model_registry,
+                )
+            except BaseException:
+                self.close()
+                raise
+            self._owned.append(ocr)
+        self.ocr = ocr
+
+        if tiling is not None:
+            self.detector = TiledDetector(self.detector, tiling)
+
+        if cascade is not None:
+            try:
+                self._build_cascade(
+                    cascade,
+                    detector_conf_thresh=detector_conf_thresh,
+                    detector_providers=detector_providers,
+                    detector_sess_options=detector_sess_options,
+                    ocr_device=ocr_device,
+                    ocr_providers=ocr_providers,
+                    ocr_sess_options=ocr_sess_options,
+                    plate_decoder=plate_decoder,
+                    model_registry=model_registry,
+                )
+            except BaseException:
+                self.close()
+                raise
+
+        self.crop_quality = crop_quality
+        self.ocr_cache = OcrCache(ocr_cache) if ocr_cache is not None else None
+
+    def _build_cascade(
+        self,
+        cascade: CascadeConfig,
+        *,
+        detector_conf_thresh: float,
+        detector_providers: Sequence[str | tuple[str, dict]] | None,
+        detector_sess_options: ort.SessionOptions | None,
+        ocr_device: Literal["cuda", "cpu", "auto"],
+        ocr_providers: Sequence[str | tuple[str, dict]] | None,
+        ocr_sess_options: ort.SessionOptions | None,
+        plate_decoder: PlateDecoder | None,
+        model_registry: ModelRegistry | None,
+    ) -> None:
+        """Wrap the OCR and detector in their cascade stages, loading the second models."""
+        if cascade.ocr_model is not None:
+            accurate_ocr = DefaultOCR(
+                hub_ocr_model=cascade.ocr_model,
+                device=ocr_device,
+                providers=ocr_providers,
+                sess_options=ocr_sess_options,
+                decoder=plate_decoder,
+                registry=model_registry,
+            )
+            self._owned.append(accurate_ocr)
+            self.ocr = CascadeOCR(self.ocr, accurate_ocr, cascade)
+        if cascade.detector_model is not None:
+            fallback_detector = DefaultDetector(
+                model_name=cascade.detector_model,
+                conf_thresh=detector_conf_thresh,
+                providers=detector_providers,
+                sess_options=detector_sess_options,
+                registry=model_registry,
+            )
+            self._owned.append(fallback_detector)
+            self.detector = CascadeDetector(self.detector, fallback_detector)
+
+    def cascade_stats(self) -> dict[str, CascadeStats]:
+        """
+        Escalation counters of the cascade stages in use, under "ocr" and "detector".
+
+        Empty if no cascade is configured.
+        """
+        stats = {}
+        if isinstance(self.ocr, CascadeOCR):
+            stats["ocr"] = self.ocr.stats()
+        if isinstance(self.detector, CascadeDetector):
+            stats["detector"] = self.detector.stats()
+        return stats
+
+    def close(self) -> None:
+        """
+        Release the detector and OCR models this instance loaded to their `model_registry`.
+
+        A custom `detector` or `ocr` passed to the constructor is left to its owner.
+        """
+        for model in self._owned:
+            model.close()
+        self._owned = []
 
     def predict(self, frame: np.ndarray | str) -> list[ALPRResult]:
         """
@@ -108,26 +308,214 @@ class ALPR:
         Returns:
             A list of ALPRResult objects containing detection and OCR results.
         """
-        if isinstance(frame, str):
-            img_path = frame
-            img = cv2.imread(img_path)
-            if img is None:
-                raise ValueError(f"Failed to load image from path: {img_path}")
-        else:
-            img = frame
+        img = load_frame(frame)
+        return self.recognize(img, self.detect(img))
+
+    def detect(self, frame: np.ndarray | str) -> list[DetectionResult]:
+        """
+        First stage of `predict`: finds the license plates in a frame, without reading them.
+
+        Parameters:
+            frame: Unprocessed frame (Colors in order: BGR) or image path.
+
+        Returns:
+            The plate detections, to pass to `recognize` with the same frame.
+        """
+        return self.detector.predict(load_frame(frame))
+
+    def recognize(
+        self, frame: np.ndarray, detections: Sequence[DetectionResult]
+    ) -> list[ALPRResult]:
+        """
+        Second stage of `predict`: crops the detected plates out of the frame and reads them.
+
+        `detect` and `recognize` can run on different threads, so that one frame is read while
+        the next one is detected (see `fast_alpr.pipeline`).
+
+        Parameters:
+            frame: The frame the detections were found in (Colors in order: BGR).
+            detections: Plate detections returned by `detect`.
 
-        plate_detections = self.detector.predict(img)
+        Returns:
+            A list of ALPRResult objects, one per detection.
+        """
         alpr_results: list[ALPRResult] = []
-        for detection in plate_detections:
+        for detection in detections:
             bbox = detection.bounding_box
-            x1, y1 = max(bbox.x1, 0), max(bbox.y1, 0)
-            x2, y2 = min(bbox.x2, img.shape[1]), min(bbox.y2, img.shape[0])
-            cropped_plate = img[y1:y2, x1:x2]
-            ocr_result = self.ocr.predict(cropped_plate)
-            alpr_result = ALPRResult(detection=detection, ocr=ocr_result)
+            ocr_result, skip_reason = self._recognize_crop(
+                frame, bbox.x1, bbox.y1, bbox.x2, bbox.y2
+            )
+            alpr_result = ALPRResult(detection=detection, ocr=ocr_result, skip_reason=skip_reason)
             alpr_results.append(alpr_result)
         return alpr_results
 
+    def predict_arrays(self, frame: np.ndarray | str) -> ALPRArrayResult:
+        """
+        Returns all recognized license plates from a frame in array-backed form.
+
+        Same pipeline as `predict`, but detections stay in numpy arrays from the detector to the
+        result, which avoids per-plate object allocation when processing streams.
+
+        Parameters:
+            frame: Unprocessed frame (Colors in order: BGR) or image path.
+
+        Returns:
+            An ALPRArrayResult with one row per detected plate.
+        """
+        img = load_frame(frame)
+        boxes, detection_confidences, labels = self.detector.predict_arrays(img)
+        texts: list[str | None] = []
+        skip_reasons: list[str | None] = []
+        ocr_confidences = np.full(len(boxes), np.nan, dtype=np.float32)
+        for i, (x1, y1, x2, y2) in enumerate(boxes.tolist()):
+            ocr_result, skip_reason = self._recognize_crop(img, x1, y1, x2, y2)
+            skip_reasons.append(skip_reason)
+            if ocr_result is None:
+                texts.append(None)
+                continue
+            texts.append(ocr_result.text)
+            ocr_confidences[i] = (
+                statistics.mean(ocr_result.confidence)
+                if isinstance(ocr_result.confidence, list)
+                else ocr_result.confidence
+            )
+        return ALPRArrayResult(
+            boxes=boxes,
+            detection_confidences=detection_confidences,
+            labels=labels,
+            texts=texts,
+            ocr_confidences=ocr_confidences,
+            skip_reasons=skip_reasons,
+        )
+
+    def predict_batch(self, frames: Sequence[np.ndarray | str]) -> list[list[ALPRResult]]:
+        """
+        Returns all recognized license plates from several frames.
+
+        Detection runs per frame, then the plate crops of every frame go to the OCR in one
+        `predict_batch` call, which is much cheaper than one OCR call per plate.
+
+        Parameters:
+            frames: Unprocessed frames (Colors in order: BGR) or image paths.
+
+        Returns:
+            One list of ALPRResult objects per frame, in the same order as `frames`.
+        """
+        imgs = [load_frame(frame) for frame in frames]
+        detections = [self.detector.predict(img) for img in imgs]
+
+        results: list[list[ALPRResult | None]] = [[None] * len(dets) for dets in detections]
+        crops: list[np.ndarray] = []
+        crop_owners: list[tuple[int, int]] = []
+        crop_keys: list[CropKey] = []
+        for i, (img, frame_detections) in enumerate(zip(imgs, detections, strict=True)):
+            for j, detection in enumerate(frame_detections):
+                bbox = detection.bounding_box
+                cropped_plate, skip_reason = self._prepare_crop(
+                    img, bbox.x1, bbox.y1, bbox.x2, bbox.y2
+                )
+                if skip_reason is not None:
+                    results[i][j] = ALPRResult(
+                        detection=detection, ocr=None, skip_reason=skip_reason
+                    )
+                    continue
+                if self.ocr_cache is not None:
+                    key = self.ocr_cache.crop_key(bbox.x1, bbox.y1, bbox.x2, bbox.y2, cropped_plate)
+                    cached = self.ocr_cache.get(key)
+                    if cached is not None:
+                        results[i][j] = ALPRResult(detection=detection, ocr=cached)
+                        continue
+                    crop_keys.append(key)
+                crops.append(cropped_plate)
+                crop_owners.append((i, j))
+
+        ocr_results = self.ocr.predict_batch(crops) if crops else []
+        for (i, j), ocr_result in zip(crop_owners, ocr_results, strict=True):
+            results[i][j] = ALPRResult(detection=detections[i][j], ocr=ocr_result)
+        if self.ocr_cache is not None:
+            for key, ocr_result in zip(crop_keys, ocr_results, strict=True):
+                self.ocr_cache.put(key, ocr_result)
+        return [
+            [result for result in frame_results if result is not None] for frame_results in results
+        ]
+
+    def read_plates(self, cropped_plates: Sequence[np.ndarray | str]) -> list[ALPRResult]:
+        """
+        Reads license plates that were already cropped, e.g. by a detector on an edge device.
+
+        The detector is skipped: crops that pass the quality checks go to the OCR in one
+        `predict_batch` call. Each result's detection covers the whole crop, with confidence 1.0.
+
+        Parameters:
+            cropped_plates: Plate crops (Colors in order: BGR) or image paths.
+
+        Returns:
+            One ALPRResult per crop, in the same order as `cropped_plates`.
+        """
+        results: list[ALPRResult] = []
+        crops: list[np.ndarray] = []
+        crop_owners: list[int] = []
+        for i, cropped_plate in enumerate(cropped_plates):
+            img = load_frame(cropped_plate)
+            height, width = img.shape[:2]
+            detection = DetectionResult(
+                label="License Plate",
+                confidence=1.0,
+                bounding_box=BoundingBox(x1=0, y1=0, x2=width, y2=height),
+            )
+            crop, skip_reason = self._prepare_crop(img, 0, 0, width, height)
+            if skip_reason is not None:
+                results.append(ALPRResult(detection=detection, ocr=None, skip_reason=skip_reason))
+                continue
+            results.append(ALPRResult(detection=detection, ocr=None))
+            crops.append(crop)
+            crop_owners.append(i)
+
+        ocr_results = self.ocr.predict_batch(crops) if crops else []
+        for i, ocr_result in zip(crop_owners, ocr_results, strict=True):
+            results[i] = ALPRResult(detection=results[i].detection, ocr=ocr_result)
+        return results
+
+    def _recognize_crop(
+        self, img: np.ndarray, x1: int, y1: int, x2: int, y2: int
+    ) -> tuple[OcrResult | None, str | None]:
+        """
+        Crop a detected plate out of the frame and run OCR on it (or reuse a cached result).
+
+        Returns:
+            A tuple `(ocr_result, skip_reason)`. `skip_reason` is set when the crop failed the
+            quality checks, in which case OCR was not run.
+        """
+        cropped_plate, skip_reason = self._prepare_crop(img, x1, y1, x2, y2)
+        if skip_reason is not None:
+            return None, skip_reason
+        if self.ocr_cache is None:
+            return self.ocr.predict(cropped_plate), None
+        key = self.ocr_cache.crop_key(x1, y1, x2, y2, cropped_plate)
+        cached = self.ocr_cache.get(key)
+        if cached is not None:
+            return cached, None
+        ocr_result = self.ocr.predict(cropped_plate)
+        self.ocr_cache.put(key, ocr_result)
+        return ocr_result, None
+
+    def _prepare_crop(
+        self, img: np.ndarray, x1: int, y1: int, x2: int, y2: int
+    ) -> tuple[np.ndarray, str | None]:
+        """
+        Crop a detected plate out of the frame (clipped to the frame) and run the quality checks.
+
+        Returns:
+            A tuple `(cropped_plate, skip_reason)`, `skip_reason` being None if the crop should
+            go to the OCR.
+        """
+        x1, y1 = max(x1, 0), max(y1, 0)
+        x2, y2 = min(x2, img.shape[1]), min(y2, img.shape[0])
+        cropped_plate = img[y1:y2, x1:x2]
+        if self.crop_quality is not None:
+            return cropped_plate, assess_crop_quality(cropped_plate, self.crop_quality)
+        return cropped_plate, None
+
     def draw_predictions(self, frame: np.ndarray | str) -> np.ndarray:
         """
         Draws detections and OCR results on the frame.
@@ -148,8 +536,20 @@ class ALPR:
             img = frame
 
         # Get ALPR results using the ndarray
-        alpr_results = self.predict(img)
+        return self.draw_results(img, self.predict(img))
 
+    @staticmethod
+    def draw_results(img: np.ndarray, alpr_results: Sequence[ALPRResult]) -> np.ndarray:
+        """
+        Draws already computed ALPR results on the frame, in place.
+
+        Parameters:
+            img: The frame the results were computed on.
+            alpr_results: Results of `predict` (or `recognize`) for that frame.
+
+        Returns:
+            The frame with detections and OCR results drawn.
+        """
         for result in alpr_results:
             detection = result.detection
             ocr_result = result.ocr
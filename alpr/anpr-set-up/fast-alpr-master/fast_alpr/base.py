@@ -8,7 +8,7 @@ from dataclasses import dataclass
 import numpy as np
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class BoundingBox:
     x1: int
     y1: int
@@ -16,14 +16,14 @@ class BoundingBox:
     y2: int
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class DetectionResult:
     label: str
     confidence: float
     bounding_box: BoundingBox
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class OcrResult:
     text: str
     confidence: float | list[float]
@@ -34,9 +34,80 @@ class BaseDetector(ABC):
     def predict(self, frame: np.ndarray) -> list[DetectionResult]:
         """Perform detection on the input frame and return a list of detections."""
 
+    def predict_arrays(self, frame: np.ndarray) -> tuple[np.ndarray, np.ndarray, list[str]]:
+        """
+        Perform detection and return the detections as arrays instead of objects.
+
+        The default implementation converts the output of `predict`. Detectors that can produce
+        arrays directly should override it.
+
+        Returns:
+            A tuple `(boxes, confidences, labels)`, where `boxes` is an `(N, 4)` int32 array of
+            `x1, y1, x2, y2`, `confidences` an `(N,)` float32 array and `labels` a list of N
+            strings.
+        """
+        detections = self.predict(frame)
+        boxes = np.array(
+            [
+                (d.bounding_box.x1, d.bounding_box.y1, d.bounding_box.x2, d.bounding_box.y2)
+                for d in detections
+            ],
+            dtype=np.int32,
+        ).reshape(-1, 4)
+        confidences = np.array([d.confidence for d in detections], dtype=np.float32)
+        return boxes, confidences, [d.label for d in detections]
+
+    @staticmethod
+    def detections_from_arrays(
+        boxes: np.ndarray, confidences: np.ndarray, labels: list[str]
+    ) -> list[DetectionResult]:
+        """
+        Convert `(boxes, confidences, labels)` arrays, as returned by `predict_arrays`, to the
+        list of detections returned by `predict`.
+        """
+        return [
+            DetectionResult(
+                label=label,
+                confidence=confidence,
+                bounding_box=BoundingBox(x1=x1, y1=y1, x2=x2, y2=y2),
+            )
+            for (x1, y1, x2, y2), confidence, label in zip(
+                boxes.tolist(), confidences.tolist(), labels, strict=True
+            )
+        ]
+
+    def predict_arrays_batch(
+        self, frames: list[np.ndarray]
+    ) -> list[tuple[np.ndarray, np.ndarray, list[str]]]:
+        """
+        Perform detection on several frames, returning one `predict_arrays` tuple per frame.
+
+        The default implementation calls `predict_arrays` once per frame. Detectors that can run
+        a whole batch in one inference call should override it.
+        """
+        return [self.predict_arrays(frame) for frame in frames]
+
+    def close(self) -> None:  # noqa: B027
+        """Release the model. The default implementation does nothing."""
+
 
 class BaseOCR(ABC):
     @abstractmethod
     def predict(self, cropped_plate: np.ndarray) -> OcrResult | None:
         """Perform OCR on the cropped plate image and return the recognized text and character
         probabilities."""
+
+    def predict_batch(self, cropped_plates: list[np.ndarray]) -> list[OcrResult | None]:
+        """
+        Perform OCR on several cropped plate images.
+
+        The default implementation calls `predict` once per crop. OCR models that can run a
+        whole batch in one inference call should override it.
+
+        Returns:
+            One result per crop, in the same order.
+        """
+        return [self.predict(cropped_plate) for cropped_plate in cropped_plates]
+
+    def close(self) -> None:  # noqa: B027
+        """Release the model. The default implementation does nothing."""
@@ -0,0 +1,241 @@
+"""
+Model cascade module.
+
+Larger OCR and detector models read more plates correctly but cost several times as much per
+call. A cascade runs the cheap model on everything and hands only the inputs it is unsure about
+to the accurate model: crops read with low confidence or as text that fits no registration
+format, and optionally frames on which the cheap detector found nothing. On traffic where the
+cheap model is usually right, this gives close to the accurate model's results at close to the
+cheap model's cost.
+"""
+
+import statistics
+import threading
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+import numpy as np
+from fast_plate_ocr.inference.hub import OcrModel
+from open_image_models.detection.core.hub import PlateDetectorModel
+
+from fast_alpr.base import BaseDetector, BaseOCR, DetectionResult, OcrResult
+from fast_alpr.plate_format import PlateFormat
+
+ESCALATE_NO_TEXT = "no_text"
+ESCALATE_LOW_CONFIDENCE = "low_confidence"
+ESCALATE_INVALID_FORMAT = "invalid_format"
+ESCALATE_NO_DETECTION = "no_detection"
+
+
+@dataclass(frozen=True)
+class CascadeConfig:
+    """
+    Settings of the `ALPR` model cascade.
+
+    Every crop is read by the ALPR's `ocr_model` first. Crops that trip one of the checks below
+    are re-read by `ocr_model` of this config.
+    """
+
+    ocr_model: OcrModel | None = "cct-s-v1-global-model"
+    """OCR model that re-reads escalated crops. None disables OCR escalation."""
+    detector_model: PlateDetectorModel | None = None
+    """Detector run on frames where the ALPR's detector found no plate, e.g.
+    "yolo-v9-s-608-license-plate-end2end". None disables detector escalation."""
+    min_confidence: float | None = 0.9
+    """Crops read with a lower mean confidence are escalated. None disables the check."""
+    plate_formats: tuple[str, ...] | None = None
+    """Crops whose text matches none of these formats (see `PlateFormat`) are escalated.
+    None disables the check."""
+    keep_best: bool = True
+    """Keep whichever of the two readings is better: one that matches `plate_formats` first, then
+    the more confident one. If False the escalated reading always replaces the first one."""
+
+
+@dataclass(frozen=True, slots=True)
+class CascadeStats:
+    """
+    Counters of a cascade stage.
+    """
+
+    calls: int
+    """Crops (OCR) or frames (detector) seen."""
+    escalated: int
+    """Calls passed on to the accurate model."""
+    replaced: int
+    """Escalations whose result was used: the accurate OCR's reading was kept, or the fallback
+    detector found plates."""
+    reasons: dict[str, int]
+    """Escalations per reason (the `ESCALATE_*` constants)."""
+
+    @property
+    def escalation_rate(self) -> float:
+        """Fraction of calls that ran the accurate model."""
+        return self.escalated / self.calls if self.calls else 0.0
+
+
+class _Counters:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.escalated = 0
+        self.replaced = 0
+        self.reasons: dict[str, int] = {}
+
+    def record(self, calls: int, reasons: Iterable[str | None], replaced: int) -> None:
+        with self.lock:
+            self.calls += calls
+            self.replaced += replaced
+            for reason in reasons:
+                if reason is not None:
+                    self.escalated += 1
+                    self.reasons[reason] = self.reasons.get(reason, 0) + 1
+
+    def stats(self) -> CascadeStats:
+        with self.lock:
+            return CascadeStats(
+                calls=self.calls,
+                escalated=self.escalated,
+                replaced=self.replaced,
+                reasons=dict(self.reasons),
+            )
+
+
+def _mean_confidence(result: OcrResult) -> float:
+    if isinstance(result.confidence, list):
+        return statistics.mean(result.confidence) if result.confidence else 0.0
+    return result.confidence
+
+
+class CascadeOCR(BaseOCR):
+    """
+    Reads every crop with a fast OCR and re-reads the uncertain ones with an accurate OCR.
+    """
+
+    def __init__(
+        self, fast: BaseOCR, accurate: BaseOCR, config: CascadeConfig | None = None
+    ) -> None:
+        """
+        Parameters:
+            fast: OCR run on every crop.
+            accurate: OCR run on escalated crops.
+            config: When to escalate and which reading to keep. Its model names are not used
+                here. Defaults to `CascadeConfig()`.
+        """
+        self.fast = fast
+        self.accurate = accurate
+        self.config = config or CascadeConfig()
+        self.formats = (
+            tuple(PlateFormat(f) for f in self.config.plate_formats)
+            if self.config.plate_formats
+            else None
+        )
+        self._counters = _Counters()
+
+    def _valid_format(self, result: OcrResult) -> bool:
+        return self.formats is None or any(f.matches(result.text) for f in self.formats)
+
+    def escalation_reason(self, result: OcrResult | None) -> str | None:
+        """
+        Why a fast reading should be re-read by the accurate OCR, None if it can be kept.
+        """
+        if result is None or not result.text:
+            return ESCALATE_NO_TEXT
+        min_confidence = self.config.min_confidence
+        if min_confidence is not None and _mean_confidence(result) < min_confidence:
+            return ESCALATE_LOW_CONFIDENCE
+        if not self._valid_format(result):
+            return ESCALATE_INVALID_FORMAT
+        return None
+
+    def _choose(self, fast: OcrResult | None, accurate: OcrResult | None) -> OcrResult | None:
+        """The reading to keep for an escalated crop."""
+        if accurate is None or not accurate.text:
+            return fast
+        if fast is None or not fast.text or not self.config.keep_best:
+            return accurate
+
+        def rank(result: OcrResult) -> tuple[bool, float]:
+            return self._valid_format(result), _mean_confidence(result)
+
+        return accurate if rank(accurate) >= rank(fast) else fast
+
+    def predict(self, cropped_plate: np.ndarray) -> OcrResult | None:
+        result = self.fast.predict(cropped_plate)
+        reason = self.escalation_reason(result)
+        if reason is None:
+            self._counters.record(1, (), 0)
+            return result
+        chosen = self._choose(result, self.accurate.predict(cropped_plate))
+        self._counters.record(1, (reason,), int(chosen is not result))
+        return chosen
+
+    def predict_batch(self, cropped_plates: list[np.ndarray]) -> list[OcrResult | None]:
+        """
+        Read all crops with the fast OCR in one batch, then the escalated ones with the
+        accurate OCR in a second batch.
+        """
+        results = self.fast.predict_batch(cropped_plates)
+        reasons = [self.escalation_reason(result) for result in results]
+        escalated = [i for i, reason in enumerate(reasons) if reason is not None]
+        replaced = 0
+        if escalated:
+            accurate = self.accurate.predict_batch([cropped_plates[i] for i in escalated])
+            for i, accurate_result in zip(escalated, accurate, strict=True):
+                chosen = self._choose(results[i], accurate_result)
+                replaced += chosen is not results[i]
+                results[i] = chosen
+        self._counters.record(len(cropped_plates), reasons, replaced)
+        return results
+
+    def stats(self) -> CascadeStats:
+        """Snapshot of the escalation counters."""
+        return self._counters.stats()
+
+    def close(self) -> None:
+        """
+        Does nothing: the wrapped OCRs are closed by their owner.
+        """
+
+
+class CascadeDetector(BaseDetector):
+    """
+    Runs a fallback detector on frames where the primary detector found no plate.
+    """
+
+    def __init__(self, primary: BaseDetector, fallback: BaseDetector) -> None:
+        """
+        Parameters:
+            primary: Detector run on every frame.
+            fallback: Detector run on frames without detections, usually a larger model or a
+                higher input resolution.
+        """
+        self.primary = primary
+        self.fallback = fallback
+        self._counters = _Counters()
+
+    def predict(self, frame: np.ndarray) -> list[DetectionResult]:
+        detections = self.primary.predict(frame)
+        if detections:
+            self._counters.record(1, (), 0)
+            return detections
+        detections = self.fallback.predict(frame)
+        self._counters.record(1, (ESCALATE_NO_DETECTION,), int(bool(detections)))
+        return detections
+
+    def predict_arrays(self, frame: np.ndarray) -> tuple[np.ndarray, np.ndarray, list[str]]:
+        arrays = self.primary.predict_arrays(frame)
+        if len(arrays[0]):
+            self._counters.record(1, (), 0)
+            return arrays
+        arrays = self.fallback.predict_arrays(frame)
+        self._counters.record(1, (ESCALATE_NO_DETECTION,), int(len(arrays[0]) > 0))
+        return arrays
+
+    def stats(self) -> CascadeStats:
+        """Snapshot of the escalation counters."""
+        return self._counters.stats()
+
+    def close(self) -> None:
+        """
+        Does nothing: the wrapped detectors are closed by their owner.
+        """
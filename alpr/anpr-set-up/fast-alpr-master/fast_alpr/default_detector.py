@@ -2,14 +2,19 @@
 Default Detector module.
 """
 
-from collections.abc import Sequence
+import importlib
+import logging
+from collections.abc import Callable, Sequence
 
 import numpy as np
 import onnxruntime as ort
 from open_image_models import LicensePlateDetector
 from open_image_models.detection.core.hub import PlateDetectorModel
 
-from fast_alpr.base import BaseDetector, BoundingBox, DetectionResult
+from fast_alpr.base import BaseDetector, DetectionResult
+from fast_alpr.model_registry import ModelRegistry
+
+LOGGER = logging.getLogger(__name__)
 
 
 class DefaultDetector(BaseDetector):
@@ -20,12 +25,16 @@ class DefaultDetector(BaseDetector):
     to perform detection on input frames.
     """
 
+    conf_thresh: float | None = None
+    _registry: ModelRegistry | None = None
+
     def __init__(
         self,
         model_name: PlateDetectorModel = "yolo-v9-t-384-license-plate-end2end",
         conf_thresh: float = 0.4,
         providers: Sequence[str | tuple[str, dict]] | None = None,
         sess_options: ort.SessionOptions = None,
+        registry: ModelRegistry | None = None,
     ) -> None:
         """
         Initialize the DefaultDetector with the specified parameters. Uses `open-image-models`'s
@@ -39,13 +48,30 @@ class DefaultDetector(BaseDetector):
                 providers are used.
             sess_options: Custom session options for ONNX Runtime. If None, default session options
                 are used.
+            registry: Registry to get the model from, shared with every detector that uses the
+                same model, providers and session options. If None, a model is loaded for this
+                detector alone.
         """
-        self.detector = LicensePlateDetector(
-            detection_model=model_name,
-            conf_thresh=conf_thresh,
-            providers=providers,
-            sess_options=sess_options,
-        )
+        if registry is None:
+            self.detector = LicensePlateDetector(
+                detection_model=model_name,
+                conf_thresh=conf_thresh,
+                providers=providers,
+                sess_options=sess_options,
+            )
+        else:
+            self.detector = registry.detector(model_name, providers, sess_options)
+            self.conf_thresh = conf_thresh
+            self._registry = registry
+        self._session = _DirectSession.wrap(self.detector)
+
+    def close(self) -> None:
+        """
+        Release the model to the registry it came from.
+        """
+        if self._registry is not None:
+            self._registry.release(self.detector)
+            self._registry = None
 
     def predict(self, frame: np.ndarray) -> list[DetectionResult]:
         """
@@ -58,18 +84,153 @@ class DefaultDetector(BaseDetector):
             A list of detection results, each containing the label,
             confidence, and bounding box of a detected license plate.
         """
+        return self.detections_from_arrays(*self.predict_arrays(frame))
+
+    def predict_arrays(self, frame: np.ndarray) -> tuple[np.ndarray, np.ndarray, list[str]]:
+        """
+        Perform detection on the input frame and return the detections as arrays.
+
+        Runs the `LicensePlateDetector` session directly and post-processes its output with numpy,
+        so no per-detection objects are created. If the detector does not expose its session (see
+        `_DirectSession`), its public `predict` is used instead.
+
+        Parameters:
+            frame: The input image/frame in which to detect license plates.
+
+        Returns:
+            A tuple `(boxes, confidences, labels)`, where `boxes` is an `(N, 4)` int32 array of
+            `x1, y1, x2, y2` in frame coordinates, `confidences` an `(N,)` float32 array and
+            `labels` a list of N strings.
+        """
+        if self._session is None:
+            return self._predict_public(frame)
+        inputs, ratio, (dw, dh) = self._session.preprocess(frame)
+        try:
+            predictions = self._session.run(inputs)
+        # Same fallback as `open_image_models`: some providers fail on empty NMS output.
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            LOGGER.warning("An error occurred during model inference: %s", e)
+            return _no_detections()
+        return self._postprocess(predictions, ratio, dw, dh)
+
+    def predict_arrays_batch(
+        self, frames: list[np.ndarray]
+    ) -> list[tuple[np.ndarray, np.ndarray, list[str]]]:
+        """
+        Perform detection on several frames in one inference call, if the model allows it.
+
+        The hub models are exported with a fixed batch size of 1; those run one frame at a time.
+
+        Returns:
+            One `(boxes, confidences, labels)` tuple per frame, as returned by `predict_arrays`.
+        """
+        session = self._session
+        if session is None or len(frames) < 2 or session.batch_dim() not in {None, len(frames)}:
+            return [self.predict_arrays(frame) for frame in frames]
+
+        prepared = [session.preprocess(frame) for frame in frames]
+        inputs = np.concatenate([x for x, _, _ in prepared])
+        try:
+            predictions = session.run(inputs)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            LOGGER.warning("An error occurred during model inference: %s", e)
+            return [_no_detections() for _ in frames]
+        batch_ids = predictions[:, 0].astype(int)
+        return [
+            self._postprocess(predictions[batch_ids == i], ratio, dw, dh)
+            for i, (_, ratio, (dw, dh)) in enumerate(prepared)
+        ]
+
+    def _postprocess(
+        self, predictions: np.ndarray, ratio: tuple[float, float], dw: float, dh: float
+    ) -> tuple[np.ndarray, np.ndarray, list[str]]:
+        """Threshold the model's output rows and map the boxes back to frame coordinates."""
+        detector = self.detector
+        # Rows are [batch_id, x1, y1, x2, y2, class_id, score]
+        conf_thresh = detector.conf_thresh if self.conf_thresh is None else self.conf_thresh
+        predictions = predictions[predictions[:, 6] >= conf_thresh]
+        boxes = predictions[:, 1:5].astype(np.float32)
+        boxes[:, 0::2] = (boxes[:, 0::2] - dw) / ratio[0]
+        boxes[:, 1::2] = (boxes[:, 1::2] - dh) / ratio[1]
+        class_labels = detector.class_labels
+        labels = [
+            class_labels[class_id] if class_id < len(class_labels) else str(class_id)
+            for class_id in predictions[:, 5].astype(int).tolist()
+        ]
+        return boxes.astype(np.int32), predictions[:, 6].astype(np.float32), labels
+
+    def _predict_public(self, frame: np.ndarray) -> tuple[np.ndarray, np.ndarray, list[str]]:
+        """`predict_arrays` through the detector's public `predict`, one object per detection."""
         detections = self.detector.predict(frame)
-        detection_results = [
-            DetectionResult(
-                label=detection.label,
-                confidence=detection.confidence,
-                bounding_box=BoundingBox(
-                    x1=detection.bounding_box.x1,
-                    y1=detection.bounding_box.y1,
-                    x2=detection.bounding_box.x2,
-                    y2=detection.bounding_box.y2,
-                ),
+        if self.conf_thresh is not None:
+            detections = [d for d in detections if d.confidence >= self.conf_thresh]
+        if not detections:
+            return _no_detections()
+        boxes = np.array(
+            [
+                [d.bounding_box.x1, d.bounding_box.y1, d.bounding_box.x2, d.bounding_box.y2]
+                for d in detections
+            ],
+            dtype=np.int32,
+        )
+        confidences = np.array([d.confidence for d in detections], dtype=np.float32)
+        return boxes, confidences, [d.label for d in detections]
+
+
+class _DirectSession:
+    """
+    The ONNX session inside an `open_image_models` `LicensePlateDetector`, run without it.
+
+    This is the one place that relies on `open_image_models` internals (written against 0.4.x,
+    the version pinned in pyproject.toml): its `yolo_v9.preprocess` module and the detector's
+    `model`, `input_name`, `output_name`, `img_size`, `class_labels` and `conf_thresh` attributes.
+    """
+
+    _PREPROCESS_MODULE = "open_image_models.detection.core.yolo_v9.preprocess"
+    _ATTRIBUTES = ("model", "input_name", "output_name", "img_size", "class_labels", "conf_thresh")
+
+    def __init__(self, detector: LicensePlateDetector, preprocess: Callable) -> None:
+        self.detector = detector
+        self._preprocess = preprocess
+
+    @classmethod
+    def wrap(cls, detector: LicensePlateDetector) -> "_DirectSession | None":
+        """The detector's session, or None if this `open_image_models` does not expose it."""
+        missing = [name for name in cls._ATTRIBUTES if not hasattr(detector, name)]
+        try:
+            preprocess = importlib.import_module(cls._PREPROCESS_MODULE).preprocess
+        except (ImportError, AttributeError):
+            missing.append("preprocess")
+        if missing:
+            LOGGER.warning(
+                "open_image_models internals not found (%s); detecting through its public predict",
+                ", ".join(missing),
             )
-            for detection in detections
-        ]
-        return detection_results
+            return None
+        return cls(detector, preprocess)
+
+    def preprocess(self, frame: np.ndarray) -> tuple[np.ndarray, tuple[float, float], tuple]:
+        """Letterbox a frame to the model input: `(inputs, ratio, (dw, dh))`."""
+        return self._preprocess(frame, self.detector.img_size)
+
+    def run(self, inputs: np.ndarray) -> np.ndarray:
+        """Model output rows `[batch_id, x1, y1, x2, y2, class_id, score]`."""
+        detector = self.detector
+        return detector.model.run([detector.output_name], {detector.input_name: inputs})[0]
+
+    def batch_dim(self) -> int | None:
+        """Batch size the model's input was exported with, None if it is dynamic."""
+        return _batch_dim(self.detector.model)
+
+
+def _no_detections() -> tuple[np.ndarray, np.ndarray, list[str]]:
+    return np.empty((0, 4), dtype=np.int32), np.empty((0,), dtype=np.float32), []
+
+
+def _batch_dim(model: object) -> int | None:
+    """Batch size the model's input was exported with, None if it is dynamic."""
+    get_inputs = getattr(model, "get_inputs", None)
+    if get_inputs is None:
+        return 1
+    dim = get_inputs()[0].shape[0]
+    return dim if isinstance(dim, int) else None
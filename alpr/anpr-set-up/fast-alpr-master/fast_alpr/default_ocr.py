@@ -9,10 +9,15 @@ from typing import Literal
 import cv2
 import numpy as np
 import onnxruntime as ort
-from fast_plate_ocr import LicensePlateRecognizer
+from fast_plate_ocr.core.process import preprocess_image, resize_image
 from fast_plate_ocr.inference.hub import OcrModel
 
 from fast_alpr.base import BaseOCR, OcrResult
+from fast_alpr.model_registry import ModelRegistry
+from fast_alpr.plate_format import PlateDecoder
+
+# pylint: disable=too-many-arguments
+# ruff: noqa: PLR0913
 
 
 class DefaultOCR(BaseOCR):
@@ -23,6 +28,9 @@ class DefaultOCR(BaseOCR):
     to perform OCR on cropped license plate images.
     """
 
+    decoder: PlateDecoder | None = None
+    _registry: ModelRegistry | None = None
+
     def __init__(
         self,
         hub_ocr_model: OcrModel | None = None,
@@ -32,6 +40,9 @@ class DefaultOCR(BaseOCR):
         model_path: str | os.PathLike | None = None,
         config_path: str | os.PathLike | None = None,
         force_download: bool = False,
+        *,
+        decoder: PlateDecoder | None = None,
+        registry: ModelRegistry | None = None,
     ) -> None:
         """
         Initialize the DefaultOCR with the specified parameters. Uses `fast-plate-ocr`'s
@@ -51,16 +62,33 @@ class DefaultOCR(BaseOCR):
              used.
             force_download: If True, forces the download of the model and overwrites any existing
              files.
+            decoder: Decoder that turns the model's per-slot probabilities into plate text, e.g. a
+             `FormatConstrainedDecoder`. If None, the most probable character of each slot is
+             taken.
+            registry: Registry to get the model from, shared with every OCR that uses the same
+             model, device, providers and session options. If None, a model is loaded for this
+             OCR alone.
         """
-        self.ocr_model = LicensePlateRecognizer(
-            hub_ocr_model=hub_ocr_model,
+        # Without a registry, a private one loads the model for this OCR alone
+        self.ocr_model = (registry or ModelRegistry()).ocr(
+            hub_ocr_model,
             device=device,
             providers=providers,
             sess_options=sess_options,
-            onnx_model_path=model_path,
-            plate_config_path=config_path,
+            model_path=model_path,
+            config_path=config_path,
             force_download=force_download,
         )
+        self._registry = registry
+        self.decoder = decoder
+
+    def close(self) -> None:
+        """
+        Release the model to the registry it came from.
+        """
+        if self._registry is not None:
+            self._registry.release(self.ocr_model)
+            self._registry = None
 
     def predict(self, cropped_plate: np.ndarray) -> OcrResult | None:
         """
@@ -74,6 +102,8 @@ class DefaultOCR(BaseOCR):
         """
         if cropped_plate is None:
             return None
+        if self.decoder is not None:
+            return self._decode(self._model_probabilities([cropped_plate]))[0]
         if self.ocr_model.config.image_color_mode == "grayscale":
             cropped_plate = cv2.cvtColor(cropped_plate, cv2.COLOR_BGR2GRAY)
         plate_text, probabilities = self.ocr_model.run(cropped_plate, return_confidence=True)
@@ -86,3 +116,86 @@ class DefaultOCR(BaseOCR):
         # fast_plate_ocr uses '_' padding symbol
         plate_text = plate_text.pop().replace("_", "")
         return OcrResult(text=plate_text, confidence=float(np.mean(probabilities)))
+
+    def predict_batch(self, cropped_plates: list[np.ndarray]) -> list[OcrResult | None]:
+        """
+        Perform OCR on several cropped license plate images in a single inference call.
+
+        Parameters:
+            cropped_plates: Cropped images of license plates in BGR format.
+
+        Returns:
+            One OcrResult per crop, in the same order.
+        """
+        if not cropped_plates:
+            return []
+        if self.decoder is not None:
+            return self._decode(self._model_probabilities(cropped_plates))
+        if self.ocr_model.config.image_color_mode == "grayscale":
+            cropped_plates = [
+                cv2.cvtColor(cropped_plate, cv2.COLOR_BGR2GRAY) for cropped_plate in cropped_plates
+            ]
+        plate_texts, probabilities = self.ocr_model.run(cropped_plates, return_confidence=True)
+        if not isinstance(plate_texts, list):
+            raise TypeError(f"Expected plate_text to be a list, got {type(plate_texts).__name__}")
+        if not isinstance(probabilities, np.ndarray):
+            raise TypeError(
+                f"Expected probabilities to be a numpy ndarray, got {type(probabilities).__name__}"
+            )
+        return [
+            # fast_plate_ocr uses '_' padding symbol
+            OcrResult(text=plate_text.replace("_", ""), confidence=float(np.mean(plate_probs)))
+            for plate_text, plate_probs in zip(plate_texts, probabilities, strict=True)
+        ]
+
+    def _model_probabilities(self, cropped_plates: list[np.ndarray]) -> np.ndarray:
+        """
+        Run the OCR model and return its full output distribution.
+
+        `LicensePlateRecognizer.run` only returns the probability of the most likely character of
+        each slot, so the crops are resized as it would and the ONNX session is run directly.
+
+        Returns:
+            Array of shape `(N, max_plate_slots, len(alphabet))`.
+        """
+        config = self.ocr_model.config
+        if config.image_color_mode == "grayscale":
+            cropped_plates = [
+                cv2.cvtColor(cropped_plate, cv2.COLOR_BGR2GRAY) for cropped_plate in cropped_plates
+            ]
+        resized = [
+            resize_image(
+                cropped_plate,
+                config.img_height,
+                config.img_width,
+                image_color_mode=config.image_color_mode,
+                keep_aspect_ratio=config.keep_aspect_ratio,
+                interpolation_method=config.interpolation,
+                padding_color=config.padding_color,
+            )
+            for cropped_plate in cropped_plates
+        ]
+        x = preprocess_image(np.stack(resized, axis=0))
+        y = self.ocr_model.model.run(None, {"input": x})[0]
+        return np.asarray(y).reshape(-1, config.max_plate_slots, len(config.alphabet))
+
+    def _decode(self, probabilities: np.ndarray) -> list[OcrResult | None]:
+        """
+        Decode model output with `self.decoder`, taking the most probable character of each slot
+        for plates the decoder rejects.
+        """
+        assert self.decoder is not None
+        config = self.ocr_model.config
+        results: list[OcrResult | None] = []
+        for plate_probs in probabilities:
+            decoded = self.decoder.decode(plate_probs, config.alphabet, config.pad_char)
+            if decoded is not None:
+                results.append(
+                    OcrResult(text=decoded.text, confidence=float(np.mean(decoded.probabilities)))
+                )
+                continue
+            best = plate_probs.argmax(axis=1)
+            text = "".join(config.alphabet[i] for i in best).replace(config.pad_char, "")
+            confidence = float(np.mean(plate_probs[np.arange(len(best)), best]))
+            results.append(OcrResult(text=text, confidence=confidence))
+        return results
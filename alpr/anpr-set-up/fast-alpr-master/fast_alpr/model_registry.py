@@ -0,0 +1,306 @@
+"""
+Model registry module.
+
+Every detector and OCR model holds its own ONNX Runtime session, so building several `ALPR`
+instances with the same models multiplies memory use and startup time. A `ModelRegistry` loads
+each model once per key (model, providers, session options) and hands the same instance to every
+user, counting references so the model is unloaded when its last user releases it.
+
+ONNX Runtime sessions can be run from several threads at once, and the detector and OCR wrappers
+keep no per-call state, so a shared model needs no extra locking.
+"""
+
+import os
+import threading
+import time
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, field
+from typing import Any, Literal, TypeVar
+
+import onnxruntime as ort
+from fast_plate_ocr import LicensePlateRecognizer
+from fast_plate_ocr.inference.hub import OcrModel
+from open_image_models import LicensePlateDetector
+from open_image_models.detection.core.hub import PlateDetectorModel
+
+T = TypeVar("T")
+
+# Session options that change how a model runs. Config entries added with
+# `add_session_config_entry` cannot be listed, so they are not part of the key.
+_SESSION_OPTION_FIELDS = (
+    "execution_mode",
+    "execution_order",
+    "graph_optimization_level",
+    "inter_op_num_threads",
+    "intra_op_num_threads",
+    "enable_cpu_mem_arena",
+    "enable_mem_pattern",
+    "enable_mem_reuse",
+    "enable_profiling",
+    "optimized_model_filepath",
+    "use_deterministic_compute",
+)
+
+
+@dataclass(frozen=True, slots=True)
+class ModelKey:
+    """
+    Identifies a loaded model. Requests with equal keys share one model.
+    """
+
+    kind: Literal["detector", "ocr"]
+    model: str
+    """Hub model name, or the model file path."""
+    providers: tuple | None = None
+    session_options: tuple | None = None
+    variant: tuple = ()
+    """Anything else that changes the loaded model (device, config file, ...)."""
+
+
+@dataclass(frozen=True, slots=True)
+class ModelInfo:
+    """
+    A model held by a `ModelRegistry`.
+    """
+
+    key: ModelKey
+    refs: int
+    """Number of users that have acquired the model and not released it."""
+    load_seconds: float
+
+
+def providers_key(providers: Sequence[str | tuple[str, dict]] | None) -> tuple | None:
+    """
+    Hashable form of ONNX Runtime execution providers, None for the defaults.
+    """
+    if providers is None:
+        return None
+    return tuple(
+        provider
+        if isinstance(provider, str)
+        else (provider[0], tuple(sorted((str(k), repr(v)) for k, v in provider[1].items())))
+        for provider in providers
+    )
+
+
+def session_options_key(sess_options: ort.SessionOptions | None) -> tuple | None:
+    """
+    Hashable form of ONNX Runtime session options, None for the defaults.
+    """
+    if sess_options is None:
+        return None
+    return tuple((name, repr(getattr(sess_options, name, None))) for name in _SESSION_OPTION_FIELDS)
+
+
+@dataclass(slots=True)
+class _Entry:
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    model: Any = None
+    refs: int = 0
+    load_seconds: float = 0.0
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded models with reference counting.
+
+    `acquire` returns the model for a key, loading it on first use. Concurrent requests for a
+    model that is still loading wait for that load instead of starting their own. Each `acquire`
+    must be matched by a `release`, and the registry drops a model when its last reference is
+    released. `unload` drops a model straight away. Users that still hold the model can keep
+    using it; its session is freed once they let go of it.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: dict[ModelKey, _Entry] = {}
+        self._keys: dict[int, ModelKey] = {}
+
+    def acquire(self, key: ModelKey, load: Callable[[], T]) -> T:
+        """
+        Get the model for `key`, calling `load()` if it is not loaded yet.
+
+        Parameters:
+            key: The model's key.
+            load: Loads the model. Only called by the first request for the key.
+
+        Returns:
+            The shared model.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+            # Counted before loading so a concurrent release cannot drop the entry
+            entry.refs += 1
+        try:
+            with entry.lock:
+                if entry.model is None:
+                    start = time.perf_counter()
+                    model = load()
+                    entry.load_seconds = time.perf_counter() - start
+                    with self._lock:
+                        entry.model = model
+                        # Unless unloaded while loading
+                        if self._entries.get(key) is entry:
+                            self._keys[id(model)] = key
+        except BaseException:
+            with self._lock:
+                entry.refs -= 1
+                if entry.refs <= 0 and self._entries.get(key) is entry:
+                    del self._entries[key]
+            raise
+        return entry.model
+
+    def release(self, model: object) -> bool:
+        """
+        Return a model obtained from `acquire`. Unloads it if this was its last user.
+
+        Returns:
+            False if the registry does not hold the model (already unloaded).
+        """
+        with self._lock:
+            key = self._keys.get(id(model))
+            if key is None or key not in self._entries:
+                return False
+            entry = self._entries[key]
+            entry.refs -= 1
+            if entry.refs <= 0:
+                del self._entries[key]
+                del self._keys[id(model)]
+            return True
+
+    def unload(self, model: object) -> bool:
+        """
+        Drop a model from the registry whatever its reference count.
+
+        Parameters:
+            model: The model, or its `ModelKey`.
+
+        Returns:
+            False if the registry did not hold the model.
+        """
+        with self._lock:
+            key = model if isinstance(model, ModelKey) else self._keys.get(id(model))
+            entry = self._entries.pop(key, None) if key is not None else None
+            if entry is None:
+                return False
+            self._keys.pop(id(entry.model), None)
+            return True
+
+    def unload_all(self) -> None:
+        """
+        Drop every model from the registry.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._keys.clear()
+
+    def models(self) -> list[ModelInfo]:
+        """
+        The loaded models and their reference counts.
+        """
+        with self._lock:
+            return [
+                ModelInfo(key=key, refs=entry.refs, load_seconds=entry.load_seconds)
+                for key, entry in self._entries.items()
+                if entry.model is not None
+            ]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(entry.model is not None for entry in self._entries.values())
+
+    @staticmethod
+    def detector_key(
+        model_name: PlateDetectorModel,
+        providers: Sequence[str | tuple[str, dict]] | None = None,
+        sess_options: ort.SessionOptions | None = None,
+    ) -> ModelKey:
+        """
+        Key of a `LicensePlateDetector`.
+        """
+        return ModelKey(
+            kind="detector",
+            model=str(model_name),
+            providers=providers_key(providers),
+            session_options=session_options_key(sess_options),
+        )
+
+    def detector(
+        self,
+        model_name: PlateDetectorModel,
+        providers: Sequence[str | tuple[str, dict]] | None = None,
+        sess_options: ort.SessionOptions | None = None,
+    ) -> LicensePlateDetector:
+        """
+        Acquire a shared `LicensePlateDetector`.
+
+        The detector's own confidence threshold is left at its default, `DefaultDetector`
+        applies its threshold itself.
+        """
+        return self.acquire(
+            self.detector_key(model_name, providers, sess_options),
+            lambda: LicensePlateDetector(
+                detection_model=model_name, providers=providers, sess_options=sess_options
+            ),
+        )
+
+    @staticmethod
+    def ocr_key(
+        hub_ocr_model: OcrModel | None = None,
+        *,
+        device: Literal["cuda", "cpu", "auto"] = "auto",
+        providers: Sequence[str | tuple[str, dict]] | None = None,
+        sess_options: ort.SessionOptions | None = None,
+        model_path: str | os.PathLike | None = None,
+        config_path: str | os.PathLike | None = None,
+    ) -> ModelKey:
+        """
+        Key of a `LicensePlateRecognizer`.
+        """
+        return ModelKey(
+            kind="ocr",
+            model=str(model_path if model_path is not None else hub_ocr_model),
+            providers=providers_key(providers),
+            session_options=session_options_key(sess_options),
+            variant=(device, None if config_path is None else str(config_path)),
+        )
+
+    def ocr(
+        self,
+        hub_ocr_model: OcrModel | None = None,
+        *,
+        device: Literal["cuda", "cpu", "auto"] = "auto",
+        providers: Sequence[str | tuple[str, dict]] | None = None,
+        sess_options: ort.SessionOptions | None = None,
+        model_path: str | os.PathLike | None = None,
+        config_path: str | os.PathLike | None = None,
+        force_download: bool = False,
+    ) -> LicensePlateRecognizer:
+        """
+        Acquire a shared `LicensePlateRecognizer`.
+        """
+        return self.acquire(
+            self.ocr_key(
+                hub_ocr_model,
+                model_path=model_path,
+                config_path=config_path,
+                device=device,
+                providers=providers,
+                sess_options=sess_options,
+            ),
+            lambda: LicensePlateRecognizer(
+                hub_ocr_model=hub_ocr_model,
+                device=device,
+                providers=providers,
+                sess_options=sess_options,
+                onnx_model_path=model_path,
+                plate_config_path=config_path,
+                force_download=force_download,
+            ),
+        )
+
+
+default_registry = ModelRegistry()
+"""The process-wide registry."""
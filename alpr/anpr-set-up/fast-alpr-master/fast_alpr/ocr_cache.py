@@ -0,0 +1,174 @@
+"""
+OCR result cache module.
+"""
+
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from fast_alpr.base import OcrResult
+
+
+@dataclass(frozen=True)
+class OcrCacheConfig:
+    """
+    Settings for reusing OCR results on crops that have not materially changed.
+
+    Aimed at fixed cameras, where a parked plate stays in the same place for hours and the OCR
+    would otherwise re-read an almost identical crop on every frame.
+    """
+
+    max_entries: int = 512
+    """Maximum number of cached results. The least recently used entry is evicted first."""
+    ttl_seconds: float | None = 30.0
+    """Seconds a result stays valid after it was computed. None keeps it until evicted."""
+    box_quantum: int = 8
+    """Bounding box coordinates are rounded to this many pixels to absorb detector jitter."""
+    thumbnail_size: tuple[int, int] = (32, 8)
+    """`(width, height)` the grayscale crop is shrunk to before comparing."""
+    max_mean_diff: float = 4.0
+    """Largest mean absolute gray-level difference (0-255) between thumbnails still counted as
+    the same crop. Absorbs sensor noise and compression artifacts."""
+
+
+@dataclass(frozen=True, slots=True)
+class CropKey:
+    """
+    What a crop is looked up by: its quantized bounding box and a small grayscale thumbnail.
+    """
+
+    box: tuple[int, int, int, int]
+    thumbnail: np.ndarray
+
+
+@dataclass(frozen=True, slots=True)
+class OcrCacheStats:
+    """
+    Counters of an `OcrCache`.
+    """
+
+    hits: int
+    misses: int
+    expired: int
+    """Lookups that found an entry older than the TTL (also counted as misses)."""
+    changed: int
+    """Lookups that found an entry whose crop has changed since (also counted as misses)."""
+    evictions: int
+    size: int
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of lookups answered from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class OcrCache:
+    """
+    Thread-safe LRU cache of OCR results with a TTL.
+
+    Holds one entry per quantized bounding box. A lookup hits when the entry's thumbnail is
+    within `max_mean_diff` of the new crop's. Works in front of any `BaseOCR`, since it only
+    stores what the OCR returned.
+    """
+
+    def __init__(self, config: OcrCacheConfig | None = None) -> None:
+        self.config = config or OcrCacheConfig()
+        self._entries: OrderedDict[tuple[int, int, int, int], tuple[float, np.ndarray, OcrResult]]
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # hits, misses, expired, changed and evictions (see OcrCacheStats)
+        self._counts: Counter[str] = Counter()
+
+    def crop_key(self, x1: int, y1: int, x2: int, y2: int, cropped_plate: np.ndarray) -> CropKey:
+        """
+        Build the lookup key of a crop.
+
+        Parameters:
+            x1, y1, x2, y2: Bounding box of the crop in the frame.
+            cropped_plate: The cropped plate image in BGR (or grayscale) format.
+        """
+        quantum = self.config.box_quantum
+        gray = (
+            cv2.cvtColor(cropped_plate, cv2.COLOR_BGR2GRAY)
+            if cropped_plate.ndim == 3 and cropped_plate.shape[2] == 3
+            else cropped_plate
+        )
+        thumbnail = cv2.resize(gray, self.config.thumbnail_size, interpolation=cv2.INTER_AREA)
+        box = (
+            round(x1 / quantum),
+            round(y1 / quantum),
+            round(x2 / quantum),
+            round(y2 / quantum),
+        )
+        return CropKey(box=box, thumbnail=thumbnail)
+
+    def get(self, key: CropKey) -> OcrResult | None:
+        """
+        Look up a crop.
+
+        Returns:
+            The cached result, or None if there is no entry, it has expired, or the crop has
+            changed since it was read.
+        """
+        now = time.monotonic()
+        ttl = self.config.ttl_seconds
+        with self._lock:
+            entry = self._entries.get(key.box)
+            if entry is None:
+                self._counts["misses"] += 1
+                return None
+            stored_at, thumbnail, result = entry
+            if ttl is not None and now - stored_at > ttl:
+                del self._entries[key.box]
+                self._counts["expired"] += 1
+                self._counts["misses"] += 1
+                return None
+            if cv2.norm(thumbnail, key.thumbnail, cv2.NORM_L1) > (
+                self.config.max_mean_diff * thumbnail.size
+            ):
+                self._counts["changed"] += 1
+                self._counts["misses"] += 1
+                return None
+            self._entries.move_to_end(key.box)
+            self._counts["hits"] += 1
+            return result
+
+    def put(self, key: CropKey, result: OcrResult | None) -> None:
+        """
+        Store the OCR result of a crop, evicting the least recently used entries if full.
+
+        None results are not stored, so unreadable crops are retried on the next frame.
+        """
+        if result is None:
+            return
+        with self._lock:
+            self._entries[key.box] = (time.monotonic(), key.thumbnail, result)
+            self._entries.move_to_end(key.box)
+            while len(self._entries) > self.config.max_entries:
+                self._entries.popitem(last=False)
+                self._counts["evictions"] += 1
+
+    def clear(self) -> None:
+        """Drop every entry. Counters are kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> OcrCacheStats:
+        """Snapshot of the hit, miss and eviction counters."""
+        with self._lock:
+            return OcrCacheStats(
+                hits=self._counts["hits"],
+                misses=self._counts["misses"],
+                expired=self._counts["expired"],
+                changed=self._counts["changed"],
+                evictions=self._counts["evictions"],
+                size=len(self._entries),
+            )
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,382 @@
+"""
+Stage-parallel pipeline module.
+
+`ALPR.predict` detects and then reads the plates of one frame at a time, and applications decode
+before it and annotate or write results after it, so on a multi-core CPU every stage leaves
+cores idle while another one runs. `Pipeline` gives each stage its own worker threads, connected
+by bounded queues: while the OCR reads frame N, the detector works on frame N+1 and frame N+2 is
+being decoded. ONNX Runtime and OpenCV release the GIL, so the stages really run in parallel.
+Per-stage utilization shows which stage is the bottleneck and deserves more workers.
+"""
+
+import contextlib
+import queue
+import threading
+import time
+from collections.abc import Callable, Generator, Iterable, Iterator, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+from fast_alpr.alpr import ALPR, ALPRResult, load_frame
+
+_POLL_SECONDS = 0.05
+_DONE = object()
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    One step of a `Pipeline`.
+    """
+
+    name: str
+    """Name reported by `Pipeline.stats` and in `PipelineResult.stage`."""
+    fn: Callable[[Any], Any]
+    """Turns the output of the previous stage (or the input item) into this stage's output."""
+    workers: int = 1
+    """Threads running `fn` concurrently. Outputs are put back in input order at the end."""
+    queue_size: int = 8
+    """Items waiting for this stage. When it is full the previous stage waits, so a slow stage
+    holds back its producers instead of letting items pile up in memory."""
+
+    def __post_init__(self) -> None:
+        if self.workers < 1:
+            raise ValueError(f"Stage {self.name!r}: workers must be >= 1, got {self.workers}")
+        if self.queue_size < 1:
+            raise ValueError(f"Stage {self.name!r}: queue_size must be >= 1, got {self.queue_size}")
+
+
+@dataclass(frozen=True, slots=True)
+class StageStats:
+    """
+    Counters of a pipeline stage.
+    """
+
+    name: str
+    workers: int
+    items: int
+    """Items the stage has processed."""
+    errors: int
+    """Items on which the stage raised."""
+    busy_seconds: float
+    """Time spent in the stage function, summed over its workers."""
+    utilization: float
+    """Fraction of its workers' time the stage was busy since the run started. The stage closest
+    to 1.0 is the bottleneck."""
+    queue_depth: int
+    """Items currently waiting for the stage."""
+
+    @property
+    def mean_seconds(self) -> float:
+        """Mean time the stage spends on one item."""
+        return self.busy_seconds / self.items if self.items else 0.0
+
+
+@dataclass(frozen=True, slots=True)
+class PipelineResult:
+    """
+    Outcome of one input item.
+    """
+
+    index: int
+    """Position of the item in the input."""
+    item: Any
+    """The input item, as given to `Pipeline.run`."""
+    value: Any
+    """Output of the last stage, None if a stage failed."""
+    error: Exception | None = None
+    """Exception raised by the failed stage. The following stages skipped the item."""
+    stage: str | None = None
+    """Name of the stage that failed, None if none did."""
+
+    @property
+    def ok(self) -> bool:
+        """Whether every stage succeeded."""
+        return self.error is None
+
+
+class _Job:
+    __slots__ = ("error", "index", "item", "stage", "value")
+
+    def __init__(self, index: int, item: Any) -> None:
+        self.index = index
+        self.item = item
+        self.value = item
+        self.error: Exception | None = None
+        self.stage: str | None = None
+
+    def result(self) -> PipelineResult:
+        return PipelineResult(self.index, self.item, self.value, self.error, self.stage)
+
+
+class _StageCounters:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.items = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.workers_left = 0
+
+    def record(self, seconds: float, failed: bool) -> None:
+        with self.lock:
+            self.items += 1
+            self.errors += failed
+            self.busy_seconds += seconds
+
+
+def _put(target: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    """Put `item`, waiting for room unless the run is stopped. Returns False if it was."""
+    while not stop.is_set():
+        with contextlib.suppress(queue.Full):
+            target.put(item, timeout=_POLL_SECONDS)
+            return True
+    return False
+
+
+def _get(source: queue.Queue, stop: threading.Event) -> Any:
+    """Next item, or None once the run is stopped."""
+    while not stop.is_set():
+        with contextlib.suppress(queue.Empty):
+            return source.get(timeout=_POLL_SECONDS)
+    return None
+
+
+class Pipeline:  # pylint: disable=too-many-instance-attributes
+    """
+    Runs a sequence of stages on a stream of items, each stage on its own threads.
+    """
+
+    def __init__(self, stages: Sequence[Stage], ordered: bool = True) -> None:
+        """
+        Parameters:
+            stages: The stages, in the order every item goes through them.
+            ordered: Yield results in input order. If False they are yielded as soon as they
+                are done, which keeps a slow item from holding back the ones behind it.
+        """
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        names = [stage.name for stage in stages]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Stage names must be unique, got {names}")
+        self.stages = tuple(stages)
+        self.ordered = ordered
+        # Items taken from the input but not yet returned to the caller
+        self.max_in_flight = sum(stage.queue_size + stage.workers for stage in self.stages)
+        self._lock = threading.Lock()
+        self._running = False
+        self._counters = [_StageCounters() for _ in self.stages]
+        self._queues: list[queue.Queue] = []
+        self._started: float | None = None
+        self._finished: float | None = None
+
+    def run(self, items: Iterable[Any]) -> Generator[PipelineResult, None, None]:
+        """
+        Push `items` through the stages and yield one `PipelineResult` per item.
+
+        Items are taken from `items` only as the pipeline has room for them, so `items` can be
+        an endless generator, e.g. frames read from a camera. An exception in a stage fails only
+        that item. Closing the returned iterator early stops the workers.
+        """
+        with self._lock:
+            if self._running:
+                raise RuntimeError("Pipeline is already running")
+            self._running = True
+            self._counters = [_StageCounters() for _ in self.stages]
+            self._queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+            self._queues.append(queue.Queue())  # bounded by the in-flight semaphore
+            self._started = time.perf_counter()
+            self._finished = None
+
+        stop = threading.Event()
+        in_flight = threading.Semaphore(self.max_in_flight)
+        feed_errors: list[Exception] = []
+        feeder = threading.Thread(
+            target=self._feed,
+            args=(items, in_flight, stop, feed_errors),
+            name="pipeline-feed",
+            daemon=True,
+        )
+        workers: list[threading.Thread] = []
+        for position, stage in enumerate(self.stages):
+            self._counters[position].workers_left = stage.workers
+            workers.extend(
+                threading.Thread(
+                    target=self._work,
+                    args=(position, stop),
+                    name=f"pipeline-{stage.name}-{i}",
+                    daemon=True,
+                )
+                for i in range(stage.workers)
+            )
+        for thread in (feeder, *workers):
+            thread.start()
+
+        try:
+            yield from self._collect(in_flight)
+            if feed_errors:
+                raise feed_errors[0]
+        finally:
+            stop.set()
+            # The feeder may be blocked inside `items` (e.g. waiting for a camera frame); it
+            # exits on its next item, and is a daemon thread, so it is not waited for.
+            for thread in workers:
+                thread.join()
+            with self._lock:
+                self._finished = time.perf_counter()
+                self._running = False
+
+    def _collect(self, in_flight: threading.Semaphore) -> Iterator[PipelineResult]:
+        output = self._queues[-1]
+        waiting: dict[int, _Job] = {}
+        next_index = 0
+        while True:
+            job = output.get()
+            if job is _DONE:
+                return
+            if not self.ordered:
+                in_flight.release()
+                yield job.result()
+                continue
+            waiting[job.index] = job
+            while next_index in waiting:
+                ready = waiting.pop(next_index)
+                next_index += 1
+                in_flight.release()
+                yield ready.result()
+
+    def _feed(
+        self,
+        items: Iterable[Any],
+        in_flight: threading.Semaphore,
+        stop: threading.Event,
+        feed_errors: list[Exception],
+    ) -> None:
+        inbound = self._queues[0]
+        try:
+            for index, item in enumerate(items):
+                while not in_flight.acquire(timeout=_POLL_SECONDS):
+                    if stop.is_set():
+                        return
+                if not _put(inbound, _Job(index, item), stop):
+                    return
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            feed_errors.append(e)
+        _put(inbound, _DONE, stop)
+
+    def _work(self, position: int, stop: threading.Event) -> None:
+        stage = self.stages[position]
+        counters = self._counters[position]
+        inbound, outbound = self._queues[position], self._queues[position + 1]
+        while True:
+            job = _get(inbound, stop)
+            if job is None:
+                return
+            if job is _DONE:
+                # Let the other workers of this stage see it too; the last one passes it on
+                _put(inbound, _DONE, stop)
+                with counters.lock:
+                    counters.workers_left -= 1
+                    last = counters.workers_left == 0
+                if last:
+                    _put(outbound, _DONE, stop)
+                return
+            if job.error is None:
+                started = time.perf_counter()
+                try:
+                    job.value = stage.fn(job.value)
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    job.value, job.error, job.stage = None, e, stage.name
+                counters.record(time.perf_counter() - started, job.error is not None)
+            if not _put(outbound, job, stop):
+                return
+
+    def stats(self) -> list[StageStats]:
+        """
+        Counters of every stage for the current (or last) run, in stage order.
+        """
+        with self._lock:
+            started, finished = self._started, self._finished
+            queues = self._queues
+        elapsed = 0.0 if started is None else (finished or time.perf_counter()) - started
+        stats = []
+        for position, (stage, counters) in enumerate(zip(self.stages, self._counters, strict=True)):
+            with counters.lock:
+                items, errors, busy = counters.items, counters.errors, counters.busy_seconds
+            capacity = elapsed * stage.workers
+            stats.append(
+                StageStats(
+                    name=stage.name,
+                    workers=stage.workers,
+                    items=items,
+                    errors=errors,
+                    busy_seconds=busy,
+                    utilization=min(busy / capacity, 1.0) if capacity else 0.0,
+                    queue_depth=queues[position].qsize() if queues else 0,
+                )
+            )
+        return stats
+
+    def bottleneck(self) -> str | None:
+        """
+        Name of the busiest stage, None before the first run.
+        """
+        stats = [stage for stage in self.stats() if stage.items]
+        return max(stats, key=lambda stage: stage.utilization).name if stats else None
+
+
+def alpr_pipeline(  # noqa: PLR0913  # pylint: disable=too-many-arguments
+    alpr: ALPR,
+    decode: Callable[[Any], np.ndarray] | None = None,
+    output: Callable[[np.ndarray, list[ALPRResult]], Any] | None = None,
+    *,
+    decode_workers: int = 2,
+    detect_workers: int = 1,
+    ocr_workers: int = 1,
+    output_workers: int = 1,
+    queue_size: int = 8,
+    ordered: bool = True,
+) -> Pipeline:
+    """
+    Build the decode -> detect -> crop + OCR (-> output) pipeline of an ALPR.
+
+    Gives the same results as calling `alpr.predict` on every decoded frame, with the stages of
+    consecutive frames overlapping.
+
+    Parameters:
+        alpr: The ALPR whose `detect` and `recognize` run the detect and OCR stages.
+        decode: Turns an input item into a BGR frame. Defaults to reading image paths with
+            OpenCV and passing arrays through.
+        output: Called with each frame and its results, e.g. to draw and encode them. Its return
+            value becomes `PipelineResult.value`. None omits the stage, and the value is the
+            list of ALPRResult.
+        decode_workers: Threads of the decode stage.
+        detect_workers: Threads of the detect stage.
+        ocr_workers: Threads of the crop + OCR stage.
+        output_workers: Threads of the output stage.
+        queue_size: Items waiting in front of each stage.
+        ordered: Yield results in input order (see `Pipeline`).
+
+    Returns:
+        A `Pipeline` with stages "decode", "detect", "ocr" and, if `output` is given, "output".
+    """
+    load = decode or load_frame
+
+    def detect(frame: np.ndarray) -> tuple[np.ndarray, list]:
+        return frame, alpr.detect(frame)
+
+    def recognize(job: tuple[np.ndarray, list]) -> tuple[np.ndarray, list[ALPRResult]]:
+        frame, detections = job
+        return frame, alpr.recognize(frame, detections)
+
+    stages = [
+        Stage("decode", load, decode_workers, queue_size),
+        Stage("detect", detect, detect_workers, queue_size),
+    ]
+    if output is None:
+        stages.append(Stage("ocr", lambda job: recognize(job)[1], ocr_workers, queue_size))
+    else:
+        stages.append(Stage("ocr", recognize, ocr_workers, queue_size))
+        stages.append(Stage("output", lambda job: output(*job), output_workers, queue_size))
+    return Pipeline(stages, ordered=ordered)
@@ -0,0 +1,425 @@
+"""
+Plate format module.
+
+Constrains OCR decoding to known registration formats. The OCR model outputs a probability
+distribution over its alphabet for every plate slot; instead of taking the argmax of each slot
+independently, a `PlateDecoder` picks the most probable string that is a valid plate.
+"""
+
+import re
+from abc import ABC, abstractmethod
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+import numpy as np
+
+IRISH_PLATE_FORMATS = (
+    # Year (2 digits before 2013, 3 since), county code, serial: 191-D-12348, 06-MH-4321
+    r"\d{2,3}-[A-Z]{1,2}-\d{1,6}",
+)
+"""Irish registration formats."""
+
+_DIGITS = "0123456789"
+_LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_CLASS_ESCAPES = {"d": _DIGITS, "l": _LETTERS}
+_QUANTIFIER = re.compile(r"\{(\d+)(?:,(\d*))?\}|[?*+]")
+_SHORT_QUANTIFIERS: dict[str, tuple[int, int | None]] = {
+    "?": (0, 1),
+    "*": (0, None),
+    "+": (1, None),
+}
+
+
+@dataclass(frozen=True, slots=True)
+class _Segment:
+    chars: str | None
+    """Characters allowed in this segment, None for any character of the alphabet."""
+    min_count: int
+    max_count: int | None
+    literal: bool
+
+
+@dataclass(frozen=True, slots=True)
+class _CompiledSegment:
+    indices: np.ndarray
+    """Alphabet indices allowed in this segment."""
+    min_count: int
+    max_count: int
+    separator: str
+    """Separator text inserted before this segment."""
+
+
+@dataclass(frozen=True)
+class PlateFormat:
+    """
+    A registration format written in a small regex subset.
+
+    Supported syntax: literal characters, `\\d` (digit), `\\l` (letter), `.` (any character),
+    character classes such as `[A-Z]` or `[A-HJ-NP-Z0-9]`, and the quantifiers `{m}`, `{m,n}`,
+    `{m,}`, `?`, `*` and `+`. Literal characters the OCR model cannot output (such as `-` or
+    spaces) are separators: they take no plate slot and are inserted in the decoded text.
+    """
+
+    pattern: str
+    segments: tuple[_Segment, ...] = field(init=False, repr=False, compare=False)
+    _regex: re.Pattern[str] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        segments = _parse_pattern(self.pattern)
+        object.__setattr__(self, "segments", segments)
+        object.__setattr__(self, "_regex", re.compile(_to_regex(segments)))
+
+    def matches(self, text: str) -> bool:
+        """
+        Whether `text` is a plate of this format. Separators may be present or left out, so
+        both "191-D-12345" and "191D12345" match `\\d{2,3}-[A-Z]{1,2}-\\d{1,6}`.
+        """
+        return self._regex.fullmatch(text) is not None
+
+
+def _to_regex(segments: tuple[_Segment, ...]) -> str:
+    parts = []
+    for segment in segments:
+        if segment.chars is None:
+            part = "."
+        elif len(segment.chars) == 1:
+            part = re.escape(segment.chars)
+        else:
+            part = "[" + "".join(re.escape(char) for char in segment.chars) + "]"
+        upper = "" if segment.max_count is None else segment.max_count
+        part = f"(?:{part}){{{segment.min_count},{upper}}}"
+        # Separators are optional: OCR models that cannot output them leave them out
+        if segment.literal and segment.chars is not None and not segment.chars.isalnum():
+            part = f"(?:{part})?"
+        parts.append(part)
+    return "".join(parts)
+
+
+def _parse_pattern(pattern: str) -> tuple[_Segment, ...]:
+    segments: list[_Segment] = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        literal = False
+        if char == "\\":
+            if i + 1 >= len(pattern):
+                raise ValueError(f"Dangling escape in plate format {pattern!r}")
+            escaped = pattern[i + 1]
+            chars: str | None = _CLASS_ESCAPES.get(escaped, escaped)
+            literal = escaped not in _CLASS_ESCAPES
+            i += 2
+        elif char == "[":
+            end = pattern.find("]", i)
+            if end == -1:
+                raise ValueError(f"Unclosed character class in plate format {pattern!r}")
+            chars = _expand_class(pattern[i + 1 : end], pattern)
+            i = end + 1
+        elif char == ".":
+            chars = None
+            i += 1
+        elif char in "{}?*+()|^$":
+            raise ValueError(f"Unsupported syntax {char!r} in plate format {pattern!r}")
+        else:
+            chars = char
+            literal = True
+            i += 1
+
+        min_count, max_count, i = _parse_quantifier(pattern, i)
+        segments.append(_Segment(chars, min_count, max_count, literal))
+    if not segments:
+        raise ValueError("Empty plate format")
+    return tuple(segments)
+
+
+def _parse_quantifier(pattern: str, i: int) -> tuple[int, int | None, int]:
+    """Quantifier at `pattern[i:]` as `(min, max, end)`, `(1, 1, i)` if there is none."""
+    quantifier = _QUANTIFIER.match(pattern, i)
+    if not quantifier:
+        return 1, 1, i
+    text = quantifier.group(0)
+    if text in _SHORT_QUANTIFIERS:
+        return (*_SHORT_QUANTIFIERS[text], quantifier.end())
+    min_count = int(quantifier.group(1))
+    upper = quantifier.group(2)
+    max_count = min_count if upper is None else (int(upper) if upper else None)
+    if max_count is not None and max_count < min_count:
+        raise ValueError(f"Bad quantifier {text!r} in plate format {pattern!r}")
+    return min_count, max_count, quantifier.end()
+
+
+def _expand_class(body: str, pattern: str) -> str:
+    chars: list[str] = []
+    i = 0
+    while i < len(body):
+        if body[i] == "\\" and i + 1 < len(body):
+            chars.extend(_CLASS_ESCAPES.get(body[i + 1], body[i + 1]))
+            i += 2
+        elif i + 2 < len(body) and body[i + 1] == "-":
+            start, end = ord(body[i]), ord(body[i + 2])
+            if end < start:
+                raise ValueError(f"Bad range in plate format {pattern!r}")
+            chars.extend(chr(c) for c in range(start, end + 1))
+            i += 3
+        else:
+            chars.append(body[i])
+            i += 1
+    if not chars:
+        raise ValueError(f"Empty character class in plate format {pattern!r}")
+    return "".join(dict.fromkeys(chars))
+
+
+@dataclass(frozen=True, slots=True)
+class DecodedPlate:
+    """
+    Output of a `PlateDecoder`.
+    """
+
+    text: str
+    """Decoded plate text, with the format's separators."""
+    probabilities: np.ndarray
+    """`(slots,)` probability of the chosen symbol in every slot, padding included."""
+
+
+class PlateDecoder(ABC):
+    """
+    Abstract base class for decoders that turn per-slot OCR probabilities into plate text.
+    """
+
+    @abstractmethod
+    def decode(
+        self, probabilities: np.ndarray, alphabet: str, pad_char: str
+    ) -> DecodedPlate | None:
+        """
+        Decode one plate.
+
+        Parameters:
+            probabilities: `(slots, len(alphabet))` probabilities output by the OCR model.
+            alphabet: The OCR model's alphabet.
+            pad_char: The symbol the OCR model uses for empty slots.
+
+        Returns:
+            The decoded plate, or None to fall back to the unconstrained (argmax) reading.
+        """
+
+
+class FormatConstrainedDecoder(PlateDecoder):
+    """
+    Picks the most probable plate that matches one of the given formats.
+
+    Decoding is an exact Viterbi search over (format segment, characters placed) states, so it
+    finds the best valid string a beam search would only approximate, at a cost linear in the
+    number of slots. When the best valid reading is much less likely than the unconstrained
+    argmax (for example a foreign plate), None is returned so the caller keeps the argmax.
+    """
+
+    def __init__(
+        self,
+        formats: Iterable[str | PlateFormat] = IRISH_PLATE_FORMATS,
+        max_cost: float | None = 4.0,
+    ) -> None:
+        """
+        Parameters:
+            formats: Accepted registration formats (see `PlateFormat` for the syntax).
+            max_cost: Largest drop in log-probability, relative to the unconstrained argmax,
+                accepted to make the plate valid. None always returns the best valid plate.
+        """
+        self.formats = tuple(f if isinstance(f, PlateFormat) else PlateFormat(f) for f in formats)
+        if not self.formats:
+            raise ValueError("At least one plate format is required")
+        self.max_cost = max_cost
+        self._compiled: dict[str, list[list[_CompiledSegment]]] = {}
+
+    def __getstate__(self) -> dict:
+        # Compiled formats are rebuilt lazily after unpickling (e.g. in inference workers)
+        return {**self.__dict__, "_compiled": {}}
+
+    def decode(
+        self, probabilities: np.ndarray, alphabet: str, pad_char: str
+    ) -> DecodedPlate | None:
+        log_probs = np.log(np.clip(probabilities.astype(np.float64), 1e-12, 1.0))
+        pad_idx = alphabet.index(pad_char)
+        # pad_tail[n]: log-probability of padding every slot from n onwards
+        pad_tail = np.concatenate([np.cumsum(log_probs[::-1, pad_idx])[::-1], [0.0]])
+
+        best: tuple[float, str, np.ndarray] | None = None
+        best_score = -np.inf
+        for segments in self._compile(alphabet, pad_char):
+            found = self._decode_format(log_probs, pad_tail, segments, alphabet, pad_idx)
+            if found is not None and found[0] > best_score:
+                best, best_score = found, found[0]
+        if best is None:
+            return None
+
+        _, text, chosen = best
+        if self.max_cost is not None and log_probs.max(axis=1).sum() - best_score > self.max_cost:
+            return None
+        return DecodedPlate(text=text, probabilities=np.exp(chosen).astype(np.float32))
+
+    def _compile(self, alphabet: str, pad_char: str) -> list[list[_CompiledSegment]]:
+        """Per format, its character segments resolved against the OCR alphabet."""
+        key = alphabet + "\0" + pad_char
+        compiled = self._compiled.get(key)
+        if compiled is not None:
+            return compiled
+        compiled = []
+        for plate_format in self.formats:
+            segments: list[_CompiledSegment] = []
+            separator = ""
+            valid = True
+            for segment in plate_format.segments:
+                if segment.literal and segment.chars is not None and segment.chars not in alphabet:
+                    separator += segment.chars * segment.min_count
+                    continue
+                chars = segment.chars if segment.chars is not None else alphabet
+                indices = np.array(
+                    sorted({alphabet.index(c) for c in chars if c in alphabet and c != pad_char}),
+                    dtype=np.intp,
+                )
+                if not indices.size:
+                    if segment.min_count:
+                        valid = False
+                        break
+                    continue
+                max_count = segment.max_count if segment.max_count is not None else 1 << 30
+                segments.append(_CompiledSegment(indices, segment.min_count, max_count, separator))
+                separator = ""
+            if valid and segments:
+                compiled.append(segments)
+        self._compiled[key] = compiled
+        return compiled
+
+    @staticmethod
+    def _decode_format(
+        log_probs: np.ndarray,
+        pad_tail: np.ndarray,
+        segments: list[_CompiledSegment],
+        alphabet: str,
+        pad_idx: int,
+    ) -> tuple[float, str, np.ndarray] | None:
+        """
+        Best plate for one format.
+
+        Returns:
+            `(log-probability, text, per-slot log-probabilities)`, or None if no plate of this
+            format fits in the slots.
+        """
+        char_scores, char_indices = _best_chars(log_probs, segments)
+        found = _viterbi(char_scores, pad_tail, segments)
+        if found is None:
+            return None
+        score, path = found
+
+        text: list[str] = []
+        chosen = log_probs[:, pad_idx].copy()
+        for t, k in enumerate(path):
+            if t and k != path[t - 1]:
+                text.extend(segments[j].separator for j in range(path[t - 1] + 1, k + 1))
+            text.append(alphabet[char_indices[k][t]])
+            chosen[t] = char_scores[k][t]
+        return score, "".join(text), chosen
+
+
+def _best_chars(
+    log_probs: np.ndarray, segments: list[_CompiledSegment]
+) -> tuple[list[np.ndarray], list[np.ndarray]]:
+    """Per segment, the best character of every slot and its log-probability."""
+    slots = log_probs.shape[0]
+    char_scores = []
+    char_indices = []
+    for segment in segments:
+        sub = log_probs[:, segment.indices]
+        arg = sub.argmax(axis=1)
+        char_indices.append(segment.indices[arg])
+        char_scores.append(sub[np.arange(slots), arg])
+    return char_scores, char_indices
+
+
+_State = tuple[int, int]
+"""A Viterbi state: `(segment, characters placed in it)`."""
+
+
+def _viterbi(
+    char_scores: list[np.ndarray], pad_tail: np.ndarray, segments: list[_CompiledSegment]
+) -> tuple[float, list[int]] | None:
+    """
+    Best segmentation of the slots, over states `(segment, characters placed in it)`.
+
+    Parameters:
+        char_scores: Per segment, the best log-probability of each slot.
+        pad_tail: `pad_tail[n]` is the log-probability of padding every slot from n onwards.
+        segments: The format's character segments.
+
+    Returns:
+        `(log-probability, segment of every used slot)`, or None if nothing fits.
+    """
+    mins = [segment.min_count for segment in segments]
+    maxs = [min(segment.max_count, len(pad_tail) - 1) for segment in segments]
+    # can_end[k]: a plate may end inside segment k (every later segment can be empty)
+    can_end = [True] * len(segments)
+    for k in range(len(segments) - 2, -1, -1):
+        can_end[k] = can_end[k + 1] and mins[k + 1] == 0
+
+    current = {(k, 1): char_scores[k][0] for k in _entries(mins, -1)}
+    history: list[dict[_State, _State]] = [{}]
+    best_score = -np.inf
+    best_end: tuple[int, _State] | None = None
+    for t in range(len(pad_tail) - 1):
+        if t:
+            current, back = _advance(current, [scores[t] for scores in char_scores], mins, maxs)
+            history.append(back)
+        for (k, placed), score in current.items():
+            if placed >= mins[k] and can_end[k] and score + pad_tail[t + 1] > best_score:
+                best_score = score + pad_tail[t + 1]
+                best_end = (t, (k, placed))
+    if best_end is None:
+        return None
+    return float(best_score), _backtrace(history, *best_end)
+
+
+def _entries(mins: list[int], after: int) -> list[int]:
+    """Segments the next character may start, after finishing segment `after`."""
+    reachable = []
+    for k in range(after + 1, len(mins)):
+        reachable.append(k)
+        if mins[k]:
+            break
+    return reachable
+
+
+def _advance(
+    current: dict[_State, float], column: list[float], mins: list[int], maxs: list[int]
+) -> tuple[dict[_State, float], dict[_State, _State]]:
+    """
+    One Viterbi step: place the next slot's character.
+
+    Parameters:
+        current: Best log-probability of every state reached so far.
+        column: Per segment, the best log-probability of the next slot.
+        mins: Per segment, its minimum character count.
+        maxs: Per segment, its maximum character count.
+
+    Returns:
+        The states reached and, for each, the state it was reached from.
+    """
+    following: dict[_State, float] = {}
+    back: dict[_State, _State] = {}
+    for (k, placed), score in current.items():
+        moves = [(k, placed + 1)] if placed < maxs[k] else []
+        if placed >= mins[k]:
+            moves.extend((nxt, 1) for nxt in _entries(mins, k))
+        for state in moves:
+            candidate = score + column[state[0]]
+            if candidate > following.get(state, -np.inf):
+                following[state] = candidate
+                back[state] = (k, placed)
+    return following, back
+
+
+def _backtrace(history: list[dict[_State, _State]], last: int, state: _State) -> list[int]:
+    """Walk the back pointers from the slot `last` to recover the segment of every slot."""
+    path = [state[0]]
+    for t in range(last, 0, -1):
+        state = history[t][state]
+        path.append(state[0])
+    path.reverse()
+    return path
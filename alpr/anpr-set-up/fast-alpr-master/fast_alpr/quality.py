@@ -0,0 +1,94 @@
+"""
+Crop quality module.
+"""
+
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+SKIP_TOO_SMALL = "too_small"
+SKIP_BAD_ASPECT_RATIO = "bad_aspect_ratio"
+SKIP_UNDEREXPOSED = "underexposed"
+SKIP_OVEREXPOSED = "overexposed"
+SKIP_BLURRY = "blurry"
+
+
+@dataclass(frozen=True)
+class CropQualityConfig:
+    """
+    Thresholds used to reject plate crops before running OCR on them.
+
+    Any threshold set to None disables that check.
+    """
+
+    min_width: int | None = 24
+    """Minimum crop width in pixels."""
+    min_height: int | None = 8
+    """Minimum crop height in pixels."""
+    min_aspect_ratio: float | None = 0.8
+    """Minimum width / height ratio. Two-row plates are close to 1.5, so keep this low."""
+    max_aspect_ratio: float | None = 8.0
+    """Maximum width / height ratio. Heavily skewed or partial boxes exceed this."""
+    min_brightness: float | None = 25.0
+    """Minimum mean gray level (0-255)."""
+    max_brightness: float | None = 235.0
+    """Maximum mean gray level (0-255)."""
+    min_sharpness: float | None = 30.0
+    """Minimum variance of the Laplacian. Motion-blurred crops fall below this."""
+
+
+def assess_crop_quality(cropped_plate: np.ndarray, config: CropQualityConfig) -> str | None:
+    """
+    Run the cheap quality checks on a plate crop, cheapest first.
+
+    Parameters:
+        cropped_plate: The cropped plate image in BGR (or grayscale) format.
+        config: Thresholds to apply.
+
+    Returns:
+        None if the crop is worth running OCR on, otherwise the skip reason
+        (one of the `SKIP_*` constants).
+    """
+    height, width = cropped_plate.shape[:2]
+    if _too_small(width, height, config):
+        return SKIP_TOO_SMALL
+    if _outside(width / height, config.min_aspect_ratio, config.max_aspect_ratio):
+        return SKIP_BAD_ASPECT_RATIO
+
+    gray = (
+        cv2.cvtColor(cropped_plate, cv2.COLOR_BGR2GRAY)
+        if cropped_plate.ndim == 3 and cropped_plate.shape[2] == 3
+        else cropped_plate
+    )
+    if config.min_brightness is not None or config.max_brightness is not None:
+        brightness = float(gray.mean())
+        if _outside(brightness, config.min_brightness, None):
+            return SKIP_UNDEREXPOSED
+        if _outside(brightness, None, config.max_brightness):
+            return SKIP_OVEREXPOSED
+
+    if _too_blurry(gray, config):
+        return SKIP_BLURRY
+
+    return None
+
+
+def _outside(value: float, low: float | None, high: float | None) -> bool:
+    """Whether `value` is below `low` or above `high`, ignoring bounds that are None."""
+    return (low is not None and value < low) or (high is not None and value > high)
+
+
+def _too_small(width: int, height: int, config: CropQualityConfig) -> bool:
+    return (
+        height == 0
+        or width == 0
+        or _outside(width, config.min_width, None)
+        or _outside(height, config.min_height, None)
+    )
+
+
+def _too_blurry(gray: np.ndarray, config: CropQualityConfig) -> bool:
+    if config.min_sharpness is None:
+        return False
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var()) < config.min_sharpness
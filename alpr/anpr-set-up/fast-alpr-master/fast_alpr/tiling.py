@@ -0,0 +1,170 @@
+"""
+Tiled detection module.
+
+The detector resizes the whole frame to its input size (e.g. 384 px), so on a 4K overview camera
+a distant plate shrinks to a few pixels and is missed. `TiledDetector` splits large frames into
+overlapping tiles, runs the detector on all of them as one batch and merges the boxes found in
+several tiles with non-maximum suppression, so small plates are seen at a much higher resolution
+for the cost of a few more detector runs.
+"""
+
+from dataclasses import dataclass
+from typing import Literal
+
+import numpy as np
+
+from fast_alpr.base import BaseDetector, DetectionResult
+
+
+@dataclass(frozen=True)
+class TilingConfig:
+    """
+    Settings of tiled detection.
+    """
+
+    tile_size: int = 640
+    """Side of the square tiles, in frame pixels. Frames that fit in one tile are not split."""
+    overlap: float = 0.2
+    """Fraction of a tile shared with its neighbours. A plate narrower than the overlap is
+    always seen whole by at least one tile."""
+    include_full_frame: bool = True
+    """Also run the detector on the whole frame, which finds near plates too large for a tile."""
+    nms_threshold: float = 0.5
+    """Boxes overlapping a more confident box by more than this are dropped."""
+    nms_metric: Literal["iou", "ios"] = "ios"
+    """How overlap is measured: intersection over union, or intersection over the smaller box.
+    "ios" also merges the partial box of a plate cut by a tile edge into the whole box found by
+    the neighbouring tile."""
+
+    def __post_init__(self) -> None:
+        if self.tile_size < 1:
+            raise ValueError(f"tile_size must be >= 1, got {self.tile_size}")
+        if not 0.0 <= self.overlap < 1.0:
+            raise ValueError(f"overlap must be in [0, 1), got {self.overlap}")
+
+
+def tile_starts(length: int, tile_size: int, overlap: float) -> list[int]:
+    """
+    Start offsets of the tiles covering `length` pixels, the last tile ending at the edge.
+    """
+    if length <= tile_size:
+        return [0]
+    stride = max(1, int(tile_size * (1.0 - overlap)))
+    starts = list(range(0, length - tile_size, stride))
+    starts.append(length - tile_size)
+    return starts
+
+
+def tile_boxes(width: int, height: int, config: TilingConfig) -> list[tuple[int, int, int, int]]:
+    """
+    `(x1, y1, x2, y2)` of the tiles covering a `width` x `height` frame.
+    """
+    size = config.tile_size
+    return [
+        (x, y, min(x + size, width), min(y + size, height))
+        for y in tile_starts(height, size, config.overlap)
+        for x in tile_starts(width, size, config.overlap)
+    ]
+
+
+def non_max_suppression(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    threshold: float,
+    metric: Literal["iou", "ios"] = "iou",
+) -> np.ndarray:
+    """
+    Greedy class-agnostic non-maximum suppression.
+
+    Parameters:
+        boxes: `(N, 4)` array of `x1, y1, x2, y2`.
+        scores: `(N,)` confidences.
+        threshold: Boxes overlapping a kept box by more than this are dropped.
+        metric: "iou" (intersection over union) or "ios" (intersection over the smaller box).
+
+    Returns:
+        Indices of the kept boxes, most confident (then largest) first.
+    """
+    boxes = boxes.astype(np.float32)
+    areas = np.maximum(boxes[:, 2] - boxes[:, 0], 0) * np.maximum(boxes[:, 3] - boxes[:, 1], 0)
+    # Most confident first; on ties the larger box, so a whole plate beats its cut-off part
+    order = np.lexsort((-areas, -scores))
+    keep = []
+    while order.size:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        width = np.minimum(boxes[best, 2], boxes[rest, 2]) - np.maximum(
+            boxes[best, 0], boxes[rest, 0]
+        )
+        height = np.minimum(boxes[best, 3], boxes[rest, 3]) - np.maximum(
+            boxes[best, 1], boxes[rest, 1]
+        )
+        intersection = np.maximum(width, 0) * np.maximum(height, 0)
+        if metric == "ios":
+            denominator = np.minimum(areas[best], areas[rest])
+        else:
+            denominator = areas[best] + areas[rest] - intersection
+        overlap = intersection / np.maximum(denominator, 1e-9)
+        order = rest[overlap <= threshold]
+    return np.array(keep, dtype=np.intp)
+
+
+class TiledDetector(BaseDetector):
+    """
+    Runs a detector on overlapping tiles of large frames and merges the boxes.
+    """
+
+    def __init__(self, detector: BaseDetector, config: TilingConfig | None = None) -> None:
+        """
+        Parameters:
+            detector: The detector run on every tile.
+            config: Tile size, overlap and merging settings. Defaults to `TilingConfig()`.
+        """
+        self.detector = detector
+        self.config = config or TilingConfig()
+
+    def predict(self, frame: np.ndarray) -> list[DetectionResult]:
+        return self.detections_from_arrays(*self.predict_arrays(frame))
+
+    def predict_arrays(self, frame: np.ndarray) -> tuple[np.ndarray, np.ndarray, list[str]]:
+        """
+        Detect plates tile by tile, with boxes in frame coordinates.
+
+        Frames that fit in one tile go straight to the detector.
+        """
+        height, width = frame.shape[:2]
+        tiles = tile_boxes(width, height, self.config)
+        if len(tiles) == 1:
+            return self.detector.predict_arrays(frame)
+
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in tiles]
+        offsets = [(x1, y1) for x1, y1, _, _ in tiles]
+        if self.config.include_full_frame:
+            crops.append(frame)
+            offsets.append((0, 0))
+
+        return self._merge(offsets, self.detector.predict_arrays_batch(crops))
+
+    def _merge(
+        self,
+        offsets: list[tuple[int, int]],
+        results: list[tuple[np.ndarray, np.ndarray, list[str]]],
+    ) -> tuple[np.ndarray, np.ndarray, list[str]]:
+        """Shift each tile's boxes by its offset into the frame and drop the duplicates."""
+        all_boxes, all_confidences, all_labels = [], [], []
+        for (dx, dy), (boxes, confidences, labels) in zip(offsets, results, strict=True):
+            all_boxes.append(boxes + np.array([dx, dy, dx, dy], dtype=boxes.dtype))
+            all_confidences.append(confidences)
+            all_labels.extend(labels)
+        boxes = np.concatenate(all_boxes).astype(np.int32).reshape(-1, 4)
+        confidences = np.concatenate(all_confidences).astype(np.float32)
+
+        keep = non_max_suppression(
+            boxes, confidences, self.config.nms_threshold, self.config.nms_metric
+        )
+        return boxes[keep], confidences[keep], [all_labels[i] for i in keep]
+
+    def close(self) -> None:
+        """
+        Does nothing: the wrapped detector is closed by its owner.
+        """
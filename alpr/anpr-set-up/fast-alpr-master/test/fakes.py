@@ -0,0 +1,46 @@
+"""
+Model-free detector and OCR stand-ins used by the unit tests.
+"""
+
+import numpy as np
+
+from fast_alpr.base import BaseDetector, BaseOCR, BoundingBox, DetectionResult, OcrResult
+
+
+class FakeDetector(BaseDetector):
+    """Returns the same boxes for every frame."""
+
+    def __init__(self, boxes: list[tuple[int, int, int, int]], confidence: float = 0.9) -> None:
+        self.boxes = boxes
+        self.confidence = confidence
+        self.frames: list[np.ndarray] = []
+
+    def predict(self, frame: np.ndarray) -> list[DetectionResult]:
+        self.frames.append(frame)
+        return [
+            DetectionResult(
+                label="License Plate",
+                confidence=self.confidence,
+                bounding_box=BoundingBox(x1=x1, y1=y1, x2=x2, y2=y2),
+            )
+            for x1, y1, x2, y2 in self.boxes
+        ]
+
+
+class FakeOCR(BaseOCR):
+    """Returns a fixed text and records the crops it was given."""
+
+    def __init__(self, text: str = "ABC123", confidence: float = 0.95) -> None:
+        self.text = text
+        self.confidence = confidence
+        self.crops: list[np.ndarray] = []
+
+    def predict(self, cropped_plate: np.ndarray) -> OcrResult | None:
+        self.crops.append(cropped_plate)
+        return OcrResult(text=self.text, confidence=self.confidence)
+
+
+def textured_frame(height: int = 240, width: int = 320, seed: int = 0) -> np.ndarray:
+    """Mid-gray frame with sharp noise, which passes the default crop quality checks."""
+    rng = np.random.default_rng(seed)
+    return rng.integers(60, 200, size=(height, width, 3), dtype=np.uint8)
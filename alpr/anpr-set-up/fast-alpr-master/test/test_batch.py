@@ -0,0 +1,95 @@
+"""
+Test batched prediction.
+"""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from fast_alpr.alpr import ALPR
+from fast_alpr.base import OcrResult
+from fast_alpr.default_ocr import DefaultOCR
+from fast_alpr.quality import SKIP_TOO_SMALL, CropQualityConfig
+
+from .fakes import FakeDetector, FakeOCR, textured_frame
+
+
+class BatchRecordingOCR(FakeOCR):
+    """FakeOCR that records the size of each predict_batch call."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.batch_sizes: list[int] = []
+
+    def predict_batch(self, cropped_plates: list[np.ndarray]) -> list[OcrResult | None]:
+        self.batch_sizes.append(len(cropped_plates))
+        return [OcrResult(text=f"P{crop.shape[1]}", confidence=0.9) for crop in cropped_plates]
+
+
+def test_predict_batch_runs_one_ocr_call_for_all_frames() -> None:
+    detector = FakeDetector([(10, 10, 170, 50), (200, 200, 210, 204), (20, 100, 100, 130)])
+    ocr = BatchRecordingOCR()
+    alpr = ALPR(detector=detector, ocr=ocr, crop_quality=CropQualityConfig())
+    frames = [textured_frame(seed=seed) for seed in range(3)]
+
+    results = alpr.predict_batch(frames)
+
+    assert ocr.batch_sizes == [6]
+    assert not ocr.crops
+    assert len(results) == 3
+    for frame_results in results:
+        assert [r.ocr.text if r.ocr else None for r in frame_results] == ["P160", None, "P80"]
+        assert frame_results[1].skip_reason == SKIP_TOO_SMALL
+
+
+def test_predict_batch_matches_predict() -> None:
+    alpr = ALPR(detector=FakeDetector([(10, 10, 170, 50), (-5, 100, 120, 140)]), ocr=FakeOCR())
+    frames = [textured_frame(seed=seed) for seed in range(2)]
+    assert alpr.predict_batch(frames) == [alpr.predict(frame) for frame in frames]
+
+
+def test_predict_batch_without_detections() -> None:
+    ocr = BatchRecordingOCR()
+    alpr = ALPR(detector=FakeDetector([]), ocr=ocr)
+    assert alpr.predict_batch([textured_frame(), textured_frame()]) == [[], []]
+    assert not alpr.predict_batch([])
+    assert not ocr.batch_sizes
+
+
+@pytest.mark.parametrize("color_mode", ["rgb", "grayscale"])
+def test_default_ocr_predict_batch_matches_predict(color_mode: str) -> None:
+    def run(source, return_confidence: bool = False):
+        assert return_confidence
+        crops = source if isinstance(source, list) else [source]
+        for crop in crops:
+            assert crop.ndim == (2 if color_mode == "grayscale" else 3)
+        texts = [f"AB{crop.shape[1]}__" for crop in crops]
+        probs = np.array([[0.9, 0.8, 0.7, 0.6, 0.5] for _ in crops], dtype=np.float32)
+        return texts, probs
+
+    ocr = DefaultOCR.__new__(DefaultOCR)
+    ocr.ocr_model = SimpleNamespace(  # type: ignore[assignment]
+        config=SimpleNamespace(image_color_mode=color_mode), run=run
+    )
+    crops = [textured_frame(40, width) for width in (120, 90, 150)]
+
+    batch = ocr.predict_batch(crops)
+    assert batch == [ocr.predict(crop) for crop in crops]
+    assert [r.text for r in batch if r is not None] == ["AB120", "AB90", "AB150"]
+    assert not ocr.predict_batch([])
+
+
+def test_read_plates_skips_detection_and_batches_ocr() -> None:
+    detector = FakeDetector([(0, 0, 10, 10)])
+    ocr = BatchRecordingOCR()
+    alpr = ALPR(detector=detector, ocr=ocr, crop_quality=CropQualityConfig())
+    crops = [textured_frame(40, 160, seed=0), textured_frame(4, 10), textured_frame(50, 200)]
+
+    results = alpr.read_plates(crops)
+
+    assert not detector.frames
+    assert ocr.batch_sizes == [2]
+    assert [r.ocr.text if r.ocr else None for r in results] == ["P160", None, "P200"]
+    assert results[1].skip_reason == SKIP_TOO_SMALL
+    assert results[2].detection.bounding_box.x2 == 200
@@ -0,0 +1,145 @@
+"""
+Test the OCR and detector model cascade.
+"""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from fast_alpr.alpr import ALPR
+from fast_alpr.base import OcrResult
+from fast_alpr.cascade import (
+    ESCALATE_INVALID_FORMAT,
+    ESCALATE_LOW_CONFIDENCE,
+    ESCALATE_NO_DETECTION,
+    CascadeConfig,
+    CascadeDetector,
+    CascadeOCR,
+)
+from fast_alpr.model_registry import ModelRegistry
+from fast_alpr.plate_format import IRISH_PLATE_FORMATS, PlateFormat
+
+from .fakes import FakeDetector, FakeOCR, textured_frame
+
+CROP = textured_frame(40, 160)
+
+
+class ScriptedOCR(FakeOCR):
+    """Returns the queued results in order."""
+
+    def __init__(self, results: list[OcrResult | None]) -> None:
+        super().__init__()
+        self.results = list(results)
+
+    def predict(self, cropped_plate: np.ndarray) -> OcrResult | None:
+        self.crops.append(cropped_plate)
+        return self.results.pop(0)
+
+
+def test_confident_reading_is_not_escalated() -> None:
+    accurate = FakeOCR("191D12345")
+    cascade = CascadeOCR(FakeOCR("191D12345", 0.97), accurate, CascadeConfig(min_confidence=0.9))
+
+    assert cascade.predict(CROP) == OcrResult("191D12345", 0.97)
+    assert not accurate.crops
+    stats = cascade.stats()
+    assert (stats.calls, stats.escalated, stats.escalation_rate) == (1, 0, 0.0)
+
+
+def test_low_confidence_is_reread() -> None:
+    accurate = FakeOCR("191D12345", 0.93)
+    cascade = CascadeOCR(FakeOCR("191D1234S", 0.6), accurate)
+
+    assert cascade.predict(CROP) == OcrResult("191D12345", 0.93)
+    stats = cascade.stats()
+    assert (stats.escalated, stats.replaced) == (1, 1)
+    assert stats.reasons == {ESCALATE_LOW_CONFIDENCE: 1}
+
+
+def test_invalid_format_is_reread_and_valid_reading_wins() -> None:
+    config = CascadeConfig(min_confidence=None, plate_formats=IRISH_PLATE_FORMATS)
+    # The accurate reading is less confident, but it is a valid plate
+    cascade = CascadeOCR(FakeOCR("19lD12345", 0.99), FakeOCR("191-D-12345", 0.8), config)
+
+    assert cascade.predict(CROP) == OcrResult("191-D-12345", 0.8)
+    assert cascade.stats().reasons == {ESCALATE_INVALID_FORMAT: 1}
+
+
+def test_keep_best_keeps_more_confident_first_reading() -> None:
+    cascade = CascadeOCR(FakeOCR("ABC123", 0.85), FakeOCR("ABC128", 0.6))
+    assert cascade.predict(CROP) == OcrResult("ABC123", 0.85)
+    assert cascade.stats().replaced == 0
+
+    always = CascadeOCR(
+        FakeOCR("ABC123", 0.85), FakeOCR("ABC128", 0.6), CascadeConfig(keep_best=False)
+    )
+    assert always.predict(CROP) == OcrResult("ABC128", 0.6)
+
+
+def test_batch_rereads_only_escalated_crops() -> None:
+    fast = ScriptedOCR([OcrResult("AAA111", 0.95), None, OcrResult("CCC333", 0.5)])
+    accurate = ScriptedOCR([OcrResult("BBB222", 0.9), OcrResult("CCC333", 0.92)])
+    cascade = CascadeOCR(fast, accurate)
+    crops = [textured_frame(40, 160, seed=i) for i in range(3)]
+
+    results = cascade.predict_batch(crops)
+    assert [r.text if r else None for r in results] == ["AAA111", "BBB222", "CCC333"]
+    assert accurate.crops[0] is crops[1]
+    assert accurate.crops[1] is crops[2]
+    stats = cascade.stats()
+    assert (stats.calls, stats.escalated, stats.replaced) == (3, 2, 2)
+    assert stats.escalation_rate == pytest.approx(2 / 3)
+
+
+def test_detector_fallback_runs_only_on_empty_frames() -> None:
+    fallback = FakeDetector([(20, 20, 180, 60)])
+    cascade = CascadeDetector(FakeDetector([]), fallback)
+    assert len(cascade.predict(textured_frame())) == 1
+    assert len(fallback.frames) == 1
+
+    busy = CascadeDetector(FakeDetector([(10, 10, 170, 50)]), fallback)
+    busy.predict(textured_frame())
+    assert len(fallback.frames) == 1
+
+    stats = cascade.stats()
+    assert (stats.calls, stats.escalated, stats.replaced) == (1, 1, 1)
+    assert stats.reasons == {ESCALATE_NO_DETECTION: 1}
+
+
+def test_alpr_builds_fallback_detector_from_registry() -> None:
+    raw = np.array([[0, 10, 10, 170, 50, 0, 0.8]], dtype=np.float32)
+    registry = ModelRegistry()
+    registry.acquire(
+        registry.detector_key("yolo-v9-s-608-license-plate-end2end"),
+        lambda: SimpleNamespace(
+            model=SimpleNamespace(run=lambda *_: [raw.copy()]),
+            img_size=(608, 608),
+            input_name="images",
+            output_name="output",
+            conf_thresh=0.1,
+            class_labels=["License Plate"],
+        ),
+    )
+    alpr = ALPR(
+        detector=FakeDetector([]),
+        ocr=FakeOCR(),
+        model_registry=registry,
+        cascade=CascadeConfig(ocr_model=None, detector_model="yolo-v9-s-608-license-plate-end2end"),
+    )
+
+    results = alpr.predict(np.zeros((608, 608, 3), dtype=np.uint8))
+    assert [r.ocr.text if r.ocr else None for r in results] == ["ABC123"]
+    assert alpr.cascade_stats()["detector"].replaced == 1
+    assert "ocr" not in alpr.cascade_stats()
+
+    alpr.close()
+    assert registry.models()[0].refs == 1
+
+
+def test_plate_format_matches_with_or_without_separators() -> None:
+    plate_format = PlateFormat(IRISH_PLATE_FORMATS[0])
+    assert plate_format.matches("191-D-12345")
+    assert plate_format.matches("06MH4321")
+    assert not plate_format.matches("D-12345")
+    assert not plate_format.matches("191-D-")
@@ -0,0 +1,151 @@
+"""
+Test the shared model registry.
+"""
+
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import onnxruntime as ort
+import pytest
+
+from fast_alpr.alpr import ALPR
+from fast_alpr.default_detector import DefaultDetector
+from fast_alpr.model_registry import ModelKey, ModelRegistry, session_options_key
+
+from .fakes import FakeOCR
+
+KEY = ModelKey(kind="detector", model="test-model")
+
+
+class Loader:
+    """Counts loads and returns a new object for each."""
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.loads = 0
+        self.delay = delay
+
+    def __call__(self) -> object:
+        self.loads += 1
+        time.sleep(self.delay)
+        return object()
+
+
+def test_same_key_shares_one_model() -> None:
+    registry = ModelRegistry()
+    load = Loader()
+
+    first = registry.acquire(KEY, load)
+    assert registry.acquire(KEY, load) is first
+    assert registry.acquire(ModelKey(kind="detector", model="other"), load) is not first
+    assert load.loads == 2
+    assert len(registry) == 2
+
+
+def test_concurrent_acquire_loads_once() -> None:
+    registry = ModelRegistry()
+    load = Loader(delay=0.05)
+    models: list[object] = []
+
+    threads = [
+        threading.Thread(target=lambda: models.append(registry.acquire(KEY, load)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert load.loads == 1
+    assert all(model is models[0] for model in models)
+    assert registry.models()[0].refs == 8
+
+
+def test_release_unloads_after_last_user() -> None:
+    registry = ModelRegistry()
+    load = Loader()
+    model = registry.acquire(KEY, load)
+    registry.acquire(KEY, load)
+
+    assert registry.release(model)
+    assert len(registry) == 1
+    assert registry.release(model)
+    assert len(registry) == 0
+    assert not registry.release(model)
+
+    # Loaded again on the next request
+    assert registry.acquire(KEY, load) is not model
+    assert load.loads == 2
+
+
+def test_unload_ignores_references() -> None:
+    registry = ModelRegistry()
+    model = registry.acquire(KEY, Loader())
+    registry.acquire(KEY, Loader())
+
+    assert registry.unload(KEY)
+    assert len(registry) == 0
+    assert not registry.release(model)
+    assert not registry.unload(model)
+
+
+def test_failed_load_is_not_cached() -> None:
+    registry = ModelRegistry()
+
+    def fail() -> object:
+        raise RuntimeError("download failed")
+
+    with pytest.raises(RuntimeError):
+        registry.acquire(KEY, fail)
+    assert len(registry) == 0
+    assert registry.acquire(KEY, Loader()) is not None
+
+
+def test_session_options_key() -> None:
+    assert session_options_key(None) is None
+    first, second = ort.SessionOptions(), ort.SessionOptions()
+    assert session_options_key(first) == session_options_key(second)
+    second.intra_op_num_threads = 2
+    assert session_options_key(first) != session_options_key(second)
+
+
+def test_alprs_share_detector_and_release_on_close() -> None:
+    registry = ModelRegistry()
+    shared = SimpleNamespace(conf_thresh=0.25)
+    key = registry.detector_key("yolo-v9-t-384-license-plate-end2end")
+    registry.acquire(key, lambda: shared)
+
+    first = ALPR(ocr=FakeOCR(), model_registry=registry, detector_conf_thresh=0.5)
+    second = ALPR(ocr=FakeOCR(), model_registry=registry, detector_conf_thresh=0.7)
+    assert isinstance(first.detector, DefaultDetector)
+    assert isinstance(second.detector, DefaultDetector)
+    assert first.detector.detector is second.detector.detector is shared
+    # Each keeps its own threshold
+    assert (first.detector.conf_thresh, second.detector.conf_thresh) == (0.5, 0.7)
+    assert registry.models()[0].refs == 3
+
+    first.close()
+    second.close()
+    first.close()
+    assert registry.models()[0].refs == 1
+    assert registry.release(shared)
+    assert len(registry) == 0
+
+
+def test_detector_threshold_applies_to_shared_model() -> None:
+    raw = np.array([[0, 10, 10, 50, 30, 0, 0.6], [0, 60, 10, 100, 30, 0, 0.3]], dtype=np.float32)
+    shared = SimpleNamespace(
+        model=SimpleNamespace(run=lambda *_: [raw.copy()]),
+        img_size=(384, 384),
+        input_name="images",
+        output_name="output",
+        conf_thresh=0.1,
+        class_labels=["License Plate"],
+    )
+    registry = ModelRegistry()
+    registry.acquire(registry.detector_key("yolo-v9-t-384-license-plate-end2end"), lambda: shared)
+    detector = DefaultDetector(conf_thresh=0.5, registry=registry)
+
+    _, confidences, _ = detector.predict_arrays(np.zeros((384, 384, 3), dtype=np.uint8))
+    assert confidences.tolist() == [np.float32(0.6)]
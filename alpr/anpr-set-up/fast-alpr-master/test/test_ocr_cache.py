@@ -0,0 +1,100 @@
+"""
+Test OCR result caching.
+"""
+
+import numpy as np
+import pytest
+
+from fast_alpr.alpr import ALPR
+from fast_alpr.base import OcrResult
+from fast_alpr.ocr_cache import OcrCache, OcrCacheConfig
+
+from .fakes import FakeDetector, FakeOCR, textured_frame
+
+
+def test_repeated_frame_hits_cache() -> None:
+    ocr = FakeOCR()
+    alpr = ALPR(detector=FakeDetector([(10, 10, 170, 50)]), ocr=ocr, ocr_cache=OcrCacheConfig())
+    frame = textured_frame()
+
+    first = alpr.predict(frame)
+    assert alpr.predict(frame.copy()) == first
+    assert len(ocr.crops) == 1
+
+    assert alpr.ocr_cache is not None
+    stats = alpr.ocr_cache.stats()
+    assert (stats.hits, stats.misses, stats.size) == (1, 1, 1)
+    assert stats.hit_rate == pytest.approx(0.5)
+
+
+def test_small_noise_and_jitter_still_hit() -> None:
+    frame = textured_frame()
+    noisy = np.clip(frame.astype(np.int16) + 1, 0, 255).astype(np.uint8)
+    cache = OcrCache()
+
+    cache.put(cache.crop_key(16, 16, 176, 48, frame[16:48, 16:176]), OcrResult("ABC123", 0.9))
+    assert cache.get(cache.crop_key(17, 15, 175, 49, noisy[16:48, 16:176])) is not None
+
+
+def test_changed_crop_misses() -> None:
+    ocr = FakeOCR()
+    alpr = ALPR(detector=FakeDetector([(10, 10, 170, 50)]), ocr=ocr, ocr_cache=OcrCacheConfig())
+    alpr.predict(textured_frame(seed=0))
+    alpr.predict(textured_frame(seed=1))
+    assert len(ocr.crops) == 2
+    assert alpr.ocr_cache is not None
+    assert alpr.ocr_cache.stats().changed == 1
+
+
+def test_ttl_expiry(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = [100.0]
+    monkeypatch.setattr("fast_alpr.ocr_cache.time.monotonic", lambda: now[0])
+    cache = OcrCache(OcrCacheConfig(ttl_seconds=5.0))
+    key = cache.crop_key(10, 10, 170, 50, textured_frame(40, 160))
+    cache.put(key, OcrResult(text="ABC123", confidence=0.9))
+
+    now[0] += 4.0
+    assert cache.get(key) is not None
+    now[0] += 2.0
+    assert cache.get(key) is None
+
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.expired, stats.size) == (1, 1, 1, 0)
+
+
+def test_lru_eviction() -> None:
+    cache = OcrCache(OcrCacheConfig(max_entries=2))
+    crop = textured_frame(40, 160)
+    a, b, c = (cache.crop_key(x, 10, x + 160, 50, crop) for x in (0, 100, 200))
+    for key in (a, b):
+        cache.put(key, OcrResult(text="ABC123", confidence=0.9))
+    assert cache.get(a) is not None
+    cache.put(c, OcrResult(text="ABC123", confidence=0.9))
+
+    assert cache.get(b) is None
+    assert cache.get(a) is not None
+    assert cache.stats().evictions == 1
+
+
+def test_unreadable_crops_are_not_cached() -> None:
+    cache = OcrCache()
+    cache.put(cache.crop_key(10, 10, 170, 50, textured_frame(40, 160)), None)
+    assert len(cache) == 0
+
+
+def test_predict_batch_only_sends_uncached_crops() -> None:
+    ocr = FakeOCR()
+    alpr = ALPR(
+        detector=FakeDetector([(10, 10, 170, 50), (20, 100, 100, 130)]),
+        ocr=ocr,
+        ocr_cache=OcrCacheConfig(),
+    )
+    frames = [textured_frame(seed=0), textured_frame(seed=1)]
+    alpr.predict(frames[0])
+    assert len(ocr.crops) == 2
+
+    # Frame 0 is answered from the cache, frame 1 goes to the OCR and replaces its entries
+    results = alpr.predict_batch(frames)
+    assert len(ocr.crops) == 4
+    assert results[1] == alpr.predict(frames[1])
+    assert len(ocr.crops) == 4
@@ -0,0 +1,98 @@
+"""
+Test the stage-parallel pipeline.
+"""
+
+import threading
+import time
+
+import pytest
+
+from fast_alpr.alpr import ALPR
+from fast_alpr.pipeline import Pipeline, Stage, alpr_pipeline
+
+from .fakes import FakeDetector, FakeOCR, textured_frame
+
+
+def test_results_keep_input_order_with_several_workers() -> None:
+    def slow_on_even(x: int) -> int:
+        time.sleep(0.02 if x % 2 == 0 else 0.0)
+        return x * 10
+
+    pipeline = Pipeline([Stage("a", slow_on_even, workers=4), Stage("b", lambda x: x + 1)])
+    results = list(pipeline.run(range(20)))
+
+    assert [r.index for r in results] == list(range(20))
+    assert [r.value for r in results] == [x * 10 + 1 for x in range(20)]
+    assert [s.items for s in pipeline.stats()] == [20, 20]
+
+
+def test_next_item_is_detected_while_previous_is_read() -> None:
+    second_detected = threading.Event()
+
+    def detect(x: int) -> int:
+        if x == 1:
+            second_detected.set()
+        return x
+
+    def read(x: int) -> bool:
+        # Run one stage at a time and this times out
+        return x != 0 or second_detected.wait(timeout=5)
+
+    pipeline = Pipeline([Stage("detect", detect), Stage("ocr", read)])
+    assert [r.value for r in pipeline.run([0, 1, 2])] == [True, True, True]
+
+
+def test_failing_item_does_not_stop_the_others() -> None:
+    def parse(x: str) -> int:
+        return int(x)
+
+    pipeline = Pipeline([Stage("parse", parse), Stage("double", lambda x: x * 2)])
+    results = list(pipeline.run(["1", "x", "3"]))
+
+    assert [r.value for r in results] == [2, None, 6]
+    assert (results[1].ok, results[1].stage, results[1].item) == (False, "parse", "x")
+    assert isinstance(results[1].error, ValueError)
+    stats = {s.name: s for s in pipeline.stats()}
+    assert (stats["parse"].errors, stats["double"].items) == (1, 2)
+
+
+def test_input_is_read_only_as_fast_as_the_pipeline_drains() -> None:
+    taken = []
+
+    def endless():
+        i = 0
+        while True:
+            taken.append(i)
+            yield i
+            i += 1
+
+    pipeline = Pipeline([Stage("slow", lambda x: x, queue_size=2)])
+    results = pipeline.run(endless())
+    assert next(results).index == 0
+    time.sleep(0.1)
+    assert len(taken) <= pipeline.max_in_flight + 2
+
+    threads = threading.active_count()
+    results.close()
+    assert threading.active_count() < threads
+
+
+def test_alpr_pipeline_matches_predict() -> None:
+    alpr = ALPR(detector=FakeDetector([(20, 20, 180, 60), (200, 100, 300, 140)]), ocr=FakeOCR())
+    frames = [textured_frame(seed=i) for i in range(6)]
+
+    pipeline = alpr_pipeline(alpr, detect_workers=2, ocr_workers=2)
+    results = list(pipeline.run(frames))
+    assert [r.value for r in results] == [alpr.predict(frame) for frame in frames]
+    assert [s.name for s in pipeline.stats()] == ["decode", "detect", "ocr"]
+    assert pipeline.bottleneck() in {"decode", "detect", "ocr"}
+
+    annotated = alpr_pipeline(alpr, output=lambda frame, plates: (frame.shape, len(plates)))
+    assert next(annotated.run(frames)).value == ((240, 320, 3), 2)
+
+
+def test_invalid_stages() -> None:
+    with pytest.raises(ValueError, match="workers"):
+        Stage("a", str, workers=0)
+    with pytest.raises(ValueError, match="unique"):
+        Pipeline([Stage("a", str), Stage("a", str)])
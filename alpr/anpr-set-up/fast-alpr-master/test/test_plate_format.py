@@ -0,0 +1,149 @@
+"""
+Test format-constrained plate decoding.
+"""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from fast_alpr.default_ocr import DefaultOCR
+from fast_alpr.plate_format import FormatConstrainedDecoder, PlateFormat
+
+ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_"
+SLOTS = 10
+
+
+def plate_probabilities(slots: list[dict[str, float]]) -> np.ndarray:
+    """
+    Probability matrix with the given distribution per slot, padded with `_`.
+
+    The mass a slot does not assign is spread evenly over the other symbols.
+    """
+    probs = np.zeros((SLOTS, len(ALPHABET)), dtype=np.float32)
+    for i in range(SLOTS):
+        slot = slots[i] if i < len(slots) else {"_": 0.99}
+        rest = (1.0 - sum(slot.values())) / (len(ALPHABET) - len(slot))
+        probs[i] = rest
+        for char, prob in slot.items():
+            probs[i, ALPHABET.index(char)] = prob
+    return probs
+
+
+def confident(text: str) -> list[dict[str, float]]:
+    return [{char: 0.95} for char in text]
+
+
+def test_valid_plate_gets_separators() -> None:
+    decoded = FormatConstrainedDecoder().decode(
+        plate_probabilities(confident("191D12345")), ALPHABET, "_"
+    )
+    assert decoded is not None
+    assert decoded.text == "191-D-12345"
+    assert decoded.probabilities.shape == (SLOTS,)
+
+
+def test_format_resolves_confusable_characters() -> None:
+    # Slot 1 reads more like an "O" and slot 3 more like a "0"
+    slots = [*confident("1"), {"O": 0.55, "0": 0.4}, *confident("1"), {"0": 0.5, "D": 0.45}]
+    slots += confident("123")
+    probs = plate_probabilities(slots)
+
+    decoded = FormatConstrainedDecoder().decode(probs, ALPHABET, "_")
+    assert decoded is not None
+    assert decoded.text == "101-D-123"
+
+
+def test_two_digit_year_and_county() -> None:
+    decoded = FormatConstrainedDecoder().decode(
+        plate_probabilities(confident("06MH4321")), ALPHABET, "_"
+    )
+    assert decoded is not None
+    assert decoded.text == "06-MH-4321"
+
+
+def test_foreign_plate_falls_back() -> None:
+    probs = plate_probabilities(confident("ABC1234"))
+    assert FormatConstrainedDecoder().decode(probs, ALPHABET, "_") is None
+    forced = FormatConstrainedDecoder(max_cost=None).decode(probs, ALPHABET, "_")
+    assert forced is not None
+
+
+def test_best_of_several_formats() -> None:
+    decoder = FormatConstrainedDecoder([r"\l{3} \d{3}", r"\d{3}-\l{2}"])
+    decoded = decoder.decode(plate_probabilities(confident("ABC123")), ALPHABET, "_")
+    assert decoded is not None
+    assert decoded.text == "ABC 123"
+
+
+def test_plate_too_long_for_slots() -> None:
+    decoder = FormatConstrainedDecoder([r"\d{11}"], max_cost=None)
+    assert decoder.decode(plate_probabilities(confident("1234")), ALPHABET, "_") is None
+
+
+@pytest.mark.parametrize("pattern", ["", "[A-Z", "[]", r"\d{3,1}", "A|B"])
+def test_invalid_formats(pattern: str) -> None:
+    with pytest.raises(ValueError):
+        PlateFormat(pattern)
+
+
+def test_default_ocr_uses_decoder(monkeypatch: pytest.MonkeyPatch) -> None:
+    ocr = DefaultOCR.__new__(DefaultOCR)
+    monkeypatch.setattr(
+        ocr,
+        "ocr_model",
+        SimpleNamespace(config=SimpleNamespace(alphabet=ALPHABET, pad_char="_")),
+        raising=False,
+    )
+    ocr.decoder = FormatConstrainedDecoder()
+    outputs = np.stack(
+        [
+            plate_probabilities([*confident("1"), {"O": 0.55, "0": 0.4}, *confident("1D7")]),
+            plate_probabilities(confident("ABC1234")),
+        ]
+    )
+    monkeypatch.setattr(ocr, "_model_probabilities", lambda crops: outputs[: len(crops)])
+
+    crop = np.zeros((32, 128, 3), dtype=np.uint8)
+    first, foreign = ocr.predict_batch([crop, crop])
+    assert first is not None and foreign is not None
+    assert first.text == "101-D-7"
+    assert foreign.text == "ABC1234"
+    assert foreign.confidence == pytest.approx((7 * 0.95 + 3 * 0.99) / 10)
+
+    single = ocr.predict(crop)
+    assert single is not None
+    assert single.text == "101-D-7"
+
+
+def test_model_probabilities_resizes_crops(monkeypatch: pytest.MonkeyPatch) -> None:
+    ocr = DefaultOCR.__new__(DefaultOCR)
+    inputs = []
+
+    def run(_, feeds: dict[str, np.ndarray]) -> list[np.ndarray]:
+        inputs.append(feeds["input"])
+        return [np.zeros((len(feeds["input"]), SLOTS * len(ALPHABET)), dtype=np.float32)]
+
+    config = SimpleNamespace(
+        alphabet=ALPHABET,
+        pad_char="_",
+        max_plate_slots=SLOTS,
+        img_height=64,
+        img_width=128,
+        image_color_mode="grayscale",
+        keep_aspect_ratio=True,
+        interpolation="linear",
+        padding_color=(114, 114, 114),
+    )
+    monkeypatch.setattr(
+        ocr,
+        "ocr_model",
+        SimpleNamespace(config=config, model=SimpleNamespace(run=run)),
+        raising=False,
+    )
+
+    crops = [np.zeros((30, 100, 3), dtype=np.uint8), np.zeros((50, 90, 3), dtype=np.uint8)]
+    probabilities = ocr._model_probabilities(crops)  # pylint: disable=protected-access
+    assert probabilities.shape == (2, SLOTS, len(ALPHABET))
+    assert inputs[0].shape == (2, 64, 128, 1)
+    assert inputs[0].dtype == np.uint8
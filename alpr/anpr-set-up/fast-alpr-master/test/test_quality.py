@@ -0,0 +1,67 @@
+"""
+Test crop quality checks.
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+from fast_alpr.alpr import ALPR
+from fast_alpr.quality import (
+    SKIP_BAD_ASPECT_RATIO,
+    SKIP_BLURRY,
+    SKIP_OVEREXPOSED,
+    SKIP_TOO_SMALL,
+    SKIP_UNDEREXPOSED,
+    CropQualityConfig,
+    assess_crop_quality,
+)
+
+from .fakes import FakeDetector, FakeOCR, textured_frame
+
+
+def test_good_crop_passes() -> None:
+    crop = textured_frame(40, 160)
+    assert assess_crop_quality(crop, CropQualityConfig()) is None
+
+
+@pytest.mark.parametrize(
+    "crop, expected_reason",
+    [
+        (textured_frame(6, 20), SKIP_TOO_SMALL),
+        (textured_frame(0, 0), SKIP_TOO_SMALL),
+        (textured_frame(10, 200), SKIP_BAD_ASPECT_RATIO),
+        (np.full((40, 160, 3), 5, dtype=np.uint8), SKIP_UNDEREXPOSED),
+        (np.full((40, 160, 3), 250, dtype=np.uint8), SKIP_OVEREXPOSED),
+        (cv2.GaussianBlur(textured_frame(40, 160), (0, 0), 6), SKIP_BLURRY),
+    ],
+)
+def test_bad_crop_is_skipped(crop: np.ndarray, expected_reason: str) -> None:
+    assert assess_crop_quality(crop, CropQualityConfig()) == expected_reason
+
+
+def test_disabled_checks() -> None:
+    config = CropQualityConfig(
+        min_width=None,
+        min_height=None,
+        min_aspect_ratio=None,
+        max_aspect_ratio=None,
+        min_brightness=None,
+        max_brightness=None,
+        min_sharpness=None,
+    )
+    assert assess_crop_quality(np.zeros((4, 4, 3), dtype=np.uint8), config) is None
+
+
+def test_alpr_skips_ocr_for_bad_crops() -> None:
+    ocr = FakeOCR()
+    alpr = ALPR(
+        detector=FakeDetector([(10, 10, 170, 50), (200, 200, 210, 204)]),
+        ocr=ocr,
+        crop_quality=CropQualityConfig(),
+    )
+    results = alpr.predict(textured_frame())
+    assert len(results) == 2
+    assert results[0].ocr is not None and results[0].skip_reason is None
+    assert results[1].ocr is None and results[1].skip_reason == SKIP_TOO_SMALL
+    assert len(ocr.crops) == 1
@@ -0,0 +1,155 @@
+"""
+Test result types and the array-backed result path.
+"""
+
+import dataclasses
+import pickle
+from types import SimpleNamespace
+from typing import Any
+
+import numpy as np
+import pytest
+from open_image_models.detection.core.yolo_v9.postprocess import convert_to_detection_result
+from open_image_models.detection.core.yolo_v9.preprocess import preprocess
+
+from fast_alpr.alpr import ALPR, ALPRArrayResult, ALPRResult
+from fast_alpr.base import BoundingBox, DetectionResult, OcrResult
+from fast_alpr.default_detector import DefaultDetector
+from fast_alpr.model_registry import ModelRegistry
+from fast_alpr.quality import SKIP_TOO_SMALL, CropQualityConfig
+
+from .fakes import FakeDetector, FakeOCR, textured_frame
+
+
+@pytest.mark.parametrize(
+    "result",
+    [
+        BoundingBox(x1=1, y1=2, x2=3, y2=4),
+        DetectionResult(label="lp", confidence=0.5, bounding_box=BoundingBox(1, 2, 3, 4)),
+        OcrResult(text="ABC", confidence=0.9),
+        ALPRResult(
+            detection=DetectionResult(
+                label="lp", confidence=0.5, bounding_box=BoundingBox(1, 2, 3, 4)
+            ),
+            ocr=OcrResult(text="ABC", confidence=0.9),
+        ),
+    ],
+)
+def test_results_are_slotted_and_frozen(result: Any) -> None:
+    assert not hasattr(result, "__dict__")
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        setattr(result, dataclasses.fields(result)[0].name, None)
+    assert pickle.loads(pickle.dumps(result)) == result
+
+
+def test_predict_arrays_matches_predict() -> None:
+    detector = FakeDetector([(10, 10, 170, 50), (-5, 100, 120, 140), (200, 200, 210, 204)])
+    alpr = ALPR(detector=detector, ocr=FakeOCR("XYZ789", 0.8), crop_quality=CropQualityConfig())
+    frame = textured_frame()
+
+    array_result = alpr.predict_arrays(frame)
+    assert isinstance(array_result, ALPRArrayResult)
+    assert array_result.boxes.shape == (3, 4)
+    assert array_result.boxes.dtype == np.int32
+    assert array_result.detection_confidences.shape == (3,)
+    assert array_result.texts == ["XYZ789", "XYZ789", None]
+    assert array_result.skip_reasons == [None, None, SKIP_TOO_SMALL]
+    assert np.isnan(array_result.ocr_confidences[2])
+
+    expected = alpr.predict(frame)
+    actual = array_result.to_results()
+    assert len(actual) == len(expected)
+    for got, want in zip(actual, expected, strict=True):
+        assert got.detection.bounding_box == want.detection.bounding_box
+        assert got.detection.confidence == pytest.approx(want.detection.confidence)
+        assert got.skip_reason == want.skip_reason
+        if want.ocr is None:
+            assert got.ocr is None
+        else:
+            assert got.ocr is not None
+            assert got.ocr.text == want.ocr.text
+            assert got.ocr.confidence == pytest.approx(want.ocr.confidence)
+
+
+def test_predict_arrays_without_detections() -> None:
+    alpr = ALPR(detector=FakeDetector([]), ocr=FakeOCR())
+    result = alpr.predict_arrays(textured_frame())
+    assert len(result) == 0
+    assert result.boxes.shape == (0, 4)
+    assert not list(result)
+
+
+def test_default_detector_arrays_match_open_image_models() -> None:
+    frame = textured_frame(480, 640)
+    # Rows are [batch_id, x1, y1, x2, y2, class_id, score] in model input coordinates
+    raw = np.array(
+        [
+            [0, 10.7, 120.2, 90.4, 150.9, 0, 0.91],
+            [0, 200.0, 180.5, 260.3, 200.1, 0, 0.55],
+            [0, 5.0, 5.0, 30.0, 20.0, 0, 0.1],
+        ],
+        dtype=np.float32,
+    )
+    session = SimpleNamespace(run=lambda *_: [raw.copy()])
+    registry = ModelRegistry()
+    registry.acquire(
+        registry.detector_key("yolo-v9-t-384-license-plate-end2end"),
+        lambda: SimpleNamespace(
+            model=session,
+            img_size=(384, 384),
+            input_name="images",
+            output_name="output",
+            conf_thresh=0.4,
+            class_labels=["License Plate"],
+        ),
+    )
+    detector = DefaultDetector(conf_thresh=0.4, registry=registry)
+
+    _, ratio, padding = preprocess(frame, (384, 384))
+    expected = convert_to_detection_result(
+        predictions=raw.copy(),
+        class_labels=["License Plate"],
+        ratio=ratio,
+        padding=padding,
+        score_threshold=0.4,
+    )
+    actual = detector.predict(frame)
+    assert len(actual) == len(expected) == 2
+    for got, want in zip(actual, expected, strict=True):
+        assert got.label == want.label
+        assert got.confidence == pytest.approx(want.confidence)
+        assert (
+            got.bounding_box.x1,
+            got.bounding_box.y1,
+            got.bounding_box.x2,
+            got.bounding_box.y2,
+        ) == (
+            want.bounding_box.x1,
+            want.bounding_box.y1,
+            want.bounding_box.x2,
+            want.bounding_box.y2,
+        )
+
+
+def test_default_detector_falls_back_to_public_predict() -> None:
+    # A detector without the internals `predict_arrays` runs its session through
+    plates = [
+        DetectionResult(
+            label="License Plate", confidence=0.9, bounding_box=BoundingBox(1, 2, 3, 4)
+        ),
+        DetectionResult(
+            label="License Plate", confidence=0.3, bounding_box=BoundingBox(5, 6, 7, 8)
+        ),
+    ]
+    registry = ModelRegistry()
+    registry.acquire(
+        registry.detector_key("yolo-v9-t-384-license-plate-end2end"),
+        lambda: SimpleNamespace(predict=lambda _frame: plates),
+    )
+    detector = DefaultDetector(conf_thresh=0.5, registry=registry)
+
+    boxes, confidences, labels = detector.predict_arrays(textured_frame())
+    assert boxes.tolist() == [[1, 2, 3, 4]]
+    assert confidences.tolist() == pytest.approx([0.9])
+    assert labels == ["License Plate"]
+    assert len(detector.predict_arrays_batch([textured_frame()] * 2)) == 2
@@ -0,0 +1,157 @@
+"""
+Test tiled detection.
+"""
+
+import itertools
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from fast_alpr.alpr import ALPR
+from fast_alpr.base import BaseDetector, BoundingBox, DetectionResult
+from fast_alpr.default_detector import DefaultDetector
+from fast_alpr.model_registry import ModelRegistry
+from fast_alpr.tiling import (
+    TiledDetector,
+    TilingConfig,
+    non_max_suppression,
+    tile_boxes,
+    tile_starts,
+)
+
+from .fakes import FakeOCR
+
+
+class BrightBlobDetector(BaseDetector):
+    """
+    Finds white (255) regions, but only those still `min_width` wide at the model input size,
+    like a real detector missing plates that shrink to a few pixels.
+    """
+
+    def __init__(self, input_size: int = 384, min_width: int = 8) -> None:
+        self.input_size = input_size
+        self.min_width = min_width
+        self.calls = 0
+
+    def predict(self, frame: np.ndarray) -> list[DetectionResult]:
+        self.calls += 1
+        scale = self.input_size / max(frame.shape[:2])
+        mask = (frame == 255).all(axis=2)
+        results = []
+        for x1, x2 in _runs(mask.any(axis=0)):
+            ys = np.flatnonzero(mask[:, x1:x2].any(axis=1))
+            if (x2 - x1) * scale >= self.min_width:
+                box = BoundingBox(x1=x1, y1=int(ys[0]), x2=x2, y2=int(ys[-1]) + 1)
+                results.append(DetectionResult("License Plate", 0.9, box))
+        return results
+
+
+def _runs(columns: np.ndarray) -> list[tuple[int, int]]:
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], columns.astype(int), [0]])))
+    return list(zip(edges[0::2].tolist(), edges[1::2].tolist(), strict=True))
+
+
+def wide_frame(plates: list[tuple[int, int]], width: int = 3840, height: int = 2160) -> np.ndarray:
+    frame = np.full((height, width, 3), 90, dtype=np.uint8)
+    for x, y in plates:
+        frame[y : y + 12, x : x + 48] = 255
+    return frame
+
+
+def test_tiles_cover_the_frame_with_overlap() -> None:
+    assert tile_starts(500, 640, 0.2) == [0]
+    starts = tile_starts(3840, 640, 0.25)
+    assert starts[0] == 0
+    assert starts[-1] == 3840 - 640
+    assert all(b - a <= 480 for a, b in itertools.pairwise(starts))
+
+    boxes = tile_boxes(1000, 300, TilingConfig(tile_size=400, overlap=0.5))
+    assert {(y1, y2) for _, y1, _, y2 in boxes} == {(0, 300)}
+    assert [x1 for x1, _, _, _ in boxes] == [0, 200, 400, 600]
+
+
+def test_nms_merges_partial_box_with_ios() -> None:
+    # A whole plate and the part of it a neighbouring tile saw
+    boxes = np.array([[100, 100, 160, 120], [130, 100, 160, 120], [400, 50, 450, 70]])
+    scores = np.array([0.9, 0.8, 0.7], dtype=np.float32)
+
+    assert non_max_suppression(boxes, scores, 0.5, "ios").tolist() == [0, 2]
+    # IoU of the two is only 0.5
+    assert non_max_suppression(boxes, scores, 0.5, "iou").tolist() == [0, 1, 2]
+    assert non_max_suppression(boxes, scores, 0.4, "iou").tolist() == [0, 2]
+
+
+def test_tiling_finds_small_distant_plates() -> None:
+    plates = [(200, 300), (2000, 1500), (3700, 2000)]
+    frame = wide_frame(plates)
+
+    assert BrightBlobDetector().predict_arrays(frame)[0].shape == (0, 4)
+    boxes, confidences, labels = TiledDetector(BrightBlobDetector()).predict_arrays(frame)
+    assert sorted(boxes.tolist()) == [[x, y, x + 48, y + 12] for x, y in plates]
+    assert confidences.shape == (3,)
+    assert labels == ["License Plate"] * 3
+
+
+def test_plate_on_tile_edge_is_reported_once() -> None:
+    config = TilingConfig(tile_size=640, overlap=0.25, include_full_frame=False)
+    # Straddles the right edge of the first tile (x = 640)
+    frame = wide_frame([(620, 100)], width=1280, height=640)
+
+    detections = TiledDetector(BrightBlobDetector(), config).predict(frame)
+    assert [d.bounding_box for d in detections] == [BoundingBox(620, 100, 668, 112)]
+
+
+def test_small_frames_are_not_tiled() -> None:
+    detector = BrightBlobDetector()
+    TiledDetector(detector, TilingConfig(tile_size=640)).predict(wide_frame([], 640, 480))
+    assert detector.calls == 1
+
+
+def test_alpr_tiling_reads_each_plate() -> None:
+    ocr = FakeOCR()
+    alpr = ALPR(detector=BrightBlobDetector(), ocr=ocr, tiling=TilingConfig())
+    results = alpr.predict(wide_frame([(500, 500), (3000, 1800)]))
+    assert len(results) == 2
+    assert len(ocr.crops) == 2
+
+
+def test_default_detector_batches_dynamic_models() -> None:
+    runs: list[int] = []
+
+    def run(_outputs: object, feeds: dict) -> list[np.ndarray]:
+        batch = feeds["images"].shape[0]
+        runs.append(batch)
+        return [np.array([[i, 10, 10, 50, 30, 0, 0.8] for i in range(batch)], dtype=np.float32)]
+
+    model = SimpleNamespace(
+        run=run, get_inputs=lambda: [SimpleNamespace(shape=["batch", 3, 64, 64])]
+    )
+    registry = ModelRegistry()
+    registry.acquire(
+        registry.detector_key("yolo-v9-t-384-license-plate-end2end"),
+        lambda: SimpleNamespace(
+            model=model,
+            img_size=(64, 64),
+            input_name="images",
+            output_name="output",
+            conf_thresh=0.1,
+            class_labels=["License Plate"],
+        ),
+    )
+    detector = DefaultDetector(registry=registry)
+    frames = [np.zeros((64, 64, 3), dtype=np.uint8)] * 3
+
+    results = detector.predict_arrays_batch(frames)
+    assert runs == [3]
+    assert [boxes.tolist() for boxes, _, _ in results] == [[[10, 10, 50, 30]]] * 3
+
+    # Fixed batch size of 1: one run per frame
+    model.get_inputs = lambda: [SimpleNamespace(shape=[1, 3, 64, 64])]
+    detector.predict_arrays_batch(frames)
+    assert runs == [3, 1, 1, 1]
+
+
+def test_invalid_config() -> None:
+    with pytest.raises(ValueError, match="overlap"):
+        TilingConfig(overlap=1.0)
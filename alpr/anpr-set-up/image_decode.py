@@ -0,0 +1,394 @@
+"""
+Memory-bounded image decoding for uploads.
+
+Full-resolution decodes of large photos are what blow up worker memory: a
+50 MP JPEG becomes a 150 MB BGR array before ALPR ever sees it. This module
+reads the image size from the file header, picks an OpenCV reduced-resolution
+decode (1/2, 1/4 or 1/8) that fits under a pixel budget, and decodes base64
+uploads in chunks into a reused per-thread buffer. Decode counters and
+per-request RSS are kept for the metrics endpoints.
+
+cv2 and numpy are imported on the first decode, so the metrics and the
+upload limits can be used without loading them.
+"""
+import binascii
+import resource
+import struct
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+DEFAULT_MAX_UPLOAD_BYTES = 25 * 1024 * 1024
+DEFAULT_MAX_PIXELS = 12_000_000
+
+# Chunk of base64 text decoded at a time (a multiple of 4)
+BASE64_CHUNK = 1 << 20
+
+# Decode reductions OpenCV supports natively (cv2.IMREAD_REDUCED_COLOR_<n>)
+REDUCTION_FACTORS = (1, 2, 4, 8)
+
+# JPEG start-of-frame markers (baseline, progressive, lossless, ...), which carry the size
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+class ImageTooLarge(ValueError):
+    """The upload or the decoded image is over the configured limit."""
+
+
+def image_size(data) -> Optional[Tuple[int, int]]:
+    """
+    Read (width, height) from a JPEG, PNG, WebP or BMP header without decoding.
+
+    Returns:
+        (width, height), or None if the format is not recognised
+    """
+    data = memoryview(data)
+    if len(data) < 26:
+        return None
+    head = bytes(data[:32])
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        width, height = struct.unpack('>II', head[16:24])
+        return width, height
+    if head.startswith(b'BM'):
+        width, height = struct.unpack('<ii', head[18:26])
+        return width, abs(height)
+    if head.startswith(b'RIFF') and head[8:12] == b'WEBP':
+        chunk = head[12:16]
+        if chunk == b'VP8 ' and len(head) >= 30:
+            width, height = struct.unpack('<HH', head[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b'VP8L':
+            bits = struct.unpack('<I', head[21:25])[0]
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b'VP8X':
+            return (
+                int.from_bytes(head[24:27], 'little') + 1,
+                int.from_bytes(head[27:30], 'little') + 1,
+            )
+        return None
+    if head.startswith(b'\xff\xd8'):
+        return _jpeg_size(data)
+    return None
+
+
+def _jpeg_size(data: memoryview) -> Optional[Tuple[int, int]]:
+    """Walk the JPEG segments up to the first start-of-frame marker."""
+    i = 2
+    end = len(data)
+    while i + 9 < end:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # Fill byte
+            i += 1
+            continue
+        if marker in _JPEG_SOF:
+            height, width = struct.unpack('>HH', data[i + 5:i + 9])
+            return width, height
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+            # Standalone markers have no length
+            i += 2
+            continue
+        i += 2 + struct.unpack('>H', data[i + 2:i + 4])[0]
+    return None
+
+
+def reduction_factor(width: int, height: int, max_pixels: int) -> int:
+    """
+    Smallest decode reduction (1, 2, 4 or 8) that brings width x height under max_pixels.
+
+    Raises:
+        ImageTooLarge: If even a 1/8 decode is over the budget
+    """
+    pixels = width * height
+    for factor in REDUCTION_FACTORS:
+        if pixels <= max_pixels * factor * factor:
+            return factor
+    raise ImageTooLarge(
+        f"Image is {width}x{height} ({pixels / 1e6:.0f} MP), "
+        f"over the {max_pixels * 64 / 1e6:.0f} MP limit"
+    )
+
+
+class DecodeStats:
+    """Thread-safe decode counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.decoded = 0
+        self.reduced = 0
+        self.resized = 0
+        self.rejected = 0
+        self.failed = 0
+        self.largest_source_pixels = 0
+
+    def record(self, outcome: str, source_pixels: int = 0):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            self.largest_source_pixels = max(self.largest_source_pixels, source_pixels)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "decoded": self.decoded,
+                "reduced": self.reduced,
+                "resized": self.resized,
+                "rejected": self.rejected,
+                "failed": self.failed,
+                "largest_source_pixels": self.largest_source_pixels,
+            }
+
+
+decode_stats = DecodeStats()
+
+
+def _imread_flag(factor: int) -> int:
+    """cv2.imread flag for a BGR decode reduced by `factor`."""
+    import cv2
+
+    if factor == 1:
+        return cv2.IMREAD_COLOR
+    return getattr(cv2, f'IMREAD_REDUCED_COLOR_{factor}')
+
+
+def decode_image(data, max_pixels: int = DEFAULT_MAX_PIXELS) -> Tuple['np.ndarray', int]:
+    """
+    Decode encoded image bytes to BGR, at reduced resolution if over the pixel budget.
+
+    JPEG, PNG, WebP and BMP sizes are read from the header, so the reduction
+    happens inside the decoder (for JPEG, without ever allocating the full
+    frame). Other formats are decoded in full and then shrunk.
+
+    Args:
+        data: Encoded image (bytes, bytearray, memoryview or uint8 array)
+        max_pixels: Pixel budget for the decoded frame
+
+    Returns:
+        (image, scale): multiply coordinates in `image` by `scale` to get
+        coordinates in the original image
+
+    Raises:
+        ImageTooLarge: If the image is too large even at 1/8 resolution
+        ValueError: If the data is empty or cannot be decoded
+    """
+    import cv2
+    import numpy as np
+
+    buf = np.frombuffer(data, np.uint8)
+    if not buf.size:
+        decode_stats.record("failed")
+        raise ValueError("Empty image data")
+
+    size = image_size(buf)
+    factor = 1
+    if size is not None:
+        try:
+            factor = reduction_factor(size[0], size[1], max_pixels)
+        except ImageTooLarge:
+            decode_stats.record("rejected", size[0] * size[1])
+            raise
+
+    img = cv2.imdecode(buf, _imread_flag(factor))
+    request_memory.sample()
+    if img is None:
+        decode_stats.record("failed")
+        raise ValueError("Failed to decode image")
+
+    height, width = img.shape[:2]
+    if size is None and width * height > max_pixels:
+        # Unknown header: only the output can be bounded
+        try:
+            factor = reduction_factor(width, height, max_pixels)
+        except ImageTooLarge:
+            decode_stats.record("rejected", width * height)
+            raise
+        img = cv2.resize(
+            img, (width // factor, height // factor), interpolation=cv2.INTER_AREA
+        )
+        decode_stats.record("resized", width * height)
+    elif factor > 1:
+        decode_stats.record("reduced", size[0] * size[1])
+    else:
+        decode_stats.record("decoded", width * height)
+    return img, factor
+
+
+def decode_image_file(path, max_pixels: int = DEFAULT_MAX_PIXELS) -> Tuple['np.ndarray', int]:
+    """`decode_image` for an image file. Raises ValueError if it cannot be read."""
+    import numpy as np
+
+    try:
+        data = np.fromfile(str(path), np.uint8)
+    except OSError:
+        decode_stats.record("failed")
+        raise ValueError(f"Failed to load image: {path}") from None
+    return decode_image(data, max_pixels)
+
+
+_local = threading.local()
+
+
+def crop_boxes(frame: 'np.ndarray', boxes, scale: int = 1) -> List['np.ndarray']:
+    """
+    Cut client-supplied boxes out of a decoded frame.
+
+    Args:
+        frame: Frame returned by decode_image / decode_image_file
+        boxes: [x1, y1, x2, y2] boxes in the original image's pixel coordinates
+        scale: The decode reduction factor returned with the frame
+
+    Returns:
+        One crop (a view of the frame) per box, clipped to the frame
+
+    Raises:
+        ValueError: If a box is not four numbers or is empty inside the frame
+    """
+    height, width = frame.shape[:2]
+    crops = []
+    for box in boxes:
+        if not isinstance(box, (list, tuple)) or len(box) != 4:
+            raise ValueError(f"Invalid box {box!r}: expected [x1, y1, x2, y2]")
+        x1, y1, x2, y2 = (int(float(v)) // scale for v in box)
+        x1, y1 = max(x1, 0), max(y1, 0)
+        x2, y2 = min(x2, width), min(y2, height)
+        if x2 <= x1 or y2 <= y1:
+            raise ValueError(f"Box {box!r} is empty or outside the image")
+        crops.append(frame[y1:y2, x1:x2])
+    return crops
+
+
+def _thread_buffer(size: int) -> bytearray:
+    """This thread's decode buffer, grown (never shrunk) to at least `size` bytes."""
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None or len(buffer) < size:
+        buffer = bytearray(size)
+        _local.buffer = buffer
+    return buffer
+
+
+def decode_base64(text: str, max_bytes: Optional[int] = DEFAULT_MAX_UPLOAD_BYTES) -> memoryview:
+    """
+    Decode base64 (optionally a data: URL) chunk by chunk into this thread's reused buffer.
+
+    The returned view is only valid until the next call on the same thread,
+    so decode it (e.g. with `decode_image`) straight away.
+
+    Raises:
+        ImageTooLarge: If the decoded size would exceed max_bytes
+        ValueError: If the text is not valid base64
+    """
+    if not isinstance(text, str):
+        raise ValueError("Image data must be a base64 string")
+    if text.startswith('data:'):
+        text = text.partition(',')[2]
+    if len(text) % 4 or '\n' in text or ' ' in text:
+        text = ''.join(text.split())
+
+    padding = len(text) - len(text.rstrip('='))
+    size = len(text) // 4 * 3 - padding
+    if max_bytes is not None and size > max_bytes:
+        decode_stats.record("rejected")
+        raise ImageTooLarge(f"Image is {size / 1e6:.1f} MB, over the {max_bytes / 1e6:.1f} MB limit")
+
+    buffer = _thread_buffer(size)
+    written = 0
+    try:
+        for start in range(0, len(text), BASE64_CHUNK):
+            chunk = binascii.a2b_base64(text[start:start + BASE64_CHUNK])
+            buffer[written:written + len(chunk)] = chunk
+            written += len(chunk)
+    except binascii.Error as e:
+        raise ValueError(f"Invalid base64 image data: {e}") from None
+    return memoryview(buffer)[:written]
+
+
+def rss_bytes() -> int:
+    """Current resident set size (peak RSS where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes() -> int:
+    """Process-lifetime peak resident set size."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class RequestMemory:
+    """
+    Per-request RSS tracking.
+
+    `start()` and `finish()` bracket a request; `sample()` is called at the
+    memory-heavy points in between (decode), and the highest reading is the
+    request's peak. RSS is process-wide, so with concurrent requests the
+    growth attributed to each one is approximate.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.requests = 0
+        self.max_peak = 0
+        self.max_growth = 0
+        self.last: Optional[Dict] = None
+        self.by_endpoint: Dict[str, Dict] = {}
+
+    def start(self):
+        rss = rss_bytes()
+        self._local.start = rss
+        self._local.peak = rss
+
+    def sample(self):
+        if getattr(self._local, 'start', None) is not None:
+            self._local.peak = max(self._local.peak, rss_bytes())
+
+    def finish(self, endpoint: Optional[str] = None):
+        start = getattr(self._local, 'start', None)
+        if start is None:
+            return
+        self.sample()
+        peak = self._local.peak
+        self._local.start = None
+        growth = max(peak - start, 0)
+        record = {
+            "endpoint": endpoint,
+            "peak_rss_mb": round(peak / (1 << 20), 1),
+            "growth_mb": round(growth / (1 << 20), 1),
+            "at": time.time(),
+        }
+        with self._lock:
+            self.requests += 1
+            self.max_peak = max(self.max_peak, peak)
+            self.max_growth = max(self.max_growth, growth)
+            self.last = record
+            if endpoint:
+                entry = self.by_endpoint.setdefault(
+                    endpoint, {"requests": 0, "max_peak_rss_mb": 0.0, "max_growth_mb": 0.0}
+                )
+                entry["requests"] += 1
+                entry["max_peak_rss_mb"] = max(entry["max_peak_rss_mb"], record["peak_rss_mb"])
+                entry["max_growth_mb"] = max(entry["max_growth_mb"], record["growth_mb"])
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "rss_mb": round(rss_bytes() / (1 << 20), 1),
+                "process_peak_rss_mb": round(peak_rss_bytes() / (1 << 20), 1),
+                "max_request_peak_rss_mb": round(self.max_peak / (1 << 20), 1),
+                "max_request_growth_mb": round(self.max_growth / (1 << 20), 1),
+                "last_request": self.last,
+                "by_endpoint": {name: dict(entry) for name, entry in self.by_endpoint.items()},
+            }
+
+
+request_memory = RequestMemory()
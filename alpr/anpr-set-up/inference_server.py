@@ -0,0 +1,468 @@
+"""
+Multi-process ALPR inference server.
+
+Runs a pool of worker processes, each holding one ALPR instance, and hands
+frames to them through `multiprocessing.shared_memory` buffers so decoded
+images are never pickled between processes. Only small handles (buffer name,
+shape, dtype) travel over the task queues; results come back as ALPRResult
+objects.
+
+Each worker has its own task queue, so the pool knows which requests every
+worker holds. A worker that dies (ONNX segfault, OOM kill) fails only those
+requests, their buffers are returned, and a replacement worker is started.
+
+Usage:
+    from inference_server import InferencePool
+
+    pool = InferencePool(workers=4)
+    pool.start()
+    results = pool.predict(frame)  # same shape as ALPR.predict
+"""
+import atexit
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from alpr_loader import import_alpr
+
+DEFAULT_DETECTOR_MODEL = "yolo-v9-t-384-license-plate-end2end"
+DEFAULT_OCR_MODEL = "cct-xs-v1-global-model"
+
+# One 1080p BGR frame per slot. Larger frames get a one-off segment.
+DEFAULT_SLOT_BYTES = 1920 * 1080 * 3
+
+# Seconds before a worker that died while loading its models is started again
+RESTART_DELAY = 5.0
+
+
+def create_alpr(
+    detector_model: str = DEFAULT_DETECTOR_MODEL,
+    ocr_model: str = DEFAULT_OCR_MODEL,
+    intra_op_threads: Optional[int] = None,
+    **alpr_kwargs,
+):
+    """
+    Build the ALPR instance a worker process holds.
+
+    Args:
+        detector_model: ALPR detector model name
+        ocr_model: ALPR OCR model name
+        intra_op_threads: ONNX Runtime intra-op threads per session. Keeping this
+            small stops N workers from oversubscribing the CPU.
+        **alpr_kwargs: Extra ALPR arguments (e.g. crop_quality)
+
+    Returns:
+        ALPR instance
+    """
+    import onnxruntime as ort
+
+    ALPR = import_alpr()
+
+    def session_options():
+        if not intra_op_threads:
+            return None
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = 1
+        return options
+
+    return ALPR(
+        detector_model=detector_model,
+        ocr_model=ocr_model,
+        detector_sess_options=session_options(),
+        ocr_sess_options=session_options(),
+        **alpr_kwargs,
+    )
+
+
+def _worker_main(alpr_factory: Callable, factory_kwargs: Dict, task_queue, result_queue):
+    """Worker loop: attach to the frame buffer named in each task and run ALPR on it."""
+    try:
+        alpr = alpr_factory(**factory_kwargs)
+    except Exception as e:
+        result_queue.put(("init_error", os.getpid(), str(e)))
+        return
+    result_queue.put(("ready", os.getpid(), None))
+
+    attached: Dict[str, shared_memory.SharedMemory] = {}
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        request_id, op, shm_name, shape, dtype, temporary = task
+        shm = attached.get(shm_name)
+        try:
+            if shm is None:
+                shm = shared_memory.SharedMemory(name=shm_name)
+                if not temporary:
+                    attached[shm_name] = shm
+            frame = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+            try:
+                if op == "draw":
+                    # Drawn in place; the caller reads the annotated frame back
+                    # out of the same buffer.
+                    alpr.draw_predictions(frame)
+                    results = None
+                elif op == "read":
+                    # A pre-cropped plate: OCR only
+                    [results] = alpr.read_plates([frame])
+                else:
+                    results = alpr.predict(frame)
+            finally:
+                del frame
+            result_queue.put((request_id, results, None))
+        except Exception as e:
+            result_queue.put((request_id, None, str(e)))
+        finally:
+            if temporary and shm is not None:
+                shm.close()
+
+    for shm in attached.values():
+        shm.close()
+
+
+class _Worker:
+    """A worker process, its task queue and the requests it holds."""
+
+    def __init__(self, process, task_queue):
+        self.process = process
+        self.task_queue = task_queue
+        # Set once the worker's models are loaded
+        self.ready = False
+        self.requests = set()
+
+
+class InferencePool:
+    """
+    Pool of ALPR worker processes fed through shared-memory frame buffers.
+
+    Exposes the same `predict` / `draw_predictions` calls as `ALPR`, so it can be
+    dropped in wherever an ALPR instance is used.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        detector_model: str = DEFAULT_DETECTOR_MODEL,
+        ocr_model: str = DEFAULT_OCR_MODEL,
+        threads_per_worker: Optional[int] = None,
+        alpr_kwargs: Optional[Dict] = None,
+        slots: Optional[int] = None,
+        slot_bytes: int = DEFAULT_SLOT_BYTES,
+        alpr_factory: Optional[Callable] = None,
+        factory_kwargs: Optional[Dict] = None,
+        start_timeout: float = 600.0,
+        request_timeout: float = 60.0,
+    ):
+        """
+        Configure the pool. Worker processes are started by `start()`.
+
+        Args:
+            workers: Number of worker processes (one ALPR instance each)
+            detector_model: ALPR detector model name
+            ocr_model: ALPR OCR model name
+            threads_per_worker: ONNX Runtime threads per session in each worker.
+                Defaults to cpu_count // workers.
+            alpr_kwargs: Extra ALPR arguments passed to every worker (must be picklable)
+            slots: Number of preallocated shared frame buffers. Defaults to 2 per worker.
+            slot_bytes: Size of each preallocated buffer
+            alpr_factory: Picklable callable returning an ALPR-like object. Defaults
+                to `create_alpr`.
+            factory_kwargs: Keyword arguments for `alpr_factory`. Overrides the
+                model arguments above when given.
+            start_timeout: Seconds to wait for workers to load their models
+            request_timeout: Seconds `predict` and friends wait for a result, and
+                `submit` for a free frame buffer, unless given their own timeout
+        """
+        if workers < 1:
+            raise ValueError(f"workers must be >= 1, got {workers}")
+        self.workers = workers
+        self.slot_bytes = slot_bytes
+        self.num_slots = slots or 2 * workers
+        self.start_timeout = start_timeout
+        self.request_timeout = request_timeout
+        self.alpr_factory = alpr_factory or create_alpr
+        if factory_kwargs is None:
+            factory_kwargs = {
+                "detector_model": detector_model,
+                "ocr_model": ocr_model,
+                "intra_op_threads": threads_per_worker or max(1, (os.cpu_count() or 1) // workers),
+                **(alpr_kwargs or {}),
+            }
+        self.factory_kwargs = factory_kwargs
+
+        self._ctx = mp.get_context("spawn")
+        self._workers: List[_Worker] = []
+        self._result_queue = None
+        self._slots: List[shared_memory.SharedMemory] = []
+        self._free_slots: "queue.Queue[shared_memory.SharedMemory]" = queue.Queue()
+        # request_id -> (future, buffer, temporary, frame shape, frame dtype, worker)
+        self._pending: Dict[int, Tuple] = {}
+        self._pending_lock = threading.Lock()
+        self._request_ids = itertools.count()
+        self._collector = None
+        self._watcher = None
+        self._stopping = False
+        self._started = False
+        # Workers replaced after dying
+        self.restarts = 0
+
+    def _spawn_worker(self) -> _Worker:
+        task_queue = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(self.alpr_factory, self.factory_kwargs, task_queue, self._result_queue),
+            daemon=True,
+        )
+        process.start()
+        return _Worker(process, task_queue)
+
+    def start(self):
+        """Allocate the frame buffers, spawn the workers and wait until all models are loaded."""
+        if self._started:
+            return self
+        self._stopping = False
+        self._result_queue = self._ctx.Queue()
+        for _ in range(self.num_slots):
+            shm = shared_memory.SharedMemory(create=True, size=self.slot_bytes)
+            self._slots.append(shm)
+            self._free_slots.put(shm)
+
+        self._workers = [self._spawn_worker() for _ in range(self.workers)]
+
+        errors = []
+        reported = 0
+        deadline = time.monotonic() + self.start_timeout
+        while reported < self.workers and not errors:
+            try:
+                status, pid, error = self._result_queue.get(timeout=1.0)
+            except queue.Empty:
+                dead = [w.process.pid for w in self._workers if w.process.exitcode is not None]
+                if dead:
+                    errors.append(f"worker(s) {dead} exited during startup")
+                elif time.monotonic() > deadline:
+                    errors.append("timed out waiting for workers to load models")
+                continue
+            reported += 1
+            if status == "init_error":
+                errors.append(f"worker {pid}: {error}")
+        if errors:
+            self.shutdown()
+            raise RuntimeError("Inference pool failed to start: " + "; ".join(errors))
+        for worker in self._workers:
+            worker.ready = True
+
+        self._collector = threading.Thread(target=self._collect_results, daemon=True)
+        self._collector.start()
+        self._watcher = threading.Thread(target=self._watch_workers, daemon=True)
+        self._watcher.start()
+        self._started = True
+        atexit.register(self.shutdown)
+        print(f"Inference pool started with {self.workers} workers")
+        return self
+
+    def _acquire_buffer(self, nbytes: int) -> Tuple[shared_memory.SharedMemory, bool]:
+        """Take a free slot, or create a one-off segment for frames larger than a slot."""
+        if nbytes > self.slot_bytes:
+            return shared_memory.SharedMemory(create=True, size=nbytes), True
+        try:
+            return self._free_slots.get(timeout=self.request_timeout), False
+        except queue.Empty:
+            raise RuntimeError(
+                f"Inference pool is busy: no free frame buffer after {self.request_timeout} s"
+            ) from None
+
+    def _release_buffer(self, shm: shared_memory.SharedMemory, temporary: bool):
+        if temporary:
+            shm.close()
+            shm.unlink()
+        else:
+            self._free_slots.put(shm)
+
+    def _collect_results(self):
+        """Route worker results back to the waiting futures."""
+        while True:
+            try:
+                message = self._result_queue.get()
+            except (EOFError, OSError):
+                break
+            if message is None:
+                break
+            request_id, results, error = message
+            if request_id in ("ready", "init_error"):
+                self._worker_started(request_id, results, error)
+                continue
+            with self._pending_lock:
+                pending = self._pending.pop(request_id, None)
+                if pending is not None:
+                    pending[5].requests.discard(request_id)
+            if pending is None:
+                continue
+            future, shm, temporary, shape, dtype, _ = pending
+            if error is not None:
+                self._release_buffer(shm, temporary)
+                future.set_exception(RuntimeError(error))
+            elif results is None:
+                # draw request: copy the annotated frame out before the slot is reused
+                annotated = np.ndarray(shape, dtype=dtype, buffer=shm.buf).copy()
+                self._release_buffer(shm, temporary)
+                future.set_result(annotated)
+            else:
+                self._release_buffer(shm, temporary)
+                future.set_result(results)
+
+    def _worker_started(self, status: str, pid: int, error: Optional[str]):
+        """A replacement worker has loaded its models (or failed to)."""
+        if status == "init_error":
+            print(f"Inference worker {pid} failed to load models: {error}")
+            return
+        with self._pending_lock:
+            for worker in self._workers:
+                if worker.process.pid == pid:
+                    worker.ready = True
+
+    def _watch_workers(self):
+        """Replace workers that exit while the pool is running."""
+        while not self._stopping:
+            with self._pending_lock:
+                sentinels = {w.process.sentinel: w for w in self._workers}
+            for sentinel in wait(list(sentinels), timeout=0.5):
+                self._replace_worker(sentinels[sentinel])
+
+    def _replace_worker(self, worker: _Worker):
+        """Fail the requests of a dead worker, free their buffers and start a new worker."""
+        if not worker.ready:
+            # Died loading its models; do not restart it in a tight loop
+            time.sleep(RESTART_DELAY)
+        with self._pending_lock:
+            if self._stopping or worker not in self._workers:
+                return
+            lost = [self._pending.pop(request_id) for request_id in worker.requests]
+            worker.requests.clear()
+            self._workers[self._workers.index(worker)] = self._spawn_worker()
+            self.restarts += 1
+        # Tasks the dead worker never took stay in its queue; drop them
+        worker.task_queue.cancel_join_thread()
+        worker.task_queue.close()
+        # The sentinel can fire before the process is reaped; join it for the exit code
+        worker.process.join(timeout=1)
+        exitcode = worker.process.exitcode
+        print(f"Inference worker {worker.process.pid} exited with code {exitcode}; "
+              f"failed {len(lost)} requests and started a new worker")
+        for future, shm, temporary, _, _, _ in lost:
+            self._release_buffer(shm, temporary)
+            future.set_exception(
+                RuntimeError(f"Inference worker exited with code {exitcode}")
+            )
+
+    def submit(self, frame, op: str = "predict") -> Future:
+        """
+        Queue a frame for inference.
+
+        Args:
+            frame: BGR image array or image path
+            op: "predict" for ALPR results, "draw" for the annotated frame,
+                "read" for the ALPRResult of a pre-cropped plate (OCR only)
+
+        Returns:
+            Future resolving to the list of ALPRResult (the annotated frame for
+            "draw", one ALPRResult for "read")
+        """
+        if not self._started:
+            raise RuntimeError("Inference pool is not started")
+        if isinstance(frame, str):
+            img = cv2.imread(frame)
+            if img is None:
+                raise ValueError(f"Failed to load image from path: {frame}")
+            frame = img
+        frame = np.ascontiguousarray(frame)
+
+        shm, temporary = self._acquire_buffer(frame.nbytes)
+        buffer_view = np.ndarray(frame.shape, dtype=frame.dtype, buffer=shm.buf)
+        buffer_view[...] = frame
+        del buffer_view
+
+        future: Future = Future()
+        request_id = next(self._request_ids)
+        with self._pending_lock:
+            # The ready worker holding the fewest requests (a restarting one if none is ready)
+            worker = min(self._workers, key=lambda w: (not w.ready, len(w.requests)))
+            worker.requests.add(request_id)
+            self._pending[request_id] = (future, shm, temporary, frame.shape, frame.dtype, worker)
+            worker.task_queue.put(
+                (request_id, op, shm.name, frame.shape, frame.dtype.str, temporary)
+            )
+        return future
+
+    def predict(self, frame, timeout: Optional[float] = None):
+        """Run ALPR on a frame in a worker process. Mirrors `ALPR.predict`."""
+        return self.submit(frame).result(timeout=timeout or self.request_timeout)
+
+    def predict_batch(self, frames, timeout: Optional[float] = None) -> List:
+        """
+        Run ALPR on several frames, spread across the workers. Mirrors `ALPR.predict_batch`.
+
+        Frames can be of different sizes (frames bigger than a slot get a temporary buffer).
+        """
+        futures = [self.submit(frame) for frame in frames]
+        return [future.result(timeout=timeout or self.request_timeout) for future in futures]
+
+    def read_plates(self, crops, timeout: Optional[float] = None) -> List:
+        """
+        Read pre-cropped plates, spread across the workers. Mirrors `ALPR.read_plates`.
+
+        Each crop is read on its own in whichever worker is free, so the OCR
+        does not batch crops together as it does in one process.
+        """
+        futures = [self.submit(crop, op="read") for crop in crops]
+        return [future.result(timeout=timeout or self.request_timeout) for future in futures]
+
+    def draw_predictions(self, frame, timeout: Optional[float] = None) -> np.ndarray:
+        """Return the annotated frame from a worker process. Mirrors `ALPR.draw_predictions`."""
+        return self.submit(frame, op="draw").result(timeout=timeout or self.request_timeout)
+
+    def shutdown(self):
+        """Stop the workers and release all shared memory."""
+        self._stopping = True
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+        for worker in self._workers:
+            worker.task_queue.put(None)
+        for worker in self._workers:
+            worker.process.join(timeout=10)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        self._workers = []
+        if self._result_queue is not None:
+            self._result_queue.put(None)
+        if self._collector is not None:
+            self._collector.join(timeout=5)
+            self._collector = None
+
+        with self._pending_lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for future, shm, temporary, _, _, _ in pending:
+            if temporary:
+                shm.close()
+                shm.unlink()
+            if not future.done():
+                future.set_exception(RuntimeError("Inference pool shut down"))
+
+        for shm in self._slots:
+            shm.close()
+            shm.unlink()
+        self._slots = []
+        self._free_slots = queue.Queue()
+        self._started = False
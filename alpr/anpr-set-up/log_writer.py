@@ -0,0 +1,172 @@
+"""
+Background log writer.
+
+Scan events are pushed onto a bounded in-memory queue and a writer thread
+drains it in batches to a sink (text log, scan store, ...), so request
+handlers never wait on disk.
+"""
+import atexit
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+OVERFLOW_DROP = "drop"
+OVERFLOW_BLOCK = "block"
+
+_STOP = object()
+
+
+class AsyncLogWriter:
+    """
+    Bounded queue plus a writer thread that hands events to `sink` in batches.
+
+    When the queue is full, events are either dropped (counted in the
+    "dropped" stat) or the caller blocks until there is room, depending
+    on `overflow`. Pending events are flushed at interpreter exit.
+    """
+
+    def __init__(
+        self,
+        sink: Callable[[List], None],
+        max_queue: int = 10000,
+        batch_size: int = 200,
+        flush_interval: float = 0.2,
+        overflow: str = OVERFLOW_DROP,
+        block_timeout: Optional[float] = None,
+        name: str = "log-writer",
+    ):
+        """
+        Start the writer thread.
+
+        Args:
+            sink: Called from the writer thread with a list of events
+            max_queue: Maximum number of events waiting to be written
+            batch_size: Maximum number of events per sink call
+            flush_interval: Seconds to wait for more events before writing a partial batch
+            overflow: "drop" to discard events when the queue is full, "block" to wait
+            block_timeout: With "block", give up (and drop) after this many seconds.
+                None waits indefinitely.
+            name: Writer thread name
+        """
+        if overflow not in (OVERFLOW_DROP, OVERFLOW_BLOCK):
+            raise ValueError(
+                f"overflow must be '{OVERFLOW_DROP}' or '{OVERFLOW_BLOCK}', got {overflow!r}"
+            )
+        self.sink = sink
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        # Held while queueing, so no event can land behind _STOP and be lost
+        self._submit_lock = threading.Lock()
+        self._closed = False
+        self.queued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, event) -> bool:
+        """
+        Queue an event for writing.
+
+        Returns:
+            True if the event was queued, False if it was dropped
+        """
+        with self._submit_lock:
+            if self._closed:
+                with self._lock:
+                    self.dropped += 1
+                return False
+            try:
+                if self.overflow == OVERFLOW_BLOCK:
+                    self._queue.put(event, timeout=self.block_timeout)
+                else:
+                    self._queue.put_nowait(event)
+            except queue.Full:
+                with self._lock:
+                    self.dropped += 1
+                return False
+        with self._lock:
+            self.queued += 1
+        return True
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            batch = []
+            if item is _STOP:
+                stop = True
+            else:
+                batch.append(item)
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                        break
+                    batch.append(item)
+            if batch:
+                self._write(batch)
+            for _ in range(len(batch) + (1 if stop else 0)):
+                self._queue.task_done()
+
+    def _write(self, batch: List):
+        try:
+            self.sink(batch)
+        except Exception as e:
+            with self._lock:
+                self.failed += len(batch)
+            print(f"Error writing log batch: {e}")
+            return
+        with self._lock:
+            self.written += len(batch)
+            self.batches += 1
+
+    def flush(self):
+        """Block until every queued event has been handed to the sink."""
+        if self._thread.is_alive():
+            self._queue.join()
+
+    def close(self, timeout: Optional[float] = 10.0):
+        """Stop accepting events, write everything still queued and stop the thread."""
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            stopping = self._thread.is_alive()
+            if stopping:
+                self._queue.put(_STOP)
+        atexit.unregister(self.close)
+        if stopping:
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict:
+        """Counters for the metrics endpoint."""
+        with self._lock:
+            return {
+                "queued": self.queued,
+                "dropped": self.dropped,
+                "written": self.written,
+                "failed": self.failed,
+                "batches": self.batches,
+                "pending": self._queue.qsize(),
+                "max_queue": self.max_queue,
+                "overflow": self.overflow,
+            }
@@ -0,0 +1,13 @@
+"""
+Plate text helpers shared by the ALPR service modules.
+"""
+
+
+def canonical_plate(plate_text: str) -> str:
+    """
+    Canonical form of a plate used for lookups and indexing.
+
+    Uppercase with spaces and dashes removed, so "191-d-12348" and
+    "191D12348" compare equal.
+    """
+    return plate_text.strip().upper().replace(' ', '').replace('-', '')
@@ -0,0 +1,505 @@
+"""
+Vehicle registration database.
+
+Registrations are loaded from a CSV file into an immutable snapshot. A
+watcher thread polls the file and, when it changes, builds the next
+snapshot from the previous one (appended rows are parsed on their own;
+any other edit is re-parsed and diffed) and swaps it in with a single
+attribute assignment, so lookups never block and never see a half-built
+database.
+
+Records are keyed by canonical plate (see plates.canonical_plate), so a
+lookup ignores case, spaces and dashes with a single dict access. Large
+registers are parsed in fixed-size chunks straight from the file into
+compact `VehicleRecord` tuples, and can be cached in a binary snapshot
+file that is reused while the CSV's hash is unchanged.
+
+CSV format:
+    registration,owner,vehicle_type,make,model,color,notes
+    ABC-123,John Doe,Car,Toyota,Camry,Blue,Company vehicle
+"""
+import codecs
+import csv
+import gc
+import hashlib
+import os
+import pickle
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from itertools import islice, repeat
+from operator import itemgetter, methodcaller
+from pathlib import Path
+from types import MappingProxyType
+from typing import BinaryIO, Dict, Iterator, List, Mapping, NamedTuple, Optional, Tuple
+
+from plates import canonical_plate
+
+FIELDS = ('registration', 'owner', 'vehicle_type', 'make', 'model', 'color', 'notes')
+
+CHUNK_BYTES = 1 << 20
+CHUNK_ROWS = 50000
+
+# vehicle_type, make, model and color repeat across a fleet
+INTERNED_COLUMNS = (2, 3, 4, 5)
+
+SNAPSHOT_VERSION = 1
+# Column separator in snapshot files; never appears in registration data
+_SEP = '\x1f'
+
+
+class VehicleRecord(NamedTuple):
+    """One registered vehicle. A plain tuple, so it costs far less than a dict per row."""
+
+    registration: str
+    owner: str
+    vehicle_type: str
+    make: str
+    model: str
+    color: str
+    notes: str
+
+
+_new_record = tuple.__new__
+_drop_spaces = methodcaller('replace', ' ', '')
+_drop_dashes = methodcaller('replace', '-', '')
+
+
+def _canonical_keys(registrations):
+    """plates.canonical_plate for already stripped, uppercased plates, mapped in C."""
+    return map(_drop_dashes, map(_drop_spaces, registrations))
+
+
+@contextmanager
+def _gc_paused():
+    """
+    Pause the cyclic garbage collector while building large record dicts.
+
+    Every new tuple is tracked until the collector has seen it once, so
+    allocating a million of them triggers dozens of pointless full scans.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _read_lines(f: BinaryIO, size: int, digest=None) -> Iterator[str]:
+    """Yield decoded lines from the next `size` bytes of `f`, reading CHUNK_BYTES at a time."""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    pending = ''
+    remaining = size
+    while remaining > 0:
+        chunk = f.read(min(CHUNK_BYTES, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        if digest is not None:
+            digest.update(chunk)
+        lines = (pending + decoder.decode(chunk)).split('\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+def _hash_prefix(f: BinaryIO, size: int):
+    """sha1 of the next `size` bytes of `f` (the hash object, so it can be continued)."""
+    digest = hashlib.sha1()
+    remaining = size
+    while remaining > 0:
+        chunk = f.read(min(CHUNK_BYTES, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        digest.update(chunk)
+    return digest
+
+
+def parse_records(lines, fieldnames: Optional[List[str]] = None) -> Tuple[Dict, List[str]]:
+    """
+    Parse CSV lines into canonical plate -> VehicleRecord.
+
+    Registrations are uppercased and stripped; later rows win on duplicates.
+    Repeated values (vehicle type, make, model, color) are interned so a large
+    fleet shares one string per distinct value.
+
+    Args:
+        lines: Iterable of CSV lines
+        fieldnames: Column names if `lines` has no header row
+
+    Returns:
+        Tuple of (records, fieldnames)
+    """
+    reader = csv.reader(lines)
+    if fieldnames is None:
+        fieldnames = [name.strip() for name in next(reader, [])]
+    if not fieldnames:
+        return {}, fieldnames
+    if 'registration' not in fieldnames:
+        raise ValueError("Registrations CSV has no 'registration' column")
+
+    width = len(fieldnames)
+    indices = [fieldnames.index(field) if field in fieldnames else -1 for field in FIELDS]
+    # Missing columns read the trailing '' of the padding added to each row
+    getter = itemgetter(*indices)
+    in_order = indices == list(range(len(FIELDS))) and width == len(FIELDS)
+    complete = -1 not in indices
+    pad = [''] * (width + 1)
+    same_width = width.__eq__
+
+    records = {}
+    while True:
+        rows = list(islice(reader, CHUNK_ROWS))
+        if not rows:
+            break
+        # Column-wise: every step below is a C-level map/zip over the chunk
+        if complete and all(map(same_width, map(len, rows))):
+            columns = list(zip(*rows)) if in_order else list(zip(*map(getter, rows)))
+        else:
+            columns = list(zip(*map(getter, (row + pad for row in rows if row))))
+            if not columns:
+                continue
+        registrations = list(map(str.upper, map(str.strip, columns[0])))
+        columns[0] = registrations
+        for i in INTERNED_COLUMNS:
+            columns[i] = map(sys.intern, columns[i])
+        records.update(zip(
+            _canonical_keys(registrations),
+            map(_new_record, repeat(VehicleRecord), zip(*columns)),
+        ))
+    records.pop('', None)
+    return records, fieldnames
+
+
+def record_from_dict(registration: str, info: Dict) -> VehicleRecord:
+    """Build a VehicleRecord from a vehicle info dict (missing fields are '')."""
+    return VehicleRecord(registration, *(str(info.get(field) or '') for field in FIELDS[1:]))
+
+
+def write_snapshot(path, digest: str, fieldnames: List[str], records: Mapping) -> bool:
+    """
+    Save records to a binary snapshot file, tagged with the CSV's digest.
+
+    Columns are stored as one joined string each, which loads much faster
+    than parsing the CSV again. Written to a temporary file and renamed.
+
+    Returns:
+        False if the records can't be stored (a value contains the separator)
+    """
+    columns = []
+    for column in zip(*records.values()):
+        joined = _SEP.join(column)
+        if joined.count(_SEP) != len(column) - 1:
+            # The CSV stays the source of truth
+            return False
+        columns.append(joined)
+    path = Path(path)
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as f:
+        pickle.dump(
+            {
+                'version': SNAPSHOT_VERSION,
+                'digest': digest,
+                'fieldnames': fieldnames,
+                'count': len(records),
+                'columns': columns,
+            },
+            f,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    os.replace(tmp, path)
+    return True
+
+
+def read_snapshot(path, digest: str) -> Optional[Tuple[Dict, List[str]]]:
+    """
+    Load records from a snapshot file written by `write_snapshot`.
+
+    Only trusted, locally written files should be used (they are pickles).
+
+    Returns:
+        Tuple of (records, fieldnames), or None if the file is missing, stale
+        (written for a different CSV digest) or unreadable
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    if (
+        not isinstance(data, dict)
+        or data.get('version') != SNAPSHOT_VERSION
+        or data.get('digest') != digest
+    ):
+        return None
+    if not data['count']:
+        return {}, data['fieldnames']
+    columns = [column.split(_SEP) for column in data['columns']]
+    for i in INTERNED_COLUMNS:
+        columns[i] = map(sys.intern, columns[i])
+    keys = list(_canonical_keys(columns[0]))
+    records = dict(zip(keys, map(_new_record, repeat(VehicleRecord), zip(*columns))))
+    return records, data['fieldnames']
+
+
+class RegistrationSnapshot:
+    """
+    Read-only view of the registration database at one point in time.
+
+    Never modified after construction; a reload builds a new snapshot.
+    """
+
+    __slots__ = (
+        'registrations', 'mtime_ns', 'size', 'digest', 'fieldnames', 'loaded_at'
+    )
+
+    def __init__(
+        self,
+        registrations: Dict[str, VehicleRecord],
+        mtime_ns: int = 0,
+        size: int = 0,
+        digest: str = '',
+        fieldnames: Optional[List[str]] = None,
+    ):
+        # Canonical plate -> record
+        self.registrations: Mapping[str, VehicleRecord] = MappingProxyType(registrations)
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.digest = digest
+        self.fieldnames = fieldnames
+        self.loaded_at = time.time()
+
+    def __len__(self) -> int:
+        return len(self.registrations)
+
+    def lookup(self, plate_text: str) -> Optional[VehicleRecord]:
+        """
+        Find a vehicle by scanned plate text.
+
+        Case, spaces and dashes are ignored.
+        """
+        return self.registrations.get(canonical_plate(plate_text))
+
+
+EMPTY_SNAPSHOT = RegistrationSnapshot({})
+
+
+class RegistrationDatabase:
+    """
+    Registration CSV loaded into a snapshot, optionally kept in sync with the file.
+    """
+
+    def __init__(
+        self,
+        csv_path: Optional[str],
+        watch: bool = True,
+        poll_interval: float = 2.0,
+        snapshot_path: Optional[str] = None,
+    ):
+        """
+        Load the CSV and (optionally) start watching it.
+
+        Args:
+            csv_path: Path to the registrations CSV. None or a missing file gives
+                an empty database; the file is picked up if it appears later.
+            watch: Poll the file for changes and reload automatically
+            poll_interval: Seconds between checks of the file's mtime and size
+            snapshot_path: Binary snapshot file to load from while the CSV is
+                unchanged (rewritten after each full parse). None disables it.
+        """
+        self.csv_path = csv_path
+        self.poll_interval = poll_interval
+        self.snapshot_path = snapshot_path
+        self.snapshot = EMPTY_SNAPSHOT
+        # Serializes reloads; readers never take it
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self.reload(force=True)
+        if watch and csv_path:
+            self.start_watching()
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.csv_path)
+        except (OSError, TypeError):
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def changed(self) -> bool:
+        """Whether the file's mtime or size differs from the current snapshot."""
+        stat = self._stat()
+        if stat is None:
+            return len(self.snapshot) > 0
+        return stat != (self.snapshot.mtime_ns, self.snapshot.size)
+
+    def reload(self, force: bool = False) -> Dict:
+        """
+        Bring the snapshot up to date with the CSV file.
+
+        Args:
+            force: Re-parse the whole file even if it looks unchanged
+
+        Returns:
+            Reload stats: mode ("unchanged", "append", "full", "snapshot",
+            "missing" or "error"), added, updated, removed, count and seconds
+        """
+        if not self.csv_path:
+            return {'mode': 'missing', 'added': 0, 'updated': 0, 'removed': 0,
+                    'count': 0, 'seconds': 0.0}
+        with self._reload_lock:
+            started = time.perf_counter()
+            old = self.snapshot
+            stat = self._stat()
+            if stat is None:
+                new, mode = EMPTY_SNAPSHOT, 'missing'
+                added, updated, removed = {}, {}, set(old.registrations)
+            elif not force and stat == (old.mtime_ns, old.size):
+                return {'mode': 'unchanged', 'added': 0, 'updated': 0, 'removed': 0,
+                        'count': len(old), 'seconds': 0.0}
+            else:
+                try:
+                    with _gc_paused():
+                        new, mode, added, updated, removed = self._build(old, stat, force)
+                except Exception as e:
+                    print(f"Error loading registrations: {e}")
+                    return {'mode': 'error', 'error': str(e), 'count': len(old)}
+            self.snapshot = new
+            seconds = time.perf_counter() - started
+
+        stats = {
+            'mode': mode,
+            'added': len(added),
+            'updated': len(updated),
+            'removed': len(removed),
+            'count': len(new),
+            'seconds': round(seconds, 4),
+        }
+        print(
+            f"Loaded {stats['count']} registrations ({mode} reload: +{stats['added']} "
+            f"~{stats['updated']} -{stats['removed']}) in {seconds * 1000:.1f} ms"
+        )
+        return stats
+
+    def _build(self, old: RegistrationSnapshot, stat: Tuple[int, int], force: bool):
+        mtime_ns, size = stat
+        with open(self.csv_path, 'rb') as f:
+            records = None
+            # Appended rows: the old file is an unchanged prefix, so parse only the tail
+            if not force and old.size and old.fieldnames and size > old.size:
+                digest = _hash_prefix(f, old.size - 1)
+                last = f.read(1)
+                digest.update(last)
+                if last == b'\n' and digest.hexdigest() == old.digest:
+                    records, fieldnames = parse_records(
+                        _read_lines(f, size - old.size, digest), old.fieldnames
+                    )
+                    mode = 'append'
+            if records is None:
+                f.seek(0)
+                digest = _hash_prefix(f, size)
+                loaded = None
+                if self.snapshot_path:
+                    loaded = read_snapshot(self.snapshot_path, digest.hexdigest())
+                if loaded is not None:
+                    records, fieldnames = loaded
+                    mode = 'snapshot'
+                else:
+                    f.seek(0)
+                    records, fieldnames = parse_records(_read_lines(f, size))
+                    mode = 'full'
+                    if self.snapshot_path:
+                        self._save_snapshot(digest.hexdigest(), fieldnames, records)
+        digest = digest.hexdigest()
+
+        if not old.registrations:
+            # First load: nothing to diff against or share
+            snapshot = RegistrationSnapshot(records, mtime_ns, size, digest, fieldnames)
+            return snapshot, mode, records, {}, set()
+
+        added, updated = {}, {}
+        for key, record in records.items():
+            previous = old.registrations.get(key)
+            if previous is None:
+                added[key] = record
+            elif previous != record:
+                updated[key] = record
+        removed = set() if mode == 'append' else set(old.registrations).difference(records)
+
+        # Copy-on-write: start from the previous snapshot's dict (unchanged
+        # vehicles are shared, not rebuilt) and apply only the diff
+        registrations = dict(old.registrations)
+        for key in removed:
+            del registrations[key]
+        registrations.update(updated)
+        registrations.update(added)
+
+        snapshot = RegistrationSnapshot(registrations, mtime_ns, size, digest, fieldnames)
+        return snapshot, mode, added, updated, removed
+
+    def _save_snapshot(self, digest: str, fieldnames: List[str], records: Mapping):
+        try:
+            write_snapshot(self.snapshot_path, digest, fieldnames, records)
+        except OSError as e:
+            print(f"Error writing registrations snapshot: {e}")
+
+    def replace(self, registrations: Dict[str, Dict]) -> Dict:
+        """
+        Swap in registrations that come from somewhere other than the CSV.
+
+        Args:
+            registrations: Registration -> vehicle info dict (keys already normalized)
+
+        Returns:
+            Reload stats, as for `reload`
+        """
+        with self._reload_lock, _gc_paused():
+            started = time.perf_counter()
+            records = {
+                canonical_plate(reg): record_from_dict(reg, info)
+                for reg, info in registrations.items()
+            }
+            self.snapshot = RegistrationSnapshot(records)
+            seconds = time.perf_counter() - started
+        print(f"Loaded {len(records)} registrations in {seconds * 1000:.1f} ms")
+        return {'mode': 'replace', 'added': len(records), 'updated': 0, 'removed': 0,
+                'count': len(records), 'seconds': round(seconds, 4)}
+
+    def lookup(self, plate_text: str) -> Optional[VehicleRecord]:
+        """Find a vehicle by scanned plate text in the current snapshot."""
+        return self.snapshot.lookup(plate_text)
+
+    def __len__(self) -> int:
+        return len(self.snapshot)
+
+    def start_watching(self):
+        """Start the background thread that reloads the CSV when it changes."""
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(
+            target=self._watch_loop, name='registrations-watcher', daemon=True
+        )
+        self._watcher.start()
+
+    def _watch_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                if self.changed():
+                    self.reload()
+            except Exception as e:
+                print(f"Error watching registrations: {e}")
+
+    def stop(self):
+        """Stop the watcher thread."""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
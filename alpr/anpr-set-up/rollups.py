@@ -0,0 +1,213 @@
+"""
+Hourly scan rollups for dashboard analytics.
+
+Each hour of scans is summarized as it is logged: scan count, how many were
+checked against the registrations and found, a confidence histogram, and a
+HyperLogLog sketch of the distinct plates. Rollups of any set of hours merge
+exactly (counters add, sketches take the register-wise maximum), so a
+summary of a day, a week or a year reads one small row per hour instead of
+every scan, and unique vehicles per day or per range come from the merged
+sketch.
+
+A HyperLogLog with 2^12 registers estimates distinct counts within about
+1.6% (one standard error) in 4 KB, and an hour's registers compress to a
+few hundred bytes while it has seen few plates.
+
+Usage:
+    rollup = HourRollup()
+    rollup.add("191-D-12345", confidence=0.93, in_database=True)
+    summarize({"2024-01-15 14": rollup}, bucket="day")
+"""
+import hashlib
+import math
+import zlib
+from array import array
+from typing import Dict, Iterable, List, Mapping, Optional
+
+HLL_PRECISION = 12
+HLL_REGISTERS = 1 << HLL_PRECISION
+
+CONFIDENCE_BINS = 20
+
+BUCKETS = ('hour', 'day', 'none')
+
+_RANK_BITS = 64 - HLL_PRECISION
+
+
+class HyperLogLog:
+    """Distinct-count sketch of plate strings (fixed precision, mergeable)."""
+
+    __slots__ = ('registers',)
+
+    def __init__(self, registers: Optional[bytes] = None):
+        self.registers = bytearray(registers if registers is not None else HLL_REGISTERS)
+        if len(self.registers) != HLL_REGISTERS:
+            raise ValueError(f"Expected {HLL_REGISTERS} registers, got {len(self.registers)}")
+
+    def add(self, value: str):
+        # A stable hash: Python's own hash() differs between processes
+        h = int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+        index = h >> _RANK_BITS
+        rest = h & ((1 << _RANK_BITS) - 1)
+        rank = _RANK_BITS - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: 'HyperLogLog'):
+        """Fold another sketch into this one (the union of both sets)."""
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    @classmethod
+    def union(cls, sketches: Iterable['HyperLogLog']) -> 'HyperLogLog':
+        """One sketch of the union of many, merged with numpy."""
+        import numpy as np
+
+        registers = [np.frombuffer(s.registers, dtype=np.uint8) for s in sketches]
+        if not registers:
+            return cls()
+        return cls(np.maximum.reduce(registers).tobytes())
+
+    def count(self) -> int:
+        """Estimated number of distinct values added."""
+        m = HLL_REGISTERS
+        zeros = self.registers.count(0)
+        if zeros == m:
+            return 0
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def to_bytes(self) -> bytes:
+        return zlib.compress(bytes(self.registers), 6)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'HyperLogLog':
+        return cls(zlib.decompress(data))
+
+
+class HourRollup:
+    """Counters, confidence histogram and plate sketch of one hour of scans."""
+
+    __slots__ = ('scans', 'checked', 'in_database', 'confidence_sum', 'histogram', 'plates')
+
+    def __init__(self):
+        self.scans = 0
+        # Scans checked against the registrations, and how many were found
+        self.checked = 0
+        self.in_database = 0
+        self.confidence_sum = 0.0
+        self.histogram = [0] * CONFIDENCE_BINS
+        self.plates = HyperLogLog()
+
+    def add(self, plate: str, confidence: Optional[float] = None, in_database: Optional[bool] = None):
+        """Count one scan of a canonical plate."""
+        self.scans += 1
+        if in_database is not None:
+            self.checked += 1
+            self.in_database += bool(in_database)
+        if confidence is not None:
+            self.confidence_sum += confidence
+            self.histogram[min(max(int(confidence * CONFIDENCE_BINS), 0), CONFIDENCE_BINS - 1)] += 1
+        self.plates.add(plate)
+
+    def merge(self, other: 'HourRollup'):
+        self.scans += other.scans
+        self.checked += other.checked
+        self.in_database += other.in_database
+        self.confidence_sum += other.confidence_sum
+        self.histogram = [a + b for a, b in zip(self.histogram, other.histogram)]
+        self.plates.merge(other.plates)
+
+    def to_row(self) -> tuple:
+        """(scans, checked, in_database, confidence_sum, histogram, plates) for the rollups table."""
+        return (
+            self.scans,
+            self.checked,
+            self.in_database,
+            self.confidence_sum,
+            array('I', self.histogram).tobytes(),
+            self.plates.to_bytes(),
+        )
+
+    @classmethod
+    def from_row(cls, scans, checked, in_database, confidence_sum, histogram, plates) -> 'HourRollup':
+        rollup = cls()
+        rollup.scans = scans
+        rollup.checked = checked
+        rollup.in_database = in_database
+        rollup.confidence_sum = confidence_sum
+        rollup.histogram = array('I', histogram).tolist()
+        rollup.plates = HyperLogLog.from_bytes(plates)
+        return rollup
+
+
+def merge_rollups(sources: Iterable[Mapping[str, HourRollup]]) -> Dict[str, HourRollup]:
+    """Hour -> rollup maps of several stores (e.g. sites) merged hour by hour."""
+    merged: Dict[str, HourRollup] = {}
+    for rollups in sources:
+        for hour, rollup in rollups.items():
+            if hour in merged:
+                merged[hour].merge(rollup)
+            else:
+                merged[hour] = rollup
+    return merged
+
+
+def _totals(rollups: List[HourRollup]) -> Dict:
+    scans = sum(r.scans for r in rollups)
+    checked = sum(r.checked for r in rollups)
+    in_database = sum(r.in_database for r in rollups)
+    confidences = sum(sum(r.histogram) for r in rollups)
+    return {
+        "scans": scans,
+        "unique_plates": HyperLogLog.union(r.plates for r in rollups).count(),
+        "checked": checked,
+        "in_database": in_database,
+        "hit_rate": round(in_database / checked, 4) if checked else None,
+        "mean_confidence": (
+            round(sum(r.confidence_sum for r in rollups) / confidences, 4) if confidences else None
+        ),
+    }
+
+
+def summarize(rollups: Mapping[str, HourRollup], bucket: str = 'day') -> Dict:
+    """
+    Dashboard summary of hourly rollups.
+
+    Args:
+        rollups: "YYYY-MM-DD HH" -> rollup
+        bucket: "hour" or "day" for a per-period breakdown, "none" for totals only
+
+    Returns:
+        Totals (scans, unique_plates, checked, in_database, hit_rate,
+        mean_confidence), the confidence histogram and, unless bucket is
+        "none", "buckets": the same totals per period, oldest first.
+        unique_plates is a HyperLogLog estimate.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}, got {bucket!r}")
+    hours = sorted(rollups)
+    ordered = [rollups[hour] for hour in hours]
+    histogram = [sum(column) for column in zip(*(r.histogram for r in ordered))] or [0] * CONFIDENCE_BINS
+    summary = {
+        "first_hour": hours[0] if hours else None,
+        "last_hour": hours[-1] if hours else None,
+        **_totals(ordered),
+        "confidence_histogram": [
+            {"min": i / CONFIDENCE_BINS, "max": (i + 1) / CONFIDENCE_BINS, "count": count}
+            for i, count in enumerate(histogram)
+        ],
+    }
+    if bucket != 'none':
+        width = 13 if bucket == 'hour' else 10
+        periods: Dict[str, List[HourRollup]] = {}
+        for hour, rollup in zip(hours, ordered):
+            periods.setdefault(hour[:width], []).append(rollup)
+        summary["bucket"] = bucket
+        summary["buckets"] = [
+            {"period": period, **_totals(members)} for period, members in periods.items()
+        ]
+    return summary
@@ -0,0 +1,277 @@
+"""
+Live scan feed.
+
+Scans are published to an in-memory ring of recent events as they are
+logged, and pushed to dashboards over Server-Sent Events, so an open
+dashboard gets each new scan as it happens instead of polling the logs
+endpoint (which queries the scan store on every call).
+
+Every event has an id. A client that reconnects sends the last id it saw
+(browsers do this automatically with the Last-Event-ID header) and gets the
+events it missed from the ring. If they have already left the ring, it gets
+a "gap" event first, and should reload its history from the logs endpoint.
+Ids start from the wall clock in milliseconds, so they keep increasing
+across restarts.
+
+SSE format of an event:
+    id: 1718000000123
+    event: scan
+    data: {"timestamp": "...", "plate_text": "191D12345", ...}
+"""
+import json
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+EVENT_SCAN = 'scan'
+EVENT_GAP = 'gap'
+
+# Tells EventSource clients how long to wait before reconnecting
+RETRY_MS = 3000
+
+# Response headers of a feed stream; the second stops nginx buffering it
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+# (id, kind, event, serialized event)
+_Event = Tuple[int, str, Dict, str]
+
+
+class FeedFull(Exception):
+    """The feed already has max_subscribers streams open."""
+
+
+def parse_event_id(value) -> Optional[int]:
+    """Event id from a Last-Event-ID header or query parameter; None if missing or malformed."""
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def event_filter(
+    site_id: Optional[str] = None,
+    camera_id: Optional[str] = None
+) -> Optional[Callable[[Dict], bool]]:
+    """Match function keeping the events of one site and/or camera; None keeps every event."""
+    if site_id is None and camera_id is None:
+        return None
+
+    def match(event: Dict) -> bool:
+        return ((site_id is None or event.get('site_id') == site_id)
+                and (camera_id is None or event.get('camera_id') == camera_id))
+    return match
+
+
+def format_sse(event_id: int, kind: str, data: str) -> str:
+    """One Server-Sent Events message. `data` must be a single line (compact JSON is)."""
+    return f"id: {event_id}\nevent: {kind}\ndata: {data}\n\n"
+
+
+class ScanFeed:
+    """
+    Ring of recent scan events with blocking subscriptions.
+
+    Thread-safe. publish() never blocks on subscribers: each subscription
+    keeps its own position in the ring and a slow client only falls behind
+    (and gets a gap event), it never holds up the scan path.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 1000,
+        max_subscribers: int = 100,
+        heartbeat_seconds: float = 15.0
+    ):
+        """
+        Args:
+            capacity: Recent events kept for reconnecting and late-joining clients
+            max_subscribers: Open streams allowed at once; each holds a server thread
+            heartbeat_seconds: Idle time after which a comment line is sent, so
+                proxies keep the connection open and closed clients are noticed
+        """
+        if capacity < 1:
+            raise ValueError(f"capacity must be >= 1, got {capacity}")
+        self.capacity = capacity
+        self.max_subscribers = max_subscribers
+        self.heartbeat_seconds = heartbeat_seconds
+        self._events: Deque[_Event] = deque(maxlen=capacity)
+        self._cond = threading.Condition()
+        self._last_id = int(time.time() * 1000)
+        self._subscribers = 0
+        self._closed = False
+        self.published = 0
+        self.rejected = 0
+
+    def publish(self, event: Dict, kind: str = EVENT_SCAN) -> int:
+        """
+        Add an event and wake the subscribers.
+
+        Returns:
+            The event's id
+        """
+        # Serialized once here rather than once per subscriber
+        data = json.dumps(event, default=str)
+        with self._cond:
+            self._last_id += 1
+            event_id = self._last_id
+            self._events.append((event_id, kind, event, data))
+            self.published += 1
+            self._cond.notify_all()
+        return event_id
+
+    @property
+    def last_id(self) -> int:
+        """Id of the newest event (or the starting id, before any)."""
+        return self._last_id
+
+    def _after(self, cursor: int) -> Tuple[List[_Event], bool]:
+        """Buffered events newer than `cursor`, oldest first, and whether some were lost. Needs the lock."""
+        events = []
+        for event in reversed(self._events):
+            if event[0] <= cursor:
+                break
+            events.append(event)
+        events.reverse()
+        oldest = events[0][0] if events else self._last_id + 1
+        gap = cursor > self._last_id or oldest > cursor + 1
+        return events, gap
+
+    def recent(
+        self,
+        after: Optional[int] = None,
+        limit: int = 100,
+        match: Optional[Callable[[Dict], bool]] = None
+    ) -> Dict:
+        """
+        Buffered events as JSON-ready dicts, for clients that poll instead of streaming.
+
+        Args:
+            after: Only events newer than this id. None returns the latest `limit`.
+            limit: Most events returned (the oldest are left out)
+            match: Only events for which match(event) is true
+
+        Returns:
+            {"events": [{"id", "type", "data"}, ...], "last_id": newest id
+            (pass as `after` next time), "gap": whether events after
+            `after` have already left the ring}
+        """
+        with self._cond:
+            if after is None:
+                events, gap = list(self._events), False
+            else:
+                events, gap = self._after(after)
+            last_id = self._last_id
+        if match is not None:
+            events = [e for e in events if match(e[2])]
+        events = events[-limit:] if limit > 0 else []
+        return {
+            "events": [{"id": e[0], "type": e[1], "data": e[2]} for e in events],
+            "last_id": last_id,
+            "gap": gap,
+        }
+
+    def subscribe(
+        self,
+        last_event_id: Optional[int] = None,
+        backlog: int = 0,
+        match: Optional[Callable[[Dict], bool]] = None
+    ) -> 'FeedSubscription':
+        """
+        Open a stream of SSE messages.
+
+        Args:
+            last_event_id: Resume after this id (from the Last-Event-ID header)
+            backlog: Without last_event_id, first replay up to this many recent events
+            match: Only stream events for which match(event) is true
+
+        Raises:
+            FeedFull: If max_subscribers streams are already open
+        """
+        with self._cond:
+            if self._subscribers >= self.max_subscribers:
+                self.rejected += 1
+                raise FeedFull(
+                    f"{self._subscribers} scan feed clients already connected; try again later"
+                )
+            self._subscribers += 1
+            if last_event_id is None:
+                # Start before the newest `backlog` buffered events
+                buffered = list(self._events)[-backlog:] if backlog > 0 else []
+                last_event_id = buffered[0][0] - 1 if buffered else self._last_id
+        return FeedSubscription(self, last_event_id, match)
+
+    def _release(self):
+        with self._cond:
+            self._subscribers -= 1
+
+    def stats(self) -> Dict:
+        """Counters for the metrics endpoints."""
+        with self._cond:
+            return {
+                "subscribers": self._subscribers,
+                "max_subscribers": self.max_subscribers,
+                "rejected": self.rejected,
+                "published": self.published,
+                "buffered": len(self._events),
+                "capacity": self.capacity,
+                "last_id": self._last_id,
+            }
+
+    def close(self):
+        """End every open stream (e.g. on shutdown)."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class FeedSubscription:
+    """
+    One client's stream: an iterable of SSE message strings for a streaming response.
+
+    close() (called by the WSGI server when the client goes away) frees the
+    subscriber slot even if the stream never started.
+    """
+
+    def __init__(self, feed: ScanFeed, cursor: int, match: Optional[Callable[[Dict], bool]]):
+        self.feed = feed
+        self.cursor = cursor
+        self.match = match
+        self._closed = False
+
+    def __iter__(self) -> Iterator[str]:
+        feed = self.feed
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            # A filtered stream can go quiet while events for other sites or
+            # cameras keep arriving; the keepalive is what reveals a gone client
+            last_yield = time.monotonic()
+            while not self._closed:
+                with feed._cond:
+                    if feed._last_id <= self.cursor and not feed._closed:
+                        timeout = last_yield + feed.heartbeat_seconds - time.monotonic()
+                        feed._cond.wait(max(0.0, timeout))
+                    if feed._closed:
+                        return
+                    events, gap = feed._after(self.cursor)
+                    last_id = feed._last_id
+                chunk = []
+                if gap:
+                    # No id line: the client's Last-Event-ID stays at its last real event
+                    chunk.append(f"event: {EVENT_GAP}\ndata: {json.dumps({'after': self.cursor})}\n\n")
+                for event_id, kind, event, data in events:
+                    if self.match is None or self.match(event):
+                        chunk.append(format_sse(event_id, kind, data))
+                self.cursor = last_id
+                if not chunk and time.monotonic() - last_yield >= feed.heartbeat_seconds:
+                    chunk.append(": keepalive\n\n")
+                if chunk:
+                    yield ''.join(chunk)
+                    last_yield = time.monotonic()
+        finally:
+            self.close()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.feed._release()
@@ -0,0 +1,522 @@
+"""
+Embedded scan history store.
+
+Keeps every scan in a local SQLite database indexed by timestamp and canonical
+plate, so history can be queried by time range, plate, confidence or
+in_database without reading every log file. Inserts are batched, either by
+the store's own background writer (`add`) or by the caller's
+`AsyncLogWriter` calling `add_many`.
+
+Every insert also updates hourly rollups (see rollups.py) in the same
+transaction, so `summary` answers dashboard questions (scans per hour,
+unique plates per day, hit rate, confidence distribution) for any date range
+from one small row per hour.
+
+Can also be run as a command:
+    python scan_store.py export --db vehicle_logs/scans.db --out scans.parquet --start 2025-12-01
+    python scan_store.py import-legacy --db vehicle_logs/scans.db --logs-dir vehicle_logs
+    python scan_store.py rebuild-rollups --db vehicle_logs/scans.db
+"""
+import argparse
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from log_writer import AsyncLogWriter
+from plates import canonical_plate
+from rollups import HourRollup, summarize
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    plate_text TEXT NOT NULL,
+    canonical_plate TEXT NOT NULL,
+    confidence REAL,
+    in_database INTEGER,
+    vehicle_info TEXT,
+    image_filename TEXT,
+    camera_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_scans_timestamp ON scans (timestamp);
+CREATE INDEX IF NOT EXISTS idx_scans_plate ON scans (canonical_plate, timestamp);
+CREATE TABLE IF NOT EXISTS rollups (
+    hour TEXT PRIMARY KEY,
+    scans INTEGER NOT NULL,
+    checked INTEGER NOT NULL,
+    in_database INTEGER NOT NULL,
+    confidence_sum REAL NOT NULL,
+    histogram BLOB NOT NULL,
+    plates BLOB NOT NULL
+);
+"""
+
+ROLLUP_COLUMNS = ("scans", "checked", "in_database", "confidence_sum", "histogram", "plates")
+
+COLUMNS = (
+    "timestamp",
+    "plate_text",
+    "canonical_plate",
+    "confidence",
+    "in_database",
+    "vehicle_info",
+    "image_filename",
+    "camera_id",
+)
+
+# Columns added after the first release, created on databases that predate them
+MIGRATIONS = (
+    ("camera_id", "ALTER TABLE scans ADD COLUMN camera_id TEXT"),
+)
+
+
+def _start_bound(value: Optional[str]) -> Optional[str]:
+    """Expand a YYYY-MM-DD start bound to the beginning of that day."""
+    if value and len(value) == 10:
+        return f"{value} 00:00:00"
+    return value
+
+
+def _end_bound(value: Optional[str]) -> Optional[str]:
+    """Expand a YYYY-MM-DD end bound to the end of that day (inclusive)."""
+    if value and len(value) == 10:
+        return f"{value} 23:59:59"
+    return value
+
+
+class ScanStore:
+    """
+    SQLite-backed scan history with indexed queries and batched background inserts.
+
+    Timestamps are stored as "YYYY-MM-DD HH:MM:SS" strings (the format the logs
+    already use), which sort chronologically, so range queries hit the index.
+    """
+
+    def __init__(self, db_path, batch_size: int = 200, flush_interval: float = 0.2):
+        """
+        Open (or create) the store and start its writer thread.
+
+        Args:
+            db_path: Path to the SQLite database file
+            batch_size: Maximum number of scans written per transaction by `add`
+            flush_interval: Seconds the writer waits to fill a batch
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.created = not self.db_path.exists()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._local = threading.local()
+        conn = self._connection()
+        # WAL lets readers run while the writer thread commits
+        conn.execute("PRAGMA journal_mode=WAL")
+        had_rollups = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rollups'"
+        ).fetchone() is not None
+        conn.executescript(SCHEMA)
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(scans)")}
+        for column, statement in MIGRATIONS:
+            if column not in existing:
+                conn.execute(statement)
+        conn.commit()
+        if not had_rollups and not self.created:
+            # Database from before rollups: summarize the scans it already has
+            hours = self.rebuild_rollups()
+            if hours:
+                print(f"Built rollups for {hours} hours of existing scans")
+
+        # Started on the first `add`; callers with their own writer use `add_many`
+        self._writer: Optional[AsyncLogWriter] = None
+        self._writer_lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread; SQLite connections must not be shared across threads."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_row(entry: Dict) -> tuple:
+        in_database = entry.get("in_database")
+        vehicle_info = entry.get("vehicle_info")
+        return (
+            entry["timestamp"],
+            entry["plate_text"],
+            canonical_plate(entry["plate_text"]),
+            entry.get("confidence"),
+            None if in_database is None else int(bool(in_database)),
+            None if vehicle_info is None else json.dumps(vehicle_info),
+            entry.get("image_filename"),
+            entry.get("camera_id"),
+        )
+
+    @staticmethod
+    def _from_row(row: sqlite3.Row) -> Dict:
+        in_database = row["in_database"]
+        vehicle_info = row["vehicle_info"]
+        return {
+            "timestamp": row["timestamp"],
+            "plate_text": row["plate_text"],
+            "confidence": row["confidence"],
+            "in_database": None if in_database is None else bool(in_database),
+            "vehicle_info": None if vehicle_info is None else json.loads(vehicle_info),
+            "image_filename": row["image_filename"],
+            "camera_id": row["camera_id"],
+        }
+
+    def add(self, entry: Dict) -> bool:
+        """
+        Queue a scan for insertion. Returns immediately; the writer thread commits it.
+
+        Args:
+            entry: Scan dict with at least "timestamp" and "plate_text"
+
+        Returns:
+            False if the writer queue was full and the scan was dropped
+        """
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = AsyncLogWriter(
+                        self.add_many,
+                        batch_size=self.batch_size,
+                        flush_interval=self.flush_interval,
+                        name="scan-store-writer",
+                    )
+        return self._writer.submit(entry)
+
+    def add_many(self, entries: Iterable[Dict]) -> int:
+        """Insert scans synchronously in one transaction. Returns the number inserted."""
+        rows = [self._to_row(entry) for entry in entries]
+        if not rows:
+            return 0
+        hours: Dict[str, HourRollup] = {}
+        for row in rows:
+            hour = row[0][:13]
+            rollup = hours.get(hour)
+            if rollup is None:
+                rollup = hours[hour] = HourRollup()
+            rollup.add(row[2], confidence=row[3], in_database=row[4])
+        conn = self._connection()
+        with conn:
+            # Take the write lock first: the rollups are read, merged and written back
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                f"INSERT INTO scans ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                rows,
+            )
+            self._merge_rollups(conn, hours)
+        return len(rows)
+
+    @staticmethod
+    def _merge_rollups(conn: sqlite3.Connection, hours: Dict[str, HourRollup]):
+        """Add new hourly rollups to the stored ones. Runs inside the caller's transaction."""
+        for hour, rollup in hours.items():
+            row = conn.execute(
+                f"SELECT {', '.join(ROLLUP_COLUMNS)} FROM rollups WHERE hour = ?", (hour,)
+            ).fetchone()
+            if row is not None:
+                rollup.merge(HourRollup.from_row(*row))
+            conn.execute(
+                f"INSERT OR REPLACE INTO rollups (hour, {', '.join(ROLLUP_COLUMNS)}) "
+                f"VALUES (?, {', '.join('?' * len(ROLLUP_COLUMNS))})",
+                (hour, *rollup.to_row()),
+            )
+
+    def rebuild_rollups(self) -> int:
+        """Recompute every hourly rollup from the scans table. Returns the number of hours."""
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM rollups")
+            hours: Dict[str, HourRollup] = {}
+            total = 0
+            cursor = conn.execute(
+                "SELECT timestamp, canonical_plate, confidence, in_database FROM scans ORDER BY timestamp"
+            )
+            for timestamp, plate, confidence, in_database in cursor:
+                hour = timestamp[:13]
+                if hour not in hours:
+                    # Ordered by time: the previous hours are complete, write them out
+                    self._merge_rollups(conn, hours)
+                    total += len(hours)
+                    hours = {hour: HourRollup()}
+                hours[hour].add(plate, confidence=confidence, in_database=in_database)
+            self._merge_rollups(conn, hours)
+            total += len(hours)
+        return total
+
+    def rollups(self, start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, HourRollup]:
+        """
+        Stored hourly rollups in a time range.
+
+        Args:
+            start: Earliest timestamp ("YYYY-MM-DD" or "YYYY-MM-DD HH:MM:SS"); its whole hour counts
+            end: Latest timestamp, inclusive; its whole hour counts
+
+        Returns:
+            "YYYY-MM-DD HH" -> HourRollup
+        """
+        clauses, params = [], []
+        if start:
+            clauses.append("hour >= ?")
+            params.append(_start_bound(start)[:13])
+        if end:
+            clauses.append("hour <= ?")
+            params.append(_end_bound(end)[:13])
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connection().execute(
+            f"SELECT hour, {', '.join(ROLLUP_COLUMNS)} FROM rollups {where} ORDER BY hour", params
+        ).fetchall()
+        return {row[0]: HourRollup.from_row(*row[1:]) for row in rows}
+
+    def summary(self, start: Optional[str] = None, end: Optional[str] = None, bucket: str = "day") -> Dict:
+        """
+        Scan analytics for a time range, merged from the hourly rollups.
+
+        Hours are the unit: a range starting or ending mid-hour includes that
+        whole hour. See rollups.summarize for the returned fields.
+        """
+        return summarize(self.rollups(start, end), bucket)
+
+    def flush(self):
+        """Block until every scan queued with `add` has been committed."""
+        if self._writer is not None:
+            self._writer.flush()
+
+    def close(self):
+        """Flush pending scans and stop the writer thread."""
+        if self._writer is not None:
+            self._writer.close()
+
+    def _where(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        plate: Optional[str] = None,
+        min_confidence: Optional[float] = None,
+        in_database: Optional[bool] = None,
+        camera_id: Optional[str] = None,
+    ):
+        clauses, params = [], []
+        if plate:
+            clauses.append("canonical_plate = ?")
+            params.append(canonical_plate(plate))
+        start, end = _start_bound(start), _end_bound(end)
+        if start:
+            clauses.append("timestamp >= ?")
+            params.append(start)
+        if end:
+            clauses.append("timestamp <= ?")
+            params.append(end)
+        if min_confidence is not None:
+            clauses.append("confidence >= ?")
+            params.append(min_confidence)
+        if in_database is not None:
+            clauses.append("in_database = ?")
+            params.append(int(in_database))
+        if camera_id is not None:
+            clauses.append("camera_id = ?")
+            params.append(camera_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def query(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        plate: Optional[str] = None,
+        min_confidence: Optional[float] = None,
+        in_database: Optional[bool] = None,
+        camera_id: Optional[str] = None,
+        limit: Optional[int] = 100,
+        newest_first: bool = True,
+    ) -> List[Dict]:
+        """
+        Query scans.
+
+        Args:
+            start: Earliest timestamp ("YYYY-MM-DD" or "YYYY-MM-DD HH:MM:SS")
+            end: Latest timestamp, inclusive ("YYYY-MM-DD" covers the whole day)
+            plate: Plate text; matched on its canonical form
+            min_confidence: Minimum OCR confidence
+            in_database: Only scans that were (or were not) found in the registrations
+            camera_id: Only scans from this camera
+            limit: Maximum number of scans; None for all
+            newest_first: Order of the returned scans
+
+        Returns:
+            List of scan dicts
+        """
+        where, params = self._where(start, end, plate, min_confidence, in_database, camera_id)
+        order = "DESC" if newest_first else "ASC"
+        sql = f"SELECT * FROM scans {where} ORDER BY timestamp {order}, id {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        rows = self._connection().execute(sql, params).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def plate_stats(
+        self,
+        plate: str,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        max_scans: int = 50,
+    ) -> Dict:
+        """
+        Summary of one plate's scans.
+
+        Returns:
+            Dict with total_scans, first_seen, last_seen and the most recent
+            `max_scans` scans in chronological order
+        """
+        where, params = self._where(start, end, plate)
+        total, first_seen, last_seen = self._connection().execute(
+            f"SELECT COUNT(*), MIN(timestamp), MAX(timestamp) FROM scans {where}", params
+        ).fetchone()
+        scans = self.query(start, end, plate, limit=max_scans)
+        scans.reverse()
+        return {
+            "total_scans": total,
+            "first_seen": first_seen,
+            "last_seen": last_seen,
+            "scans": scans,
+        }
+
+    def import_json_logs(self, logs_dir) -> int:
+        """Import legacy daily `scans_YYYY-MM-DD.json` files. Returns the number of scans imported."""
+        imported = 0
+        for log_file in sorted(Path(logs_dir).glob("scans_*.json")):
+            try:
+                with open(log_file, 'r') as f:
+                    entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Skipping {log_file}: {e}")
+                continue
+            imported += self.add_many(e for e in entries if e.get("plate_text"))
+        return imported
+
+    def import_text_log(self, log_file) -> int:
+        """Import a legacy `asctime - {json}` scan log. Returns the number of scans imported."""
+        log_file = Path(log_file)
+        if not log_file.exists():
+            return 0
+        entries = []
+        with open(log_file, 'r') as f:
+            for line in f:
+                _, sep, payload = line.partition(" - ")
+                if not sep:
+                    continue
+                try:
+                    entry = json.loads(payload)
+                except ValueError:
+                    continue
+                if entry.get("plate_text"):
+                    entries.append(entry)
+        return self.add_many(entries)
+
+    def export(
+        self,
+        out_path,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> Path:
+        """
+        Write scans to a compressed columnar file for analytics.
+
+        Writes Parquet (zstd) when pyarrow is installed and the path ends in
+        .parquet; otherwise a compressed numpy .npz with one array per column.
+
+        Returns:
+            Path of the written file
+        """
+        import numpy as np
+
+        self.flush()
+        where, params = self._where(start, end)
+        rows = self._connection().execute(
+            f"SELECT {', '.join(COLUMNS)} FROM scans {where} ORDER BY timestamp, id", params
+        ).fetchall()
+        columns = {
+            "timestamp": np.array([r["timestamp"] for r in rows], dtype="datetime64[s]"),
+            "plate_text": np.array([r["plate_text"] for r in rows], dtype=str),
+            "canonical_plate": np.array([r["canonical_plate"] for r in rows], dtype=str),
+            "confidence": np.array(
+                [np.nan if r["confidence"] is None else r["confidence"] for r in rows],
+                dtype=np.float32,
+            ),
+            # -1 where the scan was not checked against the registrations
+            "in_database": np.array(
+                [-1 if r["in_database"] is None else r["in_database"] for r in rows],
+                dtype=np.int8,
+            ),
+            "vehicle_info": np.array([r["vehicle_info"] or "" for r in rows], dtype=str),
+            "image_filename": np.array([r["image_filename"] or "" for r in rows], dtype=str),
+            "camera_id": np.array([r["camera_id"] or "" for r in rows], dtype=str),
+        }
+
+        out_path = Path(out_path)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        if out_path.suffix == ".parquet":
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                out_path = out_path.with_suffix(".npz")
+                print(f"pyarrow not installed, writing {out_path} instead")
+            else:
+                pq.write_table(pa.table(columns), out_path, compression="zstd")
+                return out_path
+        if out_path.suffix != ".npz":
+            out_path = out_path.with_suffix(".npz")
+        np.savez_compressed(out_path, **columns)
+        return out_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan store maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export scans to a columnar file")
+    export_parser.add_argument("--db", required=True, help="Path to scans.db")
+    export_parser.add_argument("--out", required=True, help="Output .parquet or .npz path")
+    export_parser.add_argument("--start", help="Start date/time (YYYY-MM-DD[ HH:MM:SS])")
+    export_parser.add_argument("--end", help="End date/time, inclusive")
+
+    import_parser = subparsers.add_parser("import-legacy", help="Import legacy log files")
+    import_parser.add_argument("--db", required=True, help="Path to scans.db")
+    import_parser.add_argument("--logs-dir", help="Directory with scans_YYYY-MM-DD.json files")
+    import_parser.add_argument("--text-log", help="Path to a scanned_registrations.log file")
+
+    rollups_parser = subparsers.add_parser("rebuild-rollups", help="Recompute the hourly rollups")
+    rollups_parser.add_argument("--db", required=True, help="Path to scans.db")
+
+    args = parser.parse_args()
+    store = ScanStore(args.db)
+    try:
+        if args.command == "export":
+            path = store.export(args.out, start=args.start, end=args.end)
+            print(f"Exported scans to {path}")
+        elif args.command == "rebuild-rollups":
+            print(f"Rebuilt rollups for {store.rebuild_rollups()} hours")
+        else:
+            imported = 0
+            if args.logs_dir:
+                imported += store.import_json_logs(args.logs_dir)
+            if args.text_log:
+                imported += store.import_text_log(args.text_log)
+            print(f"Imported {imported} scans")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,628 @@
+"""
+Inference scheduling: priority lanes and per-site fairness for one shared ALPR.
+
+Every frame is queued with a site and a lane (request class) and run by
+dispatch threads in batches. Lanes are served in priority order:
+
+  - realtime:    gate barrier scans; cars queue if one takes over 300 ms
+  - interactive: single scans from the dashboard or the mobile app
+  - bulk:        batch uploads and back-office work
+
+Each batch takes up to `weight` frames from every lane in turn, highest
+priority first, and within a lane up to the site's weight from every site
+in turn, so a busy site cannot starve the others. A lane's `max_batch`
+caps its frames per batch: bulk frames are run at most two at a time, so a
+barrier scan that arrives mid-batch waits for two bulk frames at most
+(a running batch cannot be interrupted, so this is how bulk work is
+preempted).
+
+Each lane tracks its latency, from submit to result, against its SLO. While
+a lane's p95 latency over the last few seconds is above its SLO, the
+"throttle" lanes below it are paused. They then only run one frame at a
+time, and only when no other frame is waiting. Work that does not go
+through the scheduler (exports, reports) can wait for the pause to end
+with `throttle()`.
+
+Usage:
+    scheduler = FairScheduler(get_alpr)
+    scheduler.add_site("north")
+    gate = SiteALPR(scheduler, "north", lane=REALTIME)
+    results = gate.predict(frame)
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+REALTIME = "realtime"
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+
+class Lane(NamedTuple):
+    """A request class and how the scheduler treats it."""
+    name: str
+    # Frames taken per turn when several lanes have work waiting
+    weight: int = 1
+    # Latency objective (submit to result), in milliseconds; None for none
+    slo_ms: Optional[float] = None
+    # Most frames of this lane in one batch; None for no cap
+    max_batch: Optional[int] = None
+    # Pause this lane while a higher-priority lane misses its SLO
+    throttle: bool = False
+
+
+# Highest priority first
+DEFAULT_LANES = (
+    Lane(REALTIME, weight=4, slo_ms=300),
+    Lane(INTERACTIVE, weight=2, slo_ms=2000),
+    Lane(BULK, weight=1, max_batch=2, throttle=True),
+)
+
+LANES = tuple(lane.name for lane in DEFAULT_LANES)
+
+
+def parse_lane(value: Optional[str]) -> Optional[str]:
+    """
+    Normalize a lane (priority) given by a client or in a config.
+
+    Raises:
+        ValueError: If the value is not one of LANES or empty
+    """
+    if value is None or not str(value).strip():
+        return None
+    lane = str(value).strip().lower()
+    if lane not in LANES:
+        raise ValueError(f"Invalid priority {value!r}: use {', '.join(repr(name) for name in LANES)}")
+    return lane
+
+
+def scan_lane(priority: Optional[str] = None, gate: bool = False, bulk: bool = False) -> str:
+    """
+    Lane of a scan: `priority` if the client gave one, else bulk for batch
+    uploads, realtime for gate cameras (scans with an entry/exit direction)
+    and interactive for the rest.
+
+    Raises:
+        ValueError: If priority is not one of LANES
+    """
+    lane = parse_lane(priority)
+    if lane is not None:
+        return lane
+    if bulk:
+        return BULK
+    return REALTIME if gate else INTERACTIVE
+
+
+class SiteBusy(RuntimeError):
+    """A site's inference queue is full. The caller should retry later."""
+
+    def __init__(self, site_id: str, max_pending: int):
+        super().__init__(f"Site {site_id!r} has {max_pending} frames waiting; try again later")
+        self.site_id = site_id
+        self.max_pending = max_pending
+
+
+class UnknownSite(KeyError):
+    """No site with this id is configured."""
+
+
+class _SiteQueue:
+    """Pending frames per lane and counters of one site."""
+
+    def __init__(self, weight: int, max_pending: int, lanes: Sequence[str]):
+        self.weight = weight
+        self.max_pending = max_pending
+        # lane -> (future, op, frame, enqueued_at)
+        self.items: Dict[str, deque] = {lane: deque() for lane in lanes}
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def pending(self) -> int:
+        return sum(len(items) for items in self.items.values())
+
+    def stats(self) -> Dict:
+        finished = self.completed + self.failed
+        return {
+            "pending": self.pending,
+            "pending_by_lane": {lane: len(items) for lane, items in self.items.items()},
+            "max_pending": self.max_pending,
+            "weight": self.weight,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(1000 * self.total_wait / finished, 2) if finished else 0.0,
+            "max_wait_ms": round(1000 * self.max_wait, 2),
+        }
+
+
+class _LaneState:
+    """Counters and recent latencies of one lane."""
+
+    def __init__(self, lane: Lane, window_seconds: float):
+        self.lane = lane
+        self.window_seconds = window_seconds
+        # (finished_at, latency in seconds), newest last
+        self.latencies: Deque[Tuple[float, float]] = deque(maxlen=500)
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.slo_misses = 0
+
+    def record(self, now: float, latency: float, failed: bool):
+        if failed:
+            self.failed += 1
+            return
+        self.completed += 1
+        self.latencies.append((now, latency))
+        if self.lane.slo_ms is not None and latency * 1000 > self.lane.slo_ms:
+            self.slo_misses += 1
+
+    def recent(self, now: float) -> List[float]:
+        """Latencies of the last window_seconds, sorted."""
+        since = now - self.window_seconds
+        return sorted(latency for finished, latency in self.latencies if finished >= since)
+
+    def degraded(self, now: float) -> bool:
+        """Whether the recent p95 latency is above the SLO."""
+        if self.lane.slo_ms is None:
+            return False
+        recent = self.recent(now)
+        return bool(recent) and _percentile(recent, 0.95) * 1000 > self.lane.slo_ms
+
+    def stats(self, now: float, pending: int, paused: bool) -> Dict:
+        recent = self.recent(now)
+        return {
+            "pending": pending,
+            "weight": self.lane.weight,
+            "max_batch": self.lane.max_batch,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "slo_ms": self.lane.slo_ms,
+            "slo_misses": self.slo_misses,
+            "slo_attainment": (
+                round(1 - self.slo_misses / self.completed, 4)
+                if self.lane.slo_ms is not None and self.completed else None
+            ),
+            # Over the last window_seconds
+            "latency_ms": {
+                "p50": round(1000 * _percentile(recent, 0.5), 2),
+                "p95": round(1000 * _percentile(recent, 0.95), 2),
+                "p99": round(1000 * _percentile(recent, 0.99), 2),
+                "max": round(1000 * recent[-1], 2),
+            } if recent else None,
+            "degraded": self.degraded(now),
+            "paused": paused,
+        }
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class FairScheduler:
+    """
+    Shares one ALPR between sites and request classes with weighted batching.
+
+    Frames are queued per site and lane and dispatched by worker threads.
+    Each batch takes up to `weight` frames from every lane in turn, highest
+    priority first, and within a lane up to `weight` frames from every site
+    in turn (resuming after the last site served), so a site with a deep
+    queue gets its share of every batch but never more. A site whose queue
+    for a lane is full is rejected with `SiteBusy` instead of growing
+    everyone's latency.
+    """
+
+    def __init__(
+        self,
+        get_alpr: Callable,
+        max_batch: int = 8,
+        workers: int = 1,
+        name: str = "site-scheduler",
+        lanes: Sequence[Lane] = DEFAULT_LANES,
+        default_lane: str = INTERACTIVE,
+        slo_window: float = 10.0
+    ):
+        """
+        Start the dispatch threads.
+
+        Args:
+            get_alpr: Returns the shared ALPR (or None if it could not be loaded).
+                Called by the workers, so the models load on the first frame.
+            max_batch: Most frames sent to `predict_batch` at once
+            workers: Dispatch threads. One is usually enough, ONNX Runtime
+                already runs each batch on several cores.
+            name: Thread name prefix
+            lanes: Request classes, highest priority first
+            default_lane: Lane of frames submitted without one
+            slo_window: Seconds of recent latencies a lane's SLO is checked against
+        """
+        if max_batch < 1:
+            raise ValueError(f"max_batch must be >= 1, got {max_batch}")
+        names = [lane.name for lane in lanes]
+        if not names or len(set(names)) != len(names):
+            raise ValueError(f"Lane names must be unique and not empty, got {names}")
+        if default_lane not in names:
+            raise ValueError(f"Default lane {default_lane!r} is not one of {names}")
+        self.get_alpr = get_alpr
+        self.max_batch = max_batch
+        self.lanes = tuple(lanes)
+        self.default_lane = default_lane
+        self._lanes = {lane.name: _LaneState(lane, slo_window) for lane in self.lanes}
+        self._sites: Dict[str, _SiteQueue] = {}
+        # Sites in round-robin order per lane; the head is served first
+        self._order: Dict[str, deque] = {lane.name: deque() for lane in self.lanes}
+        self._cond = threading.Condition()
+        self._closed = False
+        self.batches = 0
+        self.frames = 0
+        self.throttled = 0
+        self.throttle_waits = 0
+        self._threads = [
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def add_site(self, site_id: str, weight: int = 1, max_pending: int = 64):
+        """
+        Register a site.
+
+        Args:
+            site_id: Site id
+            weight: Frames taken from this site per round-robin turn
+            max_pending: Frames the site may have waiting in each lane before it is rejected
+        """
+        if weight < 1 or max_pending < 1:
+            raise ValueError("weight and max_pending must be >= 1")
+        with self._cond:
+            if site_id in self._sites:
+                raise ValueError(f"Site {site_id!r} is already registered")
+            self._sites[site_id] = _SiteQueue(weight, max_pending, self._lanes)
+            for order in self._order.values():
+                order.append(site_id)
+
+    def _lane(self, lane: Optional[str]) -> str:
+        lane = lane or self.default_lane
+        if lane not in self._lanes:
+            raise ValueError(f"Unknown lane {lane!r}")
+        return lane
+
+    def has_capacity(self, site_id: str, frames: int = 1, lane: Optional[str] = None) -> bool:
+        """
+        Whether `frames` more frames from the site would be accepted in the lane now.
+
+        Batches larger than the whole queue count as max_pending frames, since
+        SiteALPR.predict_batch queues them in chunks of that size.
+        """
+        lane = self._lane(lane)
+        with self._cond:
+            site = self._site(site_id)
+            return len(site.items[lane]) + min(frames, site.max_pending) <= site.max_pending
+
+    def max_pending(self, site_id: str) -> int:
+        """Queue bound of a site (per lane)."""
+        with self._cond:
+            return self._site(site_id).max_pending
+
+    def _site(self, site_id: str) -> _SiteQueue:
+        site = self._sites.get(site_id)
+        if site is None:
+            raise UnknownSite(site_id)
+        return site
+
+    def submit_many(
+        self,
+        site_id: str,
+        frames: List,
+        op: str = "predict",
+        lane: Optional[str] = None
+    ) -> List[Future]:
+        """
+        Queue frames for one site. All of them are queued, or none.
+
+        Args:
+            site_id: Site the frames belong to
+            frames: BGR image arrays (plate crops for "read")
+            op: "predict" for ALPR results, "draw" for the annotated frame,
+                "read" for the ALPRResult of a pre-cropped plate (OCR only)
+            lane: Request class (default: default_lane)
+
+        Returns:
+            One Future per frame, resolving to the list of ALPRResult (or the
+            annotated frame, or one ALPRResult for "read")
+
+        Raises:
+            SiteBusy: If the site's queue for the lane has no room for the frames
+            UnknownSite: If the site is not registered
+            ValueError: If the lane is unknown
+        """
+        lane = self._lane(lane)
+        futures = [Future() for _ in frames]
+        now = time.monotonic()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Scheduler is closed")
+            site = self._site(site_id)
+            items = site.items[lane]
+            if len(items) + len(frames) > site.max_pending:
+                site.rejected += len(frames)
+                self._lanes[lane].rejected += len(frames)
+                raise SiteBusy(site_id, site.max_pending)
+            items.extend((future, op, frame, now) for future, frame in zip(futures, frames))
+            site.submitted += len(frames)
+            self._lanes[lane].submitted += len(frames)
+            self._cond.notify(len(frames))
+        return futures
+
+    def submit(self, site_id: str, frame, op: str = "predict", lane: Optional[str] = None) -> Future:
+        """Queue one frame for a site. See `submit_many`."""
+        return self.submit_many(site_id, [frame], op, lane)[0]
+
+    def _paused_lanes(self, now: float) -> Set[str]:
+        """Throttle lanes below a lane that is missing its SLO. Needs the lock."""
+        paused = set()
+        degraded = False
+        for lane in self.lanes:
+            if lane.throttle and degraded:
+                paused.add(lane.name)
+            degraded = degraded or self._lanes[lane.name].degraded(now)
+        return paused
+
+    def _take_from(self, lane: str, quota: int, batch: List) -> int:
+        """Move up to `quota` frames of a lane into the batch, `weight` at a time from each site in turn."""
+        order = self._order[lane]
+        taken = 0
+        # Go round the sites until the quota is met or a full round finds nothing
+        idle = 0
+        while taken < quota and idle < len(order):
+            site_id = order[0]
+            order.rotate(-1)
+            site = self._sites[site_id]
+            items = site.items[lane]
+            count = min(site.weight, len(items), quota - taken)
+            for _ in range(count):
+                batch.append((site_id, lane, items.popleft()))
+            taken += count
+            idle = 0 if count else idle + 1
+        return taken
+
+    def _take_batch(self) -> List:
+        """Take up to max_batch frames, `weight` at a time from each lane in priority order."""
+        paused = self._paused_lanes(time.monotonic())
+        batch = []
+        taken = dict.fromkeys(self._lanes, 0)
+        while len(batch) < self.max_batch:
+            progress = False
+            for lane in self.lanes:
+                if lane.name in paused:
+                    continue
+                room = self.max_batch - len(batch)
+                if lane.max_batch is not None:
+                    room = min(room, lane.max_batch - taken[lane.name])
+                if room <= 0:
+                    continue
+                count = self._take_from(lane.name, min(lane.weight, room), batch)
+                taken[lane.name] += count
+                progress = progress or count > 0
+            if not progress:
+                break
+        if not batch:
+            # Only paused lanes have work: let it through one frame at a time
+            for lane in self.lanes:
+                if lane.name in paused and self._take_from(lane.name, 1, batch):
+                    self.throttled += 1
+                    break
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and not any(s.pending for s in self._sites.values()):
+                    self._cond.wait()
+                if self._closed:
+                    return
+                batch = self._take_batch()
+            self._dispatch(batch)
+
+    def _dispatch(self, batch: List):
+        """Run a batch on the shared ALPR and resolve its futures."""
+        try:
+            alpr = self.get_alpr()
+        except Exception as e:
+            alpr, load_error = None, e
+        else:
+            load_error = None
+        outcomes = {}
+        if alpr is None:
+            error = load_error or RuntimeError("ALPR system not initialized")
+            outcomes = {i: error for i in range(len(batch))}
+        else:
+            predict = [i for i, (_, _, item) in enumerate(batch) if item[1] == "predict"]
+            if predict:
+                try:
+                    results = alpr.predict_batch([batch[i][2][2] for i in predict])
+                    outcomes.update(zip(predict, results))
+                except Exception:
+                    # Find the frames that fail instead of failing the whole batch
+                    for i in predict:
+                        outcomes[i] = self._call(alpr.predict, batch[i][2][2])
+            read = [i for i, (_, _, item) in enumerate(batch) if item[1] == "read"]
+            if read and not hasattr(alpr, 'read_plates'):
+                error = RuntimeError("This ALPR backend cannot read pre-cropped plates")
+                outcomes.update((i, error) for i in read)
+            elif read:
+                try:
+                    results = alpr.read_plates([batch[i][2][2] for i in read])
+                    outcomes.update(zip(read, results))
+                except Exception:
+                    # Find the crops that fail instead of failing the whole batch
+                    def read_one(crop):
+                        return alpr.read_plates([crop])[0]
+
+                    for i in read:
+                        outcomes[i] = self._call(read_one, batch[i][2][2])
+            for i, (_, _, item) in enumerate(batch):
+                if item[1] == "draw":
+                    outcomes[i] = self._call(alpr.draw_predictions, item[2])
+
+        done = time.monotonic()
+        with self._cond:
+            self.batches += 1
+            self.frames += len(batch)
+            for i, (site_id, lane, (_, _, _, enqueued_at)) in enumerate(batch):
+                site = self._sites[site_id]
+                wait = done - enqueued_at
+                failed = isinstance(outcomes[i], Exception)
+                site.total_wait += wait
+                site.max_wait = max(site.max_wait, wait)
+                if failed:
+                    site.failed += 1
+                else:
+                    site.completed += 1
+                self._lanes[lane].record(done, wait, failed)
+            # Wakes throttle() callers, whose pause may have ended
+            self._cond.notify_all()
+        for i, (_, _, (future, _, _, _)) in enumerate(batch):
+            if isinstance(outcomes[i], Exception):
+                future.set_exception(outcomes[i])
+            else:
+                future.set_result(outcomes[i])
+
+    @staticmethod
+    def _call(method, frame):
+        try:
+            return method(frame)
+        except Exception as e:
+            return e
+
+    def throttle(self, lane: str = BULK, max_wait: float = 5.0) -> float:
+        """
+        Wait while a lane is paused, for work of that class that runs outside
+        the scheduler (scan exports, reports) and would compete for the CPU.
+
+        Args:
+            lane: The work's request class
+            max_wait: Longest wait in seconds; the work then goes ahead anyway
+
+        Returns:
+            Seconds waited
+        """
+        lane = self._lane(lane)
+        start = time.monotonic()
+        deadline = start + max_wait
+        with self._cond:
+            while not self._closed:
+                now = time.monotonic()
+                if now >= deadline or lane not in self._paused_lanes(now):
+                    break
+                # Latencies also age out of the window without any dispatch
+                self._cond.wait(min(0.25, deadline - now))
+            waited = time.monotonic() - start
+            if waited > 0.001:
+                self.throttle_waits += 1
+        return waited
+
+    def stats(self) -> Dict:
+        """Scheduler counters, with per-lane latency under "lanes" and per-site queue stats under "sites"."""
+        now = time.monotonic()
+        with self._cond:
+            paused = self._paused_lanes(now)
+            return {
+                "batches": self.batches,
+                "frames": self.frames,
+                "avg_batch": round(self.frames / self.batches, 2) if self.batches else 0.0,
+                "max_batch": self.max_batch,
+                "workers": len(self._threads),
+                "throttled": self.throttled,
+                "throttle_waits": self.throttle_waits,
+                "lanes": {
+                    name: state.stats(
+                        now,
+                        sum(len(site.items[name]) for site in self._sites.values()),
+                        name in paused,
+                    )
+                    for name, state in self._lanes.items()
+                },
+                "sites": {site_id: site.stats() for site_id, site in self._sites.items()},
+            }
+
+    def close(self):
+        """Stop the workers. Frames still waiting fail with RuntimeError."""
+        with self._cond:
+            self._closed = True
+            pending = [
+                item for site in self._sites.values() for items in site.items.values() for item in items
+            ]
+            for site in self._sites.values():
+                for items in site.items.values():
+                    items.clear()
+            self._cond.notify_all()
+        for future, _, _, _ in pending:
+            future.set_exception(RuntimeError("Scheduler is closed"))
+        for thread in self._threads:
+            thread.join(timeout=10)
+
+
+class SiteALPR:
+    """
+    One site's view of the shared ALPR: the `predict`, `read_plates` and
+    `draw_predictions` calls of `ALPR`, run through the FairScheduler in one lane. Passed to the site's ALPRService as `alpr`.
+    """
+
+    def __init__(self, scheduler: FairScheduler, site_id: str, lane: Optional[str] = None):
+        self.scheduler = scheduler
+        self.site_id = site_id
+        self.lane = lane
+
+    def with_lane(self, lane: Optional[str]) -> "SiteALPR":
+        """The same site's view in another lane (None: the scheduler's default lane)."""
+        return SiteALPR(self.scheduler, self.site_id, lane)
+
+    def predict(self, frame, timeout: Optional[float] = None):
+        """Mirrors `ALPR.predict`."""
+        return self.scheduler.submit(self.site_id, frame, lane=self.lane).result(timeout=timeout)
+
+    def predict_batch(self, frames, timeout: Optional[float] = None) -> List:
+        """
+        Mirrors `ALPR.predict_batch`. The frames may be spread over several batches.
+
+        More frames than the site's queue holds are queued in chunks, each once
+        the previous chunk is done.
+        """
+        frames = list(frames)
+        chunk = self.scheduler.max_pending(self.site_id)
+        results = []
+        for start in range(0, len(frames), chunk):
+            futures = self.scheduler.submit_many(
+                self.site_id, frames[start:start + chunk], lane=self.lane
+            )
+            results.extend(future.result(timeout=timeout) for future in futures)
+        return results
+
+    def read_plates(self, crops, timeout: Optional[float] = None) -> List:
+        """Mirrors `ALPR.read_plates`. Queued in chunks like `predict_batch`."""
+        crops = list(crops)
+        chunk = self.scheduler.max_pending(self.site_id)
+        results = []
+        for start in range(0, len(crops), chunk):
+            futures = self.scheduler.submit_many(
+                self.site_id, crops[start:start + chunk], op="read", lane=self.lane
+            )
+            results.extend(future.result(timeout=timeout) for future in futures)
+        return results
+
+    def draw_predictions(self, frame, timeout: Optional[float] = None):
+        """Mirrors `ALPR.draw_predictions`."""
+        return self.scheduler.submit(self.site_id, frame, op="draw", lane=self.lane).result(timeout=timeout)
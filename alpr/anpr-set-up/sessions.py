@@ -0,0 +1,451 @@
+"""
+Live vehicle presence: open sessions and occupancy per site.
+
+Scans from cameras with a known direction drive a small state machine per
+plate: an entry scan opens a session, an exit scan closes it. Open sessions
+are kept in memory keyed by site and canonical plate, so "how many cars are
+on site now" and "how long has this car been here" are dict lookups instead
+of log scans. Scans without a direction only refresh an open session's
+last_seen.
+
+State is snapshotted to disk in the background (pickle, written to a
+temporary file and renamed, like the registrations snapshot) and loaded on
+start, so a restart keeps the cars that are still on site.
+
+Usage:
+    engine = SessionEngine(snapshot_path="vehicle_logs/sessions.snapshot")
+    engine.record("191-D-12345", DIRECTION_ENTRY, camera_id="gate-in")
+    engine.occupancy()                 # {"site_id": None, "occupancy": 1, ...}
+    engine.session("191D12345")        # {"plate": "191D12345", "open": {...}, ...}
+"""
+import atexit
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from plates import canonical_plate
+
+DIRECTION_ENTRY = 'entry'
+DIRECTION_EXIT = 'exit'
+DIRECTIONS = (DIRECTION_ENTRY, DIRECTION_EXIT)
+
+SNAPSHOT_VERSION = 1
+
+COUNTERS = (
+    'entries',           # sessions opened
+    'exits',             # sessions closed by an exit scan
+    'repeat_entries',    # entry scans of a plate already on site
+    'repeat_exits',      # exit scans shortly after the same plate left
+    'unmatched_exits',   # exit scans of a plate with no open session
+    'expired',           # open sessions closed for being too old
+)
+
+
+def parse_direction(value: Optional[str]) -> Optional[str]:
+    """
+    Normalize a direction given by a client or in a config.
+
+    Raises:
+        ValueError: If the value is not "entry", "exit" or empty
+    """
+    if value is None or not str(value).strip():
+        return None
+    direction = str(value).strip().lower()
+    if direction not in DIRECTIONS:
+        raise ValueError(f"Invalid direction {value!r}: use 'entry' or 'exit'")
+    return direction
+
+
+def _format_time(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class Session:
+    """One stay of a vehicle at a site, open until its exit scan."""
+
+    __slots__ = (
+        'plate', 'plate_text', 'site_id', 'entered_at', 'entry_camera',
+        'last_seen', 'sightings', 'in_database', 'exited_at', 'exit_camera',
+    )
+
+    def __init__(
+        self,
+        plate: str,
+        plate_text: str,
+        site_id: Optional[str],
+        entered_at: Optional[float],
+        entry_camera: Optional[str] = None,
+        last_seen: Optional[float] = None,
+        sightings: int = 1,
+        in_database: bool = False,
+        exited_at: Optional[float] = None,
+        exit_camera: Optional[str] = None
+    ):
+        self.plate = plate
+        self.plate_text = plate_text
+        self.site_id = site_id
+        self.entered_at = entered_at
+        self.entry_camera = entry_camera
+        self.last_seen = last_seen if last_seen is not None else entered_at
+        self.sightings = sightings
+        self.in_database = in_database
+        self.exited_at = exited_at
+        self.exit_camera = exit_camera
+
+    def to_tuple(self) -> Tuple:
+        """Snapshot form, in __slots__ order."""
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def to_dict(self, now: Optional[float] = None) -> Dict:
+        """
+        JSON-friendly view. duration_seconds runs to `now` while the session is open.
+
+        Unmatched exits have no entered_at and no duration.
+        """
+        end = self.exited_at if self.exited_at is not None else (now or time.time())
+        return {
+            "plate": self.plate,
+            "plate_text": self.plate_text,
+            "site_id": self.site_id,
+            "open": self.exited_at is None,
+            "entered_at": _format_time(self.entered_at),
+            "entry_camera": self.entry_camera,
+            "last_seen": _format_time(self.last_seen),
+            "exited_at": _format_time(self.exited_at),
+            "exit_camera": self.exit_camera,
+            "duration_seconds": (
+                None if self.entered_at is None else round(max(end - self.entered_at, 0.0), 1)
+            ),
+            "sightings": self.sightings,
+            "in_database": self.in_database,
+        }
+
+
+class _SiteState:
+    def __init__(self):
+        self.open: Dict[str, Session] = {}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.peak = 0
+        self.updated_at: Optional[float] = None
+
+
+class SessionEngine:
+    """
+    Open sessions and occupancy counters per site, fed by directed scan events.
+
+    Thread-safe. Sites are created on their first event; site_id None is the
+    single site of a service that does not use sites.
+    """
+
+    def __init__(
+        self,
+        snapshot_path: Optional[str] = None,
+        snapshot_interval: float = 30.0,
+        max_session_seconds: Optional[float] = None,
+        repeat_seconds: float = 60.0,
+        max_closed: int = 10000
+    ):
+        """
+        Load the last snapshot (if any) and start the thread that saves
+        snapshots and expires sessions.
+
+        Args:
+            snapshot_path: File the state is saved to and loaded from. None
+                keeps everything in memory only.
+            snapshot_interval: Seconds between snapshots (only written when
+                something changed) and between checks for expired sessions
+            max_session_seconds: Open sessions not seen for this long are
+                closed as expired (a missed exit scan would otherwise keep a
+                car on site forever). None never expires them.
+            repeat_seconds: An exit scan this soon after the same plate left is
+                a repeated read, not an unmatched exit
+            max_closed: Closed sessions kept for /sessions lookups (oldest dropped first)
+        """
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else None
+        self.snapshot_interval = snapshot_interval
+        self.max_session_seconds = max_session_seconds
+        self.repeat_seconds = repeat_seconds
+        self.max_closed = max_closed
+        self._lock = threading.Lock()
+        self._sites: Dict[Optional[str], _SiteState] = {}
+        # (site_id, plate) -> last closed session, most recently closed last
+        self._closed: 'OrderedDict[Tuple[Optional[str], str], Session]' = OrderedDict()
+        self._dirty = False
+        self._snapshots = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+        if self.snapshot_path is not None:
+            self._load_snapshot()
+        # Expiry needs the thread too, snapshots or not
+        if self.snapshot_path is not None or self.max_session_seconds is not None:
+            self._thread = threading.Thread(
+                target=self._upkeep_loop, name='session-upkeep', daemon=True
+            )
+            self._thread.start()
+            # Keep the last changes on a clean shutdown
+            atexit.register(self.close)
+
+    def _site(self, site_id: Optional[str]) -> _SiteState:
+        state = self._sites.get(site_id)
+        if state is None:
+            state = self._sites[site_id] = _SiteState()
+        return state
+
+    def _remember_closed(self, session: Session):
+        self._closed.pop((session.site_id, session.plate), None)
+        self._closed[(session.site_id, session.plate)] = session
+        while len(self._closed) > self.max_closed:
+            self._closed.popitem(last=False)
+
+    def record(
+        self,
+        plate_text: str,
+        direction: Optional[str],
+        site_id: Optional[str] = None,
+        camera_id: Optional[str] = None,
+        timestamp: Optional[float] = None,
+        in_database: bool = False
+    ) -> Optional[Dict]:
+        """
+        Apply one scan.
+
+        Args:
+            plate_text: Plate as read
+            direction: "entry", "exit", or None for a camera with no direction
+            site_id: Site of the camera
+            camera_id: Camera that read the plate
+            timestamp: Scan time (epoch seconds, default now)
+            in_database: Whether the plate is a known registration
+
+        Returns:
+            The affected session (see Session.to_dict), or None if the scan
+            changed nothing
+        """
+        plate = canonical_plate(plate_text)
+        if not plate:
+            return None
+        now = timestamp if timestamp is not None else time.time()
+        with self._lock:
+            state = self._site(site_id)
+            session = state.open.get(plate)
+
+            if direction == DIRECTION_ENTRY:
+                if session is not None:
+                    state.counters['repeat_entries'] += 1
+                    session.last_seen = now
+                    session.sightings += 1
+                else:
+                    session = Session(plate, plate_text, site_id, now, camera_id,
+                                      in_database=in_database)
+                    state.open[plate] = session
+                    state.counters['entries'] += 1
+                    state.peak = max(state.peak, len(state.open))
+            elif direction == DIRECTION_EXIT:
+                if session is not None:
+                    del state.open[plate]
+                    session.exited_at = session.last_seen = now
+                    session.exit_camera = camera_id
+                    session.sightings += 1
+                    state.counters['exits'] += 1
+                    self._remember_closed(session)
+                else:
+                    last = self._closed.get((site_id, plate))
+                    if last is not None and now - last.exited_at <= self.repeat_seconds:
+                        state.counters['repeat_exits'] += 1
+                        last.sightings += 1
+                        session = last
+                    else:
+                        # Entered before tracking started, or the entry was missed
+                        state.counters['unmatched_exits'] += 1
+                        session = Session(plate, plate_text, site_id, None, None, now,
+                                          in_database=in_database, exited_at=now,
+                                          exit_camera=camera_id)
+                        self._remember_closed(session)
+            elif session is not None:
+                session.last_seen = now
+                session.sightings += 1
+            else:
+                return None
+
+            state.updated_at = now
+            self._dirty = True
+            return session.to_dict(now)
+
+    def occupancy(self, site_id: Optional[str] = None) -> Dict:
+        """Vehicles on site now, the peak and the event counters of one site."""
+        with self._lock:
+            state = self._sites.get(site_id) or _SiteState()
+            return {
+                "site_id": site_id,
+                "occupancy": len(state.open),
+                "peak": state.peak,
+                **state.counters,
+                "updated_at": _format_time(state.updated_at),
+            }
+
+    def session(self, plate_text: str, site_id: Optional[str] = None) -> Dict:
+        """
+        The open session of a plate at a site, and its last closed one.
+
+        Returns:
+            {"plate", "site_id", "on_site", "open", "last"}: "open" and
+            "last" are Session.to_dict() views or None
+        """
+        plate = canonical_plate(plate_text)
+        now = time.time()
+        with self._lock:
+            state = self._sites.get(site_id)
+            session = state.open.get(plate) if state is not None else None
+            last = self._closed.get((site_id, plate))
+            return {
+                "plate": plate,
+                "site_id": site_id,
+                "on_site": session is not None,
+                "open": session.to_dict(now) if session is not None else None,
+                "last": last.to_dict(now) if last is not None else None,
+            }
+
+    def find(self, plate_text: str) -> List[Dict]:
+        """session() of the plate at every site that has seen it."""
+        plate = canonical_plate(plate_text)
+        with self._lock:
+            site_ids = [
+                site_id for site_id, state in self._sites.items()
+                if plate in state.open or (site_id, plate) in self._closed
+            ]
+        return [self.session(plate, site_id) for site_id in site_ids]
+
+    def open_sessions(self, site_id: Optional[str] = None) -> List[Dict]:
+        """Every vehicle on site now, longest stay first."""
+        now = time.time()
+        with self._lock:
+            state = self._sites.get(site_id)
+            sessions = list(state.open.values()) if state is not None else []
+        sessions.sort(key=lambda session: session.entered_at)
+        return [session.to_dict(now) for session in sessions]
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """
+        Close open sessions not seen for max_session_seconds.
+
+        Returns:
+            Number of sessions expired
+        """
+        if self.max_session_seconds is None:
+            return 0
+        now = now if now is not None else time.time()
+        cutoff = now - self.max_session_seconds
+        expired = 0
+        with self._lock:
+            for state in self._sites.values():
+                stale = [s for s in state.open.values() if s.last_seen < cutoff]
+                for session in stale:
+                    del state.open[session.plate]
+                    session.exited_at = now
+                    state.counters['expired'] += 1
+                    self._remember_closed(session)
+                expired += len(stale)
+            if expired:
+                self._dirty = True
+        return expired
+
+    def stats(self) -> Dict:
+        """Engine-wide counters for the metrics endpoints."""
+        with self._lock:
+            return {
+                "sites": len(self._sites),
+                "open": sum(len(state.open) for state in self._sites.values()),
+                "closed_kept": len(self._closed),
+                "snapshots": self._snapshots,
+            }
+
+    def save_snapshot(self) -> bool:
+        """
+        Write the state to snapshot_path now.
+
+        Returns:
+            False if there is no snapshot_path or the write failed
+        """
+        if self.snapshot_path is None:
+            return False
+        with self._lock:
+            data = {
+                'version': SNAPSHOT_VERSION,
+                'saved_at': time.time(),
+                'sites': {
+                    site_id: {
+                        'open': [session.to_tuple() for session in state.open.values()],
+                        'counters': dict(state.counters),
+                        'peak': state.peak,
+                        'updated_at': state.updated_at,
+                    }
+                    for site_id, state in self._sites.items()
+                },
+                'closed': [session.to_tuple() for session in self._closed.values()],
+            }
+            self._dirty = False
+        tmp = self.snapshot_path.with_name(self.snapshot_path.name + '.tmp')
+        try:
+            with open(tmp, 'wb') as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.snapshot_path)
+        except OSError as e:
+            print(f"Error writing sessions snapshot: {e}")
+            with self._lock:
+                self._dirty = True
+            return False
+        with self._lock:
+            self._snapshots += 1
+        return True
+
+    def _load_snapshot(self):
+        """Restore the state saved by save_snapshot (a locally written, trusted pickle)."""
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                data = pickle.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            print(f"Error reading sessions snapshot: {e}")
+            return
+        if not isinstance(data, dict) or data.get('version') != SNAPSHOT_VERSION:
+            return
+        for site_id, saved in data['sites'].items():
+            state = self._site(site_id)
+            for values in saved['open']:
+                session = Session(*values)
+                state.open[session.plate] = session
+            state.counters.update(saved['counters'])
+            state.peak = saved['peak']
+            state.updated_at = saved['updated_at']
+        for values in data['closed']:
+            session = Session(*values)
+            self._closed[(session.site_id, session.plate)] = session
+        print(f"Restored {sum(len(s.open) for s in self._sites.values())} open sessions")
+
+    def _upkeep_loop(self):
+        while not self._stop.wait(self.snapshot_interval):
+            try:
+                self.expire()
+                if self._dirty and self.snapshot_path is not None:
+                    self.save_snapshot()
+            except Exception as e:
+                print(f"Error saving sessions: {e}")
+
+    def close(self):
+        """Stop the upkeep thread and write a final snapshot."""
+        self._stop.set()
+        atexit.unregister(self.close)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._dirty:
+            self.save_snapshot()
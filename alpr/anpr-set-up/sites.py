@@ -0,0 +1,606 @@
+"""
+Multi-site scan routing.
+
+One backend serving several car parks: each site gets its own registrations,
+scan log partition (`<logs_dir>/<site_id>/`) and stats, while every site
+shares a single ALPR instance. Inference requests from all sites go through
+a `FairScheduler`, which keeps a bounded queue per site and builds each
+inference batch round-robin across the sites with work waiting, so a busy
+site cannot starve the others. Within that, gate-camera scans run in the
+scheduler's realtime lane ahead of interactive and bulk work (scheduler.py).
+
+Usage:
+    from sites import MultiSiteService, create_site_routes
+
+    sites = MultiSiteService.from_config("sites.json")
+    result = sites.scan_image("north", image_data=data, camera_id="gate-1")
+    create_site_routes(app, sites)
+
+sites.json:
+    {
+        "logs_dir": "vehicle_logs",
+        "sites": {
+            "north": {"registrations_csv_path": "north.csv", "weight": 2},
+            "south": {"registrations_csv_path": "south.csv", "max_pending": 32,
+                      "camera_directions": {"gate-in": "entry", "gate-out": "exit"}}
+        }
+    }
+"""
+import json
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from alpr_loader import describe_models, import_alpr, shared_model_registry
+from alpr_service import ALPRService, decode_base64_image, read_request_args
+from event_sink import EventSink
+from rollups import merge_rollups, summarize
+from scan_feed import SSE_HEADERS, FeedFull, ScanFeed, event_filter, parse_event_id
+from scheduler import FairScheduler, SiteALPR, SiteBusy, UnknownSite  # noqa: F401 (re-exported)
+from sessions import SessionEngine
+
+DEFAULT_DETECTOR_MODEL = "yolo-v9-t-384-license-plate-end2end"
+DEFAULT_OCR_MODEL = "cct-xs-v1-global-model"
+
+# Site ids name log directories and URL segments
+SITE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class MultiSiteService:
+    """
+    Per-site ALPRServices sharing one ALPR through a FairScheduler.
+
+    Each site has its own registrations CSV, scan log and scan store under
+    `<logs_dir>/<site_id>/`, and its own queue and counters in the scheduler.
+    """
+
+    def __init__(
+        self,
+        sites: Dict[str, Dict],
+        logs_dir: Optional[str] = None,
+        detector_model: str = DEFAULT_DETECTOR_MODEL,
+        ocr_model: str = DEFAULT_OCR_MODEL,
+        alpr_kwargs: Optional[Dict] = None,
+        alpr=None,
+        load_alpr: Optional[Callable] = None,
+        model_registry=None,
+        max_batch: int = 8,
+        workers: int = 1,
+        default_weight: int = 1,
+        default_max_pending: int = 64,
+        preload_models: bool = False,
+        sessions_snapshot_path: Optional[str] = None,
+        session_max_hours: Optional[float] = None,
+        backend_url: Optional[str] = None,
+        backend_headers: Optional[Dict[str, str]] = None,
+        **service_kwargs
+    ):
+        """
+        Build the site services. The models load on the first scan unless preload_models.
+
+        Args:
+            sites: site_id -> settings. "weight" and "max_pending" configure the
+                site's queue; everything else (registrations_csv_path,
+                registrations_snapshot_path, ...) is passed to its ALPRService.
+            logs_dir: Parent of the per-site log directories
+            detector_model: ALPR detector model name
+            ocr_model: ALPR OCR model name
+            alpr_kwargs: Extra ALPR arguments (crop_quality, ocr_cache, plate_decoder, ...)
+            alpr: An existing ALPR (or InferencePool) to share instead of building
+                one. close() leaves it open.
+            load_alpr: Callable returning the ALPR to share, e.g. AppState.load_alpr.
+                Takes precedence over the model arguments; close() leaves it open.
+            model_registry: fast_alpr ModelRegistry for a built ALPR (default: the
+                process-wide one)
+            max_batch: Most frames per inference batch
+            workers: Scheduler dispatch threads
+            default_weight: Weight of sites that do not set one
+            default_max_pending: Queue bound of sites that do not set one
+            preload_models: Load the models now instead of on the first scan
+            sessions_snapshot_path: Snapshot of the session engine all sites share
+                (default: <logs_dir>/sessions.snapshot)
+            session_max_hours: Close open sessions not seen for this long (a missed
+                exit scan); None keeps them open
+            backend_url: Parking backend endpoint the scans of every site are
+                POSTed to, through one shared EventSink spooling to
+                <logs_dir>/backend_spool. Each event carries its site_id.
+            backend_headers: Extra headers for backend_url (e.g. Authorization)
+            **service_kwargs: Passed to every site's ALPRService
+        """
+        if not sites:
+            raise ValueError("At least one site is required")
+        self.logs_dir = Path(logs_dir) if logs_dir else Path(__file__).parent / "vehicle_logs"
+        self.logs_dir.mkdir(exist_ok=True)
+        self.alpr = alpr
+        self._owns_alpr = False
+        self._load_alpr = load_alpr
+        self._model_registry = model_registry
+        self._alpr_lock = threading.Lock()
+        self._alpr_settings = {
+            "detector_model": detector_model,
+            "ocr_model": ocr_model,
+            **(alpr_kwargs or {}),
+        }
+
+        self.scheduler = FairScheduler(self.get_alpr, max_batch=max_batch, workers=workers)
+        # One engine for every site, so a plate can be found without knowing its site
+        self.sessions = SessionEngine(
+            snapshot_path=sessions_snapshot_path or str(self.logs_dir / "sessions.snapshot"),
+            max_session_seconds=session_max_hours * 3600 if session_max_hours else None,
+        )
+        # One feed for every site; each event carries its site_id
+        self.feed = ScanFeed()
+        # One backend connection pool and spool for every site
+        self.event_sink = EventSink(
+            backend_url,
+            headers=backend_headers,
+            spool_dir=str(self.logs_dir / "backend_spool"),
+        ) if backend_url else None
+        self.sites: Dict[str, ALPRService] = {}
+        for site_id, settings in sites.items():
+            if not SITE_ID_PATTERN.match(site_id):
+                raise ValueError(f"Invalid site id {site_id!r}: use letters, digits, '-' and '_'")
+            settings = dict(settings)
+            self.scheduler.add_site(
+                site_id,
+                weight=int(settings.pop("weight", default_weight)),
+                max_pending=int(settings.pop("max_pending", default_max_pending)),
+            )
+            self.sites[site_id] = ALPRService(
+                logs_dir=str(self.logs_dir / site_id),
+                alpr=SiteALPR(self.scheduler, site_id),
+                site_id=site_id,
+                sessions=self.sessions,
+                feed=self.feed,
+                event_sink=self.event_sink,
+                **{**service_kwargs, **settings},
+            )
+
+        if preload_models:
+            self.get_alpr()
+
+    @classmethod
+    def from_config(cls, path, **kwargs) -> "MultiSiteService":
+        """
+        Build from a JSON file with a "sites" object (see the module docstring).
+
+        Top-level keys other than "sites" are constructor arguments; `kwargs` override them.
+        Relative CSV and log paths are resolved against the file's directory.
+        """
+        path = Path(path)
+        with open(path, 'r') as f:
+            config = json.load(f)
+        base = path.parent
+
+        def resolve(value):
+            return str(base / value) if value and not os.path.isabs(value) else value
+
+        sites = {}
+        for site_id, settings in config.pop("sites", {}).items():
+            settings = dict(settings)
+            for key in ("registrations_csv_path", "registrations_snapshot_path"):
+                if key in settings:
+                    settings[key] = resolve(settings[key])
+            if "watchlist_paths" in settings:
+                settings["watchlist_paths"] = [resolve(p) for p in settings["watchlist_paths"]]
+            sites[site_id] = settings
+        for key in ("logs_dir", "sessions_snapshot_path"):
+            if key in config:
+                config[key] = resolve(config[key])
+        if "watchlist_paths" in config:
+            config["watchlist_paths"] = [resolve(p) for p in config["watchlist_paths"]]
+        return cls(sites, **{**config, **kwargs})
+
+    def get_alpr(self):
+        """
+        The shared ALPR, loading the models on first use.
+
+        Returns:
+            The ALPR instance, or None if it could not be loaded
+        """
+        if self._load_alpr is not None:
+            return self._load_alpr()
+        if self.alpr is None:
+            with self._alpr_lock:
+                if self.alpr is None:
+                    self._initialize_alpr()
+        return self.alpr
+
+    def _initialize_alpr(self):
+        """Build the shared ALPR from the model settings."""
+        try:
+            ALPR = import_alpr()
+            if self._model_registry is None:
+                self._model_registry = shared_model_registry()
+        except ImportError:
+            print("WARNING: fast_alpr not available. Install with: pip install fast-alpr[onnx]")
+            return
+
+        try:
+            self.alpr = ALPR(**self._alpr_settings, model_registry=self._model_registry)
+            self._owns_alpr = True
+            print(f"ALPR system initialized for {len(self.sites)} sites")
+        except Exception as e:
+            print(f"Error initializing ALPR: {e}")
+            self.alpr = None
+
+    def site(self, site_id: str) -> ALPRService:
+        """
+        The ALPRService of a site.
+
+        Raises:
+            UnknownSite: If no site has this id
+        """
+        service = self.sites.get(site_id)
+        if service is None:
+            raise UnknownSite(site_id)
+        return service
+
+    def scan_image(self, site_id: str, camera_id: Optional[str] = None, **kwargs) -> Dict:
+        """Scan an image for a site. Takes the arguments of `ALPRService.scan_image`."""
+        return self.site(site_id).scan_image(camera_id=camera_id, **kwargs)
+
+    def scan_images(
+        self,
+        site_id: str,
+        images: List,
+        camera_id: Optional[str] = None,
+        **kwargs
+    ) -> List[Dict]:
+        """Scan several images for a site. Takes the arguments of `ALPRService.scan_images`."""
+        return self.site(site_id).scan_images(images, camera_id=camera_id, **kwargs)
+
+    def get_occupancy(self) -> Dict:
+        """Vehicles on site now at every site, and the total."""
+        sites = [service.get_occupancy() for service in self.sites.values()]
+        return {"total": sum(site["occupancy"] for site in sites), "sites": sites}
+
+    def get_summary(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        days: int = 7,
+        bucket: str = "day"
+    ) -> Dict:
+        """
+        Scan analytics of every site together (see ALPRService.get_summary).
+
+        The sites' hourly rollups are merged before summarizing, so a plate
+        seen at two sites counts once in unique_plates.
+        """
+        if start is None and end is None:
+            start = (datetime.now() - timedelta(days=max(days, 1) - 1)).strftime("%Y-%m-%d")
+        rollups = merge_rollups(
+            service.scan_store.rollups(start, end) for service in self.sites.values()
+        )
+        return {"sites": list(self.sites), **summarize(rollups, bucket)}
+
+    def site_metrics(self, site_id: str) -> Dict:
+        """Queue, log writer and registration counters of one site."""
+        service = self.site(site_id)
+        return {
+            "site_id": site_id,
+            "queue": self.scheduler.stats()["sites"][site_id],
+            "log_writer": service.log_writer.stats(),
+            "registrations": len(service.registrations_db),
+            "occupancy": service.get_occupancy(),
+        }
+
+    def get_metrics(self) -> Dict:
+        """Scheduler counters, per-site metrics and the loaded models."""
+        scheduler = self.scheduler.stats()
+        sites = scheduler.pop("sites")
+        metrics = {
+            "scheduler": scheduler,
+            "sites": {
+                site_id: {
+                    "queue": sites[site_id],
+                    "log_writer": service.log_writer.stats(),
+                    "registrations": len(service.registrations_db),
+                    "occupancy": service.get_occupancy(),
+                }
+                for site_id, service in self.sites.items()
+            },
+            "sessions": self.sessions.stats(),
+            "feed": self.feed.stats(),
+        }
+        if self.event_sink is not None:
+            metrics["backend"] = self.event_sink.stats()
+        if self._model_registry is not None:
+            metrics["models"] = describe_models(self._model_registry)
+        return metrics
+
+    def close(self):
+        """
+        Stop the scheduler, close every site, save the sessions, end the feed,
+        flush the backend sink and release a built ALPR.
+        """
+        self.scheduler.close()
+        for service in self.sites.values():
+            service.close()
+        self.sessions.close()
+        self.feed.close()
+        if self.event_sink is not None:
+            self.event_sink.close()
+        with self._alpr_lock:
+            if self._owns_alpr and self.alpr is not None:
+                self.alpr.close()
+            self.alpr = None
+            self._owns_alpr = False
+
+
+def create_site_routes(app, sites: MultiSiteService, url_prefix: str = '/api/sites'):
+    """
+    Add per-site ALPR routes to a Flask app.
+
+    Routes (under url_prefix):
+        GET  /                              Sites and their queue stats
+        GET  /metrics                       Scheduler and per-site metrics
+        GET  /occupancy                     Vehicles on site now, per site and in total
+        GET  /sessions/<plate_text>         The plate's stays at every site
+        GET  /events                        Live scans of every site (SSE); ?site=, ?camera=
+        GET  /events/recent                 Buffered scans after ?after=<event id>
+        GET  /summary                       Scan analytics of all sites; ?start=, ?end=,
+                                            ?days=7, ?bucket=day|hour|none
+        POST /<site_id>/scan                Multipart "image", optional "camera" field
+        POST /<site_id>/scan/batch          Multipart "images" or JSON {"images": [...]};
+                                            optional ?camera=
+        POST /<site_id>/read                Pre-cropped plates or image + boxes, like /api/alpr/read
+        GET  /<site_id>/logs                Same filters as /api/alpr/logs
+        GET  /<site_id>/stats/<plate_text>  Plate statistics at this site
+        POST /<site_id>/reload              Reload the site's registrations
+        GET  /<site_id>/metrics             Site metrics
+        GET  /<site_id>/summary             Scan analytics of the site, same parameters
+        GET  /<site_id>/occupancy           Vehicles on the site now; ?vehicles=true lists them
+        GET  /<site_id>/sessions/<plate>    Current and last stay of a plate at the site
+        GET  /<site_id>/watchlist/<plate>   Watchlist entries matching a plate
+        POST /<site_id>/watchlist/reload    Reload the site's watchlists
+        GET  /<site_id>/events              Live scans of the site (SSE); ?camera=
+        GET  /<site_id>/events/recent       Buffered scans of the site after ?after=<id>
+
+    Scan routes take an optional "direction" ("entry"/"exit") for cameras
+    without a configured direction, and an optional "priority" lane
+    ("realtime", "interactive", "bulk"; see scheduler.scan_lane).
+
+    A site whose queue is full for the scan's lane answers 429 with a
+    Retry-After header.
+    """
+    from flask import Blueprint, Response, jsonify, request
+
+    bp = Blueprint('sites', __name__, url_prefix=url_prefix)
+
+    def busy(site_id: str, lane: str, frames: int = 1):
+        if sites.scheduler.has_capacity(site_id, frames, lane):
+            return None
+        return busy_response(site_id, lane)
+
+    def busy_response(site_id: str, lane: str, results: Optional[List] = None):
+        body = {"success": False, "error": f"Site {site_id!r} is busy ({lane} lane)", "busy": True}
+        if results is not None:
+            body["results"] = results
+        response = jsonify(body)
+        response.headers['Retry-After'] = '1'
+        return response, 429
+
+    def event_stream(site_id: Optional[str]):
+        try:
+            subscription = sites.feed.subscribe(
+                last_event_id=parse_event_id(
+                    request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+                ),
+                backlog=request.args.get('backlog', 0, type=int),
+                match=event_filter(site_id, request.args.get('camera')),
+            )
+        except FeedFull as e:
+            return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+        return Response(subscription, mimetype='text/event-stream', headers=SSE_HEADERS)
+
+    def recent_events(site_id: Optional[str]):
+        return jsonify(sites.feed.recent(
+            after=parse_event_id(request.args.get('after')),
+            limit=request.args.get('limit', 100, type=int),
+            match=event_filter(site_id, request.args.get('camera')),
+        ))
+
+    def summary_args() -> Dict:
+        return {
+            "start": request.args.get('start'),
+            "end": request.args.get('end'),
+            "days": request.args.get('days', 7, type=int),
+            "bucket": request.args.get('bucket', 'day'),
+        }
+
+    @bp.errorhandler(UnknownSite)
+    def unknown_site(e):
+        return jsonify({"error": f"Unknown site {e.args[0]!r}"}), 404
+
+    @bp.route('/', methods=['GET'])
+    def list_sites():
+        stats = sites.scheduler.stats()["sites"]
+        return jsonify({"sites": [{"site_id": s, **stats[s]} for s in sites.sites]})
+
+    @bp.route('/metrics', methods=['GET'])
+    def metrics():
+        return jsonify(sites.get_metrics())
+
+    @bp.route('/occupancy', methods=['GET'])
+    def occupancy():
+        return jsonify(sites.get_occupancy())
+
+    @bp.route('/events', methods=['GET'])
+    def events():
+        return event_stream(request.args.get('site'))
+
+    @bp.route('/events/recent', methods=['GET'])
+    def events_recent():
+        return recent_events(request.args.get('site'))
+
+    @bp.route('/summary', methods=['GET'])
+    def summary():
+        try:
+            return jsonify(sites.get_summary(**summary_args()))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    @bp.route('/sessions/<plate_text>', methods=['GET'])
+    def find_sessions(plate_text):
+        found = sites.sessions.find(plate_text)
+        return jsonify({"plate_text": plate_text, "sessions": found, "count": len(found)})
+
+    @bp.route('/<site_id>/scan', methods=['POST'])
+    def scan(site_id):
+        service = sites.site(site_id)
+        file = request.files.get('image')
+        if file is None or file.filename == '':
+            return jsonify({"error": "No image provided"}), 400
+        camera_id = request.form.get('camera')
+        direction = request.form.get('direction')
+        try:
+            lane = service.lane_for(request.form.get('priority'), camera_id, direction)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        rejected = busy(site_id, lane)
+        if rejected:
+            return rejected
+
+        result = service.scan_image(
+            image_data=file.read(),
+            camera_id=camera_id,
+            direction=direction,
+            priority=lane,
+        )
+        if not result["success"] and result.get("too_large"):
+            return jsonify(result), 413
+        if not result["success"] and result.get("busy"):
+            return jsonify(result), 429, {"Retry-After": "1"}
+        return jsonify(result)
+
+    @bp.route('/<site_id>/scan/batch', methods=['POST'])
+    def scan_batch(site_id):
+        service = sites.site(site_id)
+        if request.files:
+            images = [file.read() for file in request.files.getlist('images')]
+        else:
+            data = request.get_json(silent=True) or {}
+            images = data.get('images')
+            if not isinstance(images, list):
+                return jsonify({"error": "No images provided"}), 400
+            images = [decode_base64_image(image) for image in images]
+        if not images:
+            return jsonify({"error": "No images provided"}), 400
+        camera_id = request.args.get('camera')
+        direction = request.args.get('direction')
+        try:
+            lane = service.lane_for(request.args.get('priority'), camera_id, direction, bulk=True)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        rejected = busy(site_id, lane, len(images))
+        if rejected:
+            return rejected
+
+        results = service.scan_images(
+            images,
+            annotate=request.args.get('annotate', '').lower() in ('1', 'true'),
+            camera_id=camera_id,
+            direction=direction,
+            priority=lane,
+        )
+        if any(r.get("busy") for r in results):
+            return busy_response(site_id, lane, results)
+        return jsonify({
+            "results": results,
+            "count": len(results),
+            "failed": sum(1 for r in results if not r["success"]),
+        })
+
+    @bp.route('/<site_id>/read', methods=['POST'])
+    def read(site_id):
+        service = sites.site(site_id)
+        try:
+            args = read_request_args(request)
+            args["priority"] = service.lane_for(args["priority"], args["camera_id"], args["direction"])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        rejected = busy(site_id, args["priority"], len(args["plates"] or args["boxes"]))
+        if rejected:
+            return rejected
+
+        result = service.read_plates(**args)
+        if not result["success"] and result.get("too_large"):
+            return jsonify(result), 413
+        if not result["success"] and result.get("busy"):
+            return jsonify(result), 429, {"Retry-After": "1"}
+        return jsonify(result)
+
+    @bp.route('/<site_id>/logs', methods=['GET'])
+    def logs(site_id):
+        in_database = request.args.get('in_database')
+        entries = sites.site(site_id).get_vehicle_logs(
+            date=request.args.get('date'),
+            limit=int(request.args.get('limit', 100)),
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            plate_text=request.args.get('plate'),
+            min_confidence=request.args.get('min_confidence', type=float),
+            in_database=None if in_database is None else in_database.lower() in ('1', 'true'),
+            camera_id=request.args.get('camera'),
+        )
+        return jsonify({"site_id": site_id, "logs": entries, "count": len(entries)})
+
+    @bp.route('/<site_id>/stats/<plate_text>', methods=['GET'])
+    def stats(site_id, plate_text):
+        days = int(request.args.get('days', 30))
+        stats = sites.site(site_id).get_vehicle_stats(plate_text, days=days)
+        return jsonify({"site_id": site_id, **stats})
+
+    @bp.route('/<site_id>/reload', methods=['POST'])
+    def reload(site_id):
+        stats = sites.site(site_id).reload_registrations()
+        return jsonify({"site_id": site_id, "success": stats["mode"] != "error", **stats})
+
+    @bp.route('/<site_id>/watchlist/<plate_text>', methods=['GET'])
+    def watchlist(site_id, plate_text):
+        matches = sites.site(site_id).check_watchlist(plate_text)
+        return jsonify({"site_id": site_id, "plate_text": plate_text,
+                        "matches": matches, "count": len(matches)})
+
+    @bp.route('/<site_id>/watchlist/reload', methods=['POST'])
+    def reload_watchlist(site_id):
+        stats = sites.site(site_id).reload_watchlist()
+        return jsonify({"site_id": site_id, "success": stats["mode"] != "error", **stats})
+
+    @bp.route('/<site_id>/events', methods=['GET'])
+    def site_events(site_id):
+        sites.site(site_id)  # 404 for an unknown site
+        return event_stream(site_id)
+
+    @bp.route('/<site_id>/events/recent', methods=['GET'])
+    def site_events_recent(site_id):
+        sites.site(site_id)  # 404 for an unknown site
+        return recent_events(site_id)
+
+    @bp.route('/<site_id>/metrics', methods=['GET'])
+    def site_metrics(site_id):
+        return jsonify(sites.site_metrics(site_id))
+
+    @bp.route('/<site_id>/summary', methods=['GET'])
+    def site_summary(site_id):
+        service = sites.site(site_id)
+        try:
+            return jsonify({"site_id": site_id, **service.get_summary(**summary_args())})
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    @bp.route('/<site_id>/occupancy', methods=['GET'])
+    def site_occupancy(site_id):
+        include_vehicles = request.args.get('vehicles', '').lower() in ('1', 'true')
+        return jsonify(sites.site(site_id).get_occupancy(include_vehicles=include_vehicles))
+
+    @bp.route('/<site_id>/sessions/<plate_text>', methods=['GET'])
+    def site_session(site_id, plate_text):
+        return jsonify(sites.site(site_id).get_session(plate_text))
+
+    app.register_blueprint(bp)
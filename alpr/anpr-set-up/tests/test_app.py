@@ -0,0 +1,174 @@
+"""
+Test the web app's routes and per-app state, with a fake ALPR.
+"""
+import base64
+import io
+from typing import NamedTuple, Optional
+
+import cv2
+import numpy as np
+import pytest
+
+import app as app_module
+from app import STATE_KEY, create_app
+
+# A frame filled with i reads as PLATES[i]
+PLATES = ["191-D-12345", "12-KY-999", "ABC-123"]
+
+
+class BoundingBox(NamedTuple):
+    x1: int
+    y1: int
+    x2: int
+    y2: int
+
+
+class Detection(NamedTuple):
+    confidence: float
+    bounding_box: BoundingBox
+
+
+class OcrResult(NamedTuple):
+    text: str
+    confidence: float
+
+
+class Result(NamedTuple):
+    detection: Detection
+    ocr: OcrResult
+    skip_reason: Optional[str] = None
+
+
+class FakeALPR:
+    """Reads one plate per frame."""
+
+    def predict(self, frame):
+        return [Result(Detection(0.9, BoundingBox(1, 2, 3, 4)), OcrResult(PLATES[frame.flat[0]], 0.8))]
+
+    def predict_batch(self, frames):
+        return [self.predict(frame) for frame in frames]
+
+    def read_plates(self, crops):
+        return [self.predict(crop)[0] for crop in crops]
+
+    def draw_predictions(self, frame):
+        return frame
+
+
+def png(plate: int) -> io.BytesIO:
+    return io.BytesIO(cv2.imencode(".png", np.full((8, 8, 3), plate, np.uint8))[1].tobytes())
+
+
+def png_base64(plate: int) -> str:
+    return base64.b64encode(png(plate).getvalue()).decode()
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    monkeypatch.delenv("ALPR_SITES_CONFIG", raising=False)
+    monkeypatch.delenv("ALPR_PRIORITY_LANES", raising=False)
+    states = []
+
+    def make_app(name: str = "logs"):
+        app = create_app(load_models=False, logs_dir=tmp_path / name)
+        state = app.extensions[STATE_KEY]
+        state.alpr = FakeALPR()
+        states.append(state)
+        return app
+
+    yield make_app
+    for state in states:
+        state.close()
+
+
+def test_each_app_has_its_own_state(make_app):
+    first, second = make_app("first"), make_app("second")
+    response = first.test_client().post("/api/scan", data={"image": (png(0), "car.png"), "camera": "gate"})
+    assert response.status_code == 200
+    assert response.get_json()["plates"][0]["text"] == "191-D-12345"
+
+    first.extensions[STATE_KEY].scan_log_writer.flush()
+    [logged] = first.test_client().get("/api/logs").get_json()["logs"]
+    assert (logged["plate_text"], logged["image_filename"]) == ("191-D-12345", "car.png")
+    assert second.test_client().get("/api/logs").get_json()["count"] == 0
+    assert "191-D-12345" in first.extensions[STATE_KEY].log_file.read_text()
+    assert "191-D-12345" not in second.extensions[STATE_KEY].log_file.read_text()
+
+
+def test_scan_batch_fails_only_the_bad_images(make_app):
+    app = make_app()
+    response = app.test_client().post("/api/scan/batch", json={"images": [png_base64(0), "AAAAA", png_base64(2)]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body["count"], body["failed"]) == (3, 1)
+    first, bad, last = body["results"]
+    assert (first["filename"], first["plates"][0]["text"]) == ("image_0", "191-D-12345")
+    assert (bad["index"], bad["success"]) == (1, False) and bad["error"].startswith("image_1: ")
+    assert (last["index"], last["plates"][0]["text"]) == (2, "ABC-123")
+
+    app.extensions[STATE_KEY].scan_log_writer.flush()
+    logs = app.test_client().get("/api/logs?limit=10").get_json()["logs"]
+    assert sorted(log["image_filename"] for log in logs) == ["image_0", "image_2"]
+
+
+def test_scan_maps_bad_requests_to_400(make_app):
+    client = make_app().test_client()
+    response = client.post("/api/scan", data={"image": (png(0), "car.png"), "priority": "urgent"})
+    assert response.status_code == 400
+    response = client.post("/api/scan", data={"image": (io.BytesIO(b"not an image"), "car.png")})
+    assert response.status_code == 400
+    assert response.get_json()["invalid"] is True
+
+
+def test_scans_run_through_the_priority_lanes(make_app, monkeypatch):
+    monkeypatch.setenv("ALPR_PRIORITY_LANES", "1")
+    app = make_app()
+    response = app.test_client().post("/api/scan", data={"image": (png(1), "car.png"), "priority": "realtime"})
+    assert response.get_json()["plates"][0]["text"] == "12-KY-999"
+    # The read and the annotated image
+    assert app.extensions[STATE_KEY].lane_scheduler.stats()["lanes"]["realtime"]["completed"] == 2
+
+
+def test_process_returns_the_mobile_app_shape(make_app):
+    app = make_app()
+    response = app.test_client().post("/process", json={"image": png_base64(2), "camera": "gate"})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["detections"] == [{"registration": "ABC-123", "confidence": 0.8, "bbox": [1.0, 2.0, 3.0, 4.0]}]
+    assert "annotated_image" not in body
+
+    response = app.test_client().post("/process", json={"image": "AAAAA"})
+    assert response.status_code == 400
+
+
+def test_process_plates_reads_crops_and_boxes(make_app):
+    client = make_app().test_client()
+    body = client.post("/process/plates", json={"plates": [png_base64(1), png_base64(0)]}).get_json()
+    assert [(d["index"], d["registration"]) for d in body["detections"]] == [(0, "12-KY-999"), (1, "191-D-12345")]
+    assert "bbox" not in body["detections"][0]
+
+    body = client.post("/process/plates", json={"image": png_base64(2), "boxes": [[0, 0, 4, 4]]}).get_json()
+    assert body["detections"] == [{"index": 0, "registration": "ABC-123", "confidence": 0.8, "bbox": [0.0, 0.0, 4.0, 4.0]}]
+
+    response = client.post("/process/plates", json={"image": png_base64(2), "boxes": [[5, 5, 5, 5]]})
+    assert response.status_code == 400
+
+
+def test_health_reports_the_state_of_its_app(make_app):
+    app = make_app()
+    assert app.test_client().get("/api/health").get_json()["alpr_initialized"] is True
+    app.extensions[STATE_KEY].alpr = None
+    app.extensions[STATE_KEY].alpr_init_error = "no models"
+    health = app.test_client().get("/health").get_json()
+    assert (health["status"], health["alpr_error"]) == ("initializing", "no models")
+
+
+def test_old_module_attributes_resolve_on_the_module_app(make_app, monkeypatch):
+    app = make_app()
+    monkeypatch.setattr(app_module, "app", app, raising=False)
+    state = app.extensions[STATE_KEY]
+    assert app_module.scan_store is state.scan_store
+    assert app_module.session_engine is state.session_engine
+    assert app_module.initialize_alpr() is state.alpr
+    with pytest.raises(AttributeError):
+        app_module.no_such_attribute
@@ -0,0 +1,163 @@
+"""
+Test backend delivery against a local stand-in HTTP server.
+"""
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from event_sink import ConnectionPool, EventSink
+
+
+class StandInBackend:
+    """Answers each POST with `status` (or the next of `statuses`) and records it."""
+
+    def __init__(self):
+        self.status = 200
+        self.statuses = []
+        self.requests = []
+        self._sockets = set()
+        self._lock = threading.Lock()
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with backend._lock:
+                    backend._sockets.add(self.connection)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with backend._lock:
+                    backend.requests.append((dict(self.headers), body))
+                    status = backend.statuses.pop(0) if backend.statuses else backend.status
+                self.send_response(status)
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/events"
+
+    def drop_connections(self):
+        """Close the open keep-alive connections, as a server's idle timeout does."""
+        with self._lock:
+            for sock in self._sockets:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            self._sockets.clear()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def backend():
+    backend = StandInBackend()
+    yield backend
+    backend.close()
+
+
+def make_sink(backend, **kwargs):
+    options = dict(flush_interval=0.05, retry_base=0.01, retry_max=0.05)
+    options.update(kwargs)
+    return EventSink(backend.url, **options)
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_delivers_a_batch_with_its_idempotency_key(backend):
+    sink = make_sink(backend, headers={"Authorization": "Bearer t"})
+    for i in range(3):
+        sink.submit({"seq": i})
+    sink.flush()
+    sink.close()
+
+    assert len(backend.requests) == 1
+    headers, body = backend.requests[0]
+    assert headers["Idempotency-Key"] == body["batch_id"]
+    assert headers["Authorization"] == "Bearer t"
+    assert body["count"] == 3
+    assert [event["seq"] for event in body["events"]] == [0, 1, 2]
+    assert sink.stats()["delivered"] == 3
+
+
+def test_retries_5xx_and_429_then_spools(backend, tmp_path):
+    backend.status = 503
+    backend.statuses = [503, 429]
+    sink = make_sink(backend, spool_dir=str(tmp_path), max_attempts=3)
+    sink.submit({"seq": 0})
+    sink.flush()
+
+    stats = sink.stats()
+    assert stats["spooled_batches"] == 1
+    assert stats["failed_attempts"] >= 3
+    # Every attempt of the batch is the same request
+    keys = {headers["Idempotency-Key"] for headers, _ in backend.requests}
+    assert len(keys) == 1
+    assert [path.name.split("_")[-1] for path in tmp_path.glob("*.json")] == [f"{keys.pop()}.json"]
+    sink.close()
+
+
+def test_other_4xx_is_rejected_not_retried(backend, tmp_path):
+    backend.status = 400
+    sink = make_sink(backend, spool_dir=str(tmp_path))
+    sink.submit({"seq": 0})
+    sink.submit({"seq": 1})
+    sink.flush()
+    sink.close()
+
+    assert len(backend.requests) == 1
+    stats = sink.stats()
+    assert stats["rejected"] == 2
+    assert stats["spooled_batches"] == 0
+    assert not list(tmp_path.glob("*.json"))
+
+
+def test_spool_drains_oldest_first_when_the_backend_is_back(backend, tmp_path):
+    backend.status = 503
+    sink = make_sink(backend, spool_dir=str(tmp_path), max_attempts=1)
+    for seq in range(4):
+        sink.submit({"seq": seq})
+        # One batch per event
+        sink.flush()
+    assert sink.stats()["spooled_batches"] == 4
+
+    backend.status = 200
+    wait_for(lambda: sink.stats()["delivered"] == 4)
+    sink.close()
+    # Failed attempts come first; the four that succeeded are the last requests
+    delivered = [body["events"][0]["seq"] for _, body in backend.requests]
+    assert delivered[-4:] == [0, 1, 2, 3]
+    assert sink.stats()["spooled_batches"] == 0
+    assert not list(tmp_path.glob("*.json"))
+
+
+def test_stale_keepalive_connection_is_replaced(backend):
+    pool = ConnectionPool(backend.url)
+    assert pool.post(b'{"events": []}', {"Content-Type": "application/json"})[0] == 200
+    assert pool.opened == 1
+    backend.drop_connections()
+    time.sleep(0.05)
+    assert pool.post(b'{"events": []}', {"Content-Type": "application/json"})[0] == 200
+    assert pool.opened == 2
+    pool.close()
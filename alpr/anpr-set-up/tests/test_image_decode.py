@@ -0,0 +1,102 @@
+"""
+Test header sniffing, reduced-resolution decodes and chunked base64 uploads.
+"""
+import base64
+
+import cv2
+import numpy as np
+import pytest
+
+from image_decode import (
+    BASE64_CHUNK,
+    ImageTooLarge,
+    crop_boxes,
+    decode_base64,
+    decode_image,
+    decode_image_file,
+    image_size,
+    reduction_factor,
+)
+
+
+def encode(ext: str, width: int = 320, height: int = 240) -> bytes:
+    """A gradient image of the given size, encoded as `ext`."""
+    frame = np.zeros((height, width, 3), np.uint8)
+    frame[:, :, 1] = np.linspace(0, 255, width, dtype=np.uint8)
+    ok, data = cv2.imencode(ext, frame)
+    assert ok
+    return data.tobytes()
+
+
+@pytest.mark.parametrize("ext", [".jpg", ".png", ".bmp", ".webp"])
+def test_image_size_reads_the_header(ext):
+    assert image_size(encode(ext, 321, 123)) == (321, 123)
+
+
+def test_image_size_rejects_unknown_data():
+    assert image_size(b"GIF89a" + bytes(40)) is None
+    assert image_size(b"\xff\xd8") is None
+
+
+def test_reduction_factor():
+    assert reduction_factor(1000, 1000, 1_000_000) == 1
+    assert reduction_factor(2000, 1000, 1_000_000) == 2
+    assert reduction_factor(8000, 8000, 1_000_000) == 8
+    with pytest.raises(ImageTooLarge):
+        reduction_factor(9000, 8000, 1_000_000)
+
+
+def test_decode_reduces_to_the_pixel_budget():
+    img, scale = decode_image(encode(".jpg", 640, 480), max_pixels=640 * 480 // 4)
+    assert scale == 2
+    assert img.shape == (240, 320, 3)
+
+    img, scale = decode_image(encode(".png", 640, 480))
+    assert scale == 1
+    assert img.shape == (480, 640, 3)
+
+
+def test_decode_rejects_bad_input():
+    with pytest.raises(ValueError, match="Empty"):
+        decode_image(b"")
+    with pytest.raises(ValueError, match="decode"):
+        decode_image(b"\x89PNG\r\n\x1a\n" + bytes(40))
+    with pytest.raises(ImageTooLarge):
+        decode_image(encode(".png", 640, 480), max_pixels=640 * 480 // 100)
+
+
+def test_decode_image_file(tmp_path):
+    path = tmp_path / "car.jpg"
+    path.write_bytes(encode(".jpg"))
+    img, _ = decode_image_file(path)
+    assert img.shape == (240, 320, 3)
+    with pytest.raises(ValueError, match="load"):
+        decode_image_file(tmp_path / "missing.jpg")
+
+
+def test_crop_boxes_scales_and_clips():
+    frame = np.arange(100 * 200).reshape(100, 200)
+    [crop] = crop_boxes(frame, [[20, 40, 500, 80]], scale=2)
+    assert crop.shape == (20, 190)
+    assert np.shares_memory(crop, frame)
+    for box in ([1, 2, 3], [300, 300, 400, 400]):
+        with pytest.raises(ValueError):
+            crop_boxes(frame, [box])
+
+
+def test_decode_base64_in_chunks():
+    data = bytes(range(256)) * (BASE64_CHUNK // 256 * 3 + 7)
+    text = base64.b64encode(data).decode()
+    assert bytes(decode_base64(text)) == data
+    assert bytes(decode_base64("data:image/jpeg;base64," + text[:4000])) == data[:3000]
+    # Wrapped base64 is accepted
+    assert bytes(decode_base64("AAEC\nAwQF")) == bytes(range(6))
+
+
+def test_decode_base64_limits_and_errors():
+    with pytest.raises(ImageTooLarge):
+        decode_base64(base64.b64encode(bytes(1000)).decode(), max_bytes=999)
+    with pytest.raises(ValueError):
+        decode_base64("AAAAA")
+    with pytest.raises(ValueError):
+        decode_base64(b"AAAA")
@@ -0,0 +1,80 @@
+"""
+Test the multi-process inference pool, with a fake ALPR in the workers.
+"""
+import os
+import time
+
+import numpy as np
+import pytest
+
+from inference_server import InferencePool
+
+# Frames filled with this value kill the worker that gets them
+CRASH = 255
+
+
+class FakeALPR:
+    """Reports each frame's mean; crashes the process on a CRASH frame."""
+
+    def predict(self, frame):
+        if frame.size and frame.flat[0] == CRASH:
+            os._exit(1)
+        return [float(frame.mean())]
+
+    def read_plates(self, crops):
+        return [f"crop {crop.shape[1]}x{crop.shape[0]}" for crop in crops]
+
+    def draw_predictions(self, frame):
+        frame[...] = 7
+
+
+def fake_alpr():
+    return FakeALPR()
+
+
+@pytest.fixture
+def pool():
+    pool = InferencePool(workers=2, slots=2, slot_bytes=1024, alpr_factory=fake_alpr,
+                         factory_kwargs={}, request_timeout=10.0)
+    pool.start()
+    yield pool
+    pool.shutdown()
+
+
+def frame(value: int, size: int = 8) -> np.ndarray:
+    return np.full((size, size, 3), value, dtype=np.uint8)
+
+
+def test_predict_and_draw(pool):
+    assert pool.predict(frame(3)) == [3.0]
+    # A frame larger than a slot gets a one-off buffer
+    assert pool.predict_batch([frame(1), frame(2, size=32), frame(4)]) == [[1.0], [2.0], [4.0]]
+    assert (pool.draw_predictions(frame(0)) == 7).all()
+
+
+def test_read_plates_reads_each_crop(pool):
+    crops = [frame(1, size=4), frame(2, size=32), np.zeros((6, 20, 3), np.uint8)]
+    assert pool.read_plates(crops) == ["crop 4x4", "crop 32x32", "crop 20x6"]
+
+
+def test_dead_worker_fails_its_requests_and_is_replaced(pool):
+    with pytest.raises(RuntimeError, match="exited with code 1"):
+        pool.predict(frame(CRASH))
+    assert pool.restarts == 1
+    # Every buffer is back and the replacement serves requests
+    assert pool._free_slots.qsize() == pool.num_slots
+    deadline = time.monotonic() + 30
+    while not all(worker.ready for worker in pool._workers) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert pool.predict_batch([frame(i) for i in range(6)]) == [[float(i)] for i in range(6)]
+    assert len(pool._workers) == 2
+
+
+def test_no_free_buffer_times_out(pool):
+    pool.request_timeout = 0.2
+    taken = [pool._free_slots.get() for _ in range(pool.num_slots)]
+    with pytest.raises(RuntimeError, match="no free frame buffer"):
+        pool.predict(frame(1))
+    for shm in taken:
+        pool._free_slots.put(shm)
+    assert pool.predict(frame(1)) == [1.0]
@@ -0,0 +1,116 @@
+"""
+Test the background log writer's batching, overflow policies and shutdown.
+"""
+import threading
+import time
+
+import pytest
+
+from log_writer import AsyncLogWriter
+
+
+class GatedSink:
+    """Records batches; holds the writer thread inside the sink until released."""
+
+    def __init__(self, gated: bool = False):
+        self.batches = []
+        self.entered = threading.Event()
+        self.gate = threading.Event()
+        if not gated:
+            self.gate.set()
+
+    def __call__(self, batch):
+        self.entered.set()
+        self.gate.wait()
+        self.batches.append(list(batch))
+
+    @property
+    def events(self):
+        return [event for batch in self.batches for event in batch]
+
+
+def stall(writer: AsyncLogWriter, sink: GatedSink):
+    """Get the writer thread stuck in the sink, so later events stay queued."""
+    writer.submit("first")
+    assert sink.entered.wait(5)
+
+
+def test_batches_in_order():
+    sink = GatedSink()
+    writer = AsyncLogWriter(sink, batch_size=2, flush_interval=0.01)
+    for i in range(5):
+        assert writer.submit(i)
+    writer.flush()
+    assert sink.events == [0, 1, 2, 3, 4]
+    assert all(len(batch) <= 2 for batch in sink.batches)
+    writer.close()
+    assert writer.stats()["written"] == 5
+
+
+def test_drop_when_full():
+    sink = GatedSink(gated=True)
+    writer = AsyncLogWriter(sink, max_queue=2, flush_interval=0.01)
+    stall(writer, sink)
+    assert writer.submit("a") and writer.submit("b")
+    assert not writer.submit("c")
+    assert writer.stats()["dropped"] == 1
+
+    sink.gate.set()
+    writer.close()
+    assert sink.events == ["first", "a", "b"]
+
+
+def test_block_waits_for_room_or_times_out():
+    sink = GatedSink(gated=True)
+    writer = AsyncLogWriter(sink, max_queue=1, flush_interval=0.01, overflow="block", block_timeout=0.1)
+    stall(writer, sink)
+    assert writer.submit("a")
+    started = time.monotonic()
+    assert not writer.submit("late")
+    assert time.monotonic() - started >= 0.1
+    assert writer.stats()["dropped"] == 1
+
+    writer.block_timeout = 5
+    result = []
+    blocked = threading.Thread(target=lambda: result.append(writer.submit("b")))
+    blocked.start()
+    time.sleep(0.05)
+    assert not result
+    sink.gate.set()
+    blocked.join(5)
+    assert result == [True]
+    writer.close()
+    assert sink.events == ["first", "a", "b"]
+
+
+def test_sink_errors_are_counted():
+    def sink(batch):
+        raise OSError("disk full")
+
+    writer = AsyncLogWriter(sink, flush_interval=0.01)
+    writer.submit("a")
+    writer.flush()
+    assert writer.stats()["failed"] == 1
+    writer.close()
+
+
+@pytest.mark.parametrize("overflow", ["drop", "block"])
+def test_close_keeps_every_accepted_event(overflow):
+    # Submits racing close() are either written or refused, never lost
+    for _ in range(20):
+        sink = GatedSink()
+        writer = AsyncLogWriter(sink, flush_interval=0.001, overflow=overflow)
+        accepted = []
+
+        def submit(offset):
+            accepted.extend(i for i in range(offset, offset + 500) if writer.submit(i))
+
+        threads = [threading.Thread(target=submit, args=(n * 1000,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        writer.close()
+        for thread in threads:
+            thread.join()
+        assert sorted(sink.events) == sorted(accepted)
+        assert writer.stats()["dropped"] == 2000 - len(accepted)
+    assert not writer.submit("after close")
@@ -0,0 +1,152 @@
+"""
+Test the registration database's loading, incremental reloads and snapshot swaps.
+"""
+import io
+import os
+import time
+
+import pytest
+
+from registrations import (
+    RegistrationDatabase,
+    VehicleRecord,
+    parse_records,
+    read_snapshot,
+    write_snapshot,
+)
+
+HEADER = "registration,owner,vehicle_type,make,model,color,notes\n"
+
+
+def row(plate: str, owner: str = "Owner", make: str = "Toyota") -> str:
+    return f"{plate},{owner},Car,{make},Corolla,Blue,\n"
+
+
+def touch(path):
+    """Move the mtime on, so an edit that keeps the size is still noticed."""
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "registrations.csv"
+    path.write_text(HEADER + row("191-D-12345") + row("12-KY-999"))
+    return path
+
+
+def test_lookup_ignores_case_spaces_and_dashes(csv_path):
+    db = RegistrationDatabase(str(csv_path), watch=False)
+    assert len(db) == 2
+    assert db.lookup("191 d 12345").registration == "191-D-12345"
+    assert db.lookup("UNKNOWN") is None
+
+
+def test_appended_rows_are_parsed_alone_and_shared(csv_path):
+    db = RegistrationDatabase(str(csv_path), watch=False)
+    before = db.snapshot
+    with open(csv_path, "a") as f:
+        f.write(row("ABC-123") + row("12-KY-999", owner="New owner"))
+
+    stats = db.reload()
+    assert stats["mode"] == "append"
+    assert (stats["added"], stats["updated"], stats["removed"]) == (1, 1, 0)
+    assert db.lookup("ABC123") is not None
+    assert db.lookup("12KY999").owner == "New owner"
+    # Copy-on-write: the old snapshot is untouched and unchanged records are shared
+    assert len(before) == 2 and before.lookup("12KY999").owner == "Owner"
+    assert db.lookup("191D12345") is before.lookup("191D12345")
+    assert db.reload()["mode"] == "unchanged"
+
+
+def test_edited_prefix_is_reparsed_and_diffed(csv_path):
+    db = RegistrationDatabase(str(csv_path), watch=False)
+    # Longer than before, but not an append: the first row changed
+    csv_path.write_text(HEADER + row("191-D-12345", make="Honda") + row("ABC-123") + row("XYZ-9"))
+    stats = db.reload()
+    assert stats["mode"] == "full"
+    assert (stats["added"], stats["updated"], stats["removed"]) == (2, 1, 1)
+    assert db.lookup("12KY999") is None
+    assert db.lookup("191D12345").make == "Honda"
+
+    # Same size, new content
+    csv_path.write_text(HEADER + row("191-D-12345", make="Mazda") + row("ABC-123") + row("XYZ-9"))
+    touch(csv_path)
+    assert db.changed()
+    assert db.reload()["updated"] == 1
+
+
+def test_missing_file_empties_the_database(csv_path):
+    db = RegistrationDatabase(str(csv_path), watch=False)
+    csv_path.unlink()
+    assert db.changed()
+    stats = db.reload()
+    assert stats["mode"] == "missing"
+    assert stats["removed"] == 2
+    assert len(db) == 0
+
+
+def test_bad_csv_keeps_the_current_snapshot(csv_path):
+    db = RegistrationDatabase(str(csv_path), watch=False)
+    csv_path.write_text("plate,owner\nABC,Someone\n")
+    assert db.reload()["mode"] == "error"
+    assert len(db) == 2
+
+
+def test_watcher_reloads_changes(csv_path):
+    db = RegistrationDatabase(str(csv_path), poll_interval=0.02)
+    try:
+        with open(csv_path, "a") as f:
+            f.write(row("ABC-123"))
+        deadline = time.monotonic() + 5
+        while db.lookup("ABC123") is None and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert db.lookup("ABC123") is not None
+    finally:
+        db.stop()
+
+
+def test_parse_records_reorders_pads_and_dedupes():
+    lines = io.StringIO(
+        "make,registration,owner\n"
+        "Ford, abc-123 ,First\n"
+        "\n"
+        "Audi,XYZ-9\n"
+        "Opel,ABC 123,Second\n"
+    )
+    records, fieldnames = parse_records(lines)
+    assert fieldnames == ["make", "registration", "owner"]
+    assert records == {
+        "ABC123": VehicleRecord("ABC 123", "Second", "", "Opel", "", "", ""),
+        "XYZ9": VehicleRecord("XYZ-9", "", "", "Audi", "", "", ""),
+    }
+    with pytest.raises(ValueError, match="registration"):
+        parse_records(io.StringIO("plate,owner\nABC,Someone\n"))
+
+
+def test_parse_records_interns_repeated_columns():
+    lines = [HEADER] + [row(f"P{i}", make="".join(["Toy", "ota"])) for i in range(3)]
+    records, _ = parse_records(lines)
+    makes = [record.make for record in records.values()]
+    assert makes[0] is makes[1] is makes[2]
+
+
+def test_snapshot_file_is_used_while_the_csv_is_unchanged(csv_path, tmp_path):
+    snapshot_path = tmp_path / "registrations.snapshot"
+    first = RegistrationDatabase(str(csv_path), watch=False, snapshot_path=str(snapshot_path))
+    assert snapshot_path.exists()
+
+    second = RegistrationDatabase(str(csv_path), watch=False, snapshot_path=str(snapshot_path))
+    assert second.reload(force=True)["mode"] == "snapshot"
+    assert dict(second.snapshot.registrations) == dict(first.snapshot.registrations)
+
+    # A changed CSV makes the snapshot stale
+    csv_path.write_text(HEADER + row("ABC-123"))
+    assert second.reload(force=True)["mode"] == "full"
+    assert list(second.snapshot.registrations) == ["ABC123"]
+
+
+def test_snapshot_refuses_values_with_its_separator(tmp_path):
+    records = {"ABC": VehicleRecord("ABC", "a\x1fb", "", "", "", "", "")}
+    assert not write_snapshot(tmp_path / "s", "digest", list(HEADER.strip().split(",")), records)
+    assert read_snapshot(tmp_path / "s", "digest") is None
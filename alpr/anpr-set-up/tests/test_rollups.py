@@ -0,0 +1,112 @@
+"""
+Test the HyperLogLog sketch, hourly rollup merging and the dashboard summary.
+"""
+import pytest
+
+from rollups import HLL_REGISTERS, HourRollup, HyperLogLog, merge_rollups, summarize
+from scan_store import ScanStore
+
+
+def sketch(plates) -> HyperLogLog:
+    hll = HyperLogLog()
+    for plate in plates:
+        hll.add(plate)
+    return hll
+
+
+@pytest.mark.parametrize("distinct", [0, 1, 100, 5000, 50000])
+def test_count_is_within_a_few_percent(distinct):
+    # Every plate added twice: duplicates do not count
+    hll = sketch(f"P{i}" for i in list(range(distinct)) * 2)
+    assert abs(hll.count() - distinct) <= max(0.05 * distinct, 1)
+
+
+def test_merge_is_the_union():
+    north = sketch(f"P{i}" for i in range(0, 3000))
+    south = sketch(f"P{i}" for i in range(2000, 5000))
+    union = HyperLogLog.union([north, south])
+    assert abs(union.count() - 5000) <= 250
+    north.merge(south)
+    assert north.registers == union.registers
+    # Merging is idempotent
+    north.merge(south)
+    assert north.registers == union.registers
+    assert HyperLogLog.union([]).count() == 0
+
+
+def test_sketch_round_trips_compressed():
+    hll = sketch(["191D12345", "12KY999"])
+    data = hll.to_bytes()
+    assert len(data) < HLL_REGISTERS // 10
+    assert HyperLogLog.from_bytes(data).registers == hll.registers
+    with pytest.raises(ValueError):
+        HyperLogLog(b"\0" * 10)
+
+
+def rollup(*scans) -> HourRollup:
+    hour = HourRollup()
+    for plate, confidence, in_database in scans:
+        hour.add(plate, confidence, in_database)
+    return hour
+
+
+def test_merge_rollups_across_sites():
+    north = {
+        "2024-01-15 08": rollup(("ABC123", 0.91, True), ("XYZ9", 0.42, False)),
+        "2024-01-15 09": rollup(("ABC123", 0.95, True)),
+    }
+    south = {
+        "2024-01-15 09": rollup(("ABC123", 0.99, None)),
+        "2024-01-16 10": rollup(("NEW1", None, False)),
+    }
+    summary = summarize(merge_rollups([north, south]), bucket="day")
+    assert (summary["first_hour"], summary["last_hour"]) == ("2024-01-15 08", "2024-01-16 10")
+    assert summary["scans"] == 5
+    assert summary["unique_plates"] == 3
+    assert (summary["checked"], summary["in_database"], summary["hit_rate"]) == (4, 2, 0.5)
+    assert summary["mean_confidence"] == round((0.91 + 0.42 + 0.95 + 0.99) / 4, 4)
+    assert [b["count"] for b in summary["confidence_histogram"] if b["count"]] == [1, 1, 2]
+
+    days = {b["period"]: (b["scans"], b["unique_plates"]) for b in summary["buckets"]}
+    assert days == {"2024-01-15": (4, 2), "2024-01-16": (1, 1)}
+    hours = summarize(merge_rollups([north, south]), bucket="hour")["buckets"]
+    assert [b["period"] for b in hours] == ["2024-01-15 08", "2024-01-15 09", "2024-01-16 10"]
+    assert "buckets" not in summarize(north, bucket="none")
+    with pytest.raises(ValueError):
+        summarize(north, bucket="week")
+
+
+def test_empty_summary():
+    summary = summarize({})
+    assert summary["scans"] == 0 and summary["unique_plates"] == 0
+    assert summary["hit_rate"] is None and summary["buckets"] == []
+
+
+def test_scan_store_keeps_rollups_in_step(tmp_path):
+    store = ScanStore(tmp_path / "scans.db")
+    store.add_many([
+        {"timestamp": "2024-01-15 08:10:00", "plate_text": "191-D-12345", "confidence": 0.9, "in_database": True},
+        {"timestamp": "2024-01-15 08:50:00", "plate_text": "191d12345", "confidence": 0.8, "in_database": True},
+        {"timestamp": "2024-01-15 09:05:00", "plate_text": "XYZ9", "confidence": 0.7, "in_database": False},
+    ])
+    store.add_many([{"timestamp": "2024-01-15 08:30:00", "plate_text": "XYZ9", "confidence": 0.6}])
+
+    assert set(store.rollups()) == {"2024-01-15 08", "2024-01-15 09"}
+    assert store.rollups(start="2024-01-15 09:30:00").keys() == {"2024-01-15 09"}
+    summary = store.summary(bucket="hour")
+    assert [(b["scans"], b["unique_plates"]) for b in summary["buckets"]] == [(3, 2), (1, 1)]
+    assert summary["unique_plates"] == 2
+
+    # Rebuilding from the scans gives the same rollups
+    before = store.rollups()
+    assert store.rebuild_rollups() == 2
+    after = store.rollups()
+    assert after.keys() == before.keys()
+    for hour, rollup in after.items():
+        assert (rollup.scans, rollup.checked, rollup.in_database) == (
+            before[hour].scans, before[hour].checked, before[hour].in_database
+        )
+        assert rollup.confidence_sum == pytest.approx(before[hour].confidence_sum)
+        assert rollup.histogram == before[hour].histogram
+        assert rollup.plates.registers == before[hour].plates.registers
+    store.close()
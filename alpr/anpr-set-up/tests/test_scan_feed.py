@@ -0,0 +1,58 @@
+"""
+Test the live scan feed's subscriptions.
+"""
+import threading
+import time
+
+from scan_feed import ScanFeed, event_filter
+
+
+def test_stream_replays_backlog_and_filters():
+    feed = ScanFeed(heartbeat_seconds=5)
+    feed.publish({"site_id": "a", "plate_text": "1"})
+    feed.publish({"site_id": "b", "plate_text": "2"})
+    stream = iter(feed.subscribe(backlog=2, match=event_filter(site_id="a")))
+    assert next(stream).startswith("retry:")
+    message = next(stream)
+    assert '"plate_text": "1"' in message and '"2"' not in message
+    stream.close()
+    assert feed.stats()["subscribers"] == 0
+
+
+def test_filtered_stream_sends_keepalives_under_unrelated_traffic():
+    feed = ScanFeed(max_subscribers=1, heartbeat_seconds=0.2)
+    stop = threading.Event()
+
+    def other_site():
+        while not stop.is_set():
+            feed.publish({"site_id": "other"})
+            time.sleep(0.01)
+
+    publisher = threading.Thread(target=other_site, daemon=True)
+    publisher.start()
+    stream = iter(feed.subscribe(match=event_filter(site_id="mine")))
+    next(stream)
+    received = []
+    reader = threading.Thread(target=lambda: received.append(next(stream)), daemon=True)
+    reader.start()
+    reader.join(timeout=2)
+    stop.set()
+    publisher.join()
+    assert received == [": keepalive\n\n"]
+    # The WSGI server closes the stream once the write fails, freeing the slot
+    stream.close()
+    assert feed.stats()["subscribers"] == 0
+    feed.subscribe().close()
+
+
+def test_gap_when_events_left_the_ring():
+    feed = ScanFeed(capacity=2, heartbeat_seconds=5)
+    first = feed.publish({"plate_text": "1"})
+    for plate in "234":
+        feed.publish({"plate_text": plate})
+    stream = iter(feed.subscribe(last_event_id=first))
+    next(stream)
+    message = next(stream)
+    assert message.startswith("event: gap")
+    assert '"plate_text": "3"' in message and '"plate_text": "4"' in message
+    stream.close()
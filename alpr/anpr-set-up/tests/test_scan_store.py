@@ -0,0 +1,79 @@
+"""
+Test the SQLite scan store's inserts, queries and exports.
+"""
+import json
+
+import numpy as np
+import pytest
+
+from scan_store import ScanStore
+
+
+def scan(timestamp: str, plate: str, confidence: float = 0.9, **extra) -> dict:
+    return {"timestamp": timestamp, "plate_text": plate, "confidence": confidence, **extra}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ScanStore(tmp_path / "scans.db", flush_interval=0.01)
+    yield store
+    store.close()
+
+
+def test_query_filters(store):
+    store.add_many([
+        scan("2024-01-14 23:59:59", "191-D-12345", 0.95, in_database=True, camera_id="gate"),
+        scan("2024-01-15 08:00:00", "191d12345", 0.60, in_database=True),
+        scan("2024-01-15 09:30:00", "12-KY-999", 0.80, in_database=False, camera_id="gate"),
+        scan("2024-01-16 00:00:00", "12-KY-999", 0.99),
+    ])
+
+    day = store.query(start="2024-01-15", end="2024-01-15")
+    assert [s["timestamp"] for s in day] == ["2024-01-15 09:30:00", "2024-01-15 08:00:00"]
+    # Plates match on their canonical form
+    assert len(store.query(plate="191 D 12345")) == 2
+    assert [s["confidence"] for s in store.query(min_confidence=0.9, newest_first=False)] == [0.95, 0.99]
+    assert [s["plate_text"] for s in store.query(in_database=False)] == ["12-KY-999"]
+    assert len(store.query(camera_id="gate")) == 2
+    assert len(store.query(limit=None)) == 4
+    assert store.query(limit=1)[0]["in_database"] is None
+
+
+def test_add_writes_in_the_background(store):
+    assert store.add(scan("2024-01-15 08:00:00", "ABC123", vehicle_info={"make": "Ford"}))
+    store.flush()
+    [row] = store.query()
+    assert row["vehicle_info"] == {"make": "Ford"}
+
+
+def test_plate_stats(store):
+    store.add_many(scan(f"2024-01-15 0{i}:00:00", "ABC123") for i in range(5))
+    stats = store.plate_stats("abc-123", max_scans=2)
+    assert stats["total_scans"] == 5
+    assert stats["first_seen"] == "2024-01-15 00:00:00"
+    assert stats["last_seen"] == "2024-01-15 04:00:00"
+    # The most recent scans, oldest first
+    assert [s["timestamp"] for s in stats["scans"]] == ["2024-01-15 03:00:00", "2024-01-15 04:00:00"]
+
+
+def test_reopen_and_import_legacy_logs(tmp_path):
+    ScanStore(tmp_path / "scans.db").add_many([scan("2024-01-15 08:00:00", "ABC123")])
+    log = tmp_path / "scanned_registrations.log"
+    log.write_text(
+        f"2024-01-15 09:00:00,000 - {json.dumps(scan('2024-01-15 09:00:00', 'XYZ9'))}\n"
+        "not a scan line\n"
+        f"2024-01-15 10:00:00,000 - {json.dumps({'timestamp': '2024-01-15 10:00:00', 'raw': 1})}\n"
+    )
+
+    store = ScanStore(tmp_path / "scans.db")
+    assert not store.created
+    assert store.import_text_log(log) == 1
+    assert [s["plate_text"] for s in store.query()] == ["XYZ9", "ABC123"]
+
+
+def test_export_npz(store, tmp_path):
+    store.add_many([scan("2024-01-15 08:00:00", "ABC123"), scan("2024-01-16 08:00:00", "XYZ9")])
+    path = store.export(tmp_path / "out.npz", start="2024-01-16")
+    data = np.load(path)
+    assert data["plate_text"].tolist() == ["XYZ9"]
+    assert data["in_database"].tolist() == [-1]
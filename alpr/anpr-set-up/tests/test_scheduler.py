@@ -0,0 +1,168 @@
+"""
+Test the fair scheduler's batching, priority lanes, SLO throttling and back-pressure.
+"""
+import threading
+import time
+
+import pytest
+
+from scheduler import BULK, REALTIME, FairScheduler, Lane, SiteALPR, SiteBusy, UnknownSite
+
+
+class FakeALPR:
+    """Returns each frame as its result and records the batches; `gate` holds the first batch."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches = []
+        self.entered = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def predict(self, frame):
+        return [frame]
+
+    def predict_batch(self, frames):
+        self.entered.set()
+        self.gate.wait()
+        time.sleep(self.delay)
+        self.batches.append(list(frames))
+        return [[frame] for frame in frames]
+
+    def draw_predictions(self, frame):
+        return f"drawn {frame}"
+
+
+@pytest.fixture
+def alpr():
+    return FakeALPR()
+
+
+def make_scheduler(alpr, **kwargs) -> FairScheduler:
+    scheduler = FairScheduler(lambda: alpr, **kwargs)
+    scheduler.add_site("blocker")
+    return scheduler
+
+
+def stall(scheduler: FairScheduler, alpr: FakeALPR, lane=None):
+    """Get the dispatch thread stuck in the ALPR, so later frames stay queued."""
+    alpr.gate.clear()
+    future = scheduler.submit("blocker", "blocker", lane=lane)
+    assert alpr.entered.wait(5)
+    return future
+
+
+def test_sites_share_batches_by_weight(alpr):
+    scheduler = make_scheduler(alpr, max_batch=6, lanes=(Lane("only", weight=6),), default_lane="only")
+    scheduler.add_site("north", weight=2)
+    scheduler.add_site("south")
+    stall(scheduler, alpr)
+    north = scheduler.submit_many("north", [f"n{i}" for i in range(6)])
+    south = scheduler.submit_many("south", [f"s{i}" for i in range(6)])
+    alpr.gate.set()
+    assert [f.result(5) for f in north + south] == [[f"n{i}"] for i in range(6)] + [[f"s{i}"] for i in range(6)]
+
+    # Two frames from north for every one from south, while both have work
+    assert alpr.batches[1] == ["n0", "n1", "s0", "n2", "n3", "s1"]
+    assert alpr.batches[2] == ["n4", "n5", "s2", "s3", "s4", "s5"]
+    scheduler.close()
+
+
+def test_lanes_are_served_in_priority_order_and_bulk_is_capped(alpr):
+    scheduler = make_scheduler(alpr, max_batch=8)
+    stall(scheduler, alpr, lane=REALTIME)
+    futures = [scheduler.submit("blocker", f"b{i}", lane=BULK) for i in range(4)]
+    futures += [scheduler.submit("blocker", f"i{i}") for i in range(3)]
+    futures += [scheduler.submit("blocker", f"r{i}", lane=REALTIME) for i in range(3)]
+    alpr.gate.set()
+    for future in futures:
+        future.result(5)
+
+    assert alpr.batches[1] == ["r0", "r1", "r2", "i0", "i1", "b0", "i2", "b1"]
+    assert alpr.batches[2] == ["b2", "b3"]
+    lanes = scheduler.stats()["lanes"]
+    assert lanes[REALTIME]["completed"] == 4 and lanes[BULK]["completed"] == 4
+    scheduler.close()
+
+
+def test_a_lane_missing_its_slo_pauses_the_throttle_lanes():
+    alpr = FakeALPR(delay=0.1)
+    lanes = (Lane("gate", slo_ms=50), Lane("reports", throttle=True))
+    scheduler = FairScheduler(lambda: alpr, lanes=lanes, default_lane="gate", slo_window=0.5)
+    scheduler.add_site("north")
+    scheduler.submit("north", "slow").result(5)
+
+    stats = scheduler.stats()["lanes"]
+    assert stats["gate"]["degraded"] and stats["gate"]["slo_misses"] == 1
+    assert stats["gate"]["slo_attainment"] == 0.0
+    assert stats["reports"]["paused"]
+
+    # Paused work still runs, one frame at a time
+    alpr.delay = 0
+    futures = scheduler.submit_many("north", ["r0", "r1", "r2"], lane="reports")
+    assert [f.result(5) for f in futures] == [["r0"], ["r1"], ["r2"]]
+    assert alpr.batches[-3:] == [["r0"], ["r1"], ["r2"]]
+    assert scheduler.stats()["throttled"] == 3
+
+    # Outside work waits until the slow latency leaves the window
+    waited = scheduler.throttle("reports", max_wait=5)
+    assert 0 < waited < 5
+    assert not scheduler.stats()["lanes"]["reports"]["paused"]
+    assert scheduler.throttle("gate") < 0.01
+    scheduler.close()
+
+
+def test_a_full_site_is_rejected_without_affecting_the_others(alpr):
+    scheduler = make_scheduler(alpr, max_batch=8)
+    scheduler.add_site("north", max_pending=2)
+    scheduler.add_site("south", max_pending=2)
+    stall(scheduler, alpr)
+    queued = scheduler.submit_many("north", ["n0", "n1"])
+    assert not scheduler.has_capacity("north")
+    with pytest.raises(SiteBusy) as busy:
+        scheduler.submit("north", "n2")
+    assert busy.value.site_id == "north"
+    # All or nothing: a batch that does not fit queues no frame
+    with pytest.raises(SiteBusy):
+        scheduler.submit_many("south", ["s0", "s1", "s2"])
+    assert scheduler.has_capacity("south", 2)
+    assert scheduler.has_capacity("north", lane=REALTIME)
+    stats = scheduler.stats()["sites"]
+    assert (stats["north"]["rejected"], stats["south"]["rejected"]) == (1, 3)
+    with pytest.raises(UnknownSite):
+        scheduler.submit("east", "e0")
+
+    alpr.gate.set()
+    assert [f.result(5) for f in queued] == [["n0"], ["n1"]]
+    scheduler.close()
+
+
+def test_site_alpr_queues_large_batches_in_chunks(alpr):
+    scheduler = make_scheduler(alpr, max_batch=8)
+    scheduler.add_site("north", max_pending=2)
+    site = SiteALPR(scheduler, "north")
+    assert site.predict_batch([f"n{i}" for i in range(5)]) == [[f"n{i}"] for i in range(5)]
+    assert all(len(batch) <= 2 for batch in alpr.batches)
+    assert site.predict("one") == ["one"]
+    assert site.with_lane(REALTIME).draw_predictions("frame") == "drawn frame"
+    scheduler.close()
+
+
+def test_failures_reach_the_callers(alpr):
+    scheduler = FairScheduler(lambda: None)
+    scheduler.add_site("north")
+    with pytest.raises(RuntimeError, match="not initialized"):
+        scheduler.submit("north", "n0").result(5)
+    scheduler.close()
+
+    scheduler = make_scheduler(alpr)
+    stall(scheduler, alpr)
+    waiting = scheduler.submit("blocker", "late")
+    closing = threading.Thread(target=scheduler.close)
+    closing.start()
+    with pytest.raises(RuntimeError, match="closed"):
+        waiting.result(5)
+    alpr.gate.set()
+    closing.join(5)
+    with pytest.raises(RuntimeError, match="closed"):
+        scheduler.submit("blocker", "after close")
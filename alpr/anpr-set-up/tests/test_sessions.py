@@ -0,0 +1,115 @@
+"""
+Test the session engine's entry/exit state machine, expiry and snapshots.
+"""
+import time
+
+import pytest
+
+from sessions import DIRECTION_ENTRY, DIRECTION_EXIT, SessionEngine, parse_direction
+
+
+def test_entry_and_exit_open_and_close_a_session():
+    engine = SessionEngine()
+    opened = engine.record("191-D-12345", DIRECTION_ENTRY, camera_id="gate-in", timestamp=1000)
+    assert opened["open"] and opened["entry_camera"] == "gate-in"
+    # Undirected scans only refresh an open session
+    assert engine.record("191 d 12345", None, timestamp=1100)["sightings"] == 2
+    assert engine.record("UNSEEN", None) is None
+    assert engine.occupancy()["occupancy"] == 1
+
+    closed = engine.record("191D12345", DIRECTION_EXIT, camera_id="gate-out", timestamp=1600)
+    assert not closed["open"]
+    assert closed["duration_seconds"] == 600
+    occupancy = engine.occupancy()
+    assert (occupancy["occupancy"], occupancy["peak"]) == (0, 1)
+    assert (occupancy["entries"], occupancy["exits"]) == (1, 1)
+
+    session = engine.session("191-D-12345")
+    assert not session["on_site"]
+    assert session["last"]["exit_camera"] == "gate-out"
+
+
+def test_repeated_and_unmatched_scans():
+    engine = SessionEngine(repeat_seconds=60)
+    engine.record("ABC123", DIRECTION_ENTRY, timestamp=0)
+    engine.record("ABC123", DIRECTION_ENTRY, timestamp=5)
+    engine.record("ABC123", DIRECTION_EXIT, timestamp=10)
+    engine.record("ABC123", DIRECTION_EXIT, timestamp=20)
+    unmatched = engine.record("XYZ9", DIRECTION_EXIT, timestamp=30)
+    assert unmatched["entered_at"] is None and unmatched["duration_seconds"] is None
+
+    counters = engine.occupancy()
+    assert counters["repeat_entries"] == 1
+    assert counters["repeat_exits"] == 1
+    assert counters["unmatched_exits"] == 1
+
+
+def test_sites_are_tracked_separately():
+    engine = SessionEngine()
+    engine.record("ABC123", DIRECTION_ENTRY, site_id="north")
+    engine.record("ABC123", DIRECTION_ENTRY, site_id="south")
+    engine.record("ABC123", DIRECTION_EXIT, site_id="south")
+    assert engine.occupancy("north")["occupancy"] == 1
+    assert engine.occupancy("south")["occupancy"] == 0
+    assert [s["site_id"] for s in engine.find("abc-123")] == ["north", "south"]
+
+
+def test_expiry_without_a_snapshot():
+    engine = SessionEngine(max_session_seconds=3600)
+    try:
+        now = time.time()
+        engine.record("OLD1", DIRECTION_ENTRY, timestamp=now - 7200)
+        engine.record("NEW1", DIRECTION_ENTRY, timestamp=now)
+        assert engine.expire(now) == 1
+        assert [s["plate"] for s in engine.open_sessions()] == ["NEW1"]
+        assert engine.occupancy()["expired"] == 1
+        assert engine.session("OLD1")["last"]["exited_at"] is not None
+    finally:
+        engine.close()
+
+
+def test_upkeep_thread_expires_sessions():
+    engine = SessionEngine(snapshot_interval=0.02, max_session_seconds=0.05)
+    try:
+        engine.record("ABC123", DIRECTION_ENTRY)
+        deadline = time.monotonic() + 5
+        while engine.occupancy()["occupancy"] and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert engine.occupancy()["expired"] == 1
+    finally:
+        engine.close()
+
+
+def test_snapshot_is_reloaded(tmp_path):
+    path = tmp_path / "sessions.snapshot"
+    engine = SessionEngine(snapshot_path=str(path), max_session_seconds=3600)
+    engine.record("ABC123", DIRECTION_ENTRY, site_id="north", camera_id="gate-in", in_database=True)
+    engine.record("XYZ9", DIRECTION_ENTRY, site_id="north")
+    engine.record("XYZ9", DIRECTION_EXIT, site_id="north")
+    engine.close()
+    assert path.exists()
+
+    restored = SessionEngine(snapshot_path=str(path))
+    try:
+        assert restored.occupancy("north")["occupancy"] == 1
+        assert restored.occupancy("north")["entries"] == 2
+        [session] = restored.open_sessions("north")
+        assert (session["plate"], session["entry_camera"], session["in_database"]) == ("ABC123", "gate-in", True)
+        assert restored.session("XYZ9", "north")["last"] is not None
+    finally:
+        restored.close()
+
+
+def test_unreadable_snapshot_starts_empty(tmp_path):
+    path = tmp_path / "sessions.snapshot"
+    path.write_bytes(b"not a pickle")
+    engine = SessionEngine(snapshot_path=str(path))
+    assert engine.stats()["open"] == 0
+    engine.close()
+
+
+def test_parse_direction():
+    assert parse_direction(" Entry ") == DIRECTION_ENTRY
+    assert parse_direction("") is None
+    with pytest.raises(ValueError):
+        parse_direction("sideways")
@@ -0,0 +1,179 @@
+"""
+Test multi-site routing through one shared ALPR, with a fake ALPR.
+"""
+import io
+import threading
+import time
+from typing import NamedTuple, Optional
+
+import cv2
+import numpy as np
+import pytest
+from flask import Flask
+
+from sites import MultiSiteService, UnknownSite, create_site_routes
+
+# A frame filled with i reads as PLATES[i]
+PLATES = ["191-D-12345", "12-KY-999", "ABC-123"]
+
+
+class BoundingBox(NamedTuple):
+    x1: int
+    y1: int
+    x2: int
+    y2: int
+
+
+class Detection(NamedTuple):
+    confidence: float
+    bounding_box: BoundingBox
+
+
+class OcrResult(NamedTuple):
+    text: str
+    confidence: float
+
+
+class Result(NamedTuple):
+    detection: Detection
+    ocr: OcrResult
+    skip_reason: Optional[str] = None
+
+
+class FakeALPR:
+    """Reads one plate per frame; `gate` holds predict_batch until it is set."""
+
+    def __init__(self):
+        self.batches = []
+        self.entered = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def predict(self, frame):
+        return [Result(Detection(0.9, BoundingBox(1, 2, 3, 4)), OcrResult(PLATES[frame.flat[0]], 0.8))]
+
+    def predict_batch(self, frames):
+        self.entered.set()
+        self.gate.wait()
+        self.batches.append(len(frames))
+        return [self.predict(frame) for frame in frames]
+
+    def draw_predictions(self, frame):
+        return frame
+
+
+def frame(plate: int) -> np.ndarray:
+    return np.full((8, 8, 3), plate, np.uint8)
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def alpr():
+    return FakeALPR()
+
+
+@pytest.fixture
+def sites(tmp_path, alpr):
+    csv_path = tmp_path / "north.csv"
+    csv_path.write_text("registration,owner\n191-D-12345,Resident\n")
+    sites = MultiSiteService(
+        {
+            "north": {
+                "registrations_csv_path": str(csv_path),
+                "camera_directions": {"gate-in": "entry"},
+                "max_pending": 1,
+            },
+            "south": {"weight": 2},
+        },
+        logs_dir=str(tmp_path / "logs"),
+        alpr=alpr,
+        watch_registrations=False,
+    )
+    yield sites
+    alpr.gate.set()
+    sites.close()
+
+
+def test_each_site_has_its_own_registrations_logs_and_occupancy(sites, tmp_path):
+    north = sites.scan_image("north", image_array=frame(0), camera_id="gate-in")
+    south = sites.scan_image("south", image_array=frame(0))
+    assert north["success"] and south["success"]
+    assert north["plates"][0]["in_database"] is True
+    assert north["plates"][0]["vehicle_info"]["owner"] == "Resident"
+    assert south["plates"][0]["in_database"] is False
+
+    for service in sites.sites.values():
+        service.flush_logs()
+    for site_id in ("north", "south"):
+        [logged] = sites.site(site_id).get_vehicle_logs()
+        assert logged["plate_text"] == "191-D-12345"
+        log = (tmp_path / "logs" / site_id / "vehicle_scans.log").read_text()
+        assert f'"site_id": "{site_id}"' in log
+
+    # Only the gate camera at north has a direction
+    occupancy = sites.get_occupancy()
+    assert occupancy["total"] == 1
+    assert [site["occupancy"] for site in occupancy["sites"]] == [1, 0]
+    assert sites.sessions.find("191D12345")[0]["site_id"] == "north"
+
+
+def test_unknown_site(sites):
+    with pytest.raises(UnknownSite):
+        sites.scan_image("east", image_array=frame(0))
+    with pytest.raises(ValueError, match="Invalid site id"):
+        MultiSiteService({"../etc": {}}, alpr=FakeALPR())
+
+
+def test_summary_counts_a_plate_seen_at_two_sites_once(sites):
+    sites.scan_images("north", [frame(0), frame(1)])
+    sites.scan_images("south", [frame(0), frame(2)])
+    for service in sites.sites.values():
+        service.flush_logs()
+    summary = sites.get_summary(bucket="none")
+    assert summary["sites"] == ["north", "south"]
+    assert summary["scans"] == 4
+    assert summary["unique_plates"] == 3
+
+
+def test_routes(sites):
+    app = Flask(__name__)
+    create_site_routes(app, sites)
+    client = app.test_client()
+    image = cv2.imencode(".png", frame(2))[1].tobytes()
+
+    response = client.post("/api/sites/south/scan", data={"image": (io.BytesIO(image), "car.png")})
+    assert response.status_code == 200
+    assert response.get_json()["plates"][0]["text"] == "ABC-123"
+    assert client.post("/api/sites/east/scan", data={"image": (io.BytesIO(image), "car.png")}).status_code == 404
+    assert [site["site_id"] for site in client.get("/api/sites/").get_json()["sites"]] == ["north", "south"]
+
+
+def test_a_full_site_queue_answers_429(sites, alpr):
+    alpr.gate.clear()
+    # One frame stuck in the ALPR, one waiting: north's interactive lane is full
+    running = threading.Thread(target=sites.scan_image, args=("north",), kwargs={"image_array": frame(0)})
+    running.start()
+    assert alpr.entered.wait(5)
+    waiting = threading.Thread(target=sites.scan_image, args=("north",), kwargs={"image_array": frame(1)})
+    waiting.start()
+    wait_for(lambda: sites.scheduler.stats()["sites"]["north"]["pending"])
+
+    app = Flask(__name__)
+    create_site_routes(app, sites)
+    image = cv2.imencode(".png", frame(2))[1].tobytes()
+    response = app.test_client().post("/api/sites/north/scan", data={"image": (io.BytesIO(image), "car.png")})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+    # Other sites and lanes still have room
+    assert sites.scheduler.has_capacity("south")
+    assert sites.scheduler.has_capacity("north", lane="realtime")
+
+    alpr.gate.set()
+    running.join(5)
+    waiting.join(5)
@@ -0,0 +1,86 @@
+"""
+Test watchlist pattern matching, the lazily built automaton and list reloads.
+"""
+import fnmatch
+import random
+
+import pytest
+
+from watchlist import Watchlist, WatchEntry, WatchlistAutomaton, parse_pattern, read_watchlist
+
+
+def entries(*patterns: str):
+    return [WatchEntry(pattern, "test") for pattern in patterns]
+
+
+def matched(automaton: WatchlistAutomaton, plate: str):
+    return [entry.pattern for entry in automaton.match(plate)]
+
+
+def test_wildcards_match_the_whole_plate():
+    automaton = WatchlistAutomaton(entries("191-D-1??48", "*XYZ*", "AB*", "12KY999"))
+    assert matched(automaton, "191 d 12348") == ["191-D-1??48"]
+    assert matched(automaton, "191D123480") == []
+    assert matched(automaton, "XYZ") == ["*XYZ*"]
+    assert matched(automaton, "ABXYZ1") == ["*XYZ*", "AB*"]
+    assert matched(automaton, "12-ky-999") == ["12KY999"]
+    assert matched(automaton, "ZZZ") == []
+
+
+def test_agrees_with_fnmatch():
+    rng = random.Random(7)
+    alphabet = "AB1"
+    patterns = [
+        "".join(rng.choice(alphabet + "?*") for _ in range(rng.randint(1, 5))) for _ in range(200)
+    ]
+    patterns = [p for p in patterns if any(c.isalnum() for c in p)]
+    # A small state cache forces resets mid-run
+    automaton = WatchlistAutomaton(entries(*patterns), max_states=20)
+    for _ in range(300):
+        plate = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 7)))
+        expected = sorted({p for p in patterns if fnmatch.fnmatchcase(plate, p)})
+        assert sorted(set(matched(automaton, plate))) == expected
+    assert automaton.dfa_resets > 0
+
+
+def test_parse_pattern():
+    assert parse_pattern("191-d-1??48") == "191D1??48"
+    assert parse_pattern("**XYZ***") == "*XYZ*"
+    for pattern in ("*?*", "AB#1", ""):
+        with pytest.raises(ValueError):
+            parse_pattern(pattern)
+
+
+def test_read_watchlist_skips_bad_rows(tmp_path):
+    path = tmp_path / "stolen.csv"
+    path.write_text("pattern,category,notes\n191-D-1??48,stolen,Reported\n,,\n??,,\n*XYZ*,barred,\n")
+    found, errors = read_watchlist(path)
+    assert found == [
+        WatchEntry("191-D-1??48", "stolen", "stolen", "Reported"),
+        WatchEntry("*XYZ*", "stolen", "barred", ""),
+    ]
+    assert len(errors) == 1 and ":4:" in errors[0]
+
+
+def test_lists_reload_when_a_file_changes(tmp_path):
+    stolen = tmp_path / "stolen.csv"
+    barred = tmp_path / "barred.csv"
+    stolen.write_text("pattern\nABC*\n")
+    watchlist = Watchlist([str(stolen), str(barred)], watch=False)
+    assert len(watchlist) == 1
+    assert watchlist.reload()["mode"] == "unchanged"
+
+    barred.write_text("pattern\n*123\n")
+    assert watchlist.changed()
+    stats = watchlist.reload()
+    assert (stats["mode"], stats["patterns"]) == ("full", 2)
+    assert [(e.pattern, e.list_name) for e in watchlist.match("ABC123")] == [("ABC*", "stolen"), ("*123", "barred")]
+
+    before = watchlist.automaton
+    watchlist.replace(entries("XYZ9"))
+    assert matched(watchlist.automaton, "XYZ9") == ["XYZ9"]
+    # A reload compiles a new automaton; the old one keeps working
+    assert [e.pattern for e in before.match("ABC123")] == ["ABC*", "*123"]
+    with pytest.raises(ValueError):
+        watchlist.replace(entries("#"))
+    assert len(watchlist) == 1
@@ -0,0 +1,404 @@
+"""
+Watchlists of partial plates, for stolen or barred vehicle alerts.
+
+Security often only has part of a plate. A watchlist pattern uses "?" for
+any one character and "*" for any run of characters (including none), and
+must match the whole plate: "191-D-1??48" matches "191-D-12348", and "*XYZ*"
+matches any plate containing XYZ. Patterns and plates are compared in
+canonical form (see plates.canonical_plate), so case, spaces and dashes are
+ignored.
+
+Every pattern of every list is compiled into one automaton. The patterns
+form a trie in which "?" and "*" are edges too; the trie is run as an NFA and
+determinized lazily: each DFA state is the set of trie nodes a plate prefix
+can be at, built the first time a plate reaches it, and its transitions are
+cached per character. Checking a plate is then one dict lookup per
+character, however many patterns there are, and a plate that leaves every
+pattern stops early. Plates only ever reach a small part of the full DFA, so
+it stays small even for thousands of "*" patterns (and is rebuilt from
+scratch if it ever passes max_states).
+
+Lists are CSV files, reloaded in the background when they change; a reload
+compiles a new automaton and swaps it in with one attribute assignment, like
+the registrations snapshot.
+
+CSV format (one file per list, named after the file):
+    pattern,category,notes
+    191-D-1??48,stolen,Reported 2024-03-02
+    *XYZ*,barred,Partial plate from CCTV
+"""
+import csv
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+from plates import canonical_plate
+
+ANY_CHAR = '?'
+ANY_RUN = '*'
+
+DEFAULT_MAX_STATES = 100000
+
+_DEAD = 0
+_START = 1
+
+
+class WatchEntry(NamedTuple):
+    """One watchlist pattern."""
+
+    pattern: str
+    list_name: str
+    category: str = ''
+    notes: str = ''
+
+
+def parse_pattern(pattern: str) -> str:
+    """
+    Canonical form of a watchlist pattern.
+
+    Raises:
+        ValueError: If the pattern has characters other than letters, digits,
+            "?" and "*", or no literal character (it would match every plate
+            of some length)
+    """
+    canonical = canonical_plate(pattern)
+    while ANY_RUN * 2 in canonical:
+        canonical = canonical.replace(ANY_RUN * 2, ANY_RUN)
+    if not all(c.isalnum() or c in (ANY_CHAR, ANY_RUN) for c in canonical):
+        raise ValueError(f"Invalid watchlist pattern {pattern!r}: use letters, digits, '?' and '*'")
+    if not any(c.isalnum() for c in canonical):
+        raise ValueError(f"Watchlist pattern {pattern!r} has no plate characters")
+    return canonical
+
+
+class _DFA:
+    """Lazily built DFA states. Grows while plates are matched; replaced, never cleared."""
+
+    __slots__ = ('states', 'ids', 'transitions', 'matches')
+
+    def __init__(self, start: FrozenSet[int], start_matches: Tuple[int, ...]):
+        self.states: List[FrozenSet[int]] = [frozenset(), start]
+        self.ids: Dict[FrozenSet[int], int] = {frozenset(): _DEAD, start: _START}
+        # State -> {character: next state}
+        self.transitions: List[Dict[str, int]] = [{}, {}]
+        # State -> indices of the entries whose pattern is matched there
+        self.matches: List[Tuple[int, ...]] = [(), start_matches]
+
+
+class WatchlistAutomaton:
+    """
+    Immutable set of compiled patterns; a reload builds a new one.
+
+    Thread-safe: matching never blocks on another match, only the creation
+    of a DFA state the first time a plate reaches it takes a lock.
+    """
+
+    def __init__(self, entries: Iterable[WatchEntry], max_states: int = DEFAULT_MAX_STATES):
+        """
+        Compile the patterns.
+
+        Args:
+            entries: Patterns to match (invalid ones raise ValueError, see parse_pattern)
+            max_states: DFA states kept before the cache is rebuilt from scratch
+        """
+        self.entries: Tuple[WatchEntry, ...] = tuple(entries)
+        self.max_states = max_states
+        # Trie of the patterns: literal children, the "?" child, the "*" child
+        self._children: List[Dict[str, int]] = [{}]
+        self._any_char: List[int] = [-1]
+        self._any_run: List[int] = [-1]
+        self._accepts: List[List[int]] = [[]]
+        for index, entry in enumerate(self.entries):
+            self._insert(parse_pattern(entry.pattern), index)
+        # Node -> itself plus the "*" nodes reachable without reading a character
+        self._closure: List[Tuple[int, ...]] = [
+            self._node_closure(node) for node in range(len(self._children))
+        ]
+        # "*" nodes loop on every character
+        self._run_nodes = frozenset(node for node in self._any_run if node >= 0)
+        self._lock = threading.Lock()
+        self._dfa = self._new_dfa()
+        self.dfa_resets = 0
+
+    def _add_node(self) -> int:
+        self._children.append({})
+        self._any_char.append(-1)
+        self._any_run.append(-1)
+        self._accepts.append([])
+        return len(self._children) - 1
+
+    def _insert(self, pattern: str, index: int):
+        node = 0
+        for char in pattern:
+            if char == ANY_CHAR:
+                if self._any_char[node] < 0:
+                    self._any_char[node] = self._add_node()
+                node = self._any_char[node]
+            elif char == ANY_RUN:
+                if self._any_run[node] < 0:
+                    self._any_run[node] = self._add_node()
+                node = self._any_run[node]
+            else:
+                child = self._children[node].get(char)
+                if child is None:
+                    child = self._children[node][char] = self._add_node()
+                node = child
+        self._accepts[node].append(index)
+
+    def _node_closure(self, node: int) -> Tuple[int, ...]:
+        nodes = [node]
+        while self._any_run[node] >= 0:
+            node = self._any_run[node]
+            nodes.append(node)
+        return tuple(nodes)
+
+    def _new_dfa(self) -> _DFA:
+        start = frozenset(self._closure[0])
+        return _DFA(start, self._matches_of(start))
+
+    def _matches_of(self, nodes: FrozenSet[int]) -> Tuple[int, ...]:
+        return tuple(sorted(index for node in nodes for index in self._accepts[node]))
+
+    def _step(self, dfa: _DFA, state: int, char: str) -> int:
+        """Build (or find) the state after reading `char` in `state`, and cache the transition."""
+        run_nodes = self._run_nodes
+        target = set()
+        for node in dfa.states[state]:
+            child = self._children[node].get(char)
+            if child is not None:
+                target.update(self._closure[child])
+            child = self._any_char[node]
+            if child >= 0:
+                target.update(self._closure[child])
+            if node in run_nodes:
+                target.add(node)
+        nodes = frozenset(target)
+        with self._lock:
+            next_state = dfa.ids.get(nodes)
+            if next_state is None:
+                if len(dfa.states) >= self.max_states and dfa is self._dfa:
+                    # Pathological traffic; start over rather than grow without bound.
+                    # Matches in progress finish on the old DFA.
+                    self._dfa = self._new_dfa()
+                    self.dfa_resets += 1
+                next_state = len(dfa.states)
+                dfa.states.append(nodes)
+                dfa.ids[nodes] = next_state
+                dfa.transitions.append({})
+                dfa.matches.append(self._matches_of(nodes))
+            dfa.transitions[state][char] = next_state
+        return next_state
+
+    def match(self, plate_text: str) -> List[WatchEntry]:
+        """Entries whose pattern matches the whole plate (case, spaces and dashes ignored)."""
+        dfa = self._dfa
+        transitions = dfa.transitions
+        state = _START
+        for char in canonical_plate(plate_text):
+            next_state = transitions[state].get(char)
+            if next_state is None:
+                next_state = self._step(dfa, state, char)
+            if next_state == _DEAD:
+                return []
+            state = next_state
+        return [self.entries[index] for index in dfa.matches[state]]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def stats(self) -> Dict:
+        return {
+            "patterns": len(self.entries),
+            "trie_nodes": len(self._children),
+            "dfa_states": len(self._dfa.states),
+            "dfa_resets": self.dfa_resets,
+        }
+
+
+EMPTY_AUTOMATON = WatchlistAutomaton(())
+
+
+def read_watchlist(path, list_name: Optional[str] = None) -> Tuple[List[WatchEntry], List[str]]:
+    """
+    Read one watchlist CSV.
+
+    Args:
+        path: CSV with a "pattern" column and optional "category" and "notes"
+        list_name: Name reported with its matches (default: the file name without extension)
+
+    Returns:
+        Tuple of (valid entries, error messages for the rows that were skipped)
+    """
+    list_name = list_name or Path(path).stem
+    entries, errors = [], []
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            pattern = (row.get('pattern') or '').strip()
+            if not pattern:
+                continue
+            try:
+                parse_pattern(pattern)
+            except ValueError as e:
+                errors.append(f"{path}:{line}: {e}")
+                continue
+            entries.append(WatchEntry(
+                pattern,
+                list_name,
+                (row.get('category') or '').strip(),
+                (row.get('notes') or '').strip(),
+            ))
+    return entries, errors
+
+
+class Watchlist:
+    """
+    Watchlist CSV files compiled into one automaton, optionally kept in sync with the files.
+    """
+
+    def __init__(
+        self,
+        paths: Optional[Iterable[str]] = None,
+        watch: bool = True,
+        poll_interval: float = 2.0,
+        max_states: int = DEFAULT_MAX_STATES
+    ):
+        """
+        Load the lists and (optionally) start watching them.
+
+        Args:
+            paths: Watchlist CSV files, one list each. A missing file is an empty
+                list, picked up if it appears later.
+            watch: Poll the files for changes and reload automatically
+            poll_interval: Seconds between checks of the files' mtime and size
+            max_states: DFA states cached before the cache is rebuilt (see WatchlistAutomaton)
+        """
+        self.paths = [str(path) for path in paths or ()]
+        self.poll_interval = poll_interval
+        self.max_states = max_states
+        self.automaton = EMPTY_AUTOMATON
+        self.loaded_at: Optional[float] = None
+        self._stats: Tuple[Optional[Tuple[int, int]], ...] = ()
+        self._errors: List[str] = []
+        # Serializes reloads; matching never takes it
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        if self.paths:
+            self.reload(force=True)
+            if watch:
+                self.start_watching()
+
+    def _stat(self) -> Tuple[Optional[Tuple[int, int]], ...]:
+        stats = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                stats.append(None)
+            else:
+                stats.append((st.st_mtime_ns, st.st_size))
+        return tuple(stats)
+
+    def changed(self) -> bool:
+        """Whether any file's mtime or size differs from the loaded lists."""
+        return self._stat() != self._stats
+
+    def reload(self, force: bool = False) -> Dict:
+        """
+        Recompile the lists if any file changed.
+
+        Args:
+            force: Reload even if the files look unchanged
+
+        Returns:
+            Reload stats: mode ("unchanged", "full" or "error"), patterns,
+            invalid (rows skipped), lists and seconds
+        """
+        with self._reload_lock:
+            stats = self._stat()
+            if not force and stats == self._stats:
+                return {'mode': 'unchanged', 'patterns': len(self.automaton), 'invalid': 0,
+                        'lists': len(self.paths), 'seconds': 0.0}
+            started = time.perf_counter()
+            entries, errors = [], []
+            try:
+                for path, stat in zip(self.paths, stats):
+                    if stat is not None:
+                        list_entries, list_errors = read_watchlist(path)
+                        entries.extend(list_entries)
+                        errors.extend(list_errors)
+                automaton = WatchlistAutomaton(entries, self.max_states)
+            except Exception as e:
+                print(f"Error loading watchlists: {e}")
+                return {'mode': 'error', 'error': str(e), 'patterns': len(self.automaton)}
+            self.automaton = automaton
+            self._stats = stats
+            self._errors = errors
+            self.loaded_at = time.time()
+            seconds = time.perf_counter() - started
+
+        for error in errors:
+            print(f"Skipped watchlist row: {error}")
+        print(f"Loaded {len(entries)} watchlist patterns from {len(self.paths)} lists "
+              f"in {seconds * 1000:.1f} ms")
+        return {'mode': 'full', 'patterns': len(entries), 'invalid': len(errors),
+                'lists': len(self.paths), 'seconds': round(seconds, 4)}
+
+    def replace(self, entries: Iterable[WatchEntry]) -> Dict:
+        """
+        Swap in patterns that come from somewhere other than the CSV files.
+
+        Raises:
+            ValueError: If a pattern is invalid (the current lists are kept)
+        """
+        with self._reload_lock:
+            started = time.perf_counter()
+            self.automaton = WatchlistAutomaton(entries, self.max_states)
+            self.loaded_at = time.time()
+            seconds = time.perf_counter() - started
+        return {'mode': 'replace', 'patterns': len(self.automaton), 'invalid': 0,
+                'lists': len({entry.list_name for entry in self.automaton.entries}),
+                'seconds': round(seconds, 4)}
+
+    def match(self, plate_text: str) -> List[WatchEntry]:
+        """Entries of the current lists whose pattern matches the plate."""
+        return self.automaton.match(plate_text)
+
+    def __len__(self) -> int:
+        return len(self.automaton)
+
+    def stats(self) -> Dict:
+        """Pattern and automaton counters for the metrics endpoints."""
+        return {
+            **self.automaton.stats(),
+            "lists": len(self.paths),
+            "invalid": len(self._errors),
+            "loaded_at": self.loaded_at,
+        }
+
+    def start_watching(self):
+        """Start the background thread that reloads the lists when they change."""
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(
+            target=self._watch_loop, name='watchlist-watcher', daemon=True
+        )
+        self._watcher.start()
+
+    def _watch_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                if self.changed():
+                    self.reload()
+            except Exception as e:
+                print(f"Error watching watchlists: {e}")
+
+    def stop(self):
+        """Stop the watcher thread."""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None